@@ -0,0 +1,52 @@
+"""Add stripe_webhook_events inbox table
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the durable inbox for verified Stripe webhook events."""
+    
+    op.create_table(
+        'stripe_webhook_events',
+        sa.Column('id', sa.String(255), nullable=False),
+        sa.Column('event_type', sa.String(100), nullable=False),
+        sa.Column('stripe_customer_id', sa.String(255), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('stripe_created_at', sa.DateTime(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    
+    op.create_index('ix_stripe_webhook_events_event_type', 'stripe_webhook_events', ['event_type'])
+    op.create_index('ix_stripe_webhook_events_status', 'stripe_webhook_events', ['status'])
+    op.create_index(
+        'ix_stripe_webhook_events_customer_order',
+        'stripe_webhook_events',
+        ['stripe_customer_id', 'status', 'stripe_created_at']
+    )
+
+
+def downgrade() -> None:
+    """Drop the Stripe webhook inbox."""
+    
+    op.drop_index('ix_stripe_webhook_events_customer_order', table_name='stripe_webhook_events')
+    op.drop_index('ix_stripe_webhook_events_status', table_name='stripe_webhook_events')
+    op.drop_index('ix_stripe_webhook_events_event_type', table_name='stripe_webhook_events')
+    op.drop_table('stripe_webhook_events')
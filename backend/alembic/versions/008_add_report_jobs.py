@@ -0,0 +1,51 @@
+"""Add report_jobs table
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the background report job table."""
+    
+    op.create_table(
+        'report_jobs',
+        sa.Column('id', sa.String(36), nullable=False),
+        sa.Column('company_id', sa.String(36), nullable=False),
+        sa.Column('requested_by', sa.String(36), nullable=True),
+        sa.Column('report_type', sa.String(20), nullable=False),
+        sa.Column('parameters', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='queued'),
+        sa.Column('file_key', sa.String(512), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('NOW()')),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['requested_by'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    
+    op.create_index('ix_report_jobs_company_id', 'report_jobs', ['company_id'])
+    op.create_index('ix_report_jobs_status', 'report_jobs', ['status'])
+
+
+def downgrade() -> None:
+    """Drop the report job table."""
+    
+    op.drop_index('ix_report_jobs_status', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_company_id', table_name='report_jobs')
+    op.drop_table('report_jobs')
@@ -0,0 +1,30 @@
+"""Add cache_key to report_jobs
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add the content address used to reuse generated reports."""
+    
+    op.add_column('report_jobs', sa.Column('cache_key', sa.String(64), nullable=True))
+    op.create_index('ix_report_jobs_cache_key', 'report_jobs', ['cache_key'])
+
+
+def downgrade() -> None:
+    """Remove the report cache key."""
+    
+    op.drop_index('ix_report_jobs_cache_key', table_name='report_jobs')
+    op.drop_column('report_jobs', 'cache_key')
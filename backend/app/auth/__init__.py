@@ -9,6 +9,7 @@ from .security import (
     get_current_user,
     get_current_active_user,
     get_company_context,
+    require_super_admin,
     require_admin,
     require_manager,
     require_employee,
@@ -23,6 +24,7 @@ __all__ = [
     "get_current_user",
     "get_current_active_user",
     "get_company_context",
+    "require_super_admin",
     "require_admin",
     "require_manager",
     "require_employee",
@@ -96,6 +96,28 @@ def decode_token(token: str) -> dict:
         )
 
 
+def peek_access_token(authorization: Optional[str]) -> Optional[dict]:
+    """
+    Claims of the access token in an Authorization header, if it is valid.
+    
+    For middleware that needs the caller's identity before the request is
+    authenticated (e.g. rate limiting); never raises.
+    
+    Args:
+        authorization: Authorization header value
+    
+    Returns:
+        Token claims, or None for a missing, invalid or expired token
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return None
+    return payload if payload.get("type") == "access" else None
+
+
 async def get_current_user(
     request: Request,
     token: str = Depends(oauth2_scheme),
@@ -196,7 +218,8 @@ async def get_current_user(
             detail="Your account is inactive. Please contact your administrator."
         )
     
-    logger.info(f"✅ Auth successful for user {user.email} (Company: {user.company_id})")
+    # Runs on every authenticated request: sampled (log_sampling) and only formatted when kept
+    logger.info("Auth successful for user %s (Company: %s)", user.id, user.company_id)
     return user
 
 
@@ -257,6 +280,7 @@ class RoleChecker:
 
 
 # Role-based dependencies
+require_super_admin = RoleChecker(["super_admin"])
 require_admin = RoleChecker(["company_admin", "super_admin"])
 require_manager = RoleChecker(["manager", "company_admin", "super_admin"])
 require_employee = RoleChecker(["employee", "manager", "company_admin", "super_admin"])
@@ -1,7 +1,10 @@
 """Celery configuration for background tasks."""
 
 from celery import Celery
-from ..config import settings
+from celery.schedules import crontab
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from .config import settings
+from .utils.request_context import request_id_var
 
 # Create Celery app
 celery_app = Celery(
@@ -22,11 +25,55 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    beat_schedule={
+        "evict-stale-reports": {
+            "task": "evict_stale_reports",
+            "schedule": crontab(hour=3, minute=0),
+        },
+        "reap-stale-report-jobs": {
+            "task": "reap_stale_report_jobs",
+            "schedule": crontab(minute="*/5"),
+        },
+        "drain-stripe-webhook-inbox": {
+            "task": "drain_stripe_webhook_inbox",
+            "schedule": crontab(minute="*/5"),
+        },
+        "reconcile-document-index": {
+            "task": "reconcile_document_index",
+            "schedule": crontab(minute=30),
+        },
+    },
 )
 
 # Auto-discover tasks from tasks module
 celery_app.autodiscover_tasks(['app.tasks'])
 
+# request_id_var tokens of the tasks running in this process, by task id
+_request_id_tokens = {}
+
+
+@before_task_publish.connect
+def propagate_request_id(headers=None, **kwargs):
+    """Send the id of the current request with the tasks it enqueues."""
+    request_id = request_id_var.get()
+    if request_id and headers is not None:
+        headers.setdefault("request_id", request_id)
+
+
+@task_prerun.connect
+def bind_request_id(task_id=None, task=None, **kwargs):
+    """Run a task (and its logs) in the context of the request that enqueued it."""
+    request_id = getattr(task.request, "request_id", None) or request_id_var.get()
+    _request_id_tokens[task_id] = request_id_var.set(request_id)
+
+
+@task_postrun.connect
+def unbind_request_id(task_id=None, **kwargs):
+    """Restore the request id of the process after a task."""
+    token = _request_id_tokens.pop(task_id, None)
+    if token is not None:
+        request_id_var.reset(token)
+
 
 @celery_app.task(bind=True)
 def debug_task(self):
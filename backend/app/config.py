@@ -1,7 +1,7 @@
 """Application configuration using Pydantic settings."""
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -16,11 +16,20 @@ class Settings(BaseSettings):
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
+    warmup_enabled: bool = True  # open pools and load configured SDKs before serving
+    server_timing_enabled: bool = True  # per-stage durations in the Server-Timing response header
     
     # Database
     database_url: str
     database_pool_size: int = 20
     database_max_overflow: int = 0
+    database_init_mode: str = "auto"  # "create_all", "check" (Alembic head) or "none"; auto = check in production
+    database_require_migrations: bool = False  # refuse to start when the schema is not at the Alembic head
+    query_count_warning_threshold: int = 50  # SQL statements per request
+    repeated_query_threshold: int = 10  # executions of one statement shape per request
+    slow_query_threshold_ms: int = 200
+    slow_query_log_size: int = 1000  # recent slow statements kept in memory
+    slow_query_explain_sample_rate: float = 0.0  # share of slow SELECTs explained (PostgreSQL)
     
     # JWT
     secret_key: str
@@ -34,6 +43,17 @@ class Settings(BaseSettings):
     redis_db: int = 0
     redis_password: str = ""
     
+    # Rate limiting (per-plan limits are in PLAN_CONFIGS)
+    rate_limit_enabled: bool = True
+    rate_limit_anonymous_per_minute: int = 60  # per client IP
+    rate_limit_redis_timeout_seconds: float = 0.1
+    rate_limit_redis_retry_seconds: int = 30  # use local buckets this long after a Redis failure
+    
+    # Health checks (/health/ready)
+    readiness_checks: List[str] = ["postgres", "mongodb", "redis"]
+    readiness_timeout_seconds: float = 2.0  # per dependency
+    readiness_cache_seconds: float = 2.0
+    
     # MongoDB
     mongodb_url: str = "mongodb://localhost:27017/pulse_logs"
     mongodb_host: str = "localhost"
@@ -49,6 +69,10 @@ class Settings(BaseSettings):
     # File Upload
     max_upload_size: int = 10485760  # 10MB
     upload_dir: str = "./uploads"
+    storage_backend: str = "s3"  # "s3" or "local" (files under upload_dir)
+    download_url_cache_size: int = 10000
+    download_url_refresh_margin_seconds: int = 300
+    derivative_workers: int = 2  # threads rendering thumbnails and previews
     
     # Stripe (Phase 1)
     stripe_secret_key: str = ""
@@ -59,17 +83,30 @@ class Settings(BaseSettings):
     stripe_price_id_payroll: str = ""
     stripe_price_id_communication: str = ""
     stripe_price_id_all_access: str = ""
+    stripe_cache_ttl_seconds: int = 60
+    stripe_webhook_lock_timeout_seconds: int = 300
+    entitlement_cache_ttl_seconds: int = 300
+    cache_invalidation_timeout_seconds: float = 1.0  # Redis publish of cache invalidations
     
     # SendGrid (Phase 1)
     sendgrid_api_key: str = ""
     sender_email: str = "noreply@pulse.com"
     sender_name: str = "Pulse"
+    sendgrid_api_url: str = "https://api.sendgrid.com"
+    email_max_connections: int = 20
     
     # AWS S3 (Phase 2)
     aws_access_key_id: str = ""
     aws_secret_access_key: str = ""
     aws_s3_bucket_name: str = ""
     aws_region: str = "us-east-1"
+    s3_multipart_chunk_size: int = 8388608  # 8MB
+    s3_max_concurrency: int = 4
+    
+    # Reports
+    report_workers: int = 2
+    report_cache_ttl_days: int = 30
+    report_job_timeout_minutes: int = 15
     
     # Sentry (Phase 2)
     sentry_dsn: str = ""
@@ -83,6 +120,15 @@ class Settings(BaseSettings):
     # Logging
     log_level: str = "INFO"
     log_file: str = "logs/app.log"
+    log_format: str = "text"  # "text" (colored console) or "json" (one object per line)
+    log_async: bool = True  # write records from a listener thread instead of the caller
+    log_queue_size: int = 10000  # records waiting for the listener; more are dropped
+    log_sampling: Dict[str, float] = {"app.auth.security": 0.01}  # share of DEBUG/INFO records kept, by logger
+    log_ship_to_mongodb: bool = False  # also store records in the ApplicationLog collection
+    log_ship_level: str = "WARNING"
+    log_ship_batch_size: int = 100
+    log_ship_interval_seconds: float = 2.0
+    log_ship_buffer_size: int = 10000
     
     model_config = SettingsConfigDict(
         env_file=".env",
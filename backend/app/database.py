@@ -3,9 +3,18 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Any, Deque, Dict, Generator, List, Optional, Set
+import logging
+import random
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 # Create database engine
 engine_kwargs = {
     "pool_pre_ping": True,  # Verify connections before using them
@@ -54,6 +63,332 @@ def init_db() -> None:
     Base.metadata.create_all(bind=engine)
 
 
+# Alembic project of the backend (alembic.ini's script_location is relative)
+ALEMBIC_DIR = Path(__file__).resolve().parent.parent / "alembic"
+
+DATABASE_INIT_MODES = ("create_all", "check", "none")
+
+
+def database_init_mode() -> str:
+    """
+    Schema step run at startup, from ``settings.database_init_mode``.
+    
+    ``auto`` checks migrations in production and creates tables elsewhere.
+    
+    Raises:
+        ValueError: If the configured mode is unknown
+    """
+    mode = settings.database_init_mode
+    if mode == "auto":
+        return "check" if settings.environment == "production" else "create_all"
+    if mode not in DATABASE_INIT_MODES:
+        raise ValueError(f"Unknown database_init_mode {mode!r}, expected auto or one of {DATABASE_INIT_MODES}")
+    return mode
+
+
+@dataclass
+class MigrationStatus:
+    """Alembic revisions of the database and of the migration scripts."""
+    
+    current: Set[str]
+    heads: Set[str]
+    
+    @property
+    def up_to_date(self) -> bool:
+        return self.current == self.heads
+
+
+def migration_status() -> MigrationStatus:
+    """Read the revision stamped in ``alembic_version`` and the script heads."""
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    heads = ScriptDirectory.from_config(config).get_heads()
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_heads()
+    return MigrationStatus(current=set(current), heads=set(heads))
+
+
+def check_migrations() -> Optional[MigrationStatus]:
+    """
+    Check that the database schema is at the Alembic head revision.
+    
+    A database behind the migrations is logged, or refused when
+    ``database_require_migrations`` is set.
+    
+    Returns:
+        Migration status, or None if it could not be determined
+        
+    Raises:
+        RuntimeError: If migrations are required and the schema is not at head
+    """
+    try:
+        status = migration_status()
+    except Exception as e:
+        message = f"Could not check database migrations: {e}"
+        if settings.database_require_migrations:
+            raise RuntimeError(message) from e
+        logger.warning(message)
+        return None
+    
+    if status.up_to_date:
+        logger.info(f"Database schema at migration head {', '.join(sorted(status.heads))}")
+        return status
+    
+    message = (
+        f"Database schema is at {', '.join(sorted(status.current)) or 'no revision'}, "
+        f"migrations head is {', '.join(sorted(status.heads))}; run `alembic upgrade head`"
+    )
+    if settings.database_require_migrations:
+        raise RuntimeError(message)
+    logger.warning(message)
+    return status
+
+
+def prepare_database() -> str:
+    """
+    Run the startup schema step for ``database_init_mode``.
+    
+    ``create_all`` issues DDL for missing tables (development and tests);
+    ``check`` only compares the schema revision with the Alembic head, so
+    production pods start without catalog queries for every table.
+    
+    Returns:
+        The mode that was run
+    """
+    mode = database_init_mode()
+    if mode == "create_all":
+        init_db()
+    elif mode == "check":
+        check_migrations()
+    return mode
+
+
 def close_db() -> None:
     """Close database connection."""
     engine.dispose()
+
+
+def describe_parameters(parameters: Any) -> Any:
+    """Describe bound parameters by type, without their values."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: describe the first row
+            return {"rows": len(parameters), "row": describe_parameters(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+@dataclass
+class SlowQuery:
+    """One statement that exceeded the slow query threshold."""
+    
+    statement: str  # normalized, without literal values
+    parameters: Any  # parameter types
+    duration_ms: float
+    route: Optional[str] = None
+    company_id: Optional[str] = None
+    request_id: Optional[str] = None
+    explain: Optional[str] = None
+    timestamp: datetime = field(default_factory=datetime.utcnow)
+
+
+@dataclass
+class SlowQueryStats:
+    """Slow executions of one normalized statement."""
+    
+    statement: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    routes: Dict[str, int] = field(default_factory=dict)
+    company_ids: Dict[str, int] = field(default_factory=dict)
+    last_parameters: Any = None
+    last_explain: Optional[str] = None
+    last_seen: Optional[datetime] = None
+
+
+class SlowQueryLog:
+    """
+    In-process log of statements slower than ``slow_query_threshold_ms``.
+    
+    Recent slow statements are kept in a ring buffer and aggregated by
+    normalized statement so the worst offenders by total time can be
+    listed. A sample of slow SELECTs on PostgreSQL also gets its plan
+    captured with ``EXPLAIN (ANALYZE, BUFFERS)``, which re-runs the query.
+    Records are persisted to the ``ApplicationLog`` Mongo collection by the
+    request middleware.
+    """
+    
+    # Bound on distinct statements aggregated; the least costly is dropped
+    MAX_STATEMENTS = 500
+    
+    def __init__(
+        self,
+        threshold_ms: float,
+        max_records: int = 1000,
+        explain_sample_rate: float = 0.0
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.records: Deque[SlowQuery] = deque(maxlen=max_records)
+        self.stats: Dict[str, SlowQueryStats] = {}
+        self._lock = Lock()
+    
+    def is_slow(self, duration: float) -> bool:
+        """Whether a statement duration (in seconds) is over the threshold."""
+        return duration * 1000 >= self.threshold_ms
+    
+    def observe(
+        self,
+        conn,
+        statement: str,
+        shape: str,
+        parameters: Any,
+        duration: float,
+        route: Optional[str] = None,
+        company_id: Optional[str] = None,
+        request_id: Optional[str] = None
+    ) -> SlowQuery:
+        """
+        Record a slow statement.
+        
+        Args:
+            conn: SQLAlchemy connection that executed the statement
+            statement: SQL statement as executed (used for EXPLAIN)
+            shape: Normalized statement
+            parameters: Bound parameters (only their types are kept)
+            duration: Execution time in seconds
+            route: Route template of the request, if any
+            company_id: Company of the request, if any
+            request_id: Id of the request, if any
+            
+        Returns:
+            The recorded slow query
+        """
+        explain = None
+        if self.explain_sample_rate and random.random() < self.explain_sample_rate:
+            explain = self.explain(conn, statement, parameters)
+        
+        record = SlowQuery(
+            statement=shape,
+            parameters=describe_parameters(parameters),
+            duration_ms=round(duration * 1000, 3),
+            route=route,
+            company_id=company_id,
+            request_id=request_id,
+            explain=explain
+        )
+        
+        with self._lock:
+            self.records.append(record)
+            stats = self.stats.get(shape)
+            if stats is None:
+                if len(self.stats) >= self.MAX_STATEMENTS:
+                    cheapest = min(self.stats.values(), key=lambda item: item.total_ms)
+                    del self.stats[cheapest.statement]
+                stats = self.stats[shape] = SlowQueryStats(statement=shape)
+            stats.count += 1
+            stats.total_ms += record.duration_ms
+            stats.max_ms = max(stats.max_ms, record.duration_ms)
+            if route:
+                stats.routes[route] = stats.routes.get(route, 0) + 1
+            if company_id:
+                stats.company_ids[company_id] = stats.company_ids.get(company_id, 0) + 1
+            stats.last_parameters = record.parameters
+            stats.last_explain = explain or stats.last_explain
+            stats.last_seen = record.timestamp
+        
+        logger.warning(f"Slow query ({record.duration_ms:.0f}ms) on {route or 'n/a'}: {shape[:300]}")
+        return record
+    
+    def explain(self, conn, statement: str, parameters: Any) -> Optional[str]:
+        """
+        Capture the plan of a slow SELECT on PostgreSQL.
+        
+        Runs in a savepoint on the same connection, so a failing EXPLAIN
+        does not abort the request's transaction.
+        
+        Returns:
+            Plan text, or None if the statement cannot be explained
+        """
+        if conn.dialect.name != "postgresql" or not statement.lstrip().upper().startswith("SELECT"):
+            return None
+        
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+                return plan
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                logger.warning(f"Failed to explain slow query: {e}")
+                return None
+        except Exception as e:
+            logger.warning(f"Failed to explain slow query: {e}")
+            return None
+        finally:
+            cursor.close()
+    
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Slow statements with the highest total time, worst first."""
+        with self._lock:
+            stats = sorted(self.stats.values(), key=lambda item: item.total_ms, reverse=True)[:limit]
+            return [asdict(item) for item in stats]
+    
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent slow statements, newest first."""
+        with self._lock:
+            return [asdict(record) for record in list(self.records)[::-1][:limit]]
+    
+    def clear(self) -> None:
+        """Forget all recorded slow statements."""
+        with self._lock:
+            self.records.clear()
+            self.stats.clear()
+    
+    async def persist(self, records: List[SlowQuery]) -> None:
+        """Write slow query records to the ApplicationLog collection (best effort)."""
+        from .mongodb import get_mongodb_client
+        from .mongo_models import ApplicationLog, LogLevel
+        
+        if not records or get_mongodb_client() is None:
+            return
+        
+        try:
+            await ApplicationLog.insert_many([
+                ApplicationLog(
+                    level=LogLevel.WARNING,
+                    logger_name=__name__,
+                    message=f"Slow query ({record.duration_ms:.0f}ms)",
+                    context={
+                        "statement": record.statement,
+                        "parameters": record.parameters,
+                        "duration_ms": record.duration_ms,
+                        "route": record.route,
+                        "explain": record.explain
+                    },
+                    company_id=record.company_id,
+                    request_id=record.request_id,
+                    timestamp=record.timestamp
+                )
+                for record in records
+            ])
+        except Exception as e:
+            logger.warning(f"Failed to persist slow queries: {e}")
+
+
+# Global slow query log
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.slow_query_threshold_ms,
+    max_records=settings.slow_query_log_size,
+    explain_sample_rate=settings.slow_query_explain_sample_rate
+)
@@ -3,21 +3,28 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 import time
 import logging
-import sentry_sdk
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 
 from .config import settings
-from .database import init_db, close_db
+from .database import engine, prepare_database, close_db
 from .mongodb import connect_mongodb, close_mongodb
 from .middleware.error_handler import add_error_handlers
-from .middleware.logging import setup_logging
+from .middleware.logging import log_shipper, setup_logging
 from .middleware.audit import AuditLogMiddleware
 from .middleware.tenant import TenantContextMiddleware
+from .middleware.metrics import MetricsMiddleware
+from .middleware.profiling import ProfilingMiddleware
+from .middleware.request_context import RequestContextMiddleware
+from .utils.email_dispatch import email_dispatcher
+from .utils.cache_invalidation import invalidation_listener
+from .utils.email_templates import email_templates
+from .utils.report_jobs import shutdown_report_process_pool
+from .utils.warmup import warmup
+from .utils.health import readiness_probe
+from .utils.metrics import instrument_engine, register_runtime_collector, render_metrics
 
 # Import routers
 from .routers import (
@@ -33,10 +40,15 @@ from .routers import (
 from .routers.billing import router as billing_router
 from .routers.files import router as files_router
 from .routers.reports import router as reports_router
+from .routers.monitoring import router as monitoring_router
 from .routers.websocket import router as websocket_router
 
-# Initialize Sentry for error monitoring (Phase 2)
+# Initialize Sentry for error monitoring (Phase 2); the SDK is only imported when configured
 if settings.sentry_dsn:
+    import sentry_sdk
+    from sentry_sdk.integrations.fastapi import FastApiIntegration
+    from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+
     sentry_sdk.init(
         dsn=settings.sentry_dsn,
         environment=settings.environment,
@@ -54,6 +66,10 @@ if settings.sentry_dsn:
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Prometheus instrumentation (exposed on /metrics)
+instrument_engine(engine)
+register_runtime_collector(engine)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -61,19 +77,31 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
     logger.info(f"Environment: {settings.environment}")
-    init_db()
-    logger.info("PostgreSQL database initialized")
+    schema_mode = prepare_database()
+    logger.info(f"PostgreSQL database initialized (schema: {schema_mode})")
     await connect_mongodb()
     logger.info("MongoDB initialized")
+    if settings.log_ship_to_mongodb:
+        log_shipper.start()
+    email_templates.load()
+    invalidation_listener.start()
+    if settings.warmup_enabled:
+        await warmup()
     
     yield
     
     # Shutdown
     logger.info("Shutting down application")
+    await invalidation_listener.stop()
     close_db()
     logger.info("PostgreSQL connections closed")
+    if settings.log_ship_to_mongodb:
+        await log_shipper.stop()
     await close_mongodb()
     logger.info("MongoDB connections closed")
+    await email_dispatcher.aclose()
+    await readiness_probe.aclose()
+    shutdown_report_process_pool()
 
 
 # Create FastAPI application
@@ -88,11 +116,15 @@ app = FastAPI(
 
 # Add rate limiting (Phase 2)
 from slowapi.errors import RateLimitExceeded
-from .middleware.rate_limit import limiter, custom_rate_limit_handler
+from .middleware.rate_limit import limiter, custom_rate_limit_handler, RateLimitMiddleware
 
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, custom_rate_limit_handler)
 
+# Per-user/company/IP request rates - added before CORS so 429s get CORS headers
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware)
+
 
 # CORS Middleware - Must be added before other middleware
 app.add_middleware(
@@ -115,21 +147,32 @@ app.add_middleware(AuditLogMiddleware)
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     """Add processing time to response headers."""
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
 
+# Per-request profiling (X-Profile: 1, super admins only)
+app.add_middleware(ProfilingMiddleware)
+
+# Request metrics - wraps all other middleware
+app.add_middleware(MetricsMiddleware)
+
+# Request id and stage timing - added last so everything runs within the request context
+app.add_middleware(RequestContextMiddleware)
+
+
 # Add error handlers
 add_error_handlers(app)
 
 
-# Health check endpoint
+# Health check endpoints
 @app.get("/health", tags=["Health"])
+@app.get("/health/live", tags=["Health"])
 async def health_check():
-    """Health check endpoint."""
+    """Liveness probe: the process serves requests (dependencies are not checked)."""
     return {
         "status": "healthy",
         "app": settings.app_name,
@@ -138,6 +181,24 @@ async def health_check():
     }
 
 
+@app.get("/health/ready", tags=["Health"])
+async def readiness_check():
+    """Readiness probe: PostgreSQL, MongoDB and Redis are reachable (503 otherwise)."""
+    readiness = await readiness_probe.check()
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content={**readiness.to_dict(), "version": settings.app_version}
+    )
+
+
+# Prometheus metrics endpoint
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def metrics():
+    """Prometheus metrics endpoint."""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
 # Root endpoint
 @app.get("/", tags=["Root"])
 async def root():
@@ -162,6 +223,7 @@ app.include_router(finances_router, prefix="/api/finances", tags=["Finances"])
 app.include_router(payroll_router, prefix="/api/payroll", tags=["Payroll"])
 app.include_router(dashboard_router, prefix="/api/dashboard", tags=["Dashboard"])
 app.include_router(settings_router, prefix="/api/settings", tags=["Settings"])
+app.include_router(monitoring_router, prefix="/api/monitoring", tags=["Monitoring"])
 
 
 if __name__ == "__main__":
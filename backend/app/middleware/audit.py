@@ -9,6 +9,7 @@ import logging
 from ..mongo_models import AuditLog, AuditAction
 from ..auth.security import get_current_user
 from ..mongodb import get_mongodb_client
+from ..utils.request_context import request_id_var
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,8 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
     # Routes to exclude from audit logging
     EXCLUDED_PATHS = {
         "/health",
+        "/health/live",
+        "/health/ready",
         "/docs",
         "/redoc",
         "/openapi.json",
@@ -124,6 +127,7 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
             },
             success=success,
             error_message=None if success else f"HTTP {response.status_code}",
+            request_id=request_id_var.get(),
             timestamp=start_time
         )
         
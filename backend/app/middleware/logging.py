@@ -1,9 +1,51 @@
-"""Logging configuration."""
+"""Logging configuration.
 
+Records go to the console and to ``settings.log_file``, as colored text or,
+with ``log_format = "json"``, as one JSON object per line carrying the ids
+of the request, company and user being served (see ``request_context``).
+
+With ``log_async`` (the default) the root logger only has a queue handler:
+the calling thread, usually the event loop, merges the message arguments
+and captures the request context, and a listener thread formats and writes
+the record. Logging never blocks on disk or terminal I/O; when the queue is
+full records are dropped and counted in ``log_records_dropped``.
+
+DEBUG and INFO records of hot-path loggers are sampled (``log_sampling``),
+and records at ``log_ship_level`` and above can be shipped in batches to
+the ``ApplicationLog`` Mongo collection (``log_ship_to_mongodb``).
+"""
+
+from collections import deque
+from contextlib import suppress
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Deque, Dict, List, Optional
+import asyncio
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
 import sys
 from pathlib import Path
 from ..config import settings
+from ..utils.metrics import LOG_RECORDS_DROPPED
+from ..utils.request_context import log_context
+
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; any other attribute was passed in ``extra``
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+CONTEXT_FIELDS = ("request_id", "company_id", "user_id")
+
+
+def record_extras(record: logging.LogRecord) -> Dict[str, Any]:
+    """Fields passed to a log call in ``extra``."""
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in RECORD_ATTRIBUTES and key not in CONTEXT_FIELDS and not key.startswith("_")
+    }
 
 
 class ColoredFormatter(logging.Formatter):
@@ -38,23 +80,317 @@ class ColoredFormatter(logging.Formatter):
         return f"{prefix} {formatted}{suffix}"
 
 
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with context ids and extra fields."""
+    
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        entry.update(record_extras(record))
+        
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Add the request, company and user ids of the current request to records."""
+    
+    def filter(self, record):
+        for key, value in log_context().items():
+            # Ids passed explicitly in ``extra`` win
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a share of the DEBUG and INFO records of hot-path loggers.
+    
+    Warnings and errors are always kept. A logger without a rate uses the
+    rate of its closest configured parent (``app.auth`` covers
+    ``app.auth.security``). The decision is stored on the record, so every
+    handler keeps or drops the same records.
+    
+    Args:
+        rates: Share of records kept (0 to 1) by logger name
+        random_func: Source of random numbers in [0, 1)
+    """
+    
+    def __init__(self, rates: Dict[str, float], random_func: Callable[[], float] = random.random):
+        super().__init__()
+        self.rates = dict(rates)
+        self._random = random_func
+        self._resolved: Dict[str, float] = {}
+    
+    def rate(self, name: str) -> float:
+        """Share of the DEBUG and INFO records of logger ``name`` kept."""
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+    
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        keep = getattr(record, "_sampled", None)
+        if keep is None:
+            rate = self.rate(record.name)
+            keep = rate >= 1 or self._random() < rate
+            record._sampled = keep
+        return keep
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records when the queue is full instead of blocking."""
+    
+    def prepare(self, record):
+        # Merge the arguments and render the traceback in the calling thread:
+        # arguments may be mutated after the call, and the listener thread
+        # must not keep frames alive. Formatting is left to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+
+
+class DrainingQueueListener(QueueListener):
+    """Queue listener that can be stopped while its queue is full.
+
+    ``QueueListener.stop`` puts its sentinel with ``put_nowait``, which
+    fails on a full queue before the thread is joined. Here the sentinel is
+    put with a timeout; if the queue is still full by then (the handlers are
+    stuck), the queued records are dropped to make room for it.
+    """
+    
+    def __init__(self, log_queue, *handlers, respect_handler_level=False, stop_timeout: float = 5.0):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.stop_timeout = stop_timeout
+    
+    def enqueue_sentinel(self):
+        try:
+            self.queue.put(self._sentinel, timeout=self.stop_timeout)
+            return
+        except queue.Full:
+            pass
+        while True:
+            with suppress(queue.Empty):
+                while True:
+                    self.queue.get_nowait()
+                    LOG_RECORDS_DROPPED.labels("shutdown").inc()
+            with suppress(queue.Full):
+                self.queue.put_nowait(self._sentinel)
+                return
+
+
+def log_level_name(levelno: int) -> str:
+    """``LogLevel`` value of a logging level."""
+    for threshold, name in ((logging.CRITICAL, "critical"), (logging.ERROR, "error"), (logging.WARNING, "warning"), (logging.INFO, "info")):
+        if levelno >= threshold:
+            return name
+    return "debug"
+
+
+class MongoLogShipper(logging.Handler):
+    """
+    Ship log records to the ``ApplicationLog`` collection in batches.
+    
+    ``emit`` only converts the record and buffers it (on the listener
+    thread with asynchronous logging). A task on the application's event
+    loop inserts the buffered records every ``interval`` seconds, or as soon
+    as ``batch_size`` are waiting. When the buffer is full the oldest
+    records are dropped.
+    
+    Args:
+        level: Lowest level shipped
+        batch_size: Records per ``insert_many``
+        interval: Seconds between shipments
+        buffer_size: Records buffered at most
+    """
+    
+    # The Mongo driver's records and the shipper's own would log about shipping
+    EXCLUDED_LOGGERS = ("pymongo", "motor", __name__)
+    
+    def __init__(self, level: int = logging.WARNING, batch_size: int = 100, interval: float = 2.0, buffer_size: int = 10000):
+        super().__init__(level)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def emit(self, record):
+        if any(record.name == name or record.name.startswith(f"{name}.") for name in self.EXCLUDED_LOGGERS):
+            return
+        try:
+            document = self.document(record)
+        except Exception:
+            self.handleError(record)
+            return
+        
+        if len(self.buffer) == self.buffer.maxlen:
+            LOG_RECORDS_DROPPED.labels("ship_buffer_full").inc()
+        self.buffer.append(document)
+        
+        loop = self._loop
+        if loop is not None and len(self.buffer) >= self.batch_size:
+            with suppress(RuntimeError):  # loop closed
+                loop.call_soon_threadsafe(self._wakeup.set)
+    
+    def document(self, record: logging.LogRecord) -> Dict[str, Any]:
+        """Fields of the ``ApplicationLog`` document of a record."""
+        stack_trace = record.exc_text
+        if record.exc_info and not stack_trace:
+            stack_trace = logging.Formatter().formatException(record.exc_info)
+        return {
+            "level": log_level_name(record.levelno),
+            "logger_name": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line_number": record.lineno,
+            "exception": stack_trace.splitlines()[-1] if stack_trace else None,
+            "stack_trace": stack_trace,
+            "context": {
+                key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                for key, value in record_extras(record).items()
+            },
+            "request_id": getattr(record, "request_id", None),
+            "company_id": getattr(record, "company_id", None),
+            "user_id": getattr(record, "user_id", None),
+            "timestamp": datetime.utcfromtimestamp(record.created),
+        }
+    
+    def start(self) -> None:
+        """Start shipping from the running event loop."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the shipping task, then ship the buffered records."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self._loop = None
+        await self.ship()
+    
+    async def _run(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            self._wakeup.clear()
+            await self.ship()
+    
+    async def ship(self) -> int:
+        """
+        Insert the buffered records, ``batch_size`` at a time.
+        
+        Records stay buffered while MongoDB is not connected; a batch that
+        fails to insert is dropped.
+        
+        Returns:
+            Number of records inserted
+        """
+        from ..mongodb import get_mongodb_client
+        from ..mongo_models import ApplicationLog
+        
+        if get_mongodb_client() is None:
+            return 0
+        
+        shipped = 0
+        while self.buffer:
+            batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+            try:
+                await ApplicationLog.insert_many([ApplicationLog(**document) for document in batch])
+            except Exception as e:
+                LOG_RECORDS_DROPPED.labels("ship_failed").inc(len(batch))
+                logger.warning(f"Failed to ship {len(batch)} log records to MongoDB: {e}")
+                break
+            shipped += len(batch)
+        return shipped
+
+
+# Global log shipper, attached to the root logger when log_ship_to_mongodb is set
+log_shipper = MongoLogShipper(
+    level=logging.getLevelName(settings.log_ship_level.upper()),
+    batch_size=settings.log_ship_batch_size,
+    interval=settings.log_ship_interval_seconds,
+    buffer_size=settings.log_ship_buffer_size
+)
+
+# Handlers installed on the root logger, and the listener writing queued records
+_root_handlers: List[logging.Handler] = []
+_queue_listener: Optional[QueueListener] = None
+
+
+def stop_logging() -> None:
+    """Write the queued records and stop the listener thread."""
+    global _queue_listener
+    
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
 def setup_logging() -> None:
     """Configure application logging with distinct labels for different sources."""
+    global _queue_listener
     
     # Create logs directory if it doesn't exist
     log_file_path = Path(settings.log_file)
     log_file_path.parent.mkdir(parents=True, exist_ok=True)
     
     # Create formatters
-    console_formatter = ColoredFormatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    
-    file_formatter = logging.Formatter(
-        "%(asctime)s - [%(name)s] - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    if settings.log_format == "json":
+        console_formatter = file_formatter = JsonFormatter()
+    else:
+        console_formatter = ColoredFormatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
+        
+        file_formatter = logging.Formatter(
+            "%(asctime)s - [%(name)s] - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
     
     # Create handlers
     console_handler = logging.StreamHandler(sys.stdout)
@@ -63,32 +399,58 @@ def setup_logging() -> None:
     file_handler = logging.FileHandler(settings.log_file)
     file_handler.setFormatter(file_formatter)
     
-    # Configure root logger
+    handlers = [console_handler, file_handler]
+    if settings.log_ship_to_mongodb:
+        handlers.append(log_shipper)
+    
+    # Configure root logger (replacing the handlers of a previous setup)
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG if settings.debug else logging.INFO)
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
+    for handler in _root_handlers:
+        root_logger.removeHandler(handler)
+    stop_logging()
+    
+    if settings.log_async:
+        # Handlers run on the listener thread; the caller only enqueues
+        log_queue = queue.Queue(maxsize=settings.log_queue_size)
+        _queue_listener = DrainingQueueListener(log_queue, *handlers, respect_handler_level=True)
+        _queue_listener.start()
+        _root_handlers[:] = [NonBlockingQueueHandler(log_queue)]
+    else:
+        _root_handlers[:] = handlers
     
+    # Sample first, so dropped records skip the context lookup
+    sampling_filter = SamplingFilter(settings.log_sampling)
+    context_filter = ContextFilter()
+    for handler in _root_handlers:
+        handler.addFilter(sampling_filter)
+        handler.addFilter(context_filter)
+        root_logger.addHandler(handler)
+
     # Configure application loggers (your app code)
     app_logger = logging.getLogger("app")
     app_logger.setLevel(logging.DEBUG if settings.debug else logging.INFO)
-    
+
     # Configure SQLAlchemy loggers with distinct levels
     # Engine logger - shows SQL queries
     sqlalchemy_engine = logging.getLogger("sqlalchemy.engine")
     sqlalchemy_engine.setLevel(logging.INFO if settings.debug else logging.WARNING)
-    
+
     # ORM logger - shows ORM operations
     sqlalchemy_orm = logging.getLogger("sqlalchemy.orm")
     sqlalchemy_orm.setLevel(logging.WARNING)
-    
+
     # Pool logger - shows connection pool operations
     sqlalchemy_pool = logging.getLogger("sqlalchemy.pool")
     sqlalchemy_pool.setLevel(logging.WARNING)
-    
+
     # Configure Uvicorn logger
     uvicorn_logger = logging.getLogger("uvicorn")
     uvicorn_logger.setLevel(logging.INFO)
-    
+
     uvicorn_access = logging.getLogger("uvicorn.access")
     uvicorn_access.setLevel(logging.WARNING if not settings.debug else logging.INFO)
+
+
+# Write what is still queued when the process exits
+atexit.register(stop_logging)
@@ -0,0 +1,71 @@
+"""Request metrics middleware."""
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..utils.metrics import (
+    QUERY_BUDGET_EXCEEDED,
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_QUERY_TIME,
+    REQUESTS_IN_PROGRESS,
+    route_template,
+)
+from ..database import slow_query_log
+from ..utils.query_recorder import QueryRecorder, check_query_budget, current_query_recorder
+
+
+class MetricsMiddleware:
+    """
+    Record latency, in-flight requests and SQL usage of HTTP requests.
+
+    Requests that run too many SQL statements, or the same statement shape
+    over and over (N+1 queries), are logged and counted. Their slow
+    statements are persisted to the ApplicationLog collection.
+
+    Requests are labelled with the template of the route that served them
+    (e.g. ``/api/employees/{employee_id}``), read from the scope after the
+    router has matched it, so ids in paths do not create new series.
+
+    This is a plain ASGI middleware so it wraps the whole stack, including
+    the time spent in other middleware.
+    """
+
+    def __init__(self, app: ASGIApp, excluded_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        recorder = QueryRecorder(scope=scope)
+        token = current_query_recorder.set(recorder)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            current_query_recorder.reset(token)
+
+            template = route_template(scope)
+            REQUEST_DURATION.labels(method, template, str(status_code)).observe(duration)
+            REQUEST_QUERIES.labels(template).observe(recorder.count)
+            REQUEST_QUERY_TIME.labels(template).observe(recorder.duration)
+            for reason in check_query_budget(recorder, template):
+                QUERY_BUDGET_EXCEEDED.labels(template, reason).inc()
+            if recorder.slow_queries:
+                await slow_query_log.persist(recorder.slow_queries)
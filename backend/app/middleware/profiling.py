@@ -0,0 +1,72 @@
+"""Per-request profiling middleware."""
+
+import logging
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..auth.security import peek_access_token
+from ..utils.profiler import StackSampler, profiler_session
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_INTERVAL = 0.001
+
+
+def is_super_admin(headers: Headers) -> bool:
+    """Whether the request carries a valid access token of a super admin."""
+    claims = peek_access_token(headers.get("authorization"))
+    return claims is not None and claims.get("role") == "super_admin"
+
+
+class ProfilingMiddleware:
+    """
+    Profile single requests sent with ``X-Profile: 1``.
+
+    Only super admins may profile a request; the header is ignored for
+    everyone else. While the handler runs, stacks running application code
+    are sampled every millisecond. The sampling stops when the response
+    starts, and the response gets the headers:
+
+    - ``X-Profile-Summary``: sample count and the application functions the
+      request spent most of its time in;
+    - ``X-Profile-Id``: id of the full profile, downloadable from
+      ``/api/monitoring/profiler/profiles/{id}``.
+
+    Samples are taken from every thread, so on a busy process the profile
+    also contains application code of concurrent requests.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER) != "1" or not is_super_admin(headers):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(interval=PROFILE_INTERVAL, app_code_only=True).start()
+        profile = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal profile
+            if message["type"] == "http.response.start" and profile is None:
+                profile = sampler.stop()
+                profiler_session.request_profiles.append(profile)
+                response_headers = MutableHeaders(scope=message)
+                response_headers["X-Profile-Id"] = profile.id
+                response_headers["X-Profile-Summary"] = profile.summary()
+                logger.info(f"Profiled {scope['method']} {scope['path']}: {profile.summary()}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile is None:
+                sampler.stop()
@@ -1,17 +1,59 @@
-"""Rate limiting middleware using SlowAPI."""
+"""Rate limiting middleware.
+
+Every API request is counted against token buckets shared by all replicas
+in Redis:
+
+- authenticated requests against one bucket for the user and one for the
+  whole company, sized by the company's plan (``PLAN_CONFIGS`` rate limits);
+- anonymous requests against a bucket for the client IP.
+
+Both buckets of a request are checked and consumed atomically by a Lua
+script. Rejections are remembered locally until the bucket refills, so a
+client hammering the API is turned away without a Redis round trip. When
+Redis is unreachable, buckets fall back to process memory (limits are then
+enforced per replica) until it is retried.
+
+SlowAPI's ``limiter`` is kept for stricter per-route limits applied as
+decorators; it also keys on the user and stores its counters in Redis.
+"""
+
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+import math
+import time
 
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
-import logging
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..auth.security import peek_access_token
+from ..config import settings
+from ..models.subscription import PlanTier
+from ..schemas.subscription import PLAN_CONFIGS
 
 logger = logging.getLogger(__name__)
 
 
+def rate_limit_key(request: Request) -> str:
+    """Key SlowAPI limits on the user (set by the tenant middleware) or the client IP."""
+    user_id = getattr(request.state, "user_id", None)
+    return f"user:{user_id}" if user_id else get_remote_address(request)
+
+
 # Create limiter instance
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=settings.redis_url,
+    in_memory_fallback_enabled=True,
+    swallow_errors=True
+)
 
 
 def custom_rate_limit_handler(request: Request, exc: RateLimitExceeded) -> Response:
@@ -43,3 +85,302 @@ HEAVY_OPERATION_LIMIT = "10/minute"  # 10 per minute
 
 # Public endpoints - more restrictive
 PUBLIC_RATE_LIMIT = "20/minute"  # 20 requests per minute
+
+
+# Token buckets: KEYS are bucket hashes, ARGV[1] the cost, then
+# (capacity, refill period in ms) for each key. Consumes from every bucket
+# only if all of them have enough tokens. Returns
+# {allowed, index of the bucket with the fewest tokens left, its tokens,
+# ms until a rejected request may retry, ms until that bucket is full}.
+TOKEN_BUCKET_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels, rates, capacities = {}, {}, {}
+local allowed, retry = 1, 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = capacity / tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    level = math.min(capacity, level + elapsed * rate)
+    if level < cost then
+        allowed = 0
+        retry = math.max(retry, (cost - level) / rate)
+    end
+    levels[i], rates[i], capacities[i] = level, rate, capacity
+end
+local tightest = 1
+for i, key in ipairs(KEYS) do
+    if allowed == 1 then
+        levels[i] = levels[i] - cost
+    end
+    redis.call('HSET', key, 'tokens', levels[i], 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil((capacities[i] - levels[i]) / rates[i]) + 1000)
+    if levels[i] < levels[tightest] then
+        tightest = i
+    end
+end
+local reset = (capacities[tightest] - levels[tightest]) / rates[tightest]
+return {allowed, tightest, math.floor(levels[tightest]), math.ceil(retry), math.ceil(reset)}
+"""
+
+KEY_PREFIX = "ratelimit:"
+# Local buckets kept before idle ones are dropped
+MAX_LOCAL_BUCKETS = 10000
+EXEMPT_PATHS = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """A token bucket holding ``limit`` tokens, refilled over ``period`` seconds."""
+    key: str
+    limit: int
+    period: int = 60
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Outcome of a request, reported for the most constrained bucket."""
+    allowed: bool
+    bucket: Bucket
+    remaining: int
+    retry_after: float = 0.0  # seconds until a rejected request may retry
+    reset: float = 0.0  # seconds until the bucket is full again
+
+    def headers(self) -> Dict[str, str]:
+        """``RateLimit-*`` response headers (plus ``Retry-After`` when rejected)."""
+        headers = {
+            "RateLimit-Limit": str(self.bucket.limit),
+            "RateLimit-Remaining": str(max(self.remaining, 0)),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory (the fallback when Redis is down)."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated at)
+        self._lock = Lock()
+
+    async def consume(self, buckets: Sequence[Bucket], cost: int = 1) -> RateLimitResult:
+        """Take ``cost`` tokens from every bucket, if they all have enough."""
+        with self._lock:
+            now = self.clock()
+            if len(self._buckets) > MAX_LOCAL_BUCKETS:
+                self._buckets.clear()
+            levels, retry = [], 0.0
+            for bucket in buckets:
+                rate = bucket.limit / bucket.period
+                level, updated_at = self._buckets.get(bucket.key, (bucket.limit, now))
+                level = min(bucket.limit, level + max(0.0, now - updated_at) * rate)
+                if level < cost:
+                    retry = max(retry, (cost - level) / rate)
+                levels.append(level)
+            allowed = retry == 0
+            if allowed:
+                levels = [level - cost for level in levels]
+            for bucket, level in zip(buckets, levels):
+                self._buckets[bucket.key] = (level, now)
+
+        tightest = min(range(len(buckets)), key=lambda i: levels[i])
+        bucket = buckets[tightest]
+        return RateLimitResult(
+            allowed=allowed,
+            bucket=bucket,
+            remaining=math.floor(levels[tightest]),
+            retry_after=retry,
+            reset=(bucket.limit - levels[tightest]) * bucket.period / bucket.limit
+        )
+
+
+class RedisBucketStore:
+    """Token buckets shared by every replica, updated by one Lua script call."""
+
+    def __init__(self, client):
+        self.client = client
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+
+    async def warmup(self) -> None:
+        """Open a connection and load the script, so requests start with EVALSHA."""
+        await self.client.script_load(TOKEN_BUCKET_LUA)
+
+    async def consume(self, buckets: Sequence[Bucket], cost: int = 1) -> RateLimitResult:
+        """Take ``cost`` tokens from every bucket, if they all have enough."""
+        args = [cost]
+        for bucket in buckets:
+            args += [bucket.limit, bucket.period * 1000]
+        allowed, tightest, remaining, retry_ms, reset_ms = await self._script(
+            keys=[KEY_PREFIX + bucket.key for bucket in buckets],
+            args=args
+        )
+        return RateLimitResult(
+            allowed=bool(allowed),
+            bucket=buckets[int(tightest) - 1],
+            remaining=int(remaining),
+            retry_after=int(retry_ms) / 1000,
+            reset=int(reset_ms) / 1000
+        )
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter with a local fast path.
+
+    Args:
+        store: Shared bucket store (None: process memory only)
+        retry_interval: Seconds to use local buckets after the store failed
+    """
+
+    def __init__(self, store=None, retry_interval: int = 30):
+        self.store = store
+        self.local = MemoryBucketStore()
+        self.retry_interval = retry_interval
+        self._store_down_until = 0.0
+        self._rejected: Dict[str, Tuple[float, float, RateLimitResult]] = {}  # key -> (retry at, reset at, result)
+
+    async def hit(self, buckets: List[Bucket]) -> RateLimitResult:
+        """Count a request against its buckets."""
+        now = time.monotonic()
+        for bucket in buckets:
+            rejected = self._rejected.get(bucket.key)
+            if rejected is not None:
+                retry_at, reset_at, result = rejected
+                if now < retry_at:
+                    return RateLimitResult(
+                        allowed=False,
+                        bucket=result.bucket,
+                        remaining=0,
+                        retry_after=retry_at - now,
+                        reset=reset_at - now
+                    )
+                del self._rejected[bucket.key]
+
+        result = None
+        if self.store is not None and now >= self._store_down_until:
+            try:
+                result = await self.store.consume(buckets)
+            except Exception as e:
+                logger.warning(f"Rate limit store unavailable, using local buckets for {self.retry_interval}s: {e}")
+                self._store_down_until = now + self.retry_interval
+        if result is None:
+            result = await self.local.consume(buckets)
+
+        if not result.allowed:
+            if len(self._rejected) > MAX_LOCAL_BUCKETS:
+                self._rejected.clear()
+            self._rejected[result.bucket.key] = (now + result.retry_after, now + result.reset, result)
+        return result
+
+
+def _create_rate_limiter() -> RateLimiter:
+    import redis.asyncio as aioredis
+
+    client = aioredis.Redis.from_url(
+        settings.redis_url,
+        socket_timeout=settings.rate_limit_redis_timeout_seconds,
+        socket_connect_timeout=settings.rate_limit_redis_timeout_seconds
+    )
+    return RateLimiter(RedisBucketStore(client), retry_interval=settings.rate_limit_redis_retry_seconds)
+
+
+# Global rate limiter instance
+rate_limiter = _create_rate_limiter()
+
+
+def _load_plan(company_id: str) -> PlanTier:
+    from ..database import SessionLocal
+    from .subscription import build_entitlements, entitlement_cache, load_active_subscription
+
+    db = SessionLocal()
+    try:
+        subscription = load_active_subscription(db, company_id)
+    finally:
+        db.close()
+    entitlements = build_entitlements(company_id, subscription)
+    entitlement_cache.set(entitlements)
+    return entitlements.plan_id
+
+
+async def plan_for_company(company_id: str) -> PlanTier:
+    """Plan of a company, from the entitlement cache or the database."""
+    from .subscription import entitlement_cache
+
+    entitlements = entitlement_cache.get(company_id)
+    if entitlements is not None:
+        return entitlements.plan_id
+    try:
+        return await run_in_threadpool(_load_plan, company_id)
+    except Exception as e:
+        logger.error(f"Failed to load plan of company {company_id} for rate limiting: {e}")
+        return PlanTier.FREE
+
+
+async def buckets_for(scope: Scope) -> List[Bucket]:
+    """Buckets a request counts against: user and company, or client IP."""
+    claims = peek_access_token(Headers(scope=scope).get("authorization"))
+    if claims and claims.get("company_id"):
+        company_id = claims["company_id"]
+        plan = await plan_for_company(company_id)
+        limits = PLAN_CONFIGS[plan].rate_limits
+        return [
+            Bucket(f"user:{claims.get('sub')}", limits["user_per_minute"]),
+            Bucket(f"company:{company_id}", limits["company_per_minute"]),
+        ]
+    client = scope.get("client")
+    return [Bucket(f"ip:{client[0] if client else 'unknown'}", settings.rate_limit_anonymous_per_minute)]
+
+
+class RateLimitMiddleware:
+    """
+    Enforce per-user, per-company and per-IP request rates.
+
+    Adds ``RateLimit-Limit``, ``RateLimit-Remaining`` and ``RateLimit-Reset``
+    headers to every limited response, and answers 429 with ``Retry-After``
+    when a bucket is empty.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: Optional[RateLimiter] = None, exempt_paths: tuple = EXEMPT_PATHS):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(self.exempt_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        result = await (self.limiter or rate_limiter).hit(await buckets_for(scope))
+        headers = result.headers()
+
+        if not result.allowed:
+            logger.warning(f"Rate limit exceeded for {result.bucket.key} on {scope['path']}")
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "detail": "Rate limit exceeded. Please try again later.",
+                    "retry_after": f"{headers['Retry-After']} seconds"
+                },
+                headers=headers
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                for name, value in headers.items():
+                    response_headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,65 @@
+"""Request id and stage timing middleware."""
+
+import re
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+from ..utils.request_context import REQUEST_ID_HEADER, RequestTrace, current_trace, request_id_var
+
+# Ids accepted from clients and upstream proxies; anything else is replaced
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def new_request_id() -> str:
+    """Generate a request id."""
+    return uuid.uuid4().hex
+
+
+class RequestContextMiddleware:
+    """
+    Give every HTTP request and WebSocket connection a request id.
+
+    The id is taken from the ``X-Request-ID`` header when a client or proxy
+    sent a valid one, generated otherwise, stored in ``request_id_var`` (and
+    ``scope["state"]["request_id"]``) and echoed in the response. A
+    ``RequestTrace`` collects the time spent in each stage of the request,
+    returned in the ``Server-Timing`` header when ``server_timing_enabled``.
+
+    This is a plain ASGI middleware added last, so every other middleware
+    (metrics, audit, tenant...) runs and logs within the request context.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = settings.server_timing_enabled):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = new_request_id()
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        trace = RequestTrace()
+        request_id_token = request_id_var.set(request_id)
+        trace_token = current_trace.set(trace)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers[REQUEST_ID_HEADER] = request_id
+                if self.server_timing:
+                    headers.append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(request_id_token)
+            current_trace.reset(trace_token)
@@ -1,11 +1,18 @@
 """Subscription middleware for enforcing plan limits and feature access."""
 
-from functools import wraps
-from fastapi import HTTPException, status, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass, field
+from datetime import datetime
+from fastapi import HTTPException, status, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
 from sqlalchemy import select, func
-from typing import Optional, Callable
+from typing import Optional, Dict, Tuple
+import logging
+import threading
+import time
+import uuid
 
+from app.config import settings
 from app.database import get_db
 from app.models.user import User
 from app.models.subscription import Subscription, SubscriptionStatus, PlanTier
@@ -14,37 +21,233 @@ from app.models.finance import Transaction
 from app.models.payroll import PayrollRun
 from app.schemas.subscription import PLAN_CONFIGS
 from app.auth.security import get_current_user
+from app.utils.cache_invalidation import invalidation_listener, publish_invalidation
 
+logger = logging.getLogger(__name__)
 
-async def get_active_subscription(
-    current_user: User,
-    db: AsyncSession
-) -> Optional[Subscription]:
-    """Get active subscription for current user's company.
+
+@dataclass(frozen=True)
+class Entitlements:
+    """Resolved plan entitlements for a company.
+    
+    Built from the company's active subscription (if any) and the matching
+    entry in PLAN_CONFIGS so that gated routes never need to touch the
+    subscriptions table more than once per cache window.
+    """
+    company_id: str
+    plan_id: PlanTier
+    status: str
+    limits: Dict[str, Optional[int]] = field(default_factory=dict)
+    features: list = field(default_factory=list)
+    current_period_end: Optional[datetime] = None
+    has_subscription: bool = False
+    
+    def has_feature(self, feature: PlanTier) -> bool:
+        """Check if the plan grants a specific feature."""
+        if not self.has_subscription:
+            # No subscription - only FREE features allowed
+            return feature == PlanTier.FREE
+        if self.plan_id == PlanTier.ALL_ACCESS:
+            return True
+        return self.plan_id == feature
+    
+    def limit_for(self, resource_type: str) -> Optional[int]:
+        """Get the plan limit for a resource type (None means unlimited)."""
+        return self.limits.get(resource_type)
+
+
+class EntitlementCache:
+    """In-process, per-company cache of resolved entitlements.
+    
+    Entries expire after ``ttl_seconds`` or at the subscription's period end,
+    whichever comes first. Webhook handlers and plan changes invalidate the
+    affected company explicitly, and the invalidation is broadcast to every
+    API process over Redis (see ``app.utils.cache_invalidation``).
+    """
+    
+    def __init__(self, ttl_seconds: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, Entitlements]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, company_id: str) -> Optional[Entitlements]:
+        """Return cached entitlements for a company, or None if missing/expired."""
+        key = str(company_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, entitlements = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return entitlements
+    
+    def set(self, entitlements: Entitlements) -> None:
+        """Store entitlements until the TTL or the billing period end."""
+        ttl = float(self.ttl_seconds)
+        if entitlements.current_period_end is not None:
+            remaining = entitlements.current_period_end.timestamp() - time.time()
+            ttl = max(0.0, min(ttl, remaining))
+        with self._lock:
+            self._entries[str(entitlements.company_id)] = (
+                time.monotonic() + ttl,
+                entitlements
+            )
+    
+    def invalidate(self, company_id: str) -> None:
+        """Drop the cached entitlements for a company."""
+        with self._lock:
+            self._entries.pop(str(company_id), None)
+    
+    def clear(self) -> None:
+        """Drop all cached entitlements."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global entitlement cache instance
+entitlement_cache = EntitlementCache(ttl_seconds=settings.entitlement_cache_ttl_seconds)
+
+
+# Channel carrying the ids of companies whose entitlements changed
+INVALIDATION_CHANNEL = "entitlements:invalidate"
+
+invalidation_listener.register(INVALIDATION_CHANNEL, entitlement_cache.invalidate, entitlement_cache.clear)
+
+
+def invalidate_entitlements(company_id: Optional[str]) -> None:
+    """Invalidate cached entitlements after a subscription or plan change.
+    
+    The company is dropped from this process's cache and the invalidation is
+    published to the other processes (API replicas, when called from a
+    Celery worker). If Redis is unreachable, other processes keep the old
+    entitlements until their cache entry expires.
+    
+    Args:
+        company_id: Company whose entitlements changed
+    """
+    if not company_id:
+        return
+    
+    entitlement_cache.invalidate(company_id)
+    publish_invalidation(INVALIDATION_CHANNEL, company_id)
+
+
+def load_active_subscription(db: Session, company_id: str) -> Optional[Subscription]:
+    """Load a company's most recent active or trialing subscription.
+    
+    Blocking; call it from a worker thread in async code.
     
     Args:
-        current_user: Currently authenticated user
         db: Database session
+        company_id: Company to look up
         
     Returns:
         Active subscription or None
     """
-    result = await db.execute(
+    # Subscriptions store the company id as a UUID
+    return db.execute(
         select(Subscription)
-        .where(Subscription.company_id == current_user.company_id)
+        .where(Subscription.company_id == uuid.UUID(str(company_id)))
         .where(Subscription.status.in_([
             SubscriptionStatus.ACTIVE.value,
             SubscriptionStatus.TRIALING.value
         ]))
         .order_by(Subscription.created_at.desc())
+    ).scalars().first()
+
+
+async def get_active_subscription(
+    current_user: User,
+    db: Session
+) -> Optional[Subscription]:
+    """Get active subscription for current user's company.
+    
+    Args:
+        current_user: Currently authenticated user
+        db: Database session
+        
+    Returns:
+        Active subscription or None
+    """
+    return await run_in_threadpool(load_active_subscription, db, current_user.company_id)
+
+
+def build_entitlements(company_id: str, subscription: Optional[Subscription]) -> Entitlements:
+    """Build entitlements from a company's active subscription (if any).
+    
+    Args:
+        company_id: Company the subscription belongs to
+        subscription: Active subscription, or None for the free plan
+        
+    Returns:
+        Entitlements of the subscribed plan
+    """
+    plan_id = PlanTier(subscription.plan_id) if subscription else PlanTier.FREE
+    plan_config = PLAN_CONFIGS.get(plan_id)
+    
+    return Entitlements(
+        company_id=str(company_id),
+        plan_id=plan_id,
+        status=subscription.status if subscription else "free",
+        limits=dict(plan_config.limits) if plan_config else {},
+        features=list(plan_config.features) if plan_config else [],
+        current_period_end=subscription.current_period_end if subscription else None,
+        has_subscription=subscription is not None
     )
-    return result.scalar_one_or_none()
+
+
+async def resolve_entitlements(
+    current_user: User,
+    db: Session
+) -> Entitlements:
+    """Resolve entitlements for the user's company, using the cache.
+    
+    Args:
+        current_user: Currently authenticated user
+        db: Database session
+        
+    Returns:
+        Resolved entitlements
+    """
+    cached = entitlement_cache.get(current_user.company_id)
+    if cached is not None:
+        return cached
+    
+    subscription = await get_active_subscription(current_user, db)
+    entitlements = build_entitlements(current_user.company_id, subscription)
+    entitlement_cache.set(entitlements)
+    return entitlements
+
+
+async def get_entitlements(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Entitlements:
+    """Dependency that resolves entitlements once per request.
+    
+    The result is stored on ``request.state`` so that ``require_plan`` and
+    ``require_limit`` reuse it instead of querying subscriptions again.
+    
+    Usage:
+        @router.get("/payroll")
+        async def list_payroll(entitlements: Entitlements = Depends(get_entitlements)):
+            ...
+    """
+    entitlements = getattr(request.state, "entitlements", None)
+    if entitlements is None:
+        entitlements = await resolve_entitlements(current_user, db)
+        request.state.entitlements = entitlements
+    return entitlements
 
 
 async def check_feature_access(
     feature: PlanTier,
     current_user: User,
-    db: AsyncSession
+    db: Session,
+    entitlements: Optional[Entitlements] = None
 ) -> bool:
     """Check if user has access to a specific feature.
     
@@ -52,28 +255,52 @@ async def check_feature_access(
         feature: Feature to check (e.g. PlanTier.EMPLOYEES)
         current_user: Currently authenticated user
         db: Database session
+        entitlements: Already-resolved entitlements (optional)
         
     Returns:
         True if user has access, False otherwise
     """
-    subscription = await get_active_subscription(current_user, db)
+    if entitlements is None:
+        entitlements = await resolve_entitlements(current_user, db)
     
-    if not subscription:
-        # No subscription - only FREE features allowed
-        return feature == PlanTier.FREE
+    return entitlements.has_feature(feature)
+
+
+# Tables counted against each usage limit
+USAGE_MODELS = {
+    "employees": Employee,
+    "transactions": Transaction,
+    "payroll_runs": PayrollRun
+}
+
+
+def count_usage(db: Session, company_id: str, resource_type: str) -> int:
+    """Count a company's usage of a limited resource.
     
-    # ALL_ACCESS has everything
-    if subscription.plan_id == PlanTier.ALL_ACCESS.value:
-        return True
+    Blocking; call it from a worker thread in async code.
     
-    # Check if subscription includes this feature
-    return subscription.plan_id == feature.value
+    Args:
+        db: Database session
+        company_id: Company to count for
+        resource_type: Type of resource ('employees', 'transactions', 'payroll_runs', 'messages')
+        
+    Returns:
+        Current count
+    """
+    model = USAGE_MODELS.get(resource_type)
+    if model is None:
+        # TODO: Count messages from MongoDB
+        return 0
+    return db.execute(
+        select(func.count(model.id)).where(model.company_id == company_id)
+    ).scalar() or 0
 
 
 async def check_usage_limit(
     resource_type: str,
     current_user: User,
-    db: AsyncSession
+    db: Session,
+    entitlements: Optional[Entitlements] = None
 ) -> tuple[bool, int, Optional[int]]:
     """Check if usage is within plan limits.
     
@@ -81,59 +308,37 @@ async def check_usage_limit(
         resource_type: Type of resource ('employees', 'transactions', 'payroll_runs', 'messages')
         current_user: Currently authenticated user
         db: Database session
+        entitlements: Already-resolved entitlements (optional)
         
     Returns:
         Tuple of (within_limit, current_count, limit)
     """
-    subscription = await get_active_subscription(current_user, db)
+    if entitlements is None:
+        entitlements = await resolve_entitlements(current_user, db)
     
-    # Get plan limits
-    plan_id = PlanTier(subscription.plan_id) if subscription else PlanTier.FREE
-    plan_config = PLAN_CONFIGS.get(plan_id)
-    
-    if not plan_config:
+    if not entitlements.limits:
         return False, 0, None
     
-    limit = plan_config.limits.get(resource_type)
+    limit = entitlements.limit_for(resource_type)
     
     # None means unlimited
     if limit is None:
         return True, 0, None
     
-    # Count current usage
-    current_count = 0
-    if resource_type == "employees":
-        result = await db.execute(
-            select(func.count(Employee.id))
-            .where(Employee.company_id == current_user.company_id)
-        )
-        current_count = result.scalar() or 0
-    elif resource_type == "transactions":
-        result = await db.execute(
-            select(func.count(Transaction.id))
-            .where(Transaction.company_id == current_user.company_id)
-        )
-        current_count = result.scalar() or 0
-    elif resource_type == "payroll_runs":
-        result = await db.execute(
-            select(func.count(PayrollRun.id))
-            .where(PayrollRun.company_id == current_user.company_id)
-        )
-        current_count = result.scalar() or 0
-    elif resource_type == "messages":
-        # TODO: Count from MongoDB
-        current_count = 0
-    
+    current_count = await run_in_threadpool(count_usage, db, current_user.company_id, resource_type)
     within_limit = current_count < limit
     return within_limit, current_count, limit
 
 
 def require_plan(feature: PlanTier):
-    """Decorator to require a specific plan feature.
+    """Dependency factory requiring a specific plan feature.
+    
+    The check reads the entitlements resolved for this request by
+    ``get_entitlements`` (stored on ``request.state``), so gating a route
+    costs no subscription query once the request has resolved them.
     
     Usage:
-        @router.post("/employees")
-        @require_plan(PlanTier.EMPLOYEES)
+        @router.post("/employees", dependencies=[Depends(require_plan(PlanTier.EMPLOYEES))])
         async def create_employee(...):
             ...
     
@@ -141,42 +346,24 @@ def require_plan(feature: PlanTier):
         feature: Required plan feature
         
     Returns:
-        Decorator function
+        Dependency raising 402 when the plan lacks the feature
     """
-    def decorator(func: Callable):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            # Extract dependencies from kwargs
-            current_user = kwargs.get("current_user")
-            db = kwargs.get("db")
-            
-            if not current_user or not db:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Missing required dependencies"
-                )
-            
-            # Check feature access
-            has_access = await check_feature_access(feature, current_user, db)
-            
-            if not has_access:
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"This feature requires the {feature.value} plan or higher"
-                )
-            
-            return await func(*args, **kwargs)
-        
-        return wrapper
-    return decorator
+    async def dependency(entitlements: Entitlements = Depends(get_entitlements)) -> Entitlements:
+        if not entitlements.has_feature(feature):
+            raise HTTPException(
+                status_code=status.HTTP_402_PAYMENT_REQUIRED,
+                detail=f"This feature requires the {feature.value} plan or higher"
+            )
+        return entitlements
+    
+    return dependency
 
 
 def require_limit(resource_type: str):
-    """Decorator to check resource usage limits.
+    """Dependency factory checking resource usage limits.
     
     Usage:
-        @router.post("/employees")
-        @require_limit("employees")
+        @router.post("/employees", dependencies=[Depends(require_limit("employees"))])
         async def create_employee(...):
             ...
     
@@ -184,54 +371,39 @@ def require_limit(resource_type: str):
         resource_type: Type of resource to check
         
     Returns:
-        Decorator function
+        Dependency raising 402 when the plan limit is reached
     """
-    def decorator(func: Callable):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            # Extract dependencies from kwargs
-            current_user = kwargs.get("current_user")
-            db = kwargs.get("db")
-            
-            if not current_user or not db:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Missing required dependencies"
-                )
-            
-            # Check usage limit
-            within_limit, current_count, limit = await check_usage_limit(
-                resource_type, current_user, db
-            )
-            
-            if not within_limit:
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"You have reached your plan limit of {limit} {resource_type}. Upgrade your plan to add more."
-                )
-            
-            return await func(*args, **kwargs)
+    async def dependency(
+        entitlements: Entitlements = Depends(get_entitlements),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ) -> Entitlements:
+        within_limit, current_count, limit = await check_usage_limit(
+            resource_type, current_user, db, entitlements
+        )
         
-        return wrapper
-    return decorator
+        if not within_limit:
+            raise HTTPException(
+                status_code=status.HTTP_402_PAYMENT_REQUIRED,
+                detail=f"You have reached your plan limit of {limit} {resource_type}. Upgrade your plan to add more."
+            )
+        return entitlements
+    
+    return dependency
 
 
 async def get_subscription_status(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    entitlements: Entitlements = Depends(get_entitlements)
 ) -> dict:
     """Dependency to get subscription status.
     
     Args:
-        current_user: Currently authenticated user
-        db: Database session
+        entitlements: Entitlements resolved for this request
         
     Returns:
         Dictionary with subscription status
     """
-    subscription = await get_active_subscription(current_user, db)
-    
-    if not subscription:
+    if not entitlements.has_subscription:
         return {
             "has_subscription": False,
             "plan_id": PlanTier.FREE.value,
@@ -239,12 +411,10 @@ async def get_subscription_status(
             "features": ["basic"]
         }
     
-    plan_config = PLAN_CONFIGS.get(PlanTier(subscription.plan_id))
-    
     return {
         "has_subscription": True,
-        "plan_id": subscription.plan_id,
-        "status": subscription.status,
-        "features": plan_config.features if plan_config else [],
-        "current_period_end": subscription.current_period_end.isoformat()
+        "plan_id": entitlements.plan_id.value,
+        "status": entitlements.status,
+        "features": entitlements.features,
+        "current_period_end": entitlements.current_period_end.isoformat()
     }
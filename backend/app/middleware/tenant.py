@@ -9,6 +9,7 @@ import logging
 from datetime import datetime
 
 from ..config import settings
+from ..utils.request_context import company_id_var, request_id_var, user_id_var
 
 logger = logging.getLogger(__name__)
 
@@ -144,8 +145,14 @@ class TenantContextMiddleware(BaseHTTPMiddleware):
             if self.enable_logging and settings.debug:
                 logger.debug(f"No auth header for protected endpoint: {request.url.path}")
         
-        # Continue processing request
-        response = await call_next(request)
+        # Continue processing request, with the tenant in the log context
+        company_token = company_id_var.set(company_id)
+        user_token = user_id_var.set(user_id)
+        try:
+            response = await call_next(request)
+        finally:
+            company_id_var.reset(company_token)
+            user_id_var.reset(user_token)
         
         # Add company context to response headers (useful for debugging)
         if company_id and settings.debug:
@@ -184,7 +191,8 @@ class TenantContextMiddleware(BaseHTTPMiddleware):
                 "timestamp": datetime.utcnow().isoformat()
             },
             success=False,
-            error_message="Company ID header does not match JWT token"
+            error_message="Company ID header does not match JWT token",
+            request_id=request_id_var.get()
         )
         
         try:
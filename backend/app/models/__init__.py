@@ -7,6 +7,8 @@ from .finance import Transaction, ExpenseCategory
 from .payroll import PayrollRun, PayrollItem
 from .subscription import Subscription, SubscriptionStatus, PlanTier
 from .message import Message
+from .webhook import StripeWebhookEvent
+from .report import ReportJob
 
 __all__ = [
     "User",
@@ -22,5 +24,7 @@ __all__ = [
     "Subscription",
     "SubscriptionStatus",
     "PlanTier",
-    "Message"
+    "Message",
+    "StripeWebhookEvent",
+    "ReportJob"
 ]
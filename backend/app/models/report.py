@@ -0,0 +1,32 @@
+"""Background report generation job model."""
+
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey
+from ..database import Base
+from .base import TimestampMixin
+
+
+class ReportJob(Base, TimestampMixin):
+    """A PDF report rendered in the background.
+    
+    Jobs are created by the reports router and executed by
+    ``app.utils.report_jobs.run_report_job``. Clients poll the job status
+    endpoint or wait for the ``report_ready`` WebSocket notification.
+    """
+    
+    __tablename__ = "report_jobs"
+    
+    id = Column(String(36), primary_key=True)
+    company_id = Column(String(36), ForeignKey("companies.id", ondelete="CASCADE"), nullable=False, index=True)
+    requested_by = Column(String(36), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    report_type = Column(String(20), nullable=False)  # financial, payroll
+    parameters = Column(Text, nullable=False)  # JSON: start_date, end_date, variant
+    cache_key = Column(String(64), nullable=True, index=True)  # See app.utils.report_cache
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, completed, failed, expired
+    file_key = Column(String(512), nullable=True)
+    summary = Column(Text, nullable=True)  # JSON report totals
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<ReportJob(id={self.id}, type={self.report_type}, status={self.status})>"
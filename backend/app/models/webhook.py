@@ -0,0 +1,34 @@
+"""Inbox model for received Stripe webhook events."""
+
+from sqlalchemy import Column, String, Text, Integer, DateTime, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class StripeWebhookEvent(Base):
+    """Verified Stripe webhook event persisted before processing.
+    
+    The Stripe event ID is the primary key, so redelivered events are
+    detected on insert and never applied twice.
+    """
+    
+    __tablename__ = "stripe_webhook_events"
+    
+    id = Column(String(255), primary_key=True)  # Stripe event ID (evt_...)
+    event_type = Column(String(100), nullable=False, index=True)
+    stripe_customer_id = Column(String(255), nullable=True)
+    payload = Column(Text, nullable=False)  # Raw verified event JSON
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, processing, processed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    stripe_created_at = Column(DateTime, nullable=False)
+    received_at = Column(DateTime, nullable=False, default=func.now())
+    processed_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Per-customer ordered drain of unprocessed events
+        Index("ix_stripe_webhook_events_customer_order", "stripe_customer_id", "status", "stripe_created_at"),
+    )
+    
+    def __repr__(self):
+        return f"<StripeWebhookEvent(id={self.id}, type={self.event_type}, status={self.status})>"
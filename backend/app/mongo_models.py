@@ -2,6 +2,7 @@
 
 from beanie import Document
 from pydantic import Field
+from pymongo import ASCENDING, IndexModel
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from enum import Enum
@@ -65,6 +66,7 @@ class AuditLog(Document):
     changes: Optional[Dict[str, Any]] = None  # before/after values
     success: bool = True
     error_message: Optional[str] = None
+    request_id: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     
     class Settings:
@@ -75,6 +77,7 @@ class AuditLog(Document):
             "action",
             "resource_type",
             "timestamp",
+            "request_id",
             [("company_id", 1), ("timestamp", -1)],
             [("user_id", 1), ("timestamp", -1)]
         ]
@@ -180,6 +183,9 @@ class DocumentMetadata(Document):
     related_entity_type: Optional[str] = None  # e.g., "employee", "transaction"
     related_entity_id: Optional[str] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    content_hash: Optional[str] = None  # SHA-256 of the content
+    blob_path: Optional[str] = None  # shared DocumentBlob object holding the content
+    derivatives: Dict[str, str] = Field(default_factory=dict)  # e.g. "thumbnail" -> storage key
     version: int = 1
     is_deleted: bool = False
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
@@ -194,11 +200,36 @@ class DocumentMetadata(Document):
             "related_entity_type",
             "related_entity_id",
             "uploaded_at",
+            "file_path",
             [("company_id", 1), ("is_deleted", 1), ("uploaded_at", -1)],
+            [("company_id", 1), ("is_deleted", 1), ("document_type", 1), ("uploaded_at", -1)],
+            [("company_id", 1), ("tags", 1)],
+            [("company_id", 1), ("content_hash", 1)],
             [("related_entity_type", 1), ("related_entity_id", 1)]
         ]
 
 
+class DocumentBlob(Document):
+    """Content-addressed file shared by all uploads with the same bytes."""
+    
+    company_id: str
+    content_hash: str  # SHA-256 of the content
+    blob_path: str  # storage key
+    file_size: int  # bytes
+    mime_type: str
+    ref_count: int = 0  # live DocumentMetadata entries using this blob
+    stored: bool = False  # content has been written to storage
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    released_at: Optional[datetime] = None  # when ref_count dropped to zero
+    
+    class Settings:
+        name = "document_blobs"
+        indexes = [
+            IndexModel([("company_id", ASCENDING), ("content_hash", ASCENDING)], unique=True),
+            [("company_id", 1), ("ref_count", 1), ("released_at", 1)]
+        ]
+
+
 class ApplicationLog(Document):
     """Application logs for debugging and monitoring."""
     
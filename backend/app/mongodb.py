@@ -6,6 +6,7 @@ from typing import Optional
 import logging
 
 from .config import settings
+from .utils.metrics import MongoCommandMetrics
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +22,8 @@ async def connect_mongodb():
         logger.info(f"Connecting to MongoDB: {settings.mongodb_url}")
         mongodb_client = AsyncIOMotorClient(
             settings.mongodb_url,
-            serverSelectionTimeoutMS=5000  # 5 second timeout
+            serverSelectionTimeoutMS=5000,  # 5 second timeout
+            event_listeners=[MongoCommandMetrics()]
         )
         
         # Ping the database to verify connection
@@ -35,6 +37,7 @@ async def connect_mongodb():
             Notification,
             AnalyticsEvent,
             DocumentMetadata,
+            DocumentBlob,
             ApplicationLog
         )
         
@@ -46,6 +49,7 @@ async def connect_mongodb():
                 Notification,
                 AnalyticsEvent,
                 DocumentMetadata,
+                DocumentBlob,
                 ApplicationLog
             ]
         )
@@ -1,6 +1,6 @@
 """Authentication router for login, register, and token management."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import datetime
 import uuid
@@ -276,6 +276,7 @@ async def logout():
 @router.post("/forgot-password")
 async def forgot_password(
     request: ForgotPasswordRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -299,21 +300,21 @@ async def forgot_password(
         expires_delta=timedelta(hours=1)
     )
     
-    # Send password reset email
+    # Queue the password reset email so the response never waits on SendGrid
     from app.utils.email import EmailService
     from app.config import settings
     
     frontend_url = settings.cors_origins[0] if settings.cors_origins else "http://localhost:3000"
-    email_sent = await EmailService.send_password_reset(
-        to_email=user.email,
-        reset_token=reset_token,
-        frontend_url=frontend_url
-    )
-    
-    if not email_sent:
-        # Log warning but don't reveal to user
-        import logging
-        logging.getLogger(__name__).warning(f"Failed to send password reset email to {user.email}")
+    if settings.celery_broker_url:
+        from app.tasks import send_password_reset_task
+        send_password_reset_task.delay(user.email, reset_token, frontend_url)
+    else:
+        background_tasks.add_task(
+            EmailService.send_password_reset,
+            to_email=user.email,
+            reset_token=reset_token,
+            frontend_url=frontend_url
+        )
     
     return {
         "success": True,
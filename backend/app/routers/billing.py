@@ -1,20 +1,24 @@
 """Billing and subscription management router."""
 
+from __future__ import annotations
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from sqlalchemy import select
 from typing import Optional
 from datetime import datetime
-import stripe
+import asyncio
 import logging
+import uuid
 
+from app.config import settings
 from app.database import get_db
 from app.models.user import User
 from app.models.company import Company
 from app.models.subscription import Subscription, SubscriptionStatus, PlanTier
-from app.models.employee import Employee
-from app.models.finance import Transaction
-from app.models.payroll import PayrollRun
+from app.models.webhook import StripeWebhookEvent
 from app.schemas.subscription import (
     CheckoutSessionCreate,
     CheckoutSessionResponse,
@@ -25,11 +29,18 @@ from app.schemas.subscription import (
     InvoiceItem,
     PaymentMethodResponse,
     UsageStats,
-    BillingDashboard,
-    PLAN_CONFIGS
+    BillingDashboard
 )
 from app.auth.security import get_current_user
+from app.middleware.subscription import Entitlements, count_usage, get_entitlements
 from app.utils.stripe_service import StripeService
+from app.utils.stripe_gateway import invalidate_stripe_customer, stripe
+from app.utils.stripe_webhooks import (
+    record_event,
+    event_customer_id,
+    enqueue_customer_events,
+    process_customer_events,
+)
 
 router = APIRouter(prefix="/api/billing", tags=["billing"])
 logger = logging.getLogger(__name__)
@@ -129,10 +140,24 @@ async def create_billing_portal_session(
     return BillingPortalResponse(portal_url=session.url)
 
 
+def _load_current_subscription(db: Session, company_id: str) -> Optional[Subscription]:
+    """Most recent active, trialing or past due subscription of a company."""
+    return db.execute(
+        select(Subscription)
+        .where(Subscription.company_id == uuid.UUID(str(company_id)))
+        .where(Subscription.status.in_([
+            SubscriptionStatus.ACTIVE.value,
+            SubscriptionStatus.TRIALING.value,
+            SubscriptionStatus.PAST_DUE.value
+        ]))
+        .order_by(Subscription.created_at.desc())
+    ).scalars().first()
+
+
 @router.get("/subscription", response_model=Optional[SubscriptionResponse])
 async def get_current_subscription(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: Session = Depends(get_db)
 ):
     """Get current subscription for the company.
     
@@ -143,19 +168,7 @@ async def get_current_subscription(
     Returns:
         Current subscription or None
     """
-    result = await db.execute(
-        select(Subscription)
-        .where(Subscription.company_id == current_user.company_id)
-        .where(Subscription.status.in_([
-            SubscriptionStatus.ACTIVE.value,
-            SubscriptionStatus.TRIALING.value,
-            SubscriptionStatus.PAST_DUE.value
-        ]))
-        .order_by(Subscription.created_at.desc())
-    )
-    subscription = result.scalar_one_or_none()
-    
-    return subscription
+    return await run_in_threadpool(_load_current_subscription, db, current_user.company_id)
 
 
 @router.get("/invoices", response_model=list[InvoiceResponse])
@@ -246,10 +259,14 @@ async def get_payment_method(
         customer_id=company.stripe_customer_id
     )
     
+    return _format_payment_method(payment_method)
+
+
+def _format_payment_method(payment_method: Optional[stripe.PaymentMethod]) -> Optional[PaymentMethodResponse]:
+    """Convert a Stripe payment method into the API response format."""
     if not payment_method:
         return None
     
-    # Format response
     response = PaymentMethodResponse(
         id=payment_method.id,
         type=payment_method.type,
@@ -265,65 +282,72 @@ async def get_payment_method(
     return response
 
 
+def _format_upcoming_invoice(stripe_invoice: Optional[stripe.Invoice]) -> Optional[InvoiceResponse]:
+    """Convert a Stripe upcoming invoice into the API response format."""
+    if not stripe_invoice:
+        return None
+    
+    invoice_items = []
+    for line in stripe_invoice.lines.data:
+        invoice_items.append(InvoiceItem(
+            description=line.description or "",
+            amount=line.amount / 100,
+            currency=line.currency
+        ))
+    
+    return InvoiceResponse(
+        id=stripe_invoice.id,
+        invoice_number=None,
+        amount_due=stripe_invoice.amount_due / 100,
+        amount_paid=0,
+        currency=stripe_invoice.currency,
+        status="draft",
+        invoice_pdf=None,
+        hosted_invoice_url=None,
+        created=datetime.now(),
+        due_date=datetime.fromtimestamp(stripe_invoice.period_end) if stripe_invoice.period_end else None,
+        paid_at=None,
+        lines=invoice_items
+    )
+
+
+def _count_usage(db: Session, company_id: str) -> dict:
+    """Usage of every limited resource, by resource type."""
+    return {
+        resource_type: count_usage(db, company_id, resource_type)
+        for resource_type in ("employees", "transactions", "payroll_runs", "messages")
+    }
+
+
 @router.get("/usage", response_model=UsageStats)
 async def get_usage_stats(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: Session = Depends(get_db),
+    entitlements: Entitlements = Depends(get_entitlements)
 ):
     """Get usage statistics for the company's current plan.
     
     Args:
         current_user: Currently authenticated user
         db: Database session
+        entitlements: Entitlements resolved for this request
         
     Returns:
         Usage statistics
     """
-    # Get current subscription
-    result = await db.execute(
-        select(Subscription)
-        .where(Subscription.company_id == current_user.company_id)
-        .where(Subscription.status.in_([
-            SubscriptionStatus.ACTIVE.value,
-            SubscriptionStatus.TRIALING.value
-        ]))
-    )
-    subscription = result.scalar_one_or_none()
-    
-    # Get plan limits
-    limits = {}
-    if subscription and subscription.plan_id in PLAN_CONFIGS:
-        limits = PLAN_CONFIGS[subscription.plan_id].limits
+    # Plan limits (no limits without an active subscription)
+    limits = entitlements.limits if entitlements.has_subscription else {}
     
-    # Count employees
-    result = await db.execute(
-        select(Employee).where(Employee.company_id == current_user.company_id)
-    )
-    employees_count = len(result.scalars().all())
-    
-    # Count transactions
-    result = await db.execute(
-        select(Transaction).where(Transaction.company_id == current_user.company_id)
-    )
-    transactions_count = len(result.scalars().all())
-    
-    # Count payroll runs
-    result = await db.execute(
-        select(PayrollRun).where(PayrollRun.company_id == current_user.company_id)
-    )
-    payroll_runs_count = len(result.scalars().all())
-    
-    # TODO: Count messages from MongoDB
-    messages_count = 0
+    counts = await run_in_threadpool(_count_usage, db, current_user.company_id)
     
     return UsageStats(
-        employees_count=employees_count,
+        employees_count=counts["employees"],
         employees_limit=limits.get("employees"),
-        transactions_count=transactions_count,
+        transactions_count=counts["transactions"],
         transactions_limit=limits.get("transactions"),
-        payroll_runs_count=payroll_runs_count,
+        payroll_runs_count=counts["payroll_runs"],
         payroll_runs_limit=limits.get("payroll_runs"),
-        messages_count=messages_count,
+        messages_count=counts["messages"],
         messages_limit=limits.get("messages")
     )
 
@@ -331,13 +355,15 @@ async def get_usage_stats(
 @router.get("/dashboard", response_model=BillingDashboard)
 async def get_billing_dashboard(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: Session = Depends(get_db),
+    entitlements: Entitlements = Depends(get_entitlements)
 ):
     """Get comprehensive billing dashboard data.
     
     Args:
         current_user: Currently authenticated user
         db: Database session
+        entitlements: Entitlements resolved for this request
         
     Returns:
         Complete billing dashboard
@@ -345,44 +371,23 @@ async def get_billing_dashboard(
     # Get subscription
     subscription = await get_current_subscription(current_user, db)
     
-    # Get payment method
-    payment_method = await get_payment_method(current_user, db)
+    # Get company
+    company = await run_in_threadpool(db.get, Company, current_user.company_id)
     
-    # Get upcoming invoice
+    # Get payment method and upcoming invoice
+    payment_method = None
     upcoming_invoice = None
-    result = await db.execute(
-        select(Company).where(Company.id == current_user.company_id)
-    )
-    company = result.scalar_one_or_none()
-    
     if company and company.stripe_customer_id:
-        stripe_invoice = await StripeService.get_upcoming_invoice(company.stripe_customer_id)
-        if stripe_invoice:
-            invoice_items = []
-            for line in stripe_invoice.lines.data:
-                invoice_items.append(InvoiceItem(
-                    description=line.description or "",
-                    amount=line.amount / 100,
-                    currency=line.currency
-                ))
-            
-            upcoming_invoice = InvoiceResponse(
-                id=stripe_invoice.id,
-                invoice_number=None,
-                amount_due=stripe_invoice.amount_due / 100,
-                amount_paid=0,
-                currency=stripe_invoice.currency,
-                status="draft",
-                invoice_pdf=None,
-                hosted_invoice_url=None,
-                created=datetime.now(),
-                due_date=datetime.fromtimestamp(stripe_invoice.period_end) if stripe_invoice.period_end else None,
-                paid_at=None,
-                lines=invoice_items
-            )
+        # Independent Stripe reads - fetch concurrently off the event loop
+        stripe_payment_method, stripe_invoice = await asyncio.gather(
+            StripeService.get_payment_method(company.stripe_customer_id),
+            StripeService.get_upcoming_invoice(company.stripe_customer_id)
+        )
+        payment_method = _format_payment_method(stripe_payment_method)
+        upcoming_invoice = _format_upcoming_invoice(stripe_invoice)
     
     # Get usage stats
-    usage = await get_usage_stats(current_user, db)
+    usage = await get_usage_stats(current_user, db, entitlements)
     
     # Determine if payment is required
     requires_payment = not subscription or subscription.status in [
@@ -403,14 +408,36 @@ async def get_billing_dashboard(
     )
 
 
+def _schedule_customer_events(db: Session, inbox_event: StripeWebhookEvent) -> None:
+    """Apply the inbox of an event's customer, in a worker when one is configured."""
+    if settings.celery_broker_url:
+        try:
+            enqueue_customer_events(inbox_event.stripe_customer_id)
+        except Exception as e:
+            # Event is safely in the inbox; the periodic inbox drain picks it up
+            logger.error(f"Failed to enqueue Stripe webhook {inbox_event.id}: {e}")
+    else:
+        # No worker configured (local development) - apply inline
+        try:
+            process_customer_events(db, inbox_event.stripe_customer_id)
+        except Exception as e:
+            logger.error(f"Failed to apply Stripe webhook {inbox_event.id}: {e}")
+
+
 @router.post("/webhooks")
 async def stripe_webhook(
     request: Request,
     stripe_signature: str = Header(None, alias="stripe-signature"),
-    db: AsyncSession = Depends(get_db)
+    db: Session = Depends(get_db)
 ):
     """Stripe webhook endpoint for subscription events.
     
+    Verified events are persisted to the webhook inbox and acknowledged
+    immediately; they are applied asynchronously, in order per customer,
+    by the ``process_stripe_webhook_events`` task. Redelivered events are
+    recognised by their event ID and never applied twice; a redelivered
+    event that is still unprocessed gets its customer's inbox re-enqueued.
+    
     Args:
         request: Raw request object
         stripe_signature: Stripe signature header
@@ -424,110 +451,20 @@ async def stripe_webhook(
     # Verify webhook signature
     event = StripeService.construct_webhook_event(payload, stripe_signature)
     
-    logger.info(f"Received Stripe webhook: {event.type}")
+    inbox_event, created = record_event(db, event, payload)
+    if not created:
+        logger.info(f"Duplicate Stripe webhook {event.id} ({inbox_event.status})")
+        if inbox_event.status != "processed":
+            # Enqueueing failed or the task gave up; try the customer again
+            _schedule_customer_events(db, inbox_event)
+        return {"status": "duplicate"}
     
-    # Handle different event types
-    if event.type == "customer.subscription.created":
-        await handle_subscription_created(event.data.object, db)
-    elif event.type == "customer.subscription.updated":
-        await handle_subscription_updated(event.data.object, db)
-    elif event.type == "customer.subscription.deleted":
-        await handle_subscription_deleted(event.data.object, db)
-    elif event.type == "invoice.payment_succeeded":
-        await handle_payment_succeeded(event.data.object, db)
-    elif event.type == "invoice.payment_failed":
-        await handle_payment_failed(event.data.object, db)
+    logger.info(f"Received Stripe webhook: {event.type} ({event.id})")
     
-    return {"status": "success"}
-
-
-async def handle_subscription_created(subscription_data: stripe.Subscription, db: AsyncSession):
-    """Handle subscription.created webhook."""
-    company_id = subscription_data.metadata.get("company_id")
-    if not company_id:
-        logger.error("No company_id in subscription metadata")
-        return
-    
-    # Create subscription record
-    subscription = Subscription(
-        company_id=company_id,
-        stripe_subscription_id=subscription_data.id,
-        stripe_customer_id=subscription_data.customer,
-        plan_id=subscription_data.metadata.get("plan_id", PlanTier.FREE.value),
-        status=subscription_data.status,
-        current_period_start=datetime.fromtimestamp(subscription_data.current_period_start),
-        current_period_end=datetime.fromtimestamp(subscription_data.current_period_end),
-        cancel_at_period_end=subscription_data.cancel_at_period_end,
-        trial_start=datetime.fromtimestamp(subscription_data.trial_start) if subscription_data.trial_start else None,
-        trial_end=datetime.fromtimestamp(subscription_data.trial_end) if subscription_data.trial_end else None
-    )
+    # Cached Stripe reads for this customer are stale from now on
+    invalidate_stripe_customer(event_customer_id(event))
     
-    db.add(subscription)
+    _schedule_customer_events(db, inbox_event)
     
-    # Update company
-    result = await db.execute(
-        select(Company).where(Company.id == company_id)
-    )
-    company = result.scalar_one_or_none()
-    if company:
-        company.stripe_subscription_id = subscription_data.id
-    
-    await db.commit()
-    logger.info(f"Created subscription {subscription.id} for company {company_id}")
-
-
-async def handle_subscription_updated(sub_data: stripe.Subscription, db: AsyncSession):
-    """Handle subscription.updated webhook."""
-    result = await db.execute(
-        select(Subscription)
-        .where(Subscription.stripe_subscription_id == sub_data.id)
-    )
-    subscription = result.scalar_one_or_none()
-    
-    if not subscription:
-        logger.error(f"Subscription not found: {sub_data.id}")
-        return
-    
-    # Update subscription
-    subscription.status = sub_data.status
-    subscription.current_period_start = datetime.fromtimestamp(sub_data.current_period_start)
-    subscription.current_period_end = datetime.fromtimestamp(sub_data.current_period_end)
-    subscription.cancel_at_period_end = sub_data.cancel_at_period_end
-    
-    if sub_data.canceled_at:
-        subscription.canceled_at = datetime.fromtimestamp(sub_data.canceled_at)
-    
-    await db.commit()
-    logger.info(f"Updated subscription {subscription.id}")
-
-
-async def handle_subscription_deleted(sub_data: stripe.Subscription, db: AsyncSession):
-    """Handle subscription.deleted webhook."""
-    result = await db.execute(
-        select(Subscription)
-        .where(Subscription.stripe_subscription_id == sub_data.id)
-    )
-    subscription = result.scalar_one_or_none()
-    
-    if not subscription:
-        logger.error(f"Subscription not found: {sub_data.id}")
-        return
-    
-    # Update status to canceled
-    subscription.status = SubscriptionStatus.CANCELED.value
-    subscription.canceled_at = datetime.utcnow()
-    
-    await db.commit()
-    logger.info(f"Canceled subscription {subscription.id}")
-
-
-async def handle_payment_succeeded(invoice_data: stripe.Invoice, db: AsyncSession):
-    """Handle invoice.payment_succeeded webhook."""
-    logger.info(f"Payment succeeded for invoice {invoice_data.id}")
-    # TODO: Send receipt email
-
+    return {"status": "success"}
 
-async def handle_payment_failed(invoice_data: stripe.Invoice, db: AsyncSession):
-    """Handle invoice.payment_failed webhook."""
-    logger.error(f"Payment failed for invoice {invoice_data.id}")
-    # TODO: Send payment failed email
@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, case, func
 from typing import Optional
 from datetime import datetime, date, timedelta
 from decimal import Decimal
@@ -261,11 +261,9 @@ async def get_dashboard_charts(
     company_id = current_user.company_id
     today = date.today()
     
-    income_by_month = []
-    expenses_by_month = []
-    
+    # Month boundaries, oldest first
+    months_range = []
     for i in range(months - 1, -1, -1):
-        # Calculate month boundaries
         month_date = (today.replace(day=1) - timedelta(days=i * 30))
         month_start = month_date.replace(day=1)
         
@@ -274,36 +272,39 @@ async def get_dashboard_charts(
         else:
             month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
         
-        month_label = month_start.strftime("%b %Y")
-        
-        # Get income
-        income = db.query(
-            func.coalesce(func.sum(Transaction.amount), 0)
-        ).filter(
-            Transaction.company_id == company_id,
-            Transaction.type == "income",
+        months_range.append((month_start, month_end))
+    
+    # Income and expenses of every month in a single query
+    columns = []
+    for month_start, month_end in months_range:
+        in_month = and_(
             Transaction.transaction_date >= month_start,
             Transaction.transaction_date <= month_end
-        ).scalar()
-        
+        )
+        for transaction_type in ("income", "expense"):
+            columns.append(func.coalesce(func.sum(case(
+                (and_(in_month, Transaction.type == transaction_type), Transaction.amount),
+                else_=0
+            )), 0))
+    
+    totals = db.query(*columns).filter(
+        Transaction.company_id == company_id,
+        Transaction.transaction_date >= months_range[0][0],
+        Transaction.transaction_date <= months_range[-1][1]
+    ).one()
+    
+    income_by_month = []
+    expenses_by_month = []
+    
+    for index, (month_start, _) in enumerate(months_range):
+        month_label = month_start.strftime("%b %Y")
         income_by_month.append(ChartDataPoint(
             label=month_label,
-            value=Decimal(str(income))
+            value=Decimal(str(totals[2 * index]))
         ))
-        
-        # Get expenses
-        expenses = db.query(
-            func.coalesce(func.sum(Transaction.amount), 0)
-        ).filter(
-            Transaction.company_id == company_id,
-            Transaction.type == "expense",
-            Transaction.transaction_date >= month_start,
-            Transaction.transaction_date <= month_end
-        ).scalar()
-        
         expenses_by_month.append(ChartDataPoint(
             label=month_label,
-            value=Decimal(str(expenses))
+            value=Decimal(str(totals[2 * index + 1]))
         ))
     
     # Get expenses by category (current year)
@@ -366,6 +366,49 @@ async def create_employee(
     return EmployeeResponse.model_validate(employee)
 
 
+# Declared before /{employee_id}, which would otherwise match "export"
+@router.get("/export", response_model=dict)
+async def export_employees(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Export employees to CSV format."""
+    import csv
+    from io import StringIO
+    
+    employees = db.query(Employee).filter(
+        Employee.company_id == current_user.company_id
+    ).all()
+    
+    # Create CSV in memory
+    output = StringIO()
+    writer = csv.writer(output)
+    
+    # Write header
+    writer.writerow([
+        'ID', 'First Name', 'Last Name', 'Email', 'Phone',
+        'Position', 'Department', 'Hire Date', 'Employment Type',
+        'Status', 'Salary'
+    ])
+    
+    # Write data
+    for emp in employees:
+        writer.writerow([
+            emp.id, emp.first_name, emp.last_name, emp.email, emp.phone,
+            emp.position, emp.department, emp.hire_date, emp.employment_type,
+            emp.status, emp.salary_amount
+        ])
+    
+    csv_data = output.getvalue()
+    output.close()
+    
+    return {
+        "success": True,
+        "data": csv_data,
+        "filename": f"employees_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    }
+
+
 @router.get("/{employee_id}", response_model=EmployeeDetailResponse)
 async def get_employee(
     employee_id: str,
@@ -831,45 +874,3 @@ async def delete_shift(
     
     db.delete(shift)
     db.commit()
-
-
-@router.get("/export", response_model=dict)
-async def export_employees(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """Export employees to CSV format."""
-    import csv
-    from io import StringIO
-    
-    employees = db.query(Employee).filter(
-        Employee.company_id == current_user.company_id
-    ).all()
-    
-    # Create CSV in memory
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'ID', 'First Name', 'Last Name', 'Email', 'Phone',
-        'Position', 'Department', 'Hire Date', 'Employment Type',
-        'Status', 'Salary'
-    ])
-    
-    # Write data
-    for emp in employees:
-        writer.writerow([
-            emp.id, emp.first_name, emp.last_name, emp.email, emp.phone,
-            emp.position, emp.department, emp.hire_date, emp.employment_type,
-            emp.status, emp.salary_amount
-        ])
-    
-    csv_data = output.getvalue()
-    output.close()
-    
-    return {
-        "success": True,
-        "data": csv_data,
-        "filename": f"employees_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    }
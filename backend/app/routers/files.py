@@ -1,14 +1,33 @@
 """File upload and management router."""
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Header, HTTPException, status, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from pydantic import BaseModel, Field
+import asyncio
 import logging
 
 from ..database import get_db
 from ..auth import get_current_user
 from ..models import User
-from ..utils.s3_storage import s3_service
+from ..utils.derivatives import generate_derivatives, supports_derivatives
+from ..utils.document_index import (
+    delete_document,
+    document_filters,
+    index_available,
+    list_documents,
+    resolve_storage_keys,
+    store_document,
+)
+from ..utils.storage import (
+    FileTooLargeError,
+    LocalStorage,
+    StorageBackend,
+    get_storage,
+    verify_download,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -22,6 +41,17 @@ ALLOWED_EXTENSIONS = {
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Read size for ranged local downloads
+RANGE_CHUNK_SIZE = 64 * 1024
+
+DOWNLOAD_URL_EXPIRATION = 3600  # 1 hour
+MAX_BATCH_URLS = 100
+
+
+class DownloadUrlRequest(BaseModel):
+    """Files to sign download URLs for."""
+    file_keys: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_URLS)
+
 
 def validate_file(file: UploadFile, allowed_types: List[str]) -> None:
     """Validate file type and size."""
@@ -34,27 +64,106 @@ def validate_file(file: UploadFile, allowed_types: List[str]) -> None:
         )
 
 
+def parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range: bytes=...`` header.
+    
+    Args:
+        range_header: Range header value
+        size: File size in bytes
+        
+    Returns:
+        Inclusive (start, end) offsets, or None if the header should be
+        ignored (other units, multiple ranges or malformed values)
+        
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    
+    first, _, last = spec.strip().partition("-")
+    if not (first or last) or not all(value.isdigit() for value in (first, last) if value):
+        return None
+    
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    
+    if start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Read an inclusive byte range of a file in chunks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def schedule_derivatives(
+    background_tasks: BackgroundTasks,
+    storage: StorageBackend,
+    company_id: str,
+    result: dict
+) -> None:
+    """Generate thumbnails and previews of an indexed upload after the response."""
+    if result.get("content_hash") and supports_derivatives(result["content_type"]):
+        background_tasks.add_task(generate_derivatives, company_id, result["file_key"], storage)
+
+
 @router.post("/upload")
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     folder: str = Query("documents", description="Folder to store file in"),
+    document_type: Optional[str] = Query(None, description="Document type (defaults to the folder)"),
+    related_entity_type: Optional[str] = Query(None, description="Kind of entity the file belongs to"),
+    related_entity_id: Optional[str] = Query(None, description="ID of the entity the file belongs to"),
+    tags: Optional[List[str]] = Query(None, description="Tags to attach to the file"),
     current_user: User = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
     """
-    Upload a file to S3 storage.
+    Upload a file to storage.
     
     Folder options: 'invoices', 'employee-docs', 'reports', 'documents'
+    
+    The file is recorded in the document index so it shows up in listings
+    and can be filtered by type, related entity and tags. Content the
+    company has already uploaded is not stored again. Thumbnails of images
+    and PDFs are generated in the background.
     """
     try:
         # Validate file type
         validate_file(file, ALLOWED_EXTENSIONS["all"])
         
-        # Add company context to folder path for multi-tenancy
-        company_folder = f"{current_user.company_id}/{folder}"
-        
-        # Upload to S3
-        result = await s3_service.upload_file(file, folder=company_folder)
+        # Stored under the company's folder, enforcing the size limit as the file is read
+        result = await store_document(
+            storage,
+            file,
+            company_id=current_user.company_id,
+            uploaded_by=current_user.id,
+            folder=folder,
+            max_size=MAX_FILE_SIZE,
+            document_type=document_type,
+            tags=tags,
+            related_entity_type=related_entity_type,
+            related_entity_id=related_entity_id
+        )
+        schedule_derivatives(background_tasks, storage, current_user.company_id, result)
         
         logger.info(f"File uploaded by user {current_user.id}: {result['file_key']}")
         
@@ -64,6 +173,18 @@ async def upload_file(
             "file": result
         }
         
+    except HTTPException:
+        raise
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"File upload failed: {e}")
         raise HTTPException(
@@ -74,13 +195,15 @@ async def upload_file(
 
 @router.post("/upload/multiple")
 async def upload_multiple_files(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     folder: str = Query("documents", description="Folder to store files in"),
     current_user: User = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
     """
-    Upload multiple files to S3 storage.
+    Upload multiple files to storage.
     """
     if len(files) > 10:
         raise HTTPException(
@@ -91,17 +214,29 @@ async def upload_multiple_files(
     uploaded_files = []
     errors = []
     
-    for file in files:
-        try:
-            validate_file(file, ALLOWED_EXTENSIONS["all"])
-            company_folder = f"{current_user.company_id}/{folder}"
-            result = await s3_service.upload_file(file, folder=company_folder)
-            uploaded_files.append(result)
-        except Exception as e:
+    async def upload_one(file: UploadFile):
+        validate_file(file, ALLOWED_EXTENSIONS["all"])
+        return await store_document(
+            storage,
+            file,
+            company_id=current_user.company_id,
+            uploaded_by=current_user.id,
+            folder=folder,
+            max_size=MAX_FILE_SIZE
+        )
+    
+    # Files are uploaded concurrently; storage I/O runs off the event loop
+    results = await asyncio.gather(*(upload_one(file) for file in files), return_exceptions=True)
+    
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
             errors.append({
                 "filename": file.filename,
-                "error": str(e)
+                "error": str(result)
             })
+        else:
+            uploaded_files.append(result)
+            schedule_derivatives(background_tasks, storage, current_user.company_id, result)
     
     return {
         "success": len(errors) == 0,
@@ -114,24 +249,93 @@ async def upload_multiple_files(
 @router.get("/list")
 async def list_files(
     folder: str = Query("", description="Folder to list files from"),
+    document_type: Optional[str] = Query(None, description="Only files of this document type"),
+    related_entity_type: Optional[str] = Query(None, description="Only files attached to this kind of entity"),
+    related_entity_id: Optional[str] = Query(None, description="Only files attached to this entity"),
+    tags: Optional[List[str]] = Query(None, description="Only files carrying all of these tags"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    include_urls: bool = Query(False, description="Include a signed download URL for each file"),
     current_user: User = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
     """
-    List files in a specific folder.
+    List files in a specific folder, newest first.
+    
+    Served from the document index, with filters and pagination, and with
+    a thumbnail URL for images and PDFs once it has been generated. If
+    MongoDB is unavailable, unfiltered listings fall back to the first page
+    of a storage listing.
+    
+    With include_urls, download URLs are returned alongside the keys so
+    clients do not have to request one per file.
     """
+    filtered = any((document_type, related_entity_type, related_entity_id, tags))
+    if not index_available() and filtered:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="File filters are temporarily unavailable"
+        )
+    
     try:
-        # Add company context to folder path
-        company_folder = f"{current_user.company_id}/{folder}" if folder else current_user.company_id
-        
-        files = s3_service.list_files(prefix=company_folder, max_keys=100)
+        if index_available():
+            documents, total = await list_documents(
+                document_filters(
+                    current_user.company_id,
+                    folder=folder,
+                    document_type=document_type,
+                    related_entity_type=related_entity_type,
+                    related_entity_id=related_entity_id,
+                    tags=tags
+                ),
+                skip=skip,
+                limit=limit
+            )
+            files = [document.file_path for document in documents]
+            storage_keys = {document.file_path: document.blob_path or document.file_path for document in documents}
+            documents = [
+                {
+                    "file_key": document.file_path,
+                    "file_name": document.file_name,
+                    "file_size": document.file_size,
+                    "mime_type": document.mime_type,
+                    "document_type": document.document_type,
+                    "tags": document.tags,
+                    "related_entity_type": document.related_entity_type,
+                    "related_entity_id": document.related_entity_id,
+                    "uploaded_by": document.uploaded_by,
+                    "uploaded_at": document.uploaded_at,
+                    "thumbnail_url": (
+                        storage.download_urls.get(document.derivatives["thumbnail"], DOWNLOAD_URL_EXPIRATION).url
+                        if "thumbnail" in document.derivatives else None
+                    )
+                }
+                for document in documents
+            ]
+        else:
+            # Add company context to folder path
+            company_folder = f"{current_user.company_id}/{folder}" if folder else current_user.company_id
+            files = storage.list_files(prefix=company_folder, max_keys=limit) if skip == 0 else []
+            storage_keys = {file_key: file_key for file_key in files}
+            documents = None
+            total = len(files)
         
-        return {
+        response = {
             "success": True,
             "folder": folder,
             "files": files,
-            "count": len(files)
+            "documents": documents,
+            "count": len(files),
+            "total": total,
+            "skip": skip,
+            "limit": limit
         }
+        if include_urls:
+            signed = storage.download_urls.get_many(set(storage_keys.values()), expiration=DOWNLOAD_URL_EXPIRATION)
+            response["download_urls"] = {key: signed[storage_key].url for key, storage_key in storage_keys.items()}
+        
+        return response
         
     except Exception as e:
         logger.error(f"Failed to list files: {e}")
@@ -145,12 +349,14 @@ async def list_files(
 async def get_file_url(
     file_key: str,
     current_user: User = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
     """
-    Get a presigned URL for downloading a file.
+    Get a presigned (or, for local storage, signed) URL for downloading a file.
     
-    The URL expires after 1 hour.
+    URLs are valid for 1 hour. A previously issued URL is returned while it
+    still has enough validity left; expires_in gives the remaining time.
     """
     try:
         # Verify file belongs to user's company
@@ -160,16 +366,18 @@ async def get_file_url(
                 detail="Access denied to this file"
             )
         
-        # Generate presigned URL
-        url = s3_service.get_presigned_url(file_key, expiration=3600)
+        storage_key = (await resolve_storage_keys(current_user.company_id, [file_key]))[file_key]
+        signed = storage.download_urls.get(storage_key, expiration=DOWNLOAD_URL_EXPIRATION)
         
         return {
             "success": True,
             "file_key": file_key,
-            "download_url": url,
-            "expires_in": 3600
+            "download_url": signed.url,
+            "expires_in": signed.expires_in
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to generate download URL: {e}")
         raise HTTPException(
@@ -178,14 +386,58 @@ async def get_file_url(
         )
 
 
+@router.post("/download-urls")
+async def get_file_urls(
+    request: DownloadUrlRequest,
+    current_user: User = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage)
+):
+    """
+    Get download URLs for many files in one call.
+    
+    Keys outside the user's company are reported in errors instead of
+    failing the whole batch. expires_in is the shortest remaining validity
+    among the returned URLs.
+    """
+    company_prefix = f"{current_user.company_id}/"
+    errors = {}
+    
+    allowed = []
+    for file_key in dict.fromkeys(request.file_keys):
+        if file_key.startswith(company_prefix):
+            allowed.append(file_key)
+        else:
+            errors[file_key] = "Access denied to this file"
+    
+    try:
+        storage_keys = await resolve_storage_keys(current_user.company_id, allowed)
+        signed = storage.download_urls.get_many(set(storage_keys.values()), expiration=DOWNLOAD_URL_EXPIRATION)
+    except Exception as e:
+        logger.error(f"Failed to generate download URLs: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate download URLs: {str(e)}"
+        )
+    
+    urls = {file_key: signed[storage_key].url for file_key, storage_key in storage_keys.items()}
+    
+    return {
+        "success": not errors,
+        "download_urls": urls,
+        "expires_in": min((url.expires_in for url in signed.values()), default=0),
+        "errors": errors
+    }
+
+
 @router.delete("/delete/{file_key:path}")
 async def delete_file(
     file_key: str,
     current_user: User = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
     """
-    Delete a file from S3 storage.
+    Delete a file from storage.
     """
     try:
         # Verify file belongs to user's company
@@ -202,8 +454,8 @@ async def delete_file(
                 detail="Only admins can delete files"
             )
         
-        # Delete file
-        success = s3_service.delete_file(file_key)
+        # Delete file (deduplicated content is only dereferenced)
+        success = await delete_document(storage, current_user.company_id, file_key)
         
         if not success:
             raise HTTPException(
@@ -232,6 +484,7 @@ async def delete_file(
 async def get_file_metadata(
     file_key: str,
     current_user: User = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
     """
@@ -245,7 +498,8 @@ async def get_file_metadata(
                 detail="Access denied to this file"
             )
         
-        metadata = s3_service.get_file_metadata(file_key)
+        storage_key = (await resolve_storage_keys(current_user.company_id, [file_key]))[file_key]
+        metadata = storage.get_file_metadata(storage_key)
         
         if not metadata:
             raise HTTPException(
@@ -267,3 +521,70 @@ async def get_file_metadata(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get file metadata: {str(e)}"
         )
+
+
+@router.get("/raw/{file_key:path}")
+async def serve_local_file(
+    file_key: str,
+    expires: int = Query(..., description="Expiry of the signed URL (Unix time)"),
+    signature: str = Query(..., description="URL signature"),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    storage: StorageBackend = Depends(get_storage)
+):
+    """
+    Serve a file from local storage.
+    
+    Only available with the local storage backend. Access is granted by the
+    signed URL from the download endpoints, like an S3 presigned URL, so no
+    auth header is needed (e.g. for <img> tags). Full downloads are sent
+    with FileResponse; single byte ranges get a 206 response.
+    """
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    
+    if not verify_download(file_key, expires, signature):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired download link"
+        )
+    
+    metadata = storage.get_file_metadata(file_key)
+    if not metadata:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    
+    path = storage.path(file_key)
+    size = metadata["content_length"]
+    media_type = metadata["content_type"]
+    headers = {"Accept-Ranges": "bytes"}
+    
+    byte_range = None
+    if range_header:
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+    
+    if byte_range is None:
+        return FileResponse(
+            path,
+            media_type=media_type,
+            headers=headers,
+            filename=metadata["metadata"].get("original_filename"),
+            content_disposition_type="inline"
+        )
+    
+    start, end = byte_range
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1)
+    })
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
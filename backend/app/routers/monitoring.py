@@ -0,0 +1,113 @@
+"""Monitoring router for platform operators."""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from ..auth import require_super_admin
+from ..database import slow_query_log
+from ..models.user import User
+from ..utils.profiler import MAX_WINDOW_SECONDS, profiler_session
+
+router = APIRouter()
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=100, description="Number of statements to return"),
+    include_recent: bool = Query(False, description="Also return the most recent slow statements"),
+    current_user: User = Depends(require_super_admin)
+):
+    """
+    Get the slowest SQL statements by total time (super admin only).
+    
+    Statements are normalized (literal values removed) and aggregated since
+    the process started; each API process keeps its own log.
+    
+    Args:
+        limit: Number of statements to return
+        include_recent: Also return the most recent slow statements
+        
+    Returns:
+        Worst offenders by total time, with their routes, companies and
+        last captured plan
+    """
+    response = {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "offenders": slow_query_log.top(limit)
+    }
+    if include_recent:
+        response["recent"] = slow_query_log.recent(limit)
+    return response
+
+
+@router.post("/profiler/start")
+async def start_profiler(
+    duration: int = Query(30, ge=1, le=MAX_WINDOW_SECONDS, description="Seconds to profile for"),
+    interval_ms: int = Query(5, ge=1, le=100, description="Milliseconds between samples"),
+    current_user: User = Depends(require_super_admin)
+):
+    """
+    Start sampling every thread of this API process (super admin only).
+    
+    The profiler stops by itself after ``duration`` seconds; the profile is
+    then available from ``/profiler/profiles/{id}``.
+    
+    Args:
+        duration: Seconds to profile for
+        interval_ms: Milliseconds between samples
+        
+    Returns:
+        Profiler status
+    """
+    try:
+        profiler_session.start(duration, interval=interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return profiler_session.status()
+
+
+@router.post("/profiler/stop")
+async def stop_profiler(current_user: User = Depends(require_super_admin)):
+    """Stop the profiler before its window elapses (super admin only)."""
+    profiler_session.stop()
+    return profiler_session.status()
+
+
+@router.get("/profiler")
+async def get_profiler_status(current_user: User = Depends(require_super_admin)):
+    """Get the profiler status and the last window profile (super admin only)."""
+    return profiler_session.status()
+
+
+@router.get("/profiler/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed|summary)$"),
+    current_user: User = Depends(require_super_admin)
+):
+    """
+    Download a window or request profile (super admin only).
+    
+    Args:
+        profile_id: Id from the profiler status or the X-Profile-Id header
+        format: ``speedscope`` (JSON for speedscope.app), ``collapsed``
+            (folded stacks for flamegraph.pl) or ``summary`` (top functions)
+        
+    Returns:
+        The profile in the requested format
+    """
+    profile = profiler_session.find(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    if format == "summary":
+        return {
+            "id": profile.id,
+            "samples": profile.samples,
+            "duration": round(profile.duration, 3),
+            "self": profile.top(20),
+            "app": profile.top(20, app_only=True)
+        }
+    return profile.speedscope()
@@ -1,6 +1,6 @@
 """Payroll management router with payroll runs and processing."""
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import Optional, List
@@ -28,6 +28,8 @@ from ..schemas.payroll import (
     PaymentStatus,
 )
 from ..auth import get_current_user, require_manager, require_admin
+from ..config import settings
+from ..utils.email import EmailService
 
 router = APIRouter()
 
@@ -253,6 +255,7 @@ async def get_payroll_run(
 async def process_payroll(
     run_id: str,
     process_data: ProcessPayrollRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_manager)
 ):
@@ -360,6 +363,17 @@ async def process_payroll(
             detail=f"Failed to process payroll: {str(e)}"
         )
     
+    # Notify employees in bulk outside the request (app.tasks loads Celery, import on use)
+    from ..tasks import build_payroll_notice_recipients, send_payroll_processed_notices_task
+    
+    if settings.celery_broker_url:
+        send_payroll_processed_notices_task.delay(run_id)
+    else:
+        background_tasks.add_task(
+            EmailService.send_payroll_processed_notices,
+            build_payroll_notice_recipients(db, run_id)
+        )
+    
     # Return the detailed response
     return await get_payroll_run(run_id, db, current_user)
 
@@ -1,32 +1,101 @@
 """Reports router for generating and managing PDF reports."""
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
 from datetime import date, datetime
-from typing import Optional, Literal
+from typing import Any, Dict, Optional, Literal
 import logging
 
 from ..auth.security import get_current_active_user
 from ..database import get_db
 from ..models.user import User
-from ..models.payroll import PayrollRun, PayrollItem
-from ..models.finance import Transaction
-from ..utils.pdf_reports import pdf_service
-from ..utils.s3_storage import s3_service
+from ..models.payroll import PayrollItem
+from ..models.report import ReportJob
+from ..utils.report_cache import (
+    compute_data_version,
+    find_cached_report,
+    find_inflight_report,
+    report_cache_key,
+)
+from ..utils.report_jobs import create_report_job, run_report_job, serialize_report_job
+from ..utils.storage import StorageBackend, get_storage
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+REPORT_LABELS = {
+    "financial": "Financial",
+    "payroll": "Payroll"
+}
 
-@router.post("/financial")
+
+def _queue_report(
+    db: Session,
+    current_user: User,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    storage: StorageBackend,
+    report_type: str,
+    start_date: date,
+    end_date: date,
+    parameters: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Serve a report from the cache or queue a job to generate it."""
+    company_id = current_user.company_id
+    label = REPORT_LABELS[report_type]
+    
+    data_version = compute_data_version(db, company_id, report_type, start_date, end_date)
+    cache_key = report_cache_key(company_id, report_type, parameters, data_version)
+    
+    cached = find_cached_report(db, company_id, cache_key)
+    if cached:
+        response.status_code = status.HTTP_200_OK
+        logger.info(f"Serving cached {report_type} report {cached.file_key} for company {company_id}")
+        return {
+            "message": f"{label} report ready",
+            **serialize_report_job(cached),
+            "cached": True,
+            # Generate download URL (valid for 1 hour)
+            "download_url": storage.download_urls.get(cached.file_key, expiration=3600).url
+        }
+    
+    # Identical request already being generated - share its job
+    job = find_inflight_report(db, company_id, cache_key)
+    if not job:
+        job = create_report_job(
+            db,
+            company_id=company_id,
+            user_id=current_user.id,
+            report_type=report_type,
+            parameters=parameters,
+            cache_key=cache_key
+        )
+        background_tasks.add_task(run_report_job, job.id)
+        logger.info(f"Queued {report_type} report job {job.id} for company {company_id}")
+    
+    return {
+        "message": f"{label} report generation started",
+        **serialize_report_job(job)
+    }
+
+
+@router.post("/financial", status_code=status.HTTP_202_ACCEPTED)
 async def generate_financial_report(
+    background_tasks: BackgroundTasks,
+    response: Response,
     start_date: date = Query(..., description="Start date for report"),
     end_date: date = Query(..., description="End date for report"),
     report_type: Literal["income", "expense", "summary"] = Query("summary", description="Type of financial report"),
     current_user: User = Depends(get_current_active_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
-    """Generate a financial report PDF and upload to S3.
+    """Queue a financial report PDF for background generation.
+    
+    The PDF is rendered in a worker process and saved to storage. The user is
+    notified over WebSocket when it is ready. If the same report was already
+    generated from unchanged data, it is returned immediately (200) with a
+    fresh download URL.
     
     Args:
         start_date: Start date for the report period
@@ -36,114 +105,36 @@ async def generate_financial_report(
         db: Database session
         
     Returns:
-        Download URL and S3 file key
+        Report job ID and status, or the cached report
     """
-    try:
-        # Get company name from user's company
-        company_name = current_user.company.name if current_user.company else "Company"
-        
-        # Aggregate revenue data
-        revenues = db.query(Transaction).filter(
-            Transaction.company_id == current_user.company_id,
-            Transaction.type == "income",
-            Transaction.transaction_date >= start_date,
-            Transaction.transaction_date <= end_date
-        ).all()
-        
-        total_income = sum(r.amount for r in revenues)
-        
-        # Aggregate expense data
-        expenses = db.query(Transaction).filter(
-            Transaction.company_id == current_user.company_id,
-            Transaction.type == "expense",
-            Transaction.transaction_date >= start_date,
-            Transaction.transaction_date <= end_date
-        ).all()
-        
-        total_expenses = sum(e.amount for e in expenses)
-        
-        # Create expense breakdown by category
-        expense_breakdown = {}
-        for expense in expenses:
-            category = expense.category or "Uncategorized"
-            expense_breakdown[category] = expense_breakdown.get(category, 0) + expense.amount
-        
-        # Prepare report data
-        report_data = {
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date.strftime("%Y-%m-%d"),
-            "income": total_income,
-            "expenses": total_expenses,
-            "net": total_income - total_expenses,
-            "expense_breakdown": expense_breakdown
+    return _queue_report(
+        db,
+        current_user,
+        background_tasks,
+        response,
+        storage,
+        report_type="financial",
+        start_date=start_date,
+        end_date=end_date,
+        parameters={
+            "start_date": str(start_date),
+            "end_date": str(end_date),
+            "variant": report_type
         }
-        
-        # Determine report title
-        report_titles = {
-            "income": "Income Statement",
-            "expense": "Expense Report",
-            "summary": "Financial Summary"
-        }
-        report_title = report_titles.get(report_type, "Financial Report")
-        
-        # Generate PDF
-        pdf_bytes = pdf_service.generate_financial_report(
-            company_name=company_name,
-            report_data=report_data,
-            report_type=report_title
-        )
-        
-        # Upload to S3
-        filename = f"financial_report_{start_date}_{end_date}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-        file_key = f"{current_user.company_id}/reports/{filename}"
-        
-        s3_service.upload_file(
-            file_obj=pdf_bytes,
-            file_key=file_key,
-            content_type="application/pdf",
-            metadata={
-                "report_type": report_type,
-                "start_date": str(start_date),
-                "end_date": str(end_date),
-                "generated_by": str(current_user.id),
-                "company_id": str(current_user.company_id)
-            }
-        )
-        
-        # Generate download URL (valid for 1 hour)
-        download_url = s3_service.get_presigned_url(file_key, expiration=3600)
-        
-        logger.info(f"Generated financial report for company {current_user.company_id}: {file_key}")
-        
-        return {
-            "message": "Financial report generated successfully",
-            "file_key": file_key,
-            "download_url": download_url,
-            "filename": filename,
-            "report_data": {
-                "total_income": total_income,
-                "total_expenses": total_expenses,
-                "net_income": total_income - total_expenses,
-                "period": f"{start_date} to {end_date}"
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"Failed to generate financial report: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate report: {str(e)}"
-        )
+    )
 
 
-@router.post("/payroll")
+@router.post("/payroll", status_code=status.HTTP_202_ACCEPTED)
 async def generate_payroll_report(
+    background_tasks: BackgroundTasks,
+    response: Response,
     start_date: date = Query(..., description="Start date for payroll period"),
     end_date: date = Query(..., description="End date for payroll period"),
     current_user: User = Depends(get_current_active_user),
+    storage: StorageBackend = Depends(get_storage),
     db: Session = Depends(get_db)
 ):
-    """Generate a payroll report PDF and upload to S3.
+    """Queue a payroll report PDF for background generation.
     
     Args:
         start_date: Start date for the payroll period
@@ -152,118 +143,112 @@ async def generate_payroll_report(
         db: Database session
         
     Returns:
-        Download URL and S3 file key
+        Report job ID and status, or the cached report
     """
-    try:
-        # Check authorization (admin or manager only)
-        if current_user.role not in ["company_admin", "super_admin", "manager"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Only admins and managers can generate payroll reports"
-            )
-        
-        # Get company name
-        company_name = current_user.company.name if current_user.company else "Company"
-        
-        # Get payroll records (runs for the company in period)
-        # Using PayrollItem since it has the detailed breakdown per employee
-        payroll_items = db.query(PayrollItem).filter(
-            PayrollItem.company_id == current_user.company_id,
-            PayrollItem.created_at >= datetime.combine(start_date, datetime.min.time()),
-            PayrollItem.created_at <= datetime.combine(end_date, datetime.max.time())
-        ).all()
-        
-        if not payroll_items:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No payroll data found for the specified period"
-            )
-        
-        # Prepare payroll data for PDF
-        payroll_data = []
-        for item in payroll_items:
-            employee_name = f"{item.employee.first_name} {item.employee.last_name}" if item.employee else "Unknown"
-            payroll_data.append({
-                "employee_name": employee_name,
-                "gross_pay": float(item.base_salary),
-                "deductions": float(item.deductions),
-                "net_pay": float(item.net_amount)
-            })
-        
-        # Generate PDF
-        pdf_bytes = pdf_service.generate_payroll_report(
-            company_name=company_name,
-            payroll_data=payroll_data,
-            period_start=start_date.strftime("%Y-%m-%d"),
-            period_end=end_date.strftime("%Y-%m-%d")
+    # Check authorization (admin or manager only)
+    if current_user.role not in ["company_admin", "super_admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can generate payroll reports"
         )
-        
-        # Upload to S3
-        filename = f"payroll_report_{start_date}_{end_date}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-        file_key = f"{current_user.company_id}/reports/{filename}"
-        
-        s3_service.upload_file(
-            file_obj=pdf_bytes,
-            file_key=file_key,
-            content_type="application/pdf",
-            metadata={
-                "report_type": "payroll",
-                "start_date": str(start_date),
-                "end_date": str(end_date),
-                "generated_by": str(current_user.id),
-                "company_id": str(current_user.company_id)
-            }
+    
+    # Fail fast instead of queueing a job that cannot produce a report
+    has_payroll = db.query(PayrollItem.id).filter(
+        PayrollItem.company_id == current_user.company_id,
+        PayrollItem.created_at >= datetime.combine(start_date, datetime.min.time()),
+        PayrollItem.created_at <= datetime.combine(end_date, datetime.max.time())
+    ).first()
+    
+    if not has_payroll:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No payroll data found for the specified period"
         )
-        
-        # Generate download URL
-        download_url = s3_service.get_presigned_url(file_key, expiration=3600)
-        
-        logger.info(f"Generated payroll report for company {current_user.company_id}: {file_key}")
-        
-        return {
-            "message": "Payroll report generated successfully",
-            "file_key": file_key,
-            "download_url": download_url,
-            "filename": filename,
-            "report_data": {
-                "employee_count": len(payroll_data),
-                "total_gross": sum(p["gross_pay"] for p in payroll_data),
-                "total_net": sum(p["net_pay"] for p in payroll_data),
-                "period": f"{start_date} to {end_date}"
-            }
+    
+    return _queue_report(
+        db,
+        current_user,
+        background_tasks,
+        response,
+        storage,
+        report_type="payroll",
+        start_date=start_date,
+        end_date=end_date,
+        parameters={
+            "start_date": str(start_date),
+            "end_date": str(end_date)
         }
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_report_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user),
+    storage: StorageBackend = Depends(get_storage),
+    db: Session = Depends(get_db)
+):
+    """Get the status of a report job.
+    
+    Args:
+        job_id: Report job ID
+        current_user: Current authenticated user
+        db: Database session
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Failed to generate payroll report: {e}")
+    Returns:
+        Job status, with a download URL once the report is ready
+    """
+    job = db.query(ReportJob).filter(
+        ReportJob.id == job_id,
+        ReportJob.company_id == current_user.company_id
+    ).first()
+    
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate report: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Report job not found"
         )
+    
+    response = serialize_report_job(job)
+    if job.status == "completed" and job.file_key:
+        # Generate download URL (valid for 1 hour)
+        response["download_url"] = storage.download_urls.get(job.file_key, expiration=3600).url
+    
+    return response
 
 
 @router.get("/list")
 async def list_reports(
-    current_user: User = Depends(get_current_active_user)
+    include_urls: bool = Query(False, description="Include a signed download URL for each report"),
+    current_user: User = Depends(get_current_active_user),
+    storage: StorageBackend = Depends(get_storage)
 ):
     """List all generated reports for the company.
     
+    Args:
+        include_urls: Also return download URLs, keyed by storage key
+        current_user: Current authenticated user
+        
     Returns:
-        List of report files with metadata
+        List of report storage keys
     """
     try:
         # List all files in the reports folder
         folder_prefix = f"{current_user.company_id}/reports/"
-        files = s3_service.list_files(folder_prefix)
+        files = storage.list_files(folder_prefix)
         
-        # Sort by last modified (newest first)
-        files.sort(key=lambda x: x.get("LastModified", ""), reverse=True)
+        # list_files returns keys only; keys embed the report period
+        files.sort(reverse=True)
         
-        return {
+        response = {
             "reports": files,
             "count": len(files)
         }
+        if include_urls:
+            signed = storage.download_urls.get_many(files, expiration=3600)
+            response["download_urls"] = {key: url.url for key, url in signed.items()}
+        
+        return response
         
     except Exception as e:
         logger.error(f"Failed to list reports: {e}")
@@ -276,12 +261,13 @@ async def list_reports(
 @router.get("/download/{file_key:path}")
 async def download_report(
     file_key: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    storage: StorageBackend = Depends(get_storage)
 ):
     """Generate a presigned download URL for a report.
     
     Args:
-        file_key: S3 file key
+        file_key: Storage key
         current_user: Current authenticated user
         
     Returns:
@@ -296,7 +282,7 @@ async def download_report(
             )
         
         # Check if file exists
-        metadata = s3_service.get_file_metadata(file_key)
+        metadata = storage.get_file_metadata(file_key)
         if not metadata:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -304,7 +290,7 @@ async def download_report(
             )
         
         # Generate presigned URL (valid for 1 hour)
-        download_url = s3_service.get_presigned_url(file_key, expiration=3600)
+        download_url = storage.download_urls.get(file_key, expiration=3600).url
         
         return {
             "download_url": download_url,
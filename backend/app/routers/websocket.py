@@ -23,7 +23,7 @@ async def get_user_from_token(token: str, db: Session) -> Optional[User]:
         if not user_id:
             return None
         
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = db.query(User).filter(User.id == user_id).first()
         return user
     except Exception as e:
         logger.error(f"Failed to decode token: {e}")
@@ -58,6 +58,10 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
             logger.warning(f"WebSocket connection rejected: Inactive user {user.email}")
             return
         
+        # Release the database connection; holding one per open socket
+        # would exhaust the pool
+        db.close()
+        
         # Connect the websocket
         await manager.connect(
             websocket=websocket,
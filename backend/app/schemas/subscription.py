@@ -135,6 +135,8 @@ class PlanFeatures(BaseModel):
     price_yearly: float
     features: list[str]
     limits: dict[str, Optional[int]]
+    # API requests per minute, per user and for the whole company
+    rate_limits: dict[str, int] = Field(default_factory=lambda: {"user_per_minute": 60, "company_per_minute": 300})
 
 
 PLAN_CONFIGS: dict[PlanTier, PlanFeatures] = {
@@ -152,7 +154,8 @@ PLAN_CONFIGS: dict[PlanTier, PlanFeatures] = {
             "transactions": 50,
             "payroll_runs": 2,
             "messages": 100
-        }
+        },
+        rate_limits={"user_per_minute": 60, "company_per_minute": 300}
     ),
     PlanTier.EMPLOYEES: PlanFeatures(
         name="Employees",
@@ -169,7 +172,8 @@ PLAN_CONFIGS: dict[PlanTier, PlanFeatures] = {
             "transactions": 0,
             "payroll_runs": 0,
             "messages": 500
-        }
+        },
+        rate_limits={"user_per_minute": 120, "company_per_minute": 1200}
     ),
     PlanTier.FINANCE: PlanFeatures(
         name="Finance",
@@ -186,7 +190,8 @@ PLAN_CONFIGS: dict[PlanTier, PlanFeatures] = {
             "transactions": None,
             "payroll_runs": 0,
             "messages": 500
-        }
+        },
+        rate_limits={"user_per_minute": 120, "company_per_minute": 1200}
     ),
     PlanTier.PAYROLL: PlanFeatures(
         name="Payroll",
@@ -203,7 +208,8 @@ PLAN_CONFIGS: dict[PlanTier, PlanFeatures] = {
             "transactions": 0,
             "payroll_runs": None,
             "messages": 500
-        }
+        },
+        rate_limits={"user_per_minute": 120, "company_per_minute": 1200}
     ),
     PlanTier.COMMUNICATION: PlanFeatures(
         name="Communication",
@@ -220,7 +226,8 @@ PLAN_CONFIGS: dict[PlanTier, PlanFeatures] = {
             "transactions": 0,
             "payroll_runs": 0,
             "messages": None
-        }
+        },
+        rate_limits={"user_per_minute": 120, "company_per_minute": 1200}
     ),
     PlanTier.ALL_ACCESS: PlanFeatures(
         name="All Access",
@@ -237,6 +244,7 @@ PLAN_CONFIGS: dict[PlanTier, PlanFeatures] = {
             "transactions": None,
             "payroll_runs": None,
             "messages": None
-        }
+        },
+        rate_limits={"user_per_minute": 300, "company_per_minute": 3000}
     )
 }
@@ -1,62 +1,211 @@
 """Background tasks for Celery."""
 
 from ..celery_config import celery_app
-from ..utils.email import EmailService
+from ..config import settings
+from ..database import SessionLocal
+from ..models import Company, Employee, PayrollItem, PayrollRun
+from ..utils.email import EmailService, payroll_notice_substitutions
+from ..utils.email_dispatch import (
+    SENDGRID_MAX_PERSONALIZATIONS,
+    EmailDeliveryError,
+    EmailRecipient,
+    email_dispatcher,
+)
+from ..utils.email_templates import email_templates
+from celery.signals import worker_process_init
+from dataclasses import asdict
+from typing import List, Optional
+import asyncio
 import logging
+import redis
 
 logger = logging.getLogger(__name__)
 
+# Redis client for cross-worker locks (created on first use)
+_redis_client = None
 
-@celery_app.task(name="send_email_task")
-def send_email_task(to_email: str, subject: str, html_content: str):
+# Per-worker event loop for async email delivery (created on first use)
+_event_loop = None
+
+
+def get_redis_client() -> redis.Redis:
+    """Get the shared Redis client used for task locks."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.redis_url)
+    return _redis_client
+
+
+@worker_process_init.connect
+def compile_email_templates(**kwargs):
+    """Compile email templates once per worker process."""
+    email_templates.load()
+
+
+def run_async(coro):
+    """Run a coroutine on this worker's persistent event loop.
+    
+    Reusing one loop per worker process keeps the pooled HTTP connections
+    of ``email_dispatcher`` alive between tasks.
+    """
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+    return _event_loop.run_until_complete(coro)
+
+
+def retry_email_delivery(task, exc: EmailDeliveryError):
+    """Retry a failed email task with exponential backoff.
+    
+    Permanent SendGrid rejections (4xx other than 429) are not retried.
+    """
+    if not exc.retryable:
+        raise exc
+    raise task.retry(exc=exc, countdown=min(2 ** task.request.retries * 30, 3600))
+
+
+def build_payroll_notice_recipients(db, payroll_run_id: str) -> List[EmailRecipient]:
+    """Load the recipients of a payroll run's processed notices.
+    
+    Args:
+        db: Database session
+        payroll_run_id: Payroll run ID
+        
+    Returns:
+        One recipient per paid employee with an email address
+    """
+    rows = db.query(
+        Employee.email,
+        Employee.first_name,
+        Employee.last_name,
+        PayrollItem.net_amount,
+        PayrollRun.period_start,
+        PayrollRun.period_end
+    ).join(
+        PayrollItem, PayrollItem.employee_id == Employee.id
+    ).join(
+        PayrollRun, PayrollRun.id == PayrollItem.payroll_run_id
+    ).filter(
+        PayrollItem.payroll_run_id == payroll_run_id,
+        Employee.email.isnot(None)
+    ).all()
+    
+    return [
+        EmailRecipient(
+            email=row.email,
+            name=f"{row.first_name} {row.last_name}",
+            substitutions=payroll_notice_substitutions(
+                row.first_name, row.period_start, row.period_end, row.net_amount
+            )
+        )
+        for row in rows
+    ]
+
+
+@celery_app.task(name="send_email_task", bind=True, max_retries=5)
+def send_email_task(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None):
     """Send email as a background task.
     
     Args:
         to_email: Recipient email address
         subject: Email subject
         html_content: HTML email body
+        text_content: Plain text email body (optional)
     """
     try:
-        EmailService.send_email(to_email, subject, html_content)
-        logger.info(f"Email sent successfully to {to_email}")
-        return {"status": "success", "to": to_email}
-    except Exception as e:
+        sent = run_async(email_dispatcher.send(to_email, subject, html_content, text_content))
+        return {"status": "success" if sent else "skipped", "to": to_email}
+    except EmailDeliveryError as e:
         logger.error(f"Failed to send email to {to_email}: {e}")
-        raise
+        retry_email_delivery(self, e)
 
 
-@celery_app.task(name="send_password_reset_task")
-def send_password_reset_task(to_email: str, reset_token: str):
+@celery_app.task(name="send_password_reset_task", bind=True, max_retries=5)
+def send_password_reset_task(self, to_email: str, reset_token: str, frontend_url: str = "http://localhost:3000"):
     """Send password reset email as a background task.
     
     Args:
         to_email: User email address
         reset_token: Password reset token
+        frontend_url: Frontend application URL
     """
+    email = EmailService.render_password_reset(reset_token, frontend_url)
     try:
-        EmailService.send_password_reset(to_email, reset_token)
+        sent = run_async(email_dispatcher.send(to_email, email.subject, email.html, email.text))
         logger.info(f"Password reset email sent to {to_email}")
-        return {"status": "success", "to": to_email}
-    except Exception as e:
+        return {"status": "success" if sent else "skipped", "to": to_email}
+    except EmailDeliveryError as e:
         logger.error(f"Failed to send password reset email: {e}")
-        raise
+        retry_email_delivery(self, e)
 
 
-@celery_app.task(name="send_welcome_email_task")
-def send_welcome_email_task(to_email: str, user_name: str):
+@celery_app.task(name="send_welcome_email_task", bind=True, max_retries=5)
+def send_welcome_email_task(self, to_email: str, user_name: str):
     """Send welcome email to new users.
     
     Args:
         to_email: User email address
         user_name: User's full name
     """
+    email = EmailService.render_welcome_email(user_name)
     try:
-        EmailService.send_welcome_email(to_email, user_name)
+        sent = run_async(email_dispatcher.send(to_email, email.subject, email.html, email.text))
         logger.info(f"Welcome email sent to {to_email}")
-        return {"status": "success", "to": to_email}
-    except Exception as e:
+        return {"status": "success" if sent else "skipped", "to": to_email}
+    except EmailDeliveryError as e:
         logger.error(f"Failed to send welcome email: {e}")
-        raise
+        retry_email_delivery(self, e)
+
+
+@celery_app.task(name="send_payroll_processed_notices_task")
+def send_payroll_processed_notices_task(payroll_run_id: str):
+    """Notify every employee in a payroll run that their pay was processed.
+    
+    Recipients are split into batches of up to 1000 (one SendGrid request
+    each) and every batch is sent by its own task, so a failed batch is
+    retried alone and employees in the other batches are not notified twice.
+    
+    Args:
+        payroll_run_id: ID of the completed payroll run
+    """
+    db = SessionLocal()
+    try:
+        recipients = build_payroll_notice_recipients(db, payroll_run_id)
+    finally:
+        db.close()
+    
+    batches = [
+        recipients[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+        for start in range(0, len(recipients), SENDGRID_MAX_PERSONALIZATIONS)
+    ]
+    for batch in batches:
+        send_payroll_notice_batch_task.delay(payroll_run_id, [asdict(recipient) for recipient in batch])
+    
+    logger.info(f"Queued payroll notices for run {payroll_run_id}: {len(recipients)} employees in {len(batches)} batches")
+    return {"status": "queued", "payroll_run_id": payroll_run_id, "recipients": len(recipients), "batches": len(batches)}
+
+
+@celery_app.task(name="send_payroll_notice_batch_task", bind=True, max_retries=5)
+def send_payroll_notice_batch_task(self, payroll_run_id: str, recipients: List[dict]):
+    """Send the payroll processed notice to one batch of employees.
+    
+    Args:
+        payroll_run_id: ID of the completed payroll run
+        recipients: Up to 1000 ``EmailRecipient`` fields
+    """
+    email = EmailService.render_payroll_processed_notice()
+    try:
+        sent = run_async(email_dispatcher.send_bulk(
+            [EmailRecipient(**recipient) for recipient in recipients],
+            email.subject,
+            email.html,
+            email.text
+        ))
+        logger.info(f"Payroll notices for run {payroll_run_id} sent to {sent} employees")
+        return {"status": "success", "payroll_run_id": payroll_run_id, "sent": sent}
+    except EmailDeliveryError as e:
+        logger.error(f"Failed to send payroll notices for run {payroll_run_id}: {e}")
+        retry_email_delivery(self, e)
 
 
 @celery_app.task(name="process_payroll_batch")
@@ -85,35 +234,153 @@ def process_payroll_batch(payroll_run_id: str):
         raise
 
 
-@celery_app.task(name="generate_financial_report")
-def generate_financial_report(company_id: str, report_type: str, start_date: str, end_date: str):
-    """Generate financial report as a background task.
+@celery_app.task(
+    name="process_stripe_webhook_events",
+    bind=True,
+    max_retries=8,
+    acks_late=True
+)
+def process_stripe_webhook_events(self, customer_id: str):
+    """Apply pending Stripe webhook events for one customer, in order.
+    
+    A per-customer Redis lock guarantees a single drain per customer across
+    workers. The lock holder drains until a pass finds no new events, and a
+    task finding the lock busy re-enqueues itself (outside the retry budget)
+    so events that arrived as the holder finished are still picked up.
+    Failed events are retried with exponential backoff.
     
     Args:
-        company_id: Company ID
-        report_type: Type of report (income_statement, balance_sheet, etc.)
-        start_date: Report start date (ISO format)
-        end_date: Report end date (ISO format)
+        customer_id: Stripe customer ID whose inbox should be drained
     """
+    from ..utils.stripe_webhooks import process_customer_events
+    
+    lock = get_redis_client().lock(
+        f"stripe-webhooks:{customer_id}",
+        timeout=settings.stripe_webhook_lock_timeout_seconds
+    )
+    if not lock.acquire(blocking=False):
+        process_stripe_webhook_events.apply_async((customer_id,), countdown=2)
+        return {"status": "busy", "customer_id": customer_id}
+    
+    db = SessionLocal()
     try:
-        # TODO: Implement report generation logic
-        logger.info(f"Generating {report_type} report for company {company_id}")
-        
-        # Placeholder for actual implementation
-        # 1. Fetch financial data from database
-        # 2. Calculate totals and subtotals
-        # 3. Generate PDF using ReportLab
-        # 4. Upload to S3
-        # 5. Send email notification with download link
-        
-        return {
-            "status": "success",
-            "company_id": company_id,
-            "report_type": report_type
-        }
+        applied = 0
+        while True:
+            drained = process_customer_events(db, customer_id)
+            applied += drained
+            if not drained:
+                break
+        logger.info(f"Applied {applied} Stripe events for customer {customer_id}")
+        return {"status": "success", "customer_id": customer_id, "applied": applied}
     except Exception as e:
-        logger.error(f"Failed to generate report: {e}")
+        logger.error(f"Failed to apply Stripe events for customer {customer_id}: {e}")
+        raise self.retry(exc=e, countdown=min(2 ** self.request.retries * 5, 600))
+    finally:
+        db.close()
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            # The lock expired mid-drain (and may be held by another worker)
+            logger.warning(f"Stripe webhook lock for customer {customer_id} expired before release")
+
+
+@celery_app.task(name="drain_stripe_webhook_inbox")
+def drain_stripe_webhook_inbox_task():
+    """Periodic task re-enqueueing customers with unprocessed Stripe events.
+    
+    Picks up events whose drain was never enqueued or ran out of retries.
+    Scheduled every 5 minutes by Celery Beat (see celery_config.beat_schedule).
+    """
+    from ..utils.stripe_webhooks import customers_with_unprocessed_events
+    
+    db = SessionLocal()
+    try:
+        customers = customers_with_unprocessed_events(db)
+    finally:
+        db.close()
+    
+    for customer_id in customers:
+        process_stripe_webhook_events.delay(customer_id)
+    if customers:
+        logger.info(f"Re-enqueued Stripe events of {len(customers)} customers")
+    return {"status": "success", "customers": len(customers)}
+
+
+@celery_app.task(name="evict_stale_reports")
+def evict_stale_reports_task():
+    """Periodic task deleting expired and superseded cached report PDFs.
+    
+    Scheduled daily by Celery Beat (see celery_config.beat_schedule).
+    """
+    from ..utils.report_cache import evict_stale_reports
+    
+    db = SessionLocal()
+    try:
+        evicted = evict_stale_reports(db)
+        return {"status": "success", "evicted": evicted}
+    except Exception as e:
+        logger.error(f"Failed to evict stale reports: {e}")
+        raise
+    finally:
+        db.close()
+
+
+@celery_app.task(name="reap_stale_report_jobs")
+def reap_stale_report_jobs_task():
+    """Periodic task failing report jobs lost with the API process running them.
+    
+    Scheduled every 5 minutes by Celery Beat (see celery_config.beat_schedule).
+    """
+    from ..utils.report_cache import reap_stale_report_jobs
+    
+    db = SessionLocal()
+    try:
+        reaped = reap_stale_report_jobs(db)
+        return {"status": "success", "reaped": reaped}
+    except Exception as e:
+        logger.error(f"Failed to reap stale report jobs: {e}")
         raise
+    finally:
+        db.close()
+
+
+@celery_app.task(name="reconcile_document_index")
+def reconcile_document_index_task():
+    """Periodic task reconciling the document index with the bucket.
+    
+    Indexes files that were stored but never recorded, marks entries
+    whose file is gone as deleted and removes unreferenced blobs.
+    Scheduled hourly by Celery Beat.
+    """
+    from ..mongodb import connect_mongodb, get_mongodb_client
+    from ..utils.document_index import reconcile_documents
+    from ..utils.storage import get_storage
+    
+    # The Motor client is bound to this worker's event loop
+    if get_mongodb_client() is None:
+        run_async(connect_mongodb())
+    if get_mongodb_client() is None:
+        return {"status": "skipped", "reason": "MongoDB unavailable"}
+    
+    db = SessionLocal()
+    try:
+        company_ids = [company_id for (company_id,) in db.query(Company.id)]
+    finally:
+        db.close()
+    
+    storage = get_storage()
+    totals = {"added": 0, "removed": 0, "blobs_recounted": 0, "blobs_deleted": 0}
+    failed = 0
+    for company_id in company_ids:
+        try:
+            result = run_async(reconcile_documents(storage, company_id))
+            for name, count in result.items():
+                totals[name] += count
+        except Exception as e:
+            failed += 1
+            logger.error(f"Failed to reconcile documents of company {company_id}: {e}")
+    
+    return {"status": "success", "failed": failed, **totals}
 
 
 @celery_app.task(name="cleanup_old_sessions")
@@ -0,0 +1,123 @@
+"""Invalidation of in-process caches across processes, over Redis pub/sub.
+
+Caches such as plan entitlements and Stripe reads live in each API process,
+but the changes that invalidate them are often observed elsewhere: a
+webhook is applied by a Celery worker, or received by one API replica
+only. ``publish_invalidation`` drops nothing itself; it sends the key on a
+channel, and the ``invalidation_listener`` of every API process applies it
+to the cache registered for that channel. Caches are cleared whenever the
+listener (re)connects, since messages published while disconnected are
+lost. If Redis is unreachable, caches fall back to their TTL.
+"""
+
+from contextlib import suppress
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+
+import redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_publisher: Optional[redis.Redis] = None
+
+
+def _get_publisher() -> redis.Redis:
+    """Get the Redis client publishing invalidations."""
+    global _publisher
+    if _publisher is None:
+        _publisher = redis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.cache_invalidation_timeout_seconds,
+            socket_connect_timeout=settings.cache_invalidation_timeout_seconds
+        )
+    return _publisher
+
+
+def publish_invalidation(channel: str, key: str) -> None:
+    """Tell every API process to drop a cache entry.
+
+    Args:
+        channel: Channel of the cache (see ``InvalidationListener.register``)
+        key: Cache key to drop (company id, customer id...)
+    """
+    try:
+        _get_publisher().publish(channel, str(key))
+    except redis.RedisError as e:
+        logger.warning(f"Failed to broadcast invalidation of {key} on {channel}: {e}")
+
+
+class InvalidationListener:
+    """Apply invalidations published by other processes to the local caches.
+
+    Subscribes to the registered channels from the API's event loop.
+    """
+
+    def __init__(self, retry_seconds: float = 5.0):
+        self.retry_seconds = retry_seconds
+        self._caches: Dict[str, Tuple[Callable[[str], None], Callable[[], None]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, channel: str, invalidate: Callable[[str], None], clear: Callable[[], None]) -> None:
+        """Route a channel to a cache.
+
+        Args:
+            channel: Channel the cache's invalidations are published on
+            invalidate: Drops one key from the cache
+            clear: Drops the whole cache
+        """
+        self._caches[channel] = (invalidate, clear)
+
+    def start(self) -> None:
+        """Start listening from the running event loop."""
+        if self._task is None and self._caches:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop listening."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def handle(self, message: dict) -> None:
+        """Apply one pub/sub message."""
+        if message.get("type") != "message":
+            return
+        channel, key = message["channel"], message["data"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        if isinstance(key, bytes):
+            key = key.decode()
+        cache = self._caches.get(channel)
+        if cache is not None:
+            cache[0](key)
+
+    def clear(self) -> None:
+        """Clear every registered cache."""
+        for _, clear in self._caches.values():
+            clear()
+
+    async def _run(self) -> None:
+        import redis.asyncio as aioredis
+
+        while True:
+            client = aioredis.Redis.from_url(settings.redis_url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(*self._caches)
+                    self.clear()
+                    async for message in pubsub.listen():
+                        self.handle(message)
+            except redis.RedisError as e:
+                logger.warning(f"Cache invalidation listener disconnected: {e}")
+            finally:
+                await client.close()
+            await asyncio.sleep(self.retry_seconds)
+
+
+# Global invalidation listener, started by the API
+invalidation_listener = InvalidationListener()
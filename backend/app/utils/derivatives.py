@@ -0,0 +1,197 @@
+"""Thumbnails and previews of uploaded documents.
+
+Images and PDFs uploaded through the files API get small JPEG derivatives
+so document lists do not have to download the originals:
+
+- ``thumbnail``: fits in 256x256, for list views
+- ``preview``: fits in 1024x1024, for detail views
+
+For PDFs both are rendered from the first page, which needs the optional
+``pypdfium2`` package. It is imported on first use; when it is not
+installed, PDFs get no derivatives and no work is scheduled for them.
+
+Derivatives are generated after the upload response has been sent
+(``generate_derivatives`` runs as a background task) on a small dedicated
+thread pool; Pillow and PDFium release the GIL while decoding, resizing
+and encoding. They are stored once per content under
+``{company_id}/derivatives/{sha256}/{name}.jpg`` and recorded in
+``DocumentMetadata.derivatives`` of every upload with that content, so a
+re-uploaded file reuses them.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, Optional
+import asyncio
+import importlib.util
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps
+
+from ..config import settings
+from ..mongo_models import DocumentMetadata
+from .document_index import DERIVATIVE_FOLDER, index_available
+from .storage import StorageBackend, get_storage
+
+logger = logging.getLogger(__name__)
+
+# Longest side of each derivative in pixels
+DERIVATIVE_SIZES = {"thumbnail": 256, "preview": 1024}
+
+DERIVATIVE_CONTENT_TYPE = "image/jpeg"
+JPEG_QUALITY = 80
+
+IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+PDF_TYPE = "application/pdf"
+
+# Threads rendering derivatives (created on first use)
+_render_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_render_pool() -> ThreadPoolExecutor:
+    """Get the thread pool used for rendering derivatives."""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ThreadPoolExecutor(
+            max_workers=settings.derivative_workers,
+            thread_name_prefix="derivatives"
+        )
+    return _render_pool
+
+
+@lru_cache(maxsize=1)
+def pdf_previews_available() -> bool:
+    """Whether ``pypdfium2`` is installed to render PDF pages."""
+    return importlib.util.find_spec("pypdfium2") is not None
+
+
+def supports_derivatives(mime_type: str) -> bool:
+    """Whether derivatives can be generated for a content type."""
+    if mime_type == PDF_TYPE:
+        return pdf_previews_available()
+    return mime_type in IMAGE_TYPES
+
+
+def derivative_key(company_id: str, content_hash: str, name: str) -> str:
+    """Get the storage key of a derivative."""
+    return f"{company_id}/{DERIVATIVE_FOLDER}/{content_hash}/{name}.jpg"
+
+
+def _render_first_page(data: bytes, size: int) -> Image.Image:
+    """Render the first page of a PDF with its longest side at ``size``."""
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(data)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()
+        return page.render(scale=size / max(width, height)).to_pil()
+    finally:
+        pdf.close()
+
+
+def render_derivatives(data: bytes, mime_type: str) -> Dict[str, bytes]:
+    """Render the derivatives of a file.
+
+    Args:
+        data: File content
+        mime_type: Content type of the file
+
+    Returns:
+        JPEG content by derivative name (empty if the type is not supported)
+    """
+    largest = max(DERIVATIVE_SIZES.values())
+    if mime_type == PDF_TYPE:
+        try:
+            image = _render_first_page(data, largest)
+        except ImportError:
+            logger.info("pypdfium2 is not installed, skipping PDF preview")
+            return {}
+    elif mime_type in IMAGE_TYPES:
+        image = Image.open(BytesIO(data))
+        # JPEGs are decoded at a reduced scale when the target is smaller
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+    else:
+        return {}
+
+    if image.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white, JPEG has no alpha
+        image = image.convert("RGBA")
+        flattened = Image.new("RGB", image.size, "white")
+        flattened.paste(image, mask=image.getchannel("A"))
+        image = flattened
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    derivatives = {}
+    # Largest first, so each size is resized from the previous one
+    for name, size in sorted(DERIVATIVE_SIZES.items(), key=lambda item: item[1], reverse=True):
+        image.thumbnail((size, size), Image.LANCZOS)
+        out = BytesIO()
+        image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        derivatives[name] = out.getvalue()
+    return derivatives
+
+
+async def generate_derivatives(
+    company_id: str,
+    file_key: str,
+    storage: Optional[StorageBackend] = None
+) -> Dict[str, str]:
+    """Generate, store and record the derivatives of an uploaded file.
+
+    Derivatives already generated for the same content are reused. This is
+    best effort: failures are logged and the file is simply listed without
+    a thumbnail.
+
+    Args:
+        company_id: Company UUID
+        file_key: Key of the uploaded file
+        storage: Storage backend (defaults to the configured one)
+
+    Returns:
+        Storage key by derivative name (empty if none were generated)
+    """
+    if not index_available():
+        return {}
+    storage = storage or get_storage()
+
+    try:
+        collection = DocumentMetadata.get_motor_collection()
+        document = await collection.find_one(
+            {"company_id": company_id, "file_path": file_key, "is_deleted": False}
+        )
+        if not document or not document.get("content_hash") or not supports_derivatives(document["mime_type"]):
+            return {}
+        content_hash = document["content_hash"]
+
+        existing = await collection.find_one({
+            "company_id": company_id,
+            "content_hash": content_hash,
+            "derivatives.thumbnail": {"$exists": True}
+        })
+        if existing:
+            derivatives = existing["derivatives"]
+        else:
+            data = await run_in_threadpool(storage.read_bytes, document.get("blob_path") or file_key)
+            rendered = await asyncio.get_running_loop().run_in_executor(
+                get_render_pool(), render_derivatives, data, document["mime_type"]
+            )
+            derivatives = {}
+            for name, content in rendered.items():
+                key = derivative_key(company_id, content_hash, name)
+                await run_in_threadpool(storage.upload_bytes, content, key, DERIVATIVE_CONTENT_TYPE)
+                derivatives[name] = key
+
+        if derivatives:
+            await collection.update_many(
+                {"company_id": company_id, "content_hash": content_hash, "is_deleted": False},
+                {"$set": {"derivatives": derivatives}}
+            )
+        return derivatives
+    except Exception as e:
+        logger.warning(f"Failed to generate derivatives for {file_key}: {e}")
+        return {}
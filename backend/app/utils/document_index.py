@@ -0,0 +1,580 @@
+"""Index of uploaded documents in MongoDB.
+
+Every upload and delete through the files API is recorded in
+``DocumentMetadata``, and file listings (with filters and pagination) are
+served from that collection instead of listing the bucket, which is slow,
+capped at 1000 keys per call and cannot filter on anything but a prefix.
+
+Uploads are deduplicated per company by content. The SHA-256 of an upload
+is computed from its spooled copy before anything is sent to storage, and
+the content is stored once under ``{company_id}/blobs/{sha256}``.
+``DocumentBlob`` keeps a reference count per blob, so uploading content
+the company already has skips the storage write entirely. Each upload
+still gets its own key and index entry (name, type, tags, related
+entity); ``resolve_storage_keys`` maps those keys to the blob holding the
+bytes. Blobs whose last reference is deleted are kept for
+``BLOB_RETENTION`` (a re-upload revives them) and then removed.
+
+The bucket stays the source of truth for file contents. Writes that miss
+the index (MongoDB down, a crash between upload and insert, files removed
+out of band) are repaired by ``reconcile_documents``, run periodically by
+Celery beat, which also corrects blob reference counts and removes
+unreferenced blobs.
+
+Generated reports under ``{company_id}/reports/`` are not indexed; they
+are tracked by the report cache and listed by the reports API.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import posixpath
+import re
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..mongo_models import DocumentBlob, DocumentMetadata
+from ..mongodb import get_mongodb_client
+from .storage import FileTooLargeError, StorageBackend, build_file_key
+
+logger = logging.getLogger(__name__)
+
+# Folder holding deduplicated content, by SHA-256
+BLOB_FOLDER = "blobs"
+
+# Folder holding thumbnails and previews, by SHA-256 of the original
+DERIVATIVE_FOLDER = "derivatives"
+
+# Folders managed by the index itself, not available for uploads
+RESERVED_FOLDERS = {BLOB_FOLDER, DERIVATIVE_FOLDER}
+
+# Folders whose files are not indexed
+UNINDEXED_FOLDERS = {"reports"} | RESERVED_FOLDERS
+
+# Files younger than this are left alone by reconciliation, so uploads
+# that are still being recorded are not indexed twice or marked deleted
+RECONCILE_GRACE_PERIOD = timedelta(minutes=10)
+
+# How long an unreferenced blob is kept before it is deleted
+BLOB_RETENTION = timedelta(days=1)
+
+# Read size when hashing uploads
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def index_available() -> bool:
+    """Whether MongoDB is connected and the index can be used."""
+    return get_mongodb_client() is not None
+
+
+def folder_of(file_key: str) -> Optional[str]:
+    """Get the folder of a ``{company_id}/{folder}/...`` key."""
+    parts = file_key.split("/")
+    return parts[1] if len(parts) > 2 else None
+
+
+def document_filters(
+    company_id: str,
+    folder: Optional[str] = None,
+    document_type: Optional[str] = None,
+    related_entity_type: Optional[str] = None,
+    related_entity_id: Optional[str] = None,
+    tags: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Build the query for a company's live documents.
+
+    Args:
+        company_id: Company UUID
+        folder: Only files under this folder
+        document_type: Only documents of this type
+        related_entity_type: Only documents attached to this kind of entity
+        related_entity_id: Only documents attached to this entity
+        tags: Only documents carrying all of these tags
+
+    Returns:
+        MongoDB filter
+    """
+    filters: Dict[str, Any] = {"company_id": company_id, "is_deleted": False}
+    if folder:
+        prefix = f"{company_id}/{folder.strip('/')}/"
+        filters["file_path"] = {"$regex": f"^{re.escape(prefix)}"}
+    if document_type:
+        filters["document_type"] = document_type
+    if related_entity_type:
+        filters["related_entity_type"] = related_entity_type
+    if related_entity_id:
+        filters["related_entity_id"] = related_entity_id
+    if tags:
+        filters["tags"] = {"$all": tags}
+    return filters
+
+
+def blob_key(company_id: str, content_hash: str) -> str:
+    """Get the storage key of a company's blob."""
+    return f"{company_id}/{BLOB_FOLDER}/{content_hash}"
+
+
+async def hash_upload(file: UploadFile, max_size: Optional[int] = None) -> Tuple[str, int]:
+    """Compute the SHA-256 and size of an uploaded file, then rewind it.
+
+    The upload is read back from Starlette's spool (memory or a temporary
+    file), so this costs local I/O only. The size limit is enforced while
+    reading, before anything is sent to storage.
+
+    Args:
+        file: Uploaded file
+        max_size: Maximum file size in bytes (optional)
+
+    Returns:
+        Hex digest and size in bytes
+
+    Raises:
+        FileTooLargeError: If the file is larger than max_size
+    """
+    if max_size is not None and file.size is not None and file.size > max_size:
+        raise FileTooLargeError(max_size)
+
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(HASH_CHUNK_SIZE):
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise FileTooLargeError(max_size)
+        digest.update(chunk)
+
+    await file.seek(0)
+    return digest.hexdigest(), size
+
+
+async def acquire_blob(company_id: str, content_hash: str, file_size: int, mime_type: str) -> Dict[str, Any]:
+    """Add a reference to a company's blob, creating its entry if needed.
+
+    Args:
+        company_id: Company UUID
+        content_hash: SHA-256 of the content
+        file_size: Size in bytes
+        mime_type: Content type, used if the blob is new
+
+    Returns:
+        The blob entry after the update; ``stored`` is False while the
+        content still has to be written
+    """
+    query = {"company_id": company_id, "content_hash": content_hash}
+    update = {
+        "$inc": {"ref_count": 1},
+        "$set": {"released_at": None},
+        "$setOnInsert": {
+            "blob_path": blob_key(company_id, content_hash),
+            "file_size": file_size,
+            "mime_type": mime_type,
+            "stored": False,
+            "created_at": datetime.utcnow()
+        }
+    }
+    collection = DocumentBlob.get_motor_collection()
+    try:
+        return await collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # A concurrent upload of the same content created the entry first
+        return await collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+
+
+async def release_blob(company_id: str, content_hash: str) -> None:
+    """Drop a reference to a company's blob.
+
+    The blob is not deleted here; reconciliation removes it once it has
+    been unreferenced for ``BLOB_RETENTION``.
+    """
+    collection = DocumentBlob.get_motor_collection()
+    blob = await collection.find_one_and_update(
+        {"company_id": company_id, "content_hash": content_hash},
+        {"$inc": {"ref_count": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if blob and blob["ref_count"] <= 0:
+        await collection.update_one(
+            {"_id": blob["_id"], "ref_count": {"$lte": 0}},
+            {"$set": {"released_at": datetime.utcnow()}}
+        )
+
+
+async def _insert_document(
+    upload: Dict[str, Any],
+    company_id: str,
+    uploaded_by: str,
+    document_type: str,
+    tags: Optional[List[str]] = None,
+    related_entity_type: Optional[str] = None,
+    related_entity_id: Optional[str] = None,
+    blob_path: Optional[str] = None
+) -> DocumentMetadata:
+    """Insert the index entry of an upload."""
+    document = DocumentMetadata(
+        company_id=company_id,
+        uploaded_by=uploaded_by,
+        document_type=document_type,
+        file_name=upload["original_filename"],
+        file_size=upload["file_size"],
+        file_path=upload["file_key"],
+        mime_type=upload["content_type"],
+        tags=tags or [],
+        related_entity_type=related_entity_type,
+        related_entity_id=related_entity_id,
+        content_hash=upload.get("content_hash"),
+        blob_path=blob_path
+    )
+    await document.insert()
+    return document
+
+
+async def record_upload(
+    upload: Dict[str, Any],
+    company_id: str,
+    uploaded_by: str,
+    document_type: str,
+    tags: Optional[List[str]] = None,
+    related_entity_type: Optional[str] = None,
+    related_entity_id: Optional[str] = None
+) -> Optional[DocumentMetadata]:
+    """Record a file stored under its own key in the index.
+
+    Failures are logged rather than raised: the file is already stored and
+    reconciliation will index it later.
+
+    Args:
+        upload: Result of ``StorageBackend.upload_file``
+        company_id: Company UUID
+        uploaded_by: User ID of the uploader
+        document_type: Document type (defaults to the folder in the API)
+        tags: Free-form tags
+        related_entity_type: Kind of entity the document belongs to
+        related_entity_id: ID of that entity
+
+    Returns:
+        The indexed document, or None if the index is unavailable
+    """
+    if not index_available():
+        return None
+
+    try:
+        return await _insert_document(
+            upload, company_id, uploaded_by, document_type,
+            tags=tags, related_entity_type=related_entity_type, related_entity_id=related_entity_id
+        )
+    except Exception as e:
+        logger.warning(f"Failed to index upload {upload['file_key']}: {e}")
+        return None
+
+
+async def store_document(
+    storage: StorageBackend,
+    file: UploadFile,
+    company_id: str,
+    uploaded_by: str,
+    folder: str,
+    max_size: Optional[int] = None,
+    document_type: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    related_entity_type: Optional[str] = None,
+    related_entity_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Store an uploaded file and record it in the index.
+
+    With the index available the content is deduplicated: it is hashed,
+    a reference to the company's blob for that hash is taken, and the
+    storage write is skipped if the blob already holds the content.
+    Without the index, the file is stored under its own key as before.
+
+    Args:
+        storage: Storage backend
+        file: Uploaded file
+        company_id: Company UUID
+        uploaded_by: User ID of the uploader
+        folder: Folder within the company
+        max_size: Maximum file size in bytes (optional)
+        document_type: Document type (defaults to the folder)
+        tags: Free-form tags
+        related_entity_type: Kind of entity the document belongs to
+        related_entity_id: ID of that entity
+
+    Returns:
+        Dictionary with file_key, file_url, original_filename,
+        content_type and file_size, plus content_hash and deduplicated
+        (True if the storage write was skipped) for deduplicated uploads
+
+    Raises:
+        FileTooLargeError: If the file is larger than max_size
+        ValueError: If the key is not a valid storage key
+    """
+    if folder.split("/")[0] in RESERVED_FOLDERS:
+        raise ValueError(f"Folder '{folder}' is reserved")
+
+    company_folder = f"{company_id}/{folder}"
+    document_type = document_type or folder
+    content_type = file.content_type or "application/octet-stream"
+
+    blob = None
+    if index_available():
+        content_hash, file_size = await hash_upload(file, max_size)
+        try:
+            blob = await acquire_blob(company_id, content_hash, file_size, content_type)
+        except Exception as e:
+            logger.warning(f"Failed to reference blob for {file.filename}, storing it without deduplication: {e}")
+
+    if blob is None:
+        result = await storage.upload_file(file, folder=company_folder, max_size=max_size)
+        await record_upload(
+            result, company_id, uploaded_by, document_type,
+            tags=tags, related_entity_type=related_entity_type, related_entity_id=related_entity_id
+        )
+        return result
+
+    result = {
+        "file_key": build_file_key(company_folder, file.filename),
+        "original_filename": file.filename,
+        "content_type": content_type,
+        "file_size": file_size,
+        "content_hash": content_hash,
+        "deduplicated": blob["stored"]
+    }
+    try:
+        if not blob["stored"]:
+            await storage.upload_file(
+                file,
+                folder=f"{company_id}/{BLOB_FOLDER}",
+                filename=content_hash,
+                max_size=max_size
+            )
+            await DocumentBlob.get_motor_collection().update_one(
+                {"_id": blob["_id"]}, {"$set": {"stored": True}}
+            )
+        # The key only resolves to the blob through the index, so a failed
+        # insert fails the upload
+        await _insert_document(
+            result, company_id, uploaded_by, document_type,
+            tags=tags, related_entity_type=related_entity_type, related_entity_id=related_entity_id,
+            blob_path=blob["blob_path"]
+        )
+    except BaseException:
+        await release_blob(company_id, content_hash)
+        raise
+
+    result["file_url"] = storage.download_urls.get(blob["blob_path"]).url
+    if result["deduplicated"]:
+        logger.info(f"Upload {result['file_key']} reuses stored content {content_hash}")
+    return result
+
+
+async def delete_document(storage: StorageBackend, company_id: str, file_key: str) -> bool:
+    """Delete a file and mark it deleted in the index.
+
+    Deduplicated content is only dereferenced; the blob is removed by
+    reconciliation once no upload uses it.
+
+    Args:
+        storage: Storage backend
+        company_id: Company UUID
+        file_key: Key of the uploaded file
+
+    Returns:
+        True if the file was deleted
+    """
+    entry = None
+    if index_available():
+        try:
+            entry = await DocumentMetadata.get_motor_collection().find_one_and_update(
+                {"company_id": company_id, "file_path": file_key, "is_deleted": False},
+                {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record delete of {file_key}: {e}")
+
+    if entry and entry.get("blob_path"):
+        await release_blob(company_id, entry["content_hash"])
+        return True
+
+    success = await run_in_threadpool(storage.delete_file, file_key)
+    if success:
+        storage.download_urls.invalidate(file_key)
+    return success
+
+
+async def resolve_storage_keys(company_id: str, file_keys: List[str]) -> Dict[str, str]:
+    """Map file keys to the storage keys holding their content.
+
+    Keys of deduplicated uploads map to their blob; all others (including
+    everything while the index is unavailable) map to themselves.
+
+    Args:
+        company_id: Company UUID
+        file_keys: Keys of uploaded files
+
+    Returns:
+        Storage key by file key
+    """
+    storage_keys = {file_key: file_key for file_key in file_keys}
+    if not file_keys or not index_available():
+        return storage_keys
+
+    cursor = DocumentMetadata.get_motor_collection().find(
+        {
+            "company_id": company_id,
+            "file_path": {"$in": list(storage_keys)},
+            "is_deleted": False,
+            "blob_path": {"$ne": None}
+        },
+        {"file_path": 1, "blob_path": 1}
+    )
+    async for entry in cursor:
+        storage_keys[entry["file_path"]] = entry["blob_path"]
+    return storage_keys
+
+
+async def list_documents(
+    filters: Dict[str, Any],
+    skip: int = 0,
+    limit: int = 50
+) -> Tuple[List[DocumentMetadata], int]:
+    """Get a page of documents, newest first.
+
+    Args:
+        filters: Query from ``document_filters``
+        skip: Number of documents to skip
+        limit: Page size
+
+    Returns:
+        The page and the total number of matching documents
+    """
+    total = await DocumentMetadata.find(filters).count()
+    documents = await DocumentMetadata.find(filters).sort("-uploaded_at").skip(skip).limit(limit).to_list()
+    return documents, total
+
+
+async def reconcile_documents(
+    storage: StorageBackend,
+    company_id: str,
+    now: Optional[datetime] = None
+) -> Dict[str, int]:
+    """Bring a company's index in line with the bucket.
+
+    - Files missing from the index are added, with their type taken from
+      the folder.
+    - Index entries whose content is gone are marked deleted.
+    - Blob reference counts are recounted from the index, and blobs
+      unreferenced for ``BLOB_RETENTION`` are deleted with their
+      derivatives.
+
+    Anything newer than ``RECONCILE_GRACE_PERIOD`` is skipped.
+
+    Args:
+        storage: Storage backend holding the files
+        company_id: Company UUID
+        now: Current time (UTC), for testing
+
+    Returns:
+        Counts of added and removed entries, recounted blobs and deleted
+        blobs
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - RECONCILE_GRACE_PERIOD
+
+    stored = await run_in_threadpool(lambda: set(storage.iter_files(f"{company_id}/")))
+
+    # file key -> (key holding the content, content hash, upload time)
+    indexed = {}
+    cursor = DocumentMetadata.get_motor_collection().find(
+        {"company_id": company_id, "is_deleted": False},
+        {"file_path": 1, "blob_path": 1, "content_hash": 1, "uploaded_at": 1}
+    )
+    async for entry in cursor:
+        indexed[entry["file_path"]] = (
+            entry.get("blob_path") or entry["file_path"],
+            entry.get("content_hash") if entry.get("blob_path") else None,
+            entry["uploaded_at"]
+        )
+
+    missing = []
+    unindexed = {key for key in stored if folder_of(key) not in UNINDEXED_FOLDERS} - indexed.keys()
+    for file_key in sorted(unindexed):
+        metadata = await run_in_threadpool(storage.get_file_metadata, file_key)
+        if not metadata:
+            continue
+        last_modified = metadata["last_modified"].astimezone(timezone.utc).replace(tzinfo=None)
+        if last_modified > cutoff:
+            continue
+        missing.append(DocumentMetadata(
+            company_id=company_id,
+            uploaded_by="unknown",
+            document_type=folder_of(file_key) or "document",
+            file_name=metadata["metadata"].get("original_filename") or posixpath.basename(file_key),
+            file_size=metadata["content_length"],
+            file_path=file_key,
+            mime_type=metadata["content_type"],
+            uploaded_at=last_modified
+        ))
+    if missing:
+        await DocumentMetadata.insert_many(missing)
+
+    orphaned = [
+        file_key for file_key, (storage_key, _, uploaded_at) in indexed.items()
+        if storage_key not in stored and uploaded_at <= cutoff
+    ]
+    if orphaned:
+        await DocumentMetadata.find(
+            {"company_id": company_id, "file_path": {"$in": orphaned}, "is_deleted": False}
+        ).update({"$set": {"is_deleted": True, "deleted_at": now}})
+
+    references: Dict[str, int] = {}
+    for file_key, (_, content_hash, _) in indexed.items():
+        if content_hash and file_key not in orphaned:
+            references[content_hash] = references.get(content_hash, 0) + 1
+
+    recounted = deleted = 0
+    collection = DocumentBlob.get_motor_collection()
+    blobs = [blob async for blob in collection.find({"company_id": company_id})]
+    for blob in blobs:
+        # Uploads may still be recording their reference
+        if blob["created_at"] > cutoff:
+            continue
+
+        count = references.get(blob["content_hash"], 0)
+        if blob["ref_count"] != count:
+            released_at = None if count else (blob.get("released_at") or now)
+            result = await collection.update_one(
+                {"_id": blob["_id"], "ref_count": blob["ref_count"]},
+                {"$set": {"ref_count": count, "released_at": released_at}}
+            )
+            if result.modified_count:
+                recounted += 1
+                blob.update(ref_count=count, released_at=released_at)
+
+        if blob["stored"] and blob["blob_path"] not in stored:
+            # Content removed out of band; the next upload writes it again
+            await collection.update_one({"_id": blob["_id"]}, {"$set": {"stored": False}})
+
+        released_at = blob.get("released_at")
+        if blob["ref_count"] <= 0 and released_at and released_at <= now - BLOB_RETENTION:
+            claimed = await collection.find_one_and_delete({"_id": blob["_id"], "ref_count": {"$lte": 0}})
+            if claimed:
+                derivative_prefix = f"{company_id}/{DERIVATIVE_FOLDER}/{blob['content_hash']}/"
+                derivatives = await run_in_threadpool(lambda: list(storage.iter_files(derivative_prefix)))
+                for file_key in [blob["blob_path"], *derivatives]:
+                    await run_in_threadpool(storage.delete_file, file_key)
+                    storage.download_urls.invalidate(file_key)
+                deleted += 1
+
+    if missing or orphaned or recounted or deleted:
+        logger.info(
+            f"Reconciled documents of company {company_id}: {len(missing)} added, {len(orphaned)} removed, "
+            f"{recounted} blobs recounted, {deleted} blobs deleted"
+        )
+    return {
+        "added": len(missing),
+        "removed": len(orphaned),
+        "blobs_recounted": recounted,
+        "blobs_deleted": deleted
+    }
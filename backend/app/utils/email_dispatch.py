@@ -0,0 +1,245 @@
+"""Non-blocking email delivery through the SendGrid v3 HTTP API.
+
+Requests go through a pooled ``httpx.AsyncClient`` instead of the blocking
+SendGrid SDK, so sending never stalls the event loop. Bulk sends put many
+recipients into one request using SendGrid personalizations: the body is
+rendered once with substitution tags (e.g. ``-first_name-``) and SendGrid
+fills in per-recipient values.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import logging
+
+import httpx
+
+from app.config import settings
+from app.utils.request_context import outbound_headers
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# SendGrid accepts at most 1000 personalizations per mail/send request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+
+class EmailDeliveryError(Exception):
+    """Raised when an email could not be handed off to SendGrid.
+
+    Attributes:
+        retryable: True for transient failures (network, 429, 5xx)
+        status_code: HTTP status returned by SendGrid, if any
+    """
+
+    def __init__(self, message: str, retryable: bool = True, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+@dataclass
+class EmailRecipient:
+    """A bulk-send recipient and its substitution values."""
+    email: str
+    name: Optional[str] = None
+    substitutions: Dict[str, str] = field(default_factory=dict)
+
+
+class EmailDispatcher:
+    """Sends mail via the SendGrid HTTP API over a pooled async client.
+
+    Args:
+        api_key: SendGrid API key (sending is disabled when empty)
+        api_url: SendGrid API base URL; tests point this at a local stand-in
+        max_connections: Connection pool size
+        timeout: Per-request timeout in seconds
+        transport: Optional httpx transport (used by tests)
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str = "https://api.sendgrid.com",
+        max_connections: int = 20,
+        timeout: float = 10.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_key = api_key
+        self.api_url = api_url.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether SendGrid is configured."""
+        return bool(self.api_key)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the pooled client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            # Clients are bound to the loop that created them (API process and
+            # each Celery worker run their own loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.api_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=self.timeout,
+                transport=self.transport
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled client."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+    @staticmethod
+    def _sender(from_email: Optional[str], from_name: Optional[str]) -> Dict[str, str]:
+        return {
+            "email": from_email or settings.sender_email,
+            "name": from_name or settings.sender_name
+        }
+
+    @staticmethod
+    def _content(html_content: str, text_content: Optional[str]) -> List[Dict[str, str]]:
+        # SendGrid requires text/plain before text/html
+        content = []
+        if text_content:
+            content.append({"type": "text/plain", "value": text_content})
+        content.append({"type": "text/html", "value": html_content})
+        return content
+
+    async def send(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+        from_email: Optional[str] = None,
+        from_name: Optional[str] = None
+    ) -> bool:
+        """Send a single email.
+
+        Returns:
+            True if SendGrid accepted the email, False if sending is disabled
+
+        Raises:
+            EmailDeliveryError: If SendGrid rejected the request or was unreachable
+        """
+        if not self.enabled:
+            logger.warning(f"SendGrid not configured. Would send email to {to_email}: {subject}")
+            return False
+
+        await self._post({
+            "personalizations": [{"to": [{"email": to_email}]}],
+            "from": self._sender(from_email, from_name),
+            "subject": subject,
+            "content": self._content(html_content, text_content)
+        })
+        logger.info(f"Email sent successfully to {to_email}")
+        return True
+
+    async def send_bulk(
+        self,
+        recipients: List[EmailRecipient],
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+        from_email: Optional[str] = None,
+        from_name: Optional[str] = None
+    ) -> int:
+        """Send one rendered body to many recipients.
+
+        Recipients are batched into personalizations (up to 1000 per request)
+        and batches are posted concurrently over the pooled client. Each
+        recipient only sees their own address.
+
+        Args:
+            recipients: Recipients with their substitution values
+            subject: Subject (may contain substitution tags)
+            html_content: HTML body rendered once with substitution tags
+            text_content: Plain text body (optional)
+
+        Returns:
+            Number of recipients handed off (0 if sending is disabled)
+
+        Raises:
+            EmailDeliveryError: If any batch failed
+        """
+        if not recipients:
+            return 0
+        if not self.enabled:
+            logger.warning(f"SendGrid not configured. Would send '{subject}' to {len(recipients)} recipients")
+            return 0
+
+        sender = self._sender(from_email, from_name)
+        content = self._content(html_content, text_content)
+        requests = []
+        for start in range(0, len(recipients), SENDGRID_MAX_PERSONALIZATIONS):
+            batch = recipients[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+            requests.append(self._post({
+                "personalizations": [self._personalization(r) for r in batch],
+                "from": sender,
+                "subject": subject,
+                "content": content
+            }))
+
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise EmailDeliveryError(
+                f"{len(errors)}/{len(requests)} bulk email batches failed: {errors[0]}",
+                retryable=any(getattr(e, "retryable", True) for e in errors)
+            )
+
+        logger.info(f"Bulk email '{subject}' sent to {len(recipients)} recipients in {len(requests)} requests")
+        return len(recipients)
+
+    @staticmethod
+    def _personalization(recipient: EmailRecipient) -> Dict[str, Any]:
+        to = {"email": recipient.email}
+        if recipient.name:
+            to["name"] = recipient.name
+        personalization: Dict[str, Any] = {"to": [to]}
+        if recipient.substitutions:
+            personalization["substitutions"] = {
+                key: str(value) for key, value in recipient.substitutions.items()
+            }
+        return personalization
+
+    async def _post(self, body: Dict[str, Any]) -> None:
+        """POST a mail/send request and map failures to EmailDeliveryError."""
+        try:
+            with span("sendgrid"):
+                response = await self._get_client().post("/v3/mail/send", json=body, headers=outbound_headers())
+        except httpx.HTTPError as e:
+            raise EmailDeliveryError(f"SendGrid request failed: {e}", retryable=True)
+
+        if 200 <= response.status_code < 300:
+            return
+
+        retryable = response.status_code == 429 or response.status_code >= 500
+        raise EmailDeliveryError(
+            f"SendGrid returned {response.status_code}: {response.text[:200]}",
+            retryable=retryable,
+            status_code=response.status_code
+        )
+
+
+# Singleton instance
+email_dispatcher = EmailDispatcher(
+    api_key=settings.sendgrid_api_key,
+    api_url=settings.sendgrid_api_url,
+    max_connections=settings.email_max_connections
+)
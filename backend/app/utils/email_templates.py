@@ -0,0 +1,135 @@
+"""Precompiled Jinja2 templates for transactional emails.
+
+Templates live in ``app/templates/email`` and extend a shared base layout
+(``base.html`` / ``base.txt``). Every template is compiled once by
+``EmailTemplateRegistry.load`` (called at startup) and rendered in a
+sandboxed environment with HTML autoescaping, so user-supplied values such
+as names can never inject markup.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+import logging
+import threading
+
+from jinja2 import FileSystemLoader, StrictUndefined, Template, select_autoescape
+from jinja2.sandbox import SandboxedEnvironment
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+# Subject line for each email template (also Jinja2 templates)
+EMAIL_SUBJECTS = {
+    "password_reset": "Reset Your Pulse Password",
+    "email_verification": "Verify Your Pulse Email",
+    "welcome": "Welcome to Pulse!",
+    "invoice": "Invoice {{ invoice_number }} from Pulse",
+    "payment_failed": "Payment Failed - Action Required",
+    "payroll_processed": "Your pay for {{ period }} has been processed",
+}
+
+
+class RenderedEmail(NamedTuple):
+    """A rendered email ready to hand to the dispatcher."""
+    subject: str
+    html: str
+    text: Optional[str] = None
+
+
+class CompiledEmailTemplate(NamedTuple):
+    """Compiled subject, HTML and plain text templates of one email."""
+    subject: Template
+    html: Template
+    text: Optional[Template]
+
+    def render(self, context: Dict[str, Any]) -> RenderedEmail:
+        return RenderedEmail(
+            subject=self.subject.render(context).strip(),
+            html=self.html.render(context),
+            text=self.text.render(context).strip() if self.text else None
+        )
+
+
+class EmailTemplateRegistry:
+    """Registry of compiled email templates.
+
+    Args:
+        template_dir: Directory containing ``<name>.html`` and ``<name>.txt``
+        subjects: Subject template for each email name
+    """
+
+    def __init__(self, template_dir: Path = TEMPLATE_DIR, subjects: Dict[str, str] = EMAIL_SUBJECTS):
+        self.template_dir = Path(template_dir)
+        self.subjects = dict(subjects)
+        self.env = SandboxedEnvironment(
+            loader=FileSystemLoader(str(self.template_dir)),
+            autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            auto_reload=False
+        )
+        self._templates: Dict[str, CompiledEmailTemplate] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether templates have been compiled."""
+        return bool(self._templates)
+
+    def load(self) -> None:
+        """Compile every registered template.
+
+        Raises:
+            jinja2.TemplateError: If a template is missing or invalid
+        """
+        with self._lock:
+            templates = {}
+            for name, subject in self.subjects.items():
+                text_path = self.template_dir / f"{name}.txt"
+                templates[name] = CompiledEmailTemplate(
+                    subject=self.env.from_string(subject),
+                    html=self.env.get_template(f"{name}.html"),
+                    text=self.env.get_template(f"{name}.txt") if text_path.exists() else None
+                )
+            self._templates = templates
+        logger.info(f"Compiled {len(self._templates)} email templates")
+
+    def get(self, name: str) -> CompiledEmailTemplate:
+        """Get a compiled template, compiling all templates on first use.
+
+        Raises:
+            KeyError: If no template is registered under ``name``
+        """
+        if not self._templates:
+            self.load()
+        return self._templates[name]
+
+    def render(self, name: str, **context: Any) -> RenderedEmail:
+        """Render one email.
+
+        Args:
+            name: Template name (e.g. "password_reset")
+            **context: Template variables
+
+        Returns:
+            Rendered email
+        """
+        return self.get(name).render(context)
+
+    def render_many(self, name: str, contexts: Iterable[Dict[str, Any]]) -> List[RenderedEmail]:
+        """Render one email per context against the same compiled template.
+
+        Args:
+            name: Template name
+            contexts: Template variables for each recipient
+
+        Returns:
+            Rendered emails in the order of ``contexts``
+        """
+        template = self.get(name)
+        return [template.render(context) for context in contexts]
+
+
+# Singleton instance
+email_templates = EmailTemplateRegistry()
@@ -0,0 +1,168 @@
+"""Readiness checks of the databases the API depends on.
+
+``/health/live`` answers as long as the process serves requests; it must
+not touch dependencies, or a database outage would get every pod
+restarted. ``/health/ready`` runs the checks of ``settings.readiness_checks``
+(PostgreSQL, MongoDB, Redis) concurrently, each with a timeout, so traffic
+is only routed to pods that can serve it. Results are cached for
+``readiness_cache_seconds``: probes from several sources (kubelet, load
+balancer, monitoring) cost one round of pings.
+
+A check that outlives its timeout keeps running in the background (a
+PostgreSQL ping runs in a worker thread and cannot be interrupted) and is
+awaited again by the next probes instead of starting another one.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import engine
+from app.mongodb import get_mongodb_client
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CheckResult:
+    """Outcome of one dependency check."""
+
+    name: str
+    ok: bool
+    latency_ms: float
+    error: Optional[str] = None
+
+
+@dataclass
+class Readiness:
+    """Outcome of a round of dependency checks."""
+
+    checks: List[CheckResult]
+    checked_at: float  # monotonic clock
+
+    @property
+    def ready(self) -> bool:
+        return all(check.ok for check in self.checks)
+
+    def to_dict(self) -> Dict[str, Any]:
+        checks = {}
+        for check in self.checks:
+            checks[check.name] = {"status": "ok" if check.ok else "failed", "latency_ms": check.latency_ms}
+            if check.error:
+                checks[check.name]["error"] = check.error
+        return {"status": "ready" if self.ready else "not_ready", "checks": checks}
+
+
+class ReadinessProbe:
+    """Concurrent, time-bounded and cached dependency checks."""
+
+    CHECKS = ("postgres", "mongodb", "redis")
+
+    def __init__(
+        self,
+        checks: Iterable[str] = CHECKS,
+        timeout: float = 2.0,
+        cache_seconds: float = 2.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.checks = list(checks)
+        unknown = set(self.checks) - set(self.CHECKS)
+        if unknown:
+            raise ValueError(f"Unknown readiness checks {sorted(unknown)}, expected some of {self.CHECKS}")
+        self.timeout = timeout
+        self.cache_seconds = cache_seconds
+        self.clock = clock
+        self._result: Optional[Readiness] = None
+        self._running: Dict[str, asyncio.Future] = {}
+        self._lock = asyncio.Lock()
+        self._redis = None
+
+    async def check(self) -> Readiness:
+        """Check every dependency, or return the result of a recent round."""
+        if self._is_fresh(self._result):
+            return self._result
+        async with self._lock:
+            # Concurrent probes wait for the round in progress
+            if self._is_fresh(self._result):
+                return self._result
+            results = await asyncio.gather(*(self._run(name) for name in self.checks))
+            self._result = Readiness(checks=list(results), checked_at=self.clock())
+            if not self._result.ready:
+                failed = ", ".join(f"{check.name} ({check.error})" for check in results if not check.ok)
+                logger.warning(f"Not ready: {failed}")
+            return self._result
+
+    def _is_fresh(self, result: Optional[Readiness]) -> bool:
+        return result is not None and self.clock() - result.checked_at < self.cache_seconds
+
+    async def _run(self, name: str) -> CheckResult:
+        task = self._running.get(name)
+        if task is None:
+            task = asyncio.ensure_future(getattr(self, f"check_{name}")())
+            self._running[name] = task
+            task.add_done_callback(lambda done: self._finished(name, done))
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), self.timeout)
+            error = None
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout:g}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        return CheckResult(name=name, ok=error is None, latency_ms=latency_ms, error=error)
+
+    def _finished(self, name: str, task: asyncio.Future) -> None:
+        if self._running.get(name) is task:
+            del self._running[name]
+        if not task.cancelled():
+            # Retrieve errors of checks that outlived their timeout
+            task.exception()
+
+    async def check_postgres(self) -> None:
+        """Run ``SELECT 1`` on a pooled connection."""
+        def ping() -> None:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        await run_in_threadpool(ping)
+
+    async def check_mongodb(self) -> None:
+        """Ping MongoDB with the application's client."""
+        client = get_mongodb_client()
+        if client is None:
+            raise ConnectionError("MongoDB is not connected")
+        await client.admin.command("ping")
+
+    async def check_redis(self) -> None:
+        """Ping Redis."""
+        if self._redis is None:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.Redis.from_url(
+                settings.redis_url,
+                socket_timeout=self.timeout,
+                socket_connect_timeout=self.timeout
+            )
+        await self._redis.ping()
+
+    async def aclose(self) -> None:
+        """Close the Redis connection of the probe."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+# Global readiness probe
+readiness_probe = ReadinessProbe(
+    checks=settings.readiness_checks,
+    timeout=settings.readiness_timeout_seconds,
+    cache_seconds=settings.readiness_cache_seconds
+)
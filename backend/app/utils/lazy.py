@@ -0,0 +1,69 @@
+"""Deferred imports for heavy optional SDKs.
+
+Some SDKs take hundreds of milliseconds to import (``stripe`` alone loads
+every API resource class) but are only needed by a few endpoints, and not
+at all when the service is not configured. ``lazy_import`` returns a module
+proxy that imports the real module on first attribute access, so importing
+the application stays fast and code can keep using ``stripe.Customer``.
+
+Modules using a proxy in annotations need ``from __future__ import
+annotations``, otherwise the annotations load the module at import time.
+"""
+
+from types import ModuleType
+from typing import Callable, Optional
+import importlib
+import threading
+
+
+class LazyModule(ModuleType):
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name: str, on_load: Optional[Callable[[ModuleType], None]] = None):
+        super().__init__(name)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+        object.__setattr__(self, "_lazy_module", None)
+        object.__setattr__(self, "_lazy_on_load", on_load)
+
+    def _load(self) -> ModuleType:
+        module = self._lazy_module
+        if module is None:
+            # Several threads (e.g. SDK worker pools) may get here at once
+            with self._lazy_lock:
+                module = self._lazy_module
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    if self._lazy_on_load is not None:
+                        self._lazy_on_load(module)
+                    object.__setattr__(self, "_lazy_module", module)
+        return module
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._lazy_module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self.__name__!r} ({'loaded' if self.is_loaded else 'not loaded'})>"
+
+
+def lazy_import(name: str, on_load: Optional[Callable[[ModuleType], None]] = None) -> LazyModule:
+    """Import ``name`` on first use instead of now.
+
+    Args:
+        name: Absolute module name (e.g. ``"stripe"``)
+        on_load: Called with the module once it is imported (configuration
+            such as API keys)
+
+    Returns:
+        Proxy forwarding attribute access to the module
+    """
+    return LazyModule(name, on_load)
@@ -0,0 +1,252 @@
+"""Prometheus metrics for the API process.
+
+Metrics are exposed on ``/metrics`` in the Prometheus text format:
+
+- ``http_request_duration_seconds``: latency by method, route template and status
+- ``http_requests_in_progress``: requests currently being served
+- ``db_queries_per_request`` / ``db_query_time_per_request_seconds``: SQL
+  statements and time spent in them per request, by route template
+- ``db_pool_*``: SQLAlchemy connection pool checkouts and overflow
+- ``mongodb_command_duration_seconds``: Motor/PyMongo command timings
+- ``celery_queue_length``: messages waiting in the Celery broker queue
+- ``websocket_connections``: open notification WebSocket connections
+- ``log_records_dropped``: log records dropped by the logging pipeline
+- ``span_duration_seconds``: latency of request stages timed with ``tracing.span``
+
+Per-request query stats are collected by SQLAlchemy engine event hooks into
+the ``QueryRecorder`` of the current request (see ``query_recorder``), which
+the metrics middleware sets for each request; requests over the query
+budget are counted in ``db_query_budget_exceeded``. Values that already
+live elsewhere (pool, broker queue, WebSocket manager) are read when
+``/metrics`` is scraped.
+"""
+
+from typing import Optional
+import logging
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from ..config import settings
+from ..database import slow_query_log
+from .query_recorder import current_query_recorder, statement_shape
+from .request_context import current_trace, request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Label used for requests that did not match any route, so unknown paths
+# do not create one series each
+UNMATCHED_ROUTE = "<unmatched>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served",
+    ["method"]
+)
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed per HTTP request",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_QUERY_TIME = Histogram(
+    "db_query_time_per_request_seconds",
+    "Time spent executing SQL statements per HTTP request",
+    ["route"],
+    buckets=LATENCY_BUCKETS
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency",
+    buckets=LATENCY_BUCKETS
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    "db_query_budget_exceeded",
+    "HTTP requests over the SQL statement budget (too many or repeated statements)",
+    ["route", "reason"]
+)
+POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts",
+    "Connections checked out of the SQLAlchemy pool"
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency",
+    ["command", "status"],
+    buckets=LATENCY_BUCKETS
+)
+SPAN_DURATION = Histogram(
+    "span_duration_seconds",
+    "Latency of request stages (outbound API calls, storage...)",
+    ["span"],
+    buckets=LATENCY_BUCKETS
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped",
+    "Log records dropped: writer queue or shipping buffer full, or shipping failed",
+    ["reason"]
+)
+
+
+def route_template(scope: dict) -> str:
+    """Template of the route that matched a request (after routing)."""
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time the statements and pool checkouts of an engine.
+
+    Statements over the slow query threshold are recorded in
+    ``database.slow_query_log``.
+
+    Args:
+        engine: SQLAlchemy engine to instrument
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_start_time"].pop()
+        QUERY_DURATION.observe(duration)
+        recorder = current_query_recorder.get()
+        if recorder is not None:
+            recorder.record(statement, duration)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add("db", duration)
+
+        if slow_query_log.is_slow(duration):
+            scope = recorder.scope if recorder is not None else None
+            record = slow_query_log.observe(
+                conn,
+                statement,
+                statement_shape(statement),
+                parameters,
+                duration,
+                route=route_template(scope) if scope is not None else None,
+                company_id=recorder.company_id if recorder is not None else None,
+                request_id=request_id_var.get()
+            )
+            if recorder is not None:
+                recorder.slow_queries.append(record)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        # Failed statements never reach after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """PyMongo command listener recording command latency."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "success").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "failure").observe(event.duration_micros / 1e6)
+
+
+class RuntimeCollector:
+    """Collects gauges read from other components at scrape time."""
+
+    def __init__(self, engine: Engine, broker_url: str, queue_name: str = "celery"):
+        self.engine = engine
+        self.broker_url = broker_url
+        self.queue_name = queue_name
+        self._redis = None
+
+    def collect(self):
+        yield from self._collect_pool()
+        yield from self._collect_queue()
+        yield from self._collect_websockets()
+
+    def _collect_pool(self):
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return
+        size = GaugeMetricFamily("db_pool_size", "Configured size of the SQLAlchemy pool")
+        size.add_metric([], pool.size())
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out")
+        checked_out.add_metric([], pool.checkedout())
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size")
+        overflow.add_metric([], max(pool.overflow(), 0))
+        yield from (size, checked_out, overflow)
+
+    def _collect_queue(self):
+        if not self.broker_url.startswith(("redis://", "rediss://")):
+            return
+        try:
+            if self._redis is None:
+                import redis
+                self._redis = redis.Redis.from_url(self.broker_url, socket_timeout=1, socket_connect_timeout=1)
+            length = self._redis.llen(self.queue_name)
+        except Exception as e:
+            logger.warning(f"Failed to read Celery queue length: {e}")
+            return
+        queue = GaugeMetricFamily("celery_queue_length", "Messages waiting in the Celery queue", labels=["queue"])
+        queue.add_metric([self.queue_name], length)
+        yield queue
+
+    def _collect_websockets(self):
+        from .websocket_manager import manager
+
+        connections = GaugeMetricFamily("websocket_connections", "Open notification WebSocket connections")
+        connections.add_metric([], manager.get_active_connections_count())
+        companies = GaugeMetricFamily("websocket_companies", "Companies with open WebSocket connections")
+        companies.add_metric([], len(manager.active_connections))
+        yield from (connections, companies)
+
+
+_runtime_collector: Optional[RuntimeCollector] = None
+
+
+def register_runtime_collector(engine: Engine, broker_url: Optional[str] = None) -> RuntimeCollector:
+    """Register the scrape-time collector once per process.
+
+    Args:
+        engine: SQLAlchemy engine whose pool is reported
+        broker_url: Celery broker URL (defaults to the configured one)
+
+    Returns:
+        The registered collector
+    """
+    global _runtime_collector
+    if _runtime_collector is None:
+        _runtime_collector = RuntimeCollector(engine, broker_url if broker_url is not None else settings.celery_broker_url)
+        REGISTRY.register(_runtime_collector)
+    return _runtime_collector
+
+
+def render_metrics() -> tuple:
+    """Render all metrics in the Prometheus text format.
+
+    Returns:
+        Tuple of (payload, content type)
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
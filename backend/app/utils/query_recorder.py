@@ -0,0 +1,160 @@
+"""Per-request SQL statement recording and N+1 detection.
+
+The engine event hooks installed by ``metrics.instrument_engine`` record
+every statement into the ``QueryRecorder`` of the current request (set by
+the metrics middleware). When the request finishes, ``check_query_budget``
+warns about requests that ran too many statements or ran the same
+statement shape over and over, which is what an N+1 pattern (one query per
+row of a previous query) looks like.
+
+Tests can pin the query budget of an endpoint with ``assert_max_queries``::
+
+    with assert_max_queries(3, engine):
+        client.get("/api/dashboard/charts")
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+import logging
+import re
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Expanded IN lists and multi-row VALUES of bound parameters, e.g. (?, ?, ?)
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a SQL statement so repeated queries compare equal.
+
+    Literals are replaced by ``?`` and parameter lists of any length are
+    collapsed, so ``IN (?, ?)`` and ``IN (?, ?, ?)`` share a shape.
+
+    Args:
+        statement: SQL statement as sent to the database
+
+    Returns:
+        Normalized statement
+    """
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _STRING_LITERAL.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return _PARAMETER_LIST.sub("(?)", shape)
+
+
+class QueryRecorder:
+    """SQL statements executed within one scope (usually a request).
+
+    Args:
+        keep_statements: Also keep the statements themselves
+        scope: ASGI scope of the request, used to attribute slow queries
+    """
+
+    def __init__(self, keep_statements: bool = False, scope: Optional[dict] = None):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+        self.keep_statements = keep_statements
+        self.statements: List[str] = []
+        self.scope = scope
+        # Slow statements of this scope, persisted when it ends
+        self.slow_queries: list = []
+
+    @property
+    def company_id(self) -> Optional[str]:
+        """Company of the request (set by the tenant middleware), if known."""
+        if self.scope is None:
+            return None
+        return self.scope.get("state", {}).get("company_id")
+
+    def record(self, statement: str, duration: float) -> None:
+        """Record one executed statement."""
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+        if self.keep_statements:
+            self.statements.append(statement)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least ``threshold`` times, most frequent first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+# Recorder of the request being served (None outside of requests)
+current_query_recorder: ContextVar[Optional[QueryRecorder]] = ContextVar("current_query_recorder", default=None)
+
+
+def check_query_budget(recorder: QueryRecorder, route: str) -> List[str]:
+    """Warn when a request exceeded the statement thresholds.
+
+    Args:
+        recorder: Statements executed by the request
+        route: Route template of the request
+
+    Returns:
+        Exceeded budgets: ``"count"`` (too many statements) and/or
+        ``"repeated"`` (the same shape executed too often)
+    """
+    exceeded = []
+    if recorder.count > settings.query_count_warning_threshold:
+        exceeded.append("count")
+        logger.warning(
+            f"{route} executed {recorder.count} SQL statements "
+            f"({recorder.duration * 1000:.1f}ms, threshold {settings.query_count_warning_threshold})"
+        )
+
+    repeated = recorder.repeated(settings.repeated_query_threshold)
+    if repeated:
+        exceeded.append("repeated")
+        shape, count = repeated[0]
+        logger.warning(
+            f"Possible N+1 in {route}: {len(repeated)} statement shape(s) repeated, "
+            f"most often {count}x: {shape[:300]}"
+        )
+    return exceeded
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, engine: Optional[Engine] = None) -> Iterator[QueryRecorder]:
+    """Fail if the block executes more than ``max_queries`` SQL statements.
+
+    Every statement on the engine is counted, whichever thread runs it, so
+    this also covers requests served by ``TestClient`` in another thread.
+
+    Args:
+        max_queries: Maximum number of statements allowed
+        engine: Engine to watch (defaults to the application engine)
+
+    Yields:
+        Recorder of the statements executed in the block
+
+    Raises:
+        AssertionError: If the block executed more statements
+    """
+    if engine is None:
+        from ..database import engine
+
+    recorder = QueryRecorder(keep_statements=True)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        recorder.record(statement, 0.0)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield recorder
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    if recorder.count > max_queries:
+        shapes = "\n".join(f"  {count}x {shape}" for shape, count in recorder.shapes.most_common())
+        raise AssertionError(f"Expected at most {max_queries} SQL statements, got {recorder.count}:\n{shapes}")
@@ -0,0 +1,233 @@
+"""Content-addressed cache for generated report PDFs.
+
+A report is identified by ``(company_id, report_type, parameters,
+data_version)``. ``data_version`` changes whenever a row the report reads is
+added, changed or deleted, so an unchanged request maps to the same cache
+key and is served from the existing stored object with a fresh download URL
+instead of being rendered again.
+
+Cached reports expire after ``settings.report_cache_ttl_days``:
+``evict_stale_reports`` (run daily by Celery beat) deletes expired and
+superseded objects, and an S3 lifecycle rule on the ``report-cache`` tag
+(see ``scripts/configure_report_lifecycle.py``) is the backstop.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.company import Company
+from app.models.employee import Employee
+from app.models.finance import Transaction
+from app.models.payroll import PayrollItem
+from app.models.report import ReportJob
+from app.utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Bump when report rendering changes so cached PDFs are regenerated
+REPORT_RENDER_VERSION = 2
+
+# Tag applied to cached report objects; selected by the S3 lifecycle rule
+REPORT_CACHE_TAG = {"report-cache": "true"}
+REPORT_LIFECYCLE_RULE_ID = "expire-cached-reports"
+
+
+def compute_data_version(
+    db: Session,
+    company_id: str,
+    report_type: str,
+    start_date: date,
+    end_date: date
+) -> str:
+    """Fingerprint the rows a report reads.
+
+    Row count catches deletions; the latest ``updated_at`` catches inserts
+    and edits. The company row is included because its name is printed in
+    the report header.
+
+    Returns:
+        Opaque version string
+    """
+    if report_type == "payroll":
+        row = db.query(
+            func.count(PayrollItem.id),
+            func.max(PayrollItem.updated_at),
+            func.max(Employee.updated_at)
+        ).outerjoin(
+            Employee, Employee.id == PayrollItem.employee_id
+        ).filter(
+            PayrollItem.company_id == company_id,
+            PayrollItem.created_at >= datetime.combine(start_date, datetime.min.time()),
+            PayrollItem.created_at <= datetime.combine(end_date, datetime.max.time())
+        ).one()
+    else:
+        row = db.query(
+            func.count(Transaction.id),
+            func.max(Transaction.updated_at)
+        ).filter(
+            Transaction.company_id == company_id,
+            Transaction.transaction_date >= start_date,
+            Transaction.transaction_date <= end_date
+        ).one()
+
+    company_updated_at = db.query(Company.updated_at).filter(Company.id == company_id).scalar()
+    return "|".join(str(value) for value in (*row, company_updated_at))
+
+
+def report_cache_key(
+    company_id: str,
+    report_type: str,
+    parameters: Dict[str, Any],
+    data_version: str
+) -> str:
+    """Build the content address of a report.
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    identity = json.dumps(
+        [REPORT_RENDER_VERSION, company_id, report_type, parameters, data_version],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+def _cache_cutoff(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()) - timedelta(days=settings.report_cache_ttl_days)
+
+
+def find_cached_report(db: Session, company_id: str, cache_key: str) -> Optional[ReportJob]:
+    """Find a completed, unexpired report for a cache key.
+
+    Args:
+        db: Database session
+        company_id: Company ID
+        cache_key: Report cache key
+
+    Returns:
+        The completed job whose PDF is still in storage, or None
+    """
+    job = db.query(ReportJob).filter(
+        ReportJob.company_id == company_id,
+        ReportJob.cache_key == cache_key,
+        ReportJob.status == "completed",
+        ReportJob.completed_at >= _cache_cutoff()
+    ).order_by(ReportJob.completed_at.desc()).first()
+
+    if not job or not job.file_key:
+        return None
+
+    if not get_storage().get_file_metadata(job.file_key):
+        # Object was removed out of band (e.g. by the lifecycle rule)
+        logger.warning(f"Cached report {job.file_key} is missing from storage")
+        return None
+
+    return job
+
+
+def _inflight_cutoff(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()) - timedelta(minutes=settings.report_job_timeout_minutes)
+
+
+def _last_progress():
+    """When a job was started, or created if it never started."""
+    return func.coalesce(ReportJob.started_at, ReportJob.created_at)
+
+
+def find_inflight_report(
+    db: Session,
+    company_id: str,
+    cache_key: str,
+    now: Optional[datetime] = None
+) -> Optional[ReportJob]:
+    """Find a queued or running job for the same cache key.
+
+    Jobs queued or started more than ``settings.report_job_timeout_minutes``
+    ago are ignored: they were lost with the API process running them.
+    """
+    return db.query(ReportJob).filter(
+        ReportJob.company_id == company_id,
+        ReportJob.cache_key == cache_key,
+        ReportJob.status.in_(["queued", "running"]),
+        _last_progress() >= _inflight_cutoff(now)
+    ).order_by(ReportJob.created_at.desc()).first()
+
+
+def reap_stale_report_jobs(db: Session, now: Optional[datetime] = None) -> int:
+    """Mark jobs lost with the API process running them as failed.
+
+    Jobs run in the API process, so a restart leaves them queued or running
+    forever; they are failed once older than ``report_job_timeout_minutes``.
+
+    Args:
+        db: Database session
+        now: Current time (defaults to utcnow)
+
+    Returns:
+        Number of jobs marked failed
+    """
+    now = now or datetime.utcnow()
+    jobs = db.query(ReportJob).filter(
+        ReportJob.status.in_(["queued", "running"]),
+        _last_progress() < _inflight_cutoff(now)
+    ).all()
+
+    for job in jobs:
+        job.status = "failed"
+        job.error = "Report generation was interrupted, please request the report again"
+        job.completed_at = now
+
+    db.commit()
+    if jobs:
+        logger.warning(f"Marked {len(jobs)} interrupted report jobs as failed")
+    return len(jobs)
+
+
+def evict_stale_reports(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete cached report PDFs that are expired or superseded.
+
+    A report is superseded once a newer report with the same type and
+    parameters has completed (its data changed since).
+
+    Args:
+        db: Database session
+        now: Current time (defaults to utcnow)
+
+    Returns:
+        Number of reports evicted
+    """
+    cutoff = _cache_cutoff(now)
+    jobs = db.query(ReportJob).filter(
+        ReportJob.status == "completed",
+        ReportJob.file_key.isnot(None)
+    ).order_by(ReportJob.completed_at.desc()).all()
+
+    newest_seen = set()
+    kept_keys = set()
+    evicted = 0
+    for job in jobs:
+        identity = (job.company_id, job.report_type, job.parameters)
+        superseded = identity in newest_seen
+        newest_seen.add(identity)
+
+        if not superseded and job.completed_at >= cutoff:
+            kept_keys.add(job.file_key)
+            continue
+
+        # A re-render of unchanged data reuses the same object key
+        if job.file_key in kept_keys or get_storage().delete_file(job.file_key):
+            job.status = "expired"
+            job.file_key = None
+            evicted += 1
+
+    db.commit()
+    logger.info(f"Evicted {evicted} cached reports")
+    return evicted
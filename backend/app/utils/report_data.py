@@ -0,0 +1,188 @@
+"""Report data layer.
+
+Aggregates report figures in the database instead of loading full row sets
+into Python. Totals and category breakdowns use ``GROUP BY``; payroll lines
+come from a single joined projection that is streamed in batches, so memory
+use does not grow with the length of the reporting period.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterator, NamedTuple
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.employee import Employee
+from app.models.finance import Transaction
+from app.models.payroll import PayrollItem
+
+logger = logging.getLogger(__name__)
+
+UNCATEGORIZED = "Uncategorized"
+
+
+@dataclass
+class FinancialTotals:
+    """Income and expense totals for a period."""
+    income: Decimal = Decimal(0)
+    expenses: Decimal = Decimal(0)
+    expense_breakdown: Dict[str, Decimal] = field(default_factory=dict)
+
+    @property
+    def net(self) -> Decimal:
+        return self.income - self.expenses
+
+
+@dataclass
+class PayrollTotals:
+    """Payroll totals for a period."""
+    employee_count: int = 0
+    total_gross: Decimal = Decimal(0)
+    total_deductions: Decimal = Decimal(0)
+    total_net: Decimal = Decimal(0)
+
+
+class PayrollLine(NamedTuple):
+    """One payroll item with its employee name."""
+    employee_name: str
+    gross_pay: float
+    deductions: float
+    net_pay: float
+
+
+def _payroll_period_filter(query, company_id: str, start_date: date, end_date: date):
+    return query.filter(
+        PayrollItem.company_id == company_id,
+        PayrollItem.created_at >= datetime.combine(start_date, datetime.min.time()),
+        PayrollItem.created_at <= datetime.combine(end_date, datetime.max.time())
+    )
+
+
+def get_financial_totals(
+    db: Session,
+    company_id: str,
+    start_date: date,
+    end_date: date
+) -> FinancialTotals:
+    """Sum income and expenses per category in one grouped query.
+
+    Args:
+        db: Database session
+        company_id: Company ID
+        start_date: First day of the period (inclusive)
+        end_date: Last day of the period (inclusive)
+
+    Returns:
+        Totals with the expense breakdown by category
+    """
+    category = func.coalesce(func.nullif(Transaction.category, ""), UNCATEGORIZED)
+    rows = db.query(
+        Transaction.type,
+        category.label("category"),
+        func.sum(Transaction.amount).label("total")
+    ).filter(
+        Transaction.company_id == company_id,
+        Transaction.type.in_(["income", "expense"]),
+        Transaction.transaction_date >= start_date,
+        Transaction.transaction_date <= end_date
+    ).group_by(
+        Transaction.type,
+        category
+    ).all()
+
+    totals = FinancialTotals()
+    for row in rows:
+        amount = Decimal(row.total or 0)
+        if row.type == "income":
+            totals.income += amount
+        else:
+            totals.expenses += amount
+            totals.expense_breakdown[row.category] = amount
+
+    return totals
+
+
+def get_payroll_totals(
+    db: Session,
+    company_id: str,
+    start_date: date,
+    end_date: date
+) -> PayrollTotals:
+    """Aggregate payroll totals for a period in one query.
+
+    Args:
+        db: Database session
+        company_id: Company ID
+        start_date: First day of the period (inclusive)
+        end_date: Last day of the period (inclusive)
+
+    Returns:
+        Item count and gross, deduction and net totals
+    """
+    row = _payroll_period_filter(
+        db.query(
+            func.count(PayrollItem.id).label("count"),
+            func.coalesce(func.sum(PayrollItem.base_salary), 0).label("gross"),
+            func.coalesce(func.sum(PayrollItem.deductions), 0).label("deductions"),
+            func.coalesce(func.sum(PayrollItem.net_amount), 0).label("net")
+        ),
+        company_id, start_date, end_date
+    ).one()
+
+    return PayrollTotals(
+        employee_count=row.count,
+        total_gross=Decimal(row.gross),
+        total_deductions=Decimal(row.deductions),
+        total_net=Decimal(row.net)
+    )
+
+
+def iter_payroll_lines(
+    db: Session,
+    company_id: str,
+    start_date: date,
+    end_date: date,
+    batch_size: int = 1000
+) -> Iterator[PayrollLine]:
+    """Stream payroll lines with employee names from one joined query.
+
+    Rows are fetched ``batch_size`` at a time, so callers that consume the
+    iterator incrementally use constant memory.
+
+    Args:
+        db: Database session
+        company_id: Company ID
+        start_date: First day of the period (inclusive)
+        end_date: Last day of the period (inclusive)
+        batch_size: Rows fetched per round-trip
+
+    Yields:
+        Payroll lines ordered by employee name
+    """
+    query = _payroll_period_filter(
+        db.query(
+            Employee.first_name,
+            Employee.last_name,
+            PayrollItem.base_salary,
+            PayrollItem.deductions,
+            PayrollItem.net_amount
+        ).outerjoin(
+            Employee, Employee.id == PayrollItem.employee_id
+        ),
+        company_id, start_date, end_date
+    ).order_by(
+        Employee.last_name,
+        Employee.first_name,
+        PayrollItem.id
+    ).execution_options(yield_per=batch_size)
+
+    for row in query:
+        yield PayrollLine(
+            employee_name=f"{row.first_name} {row.last_name}" if row.first_name is not None else "Unknown",
+            gross_pay=float(row.base_salary),
+            deductions=float(row.deductions or 0),
+            net_pay=float(row.net_amount)
+        )
@@ -0,0 +1,361 @@
+"""Background PDF report generation.
+
+Report requests create a ``ReportJob`` row and return immediately. The job
+then runs in the API process, outside the request:
+
+1. Report data is queried on a threadpool thread.
+2. The PDF is rendered by ReportLab in a separate worker process, so large
+   reports use other cores instead of blocking the event loop. The worker
+   writes to a temporary file; payroll lines are streamed from the database
+   inside the worker rather than pickled across the process boundary.
+3. The file is streamed to storage (S3 multipart for large reports) on a
+   threadpool thread.
+4. The requesting user is notified over WebSocket (``report_ready`` or
+   ``report_failed``). Clients can also poll the job status endpoint.
+
+Jobs are FastAPI background tasks of the API process that created them, not
+Celery tasks: a job still queued or running when that process stops (a
+deploy or a crash) is lost, and the report has to be requested again. Such
+jobs are marked failed by ``report_cache.reap_stale_report_jobs`` once older
+than ``settings.report_job_timeout_minutes``.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import multiprocessing
+import tempfile
+import uuid
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.company import Company
+from app.models.report import ReportJob
+from app.utils.report_cache import REPORT_CACHE_TAG
+from app.utils.report_data import get_financial_totals, get_payroll_totals, iter_payroll_lines
+from app.utils.storage import get_storage
+from app.utils.websocket_manager import notify_user_specific
+
+logger = logging.getLogger(__name__)
+
+REPORT_TITLES = {
+    "income": "Income Statement",
+    "expense": "Expense Report",
+    "summary": "Financial Summary"
+}
+
+# Worker processes for PDF rendering (created on first use)
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ReportDataError(Exception):
+    """Raised when a report has no data to render."""
+
+
+def get_report_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool used for PDF rendering."""
+    global _process_pool
+    if _process_pool is None:
+        # Spawn rather than fork: the API process holds threads, sockets and
+        # DB connections that must not be duplicated into workers
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.report_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_report_process_pool() -> None:
+    """Stop the PDF rendering processes."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def create_report_job(
+    db: Session,
+    company_id: str,
+    user_id: str,
+    report_type: str,
+    parameters: Dict[str, Any],
+    cache_key: Optional[str] = None
+) -> ReportJob:
+    """Create a queued report job.
+
+    Args:
+        db: Database session
+        company_id: Company the report belongs to
+        user_id: Requesting user (notified on completion)
+        report_type: "financial" or "payroll"
+        parameters: JSON-serializable report parameters
+        cache_key: Content address of the report (see app.utils.report_cache)
+
+    Returns:
+        The new job
+    """
+    job = ReportJob(
+        id=str(uuid.uuid4()),
+        company_id=company_id,
+        requested_by=user_id,
+        report_type=report_type,
+        parameters=json.dumps(parameters, sort_keys=True),
+        cache_key=cache_key,
+        status="queued"
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def serialize_report_job(job: ReportJob) -> Dict[str, Any]:
+    """Serialize a report job for API responses."""
+    return {
+        "job_id": job.id,
+        "report_type": job.report_type,
+        "status": job.status,
+        "cached": False,
+        "parameters": json.loads(job.parameters),
+        "file_key": job.file_key,
+        "summary": json.loads(job.summary) if job.summary else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "completed_at": job.completed_at
+    }
+
+
+def collect_financial_report(
+    db: Session,
+    company_id: str,
+    company_name: str,
+    start_date: date,
+    end_date: date,
+    variant: str
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Query the data for a financial report.
+
+    Returns:
+        Tuple of (render parameters, summary)
+    """
+    totals = get_financial_totals(db, company_id, start_date, end_date)
+
+    report_data = {
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "income": totals.income,
+        "expenses": totals.expenses,
+        "net": totals.net,
+        "expense_breakdown": totals.expense_breakdown
+    }
+
+    render_params = {
+        "company_name": company_name,
+        "report_data": report_data,
+        "report_type": REPORT_TITLES.get(variant, "Financial Report")
+    }
+    summary = {
+        "total_income": float(totals.income),
+        "total_expenses": float(totals.expenses),
+        "net_income": float(totals.net),
+        "period": f"{start_date} to {end_date}"
+    }
+    return render_params, summary
+
+
+def collect_payroll_report(
+    db: Session,
+    company_id: str,
+    company_name: str,
+    start_date: date,
+    end_date: date
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Query the data for a payroll report.
+
+    Returns:
+        Tuple of (render parameters, summary)
+
+    Raises:
+        ReportDataError: If there is no payroll data in the period
+    """
+    totals = get_payroll_totals(db, company_id, start_date, end_date)
+    if not totals.employee_count:
+        raise ReportDataError("No payroll data found for the specified period")
+
+    # Lines are streamed by the renderer (see render_report_file)
+    render_params = {
+        "company_id": company_id,
+        "company_name": company_name,
+        "period_start": start_date.strftime("%Y-%m-%d"),
+        "period_end": end_date.strftime("%Y-%m-%d")
+    }
+    summary = {
+        "employee_count": totals.employee_count,
+        "total_gross": float(totals.total_gross),
+        "total_net": float(totals.total_net),
+        "period": f"{start_date} to {end_date}"
+    }
+    return render_params, summary
+
+
+def render_report_file(report_type: str, params: Dict[str, Any], path: str) -> None:
+    """Render a report PDF into a file.
+
+    Module-level so it can be submitted to the worker process pool. Payroll
+    lines are read here, in batches, straight into the page layout.
+
+    Args:
+        report_type: "financial" or "payroll"
+        params: Render parameters from ``collect_*_report``
+        path: File to write the PDF to
+    """
+    # reportlab is only loaded by processes that render reports
+    from app.utils.pdf_reports import PDFReportService
+
+    with open(path, "wb") as out:
+        if report_type != "payroll":
+            PDFReportService.write_financial_report(out, **params)
+            return
+
+        db = SessionLocal()
+        try:
+            lines = iter_payroll_lines(
+                db,
+                params["company_id"],
+                date.fromisoformat(params["period_start"]),
+                date.fromisoformat(params["period_end"])
+            )
+            PDFReportService.write_payroll_report(
+                out, params["company_name"], lines, params["period_start"], params["period_end"]
+            )
+        finally:
+            db.close()
+
+
+def _start_job(job_id: str) -> Tuple[ReportJob, Dict[str, Any], Dict[str, Any]]:
+    """Mark a job running and collect its report data."""
+    db = SessionLocal()
+    try:
+        job = db.get(ReportJob, job_id)
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        params = json.loads(job.parameters)
+        start_date = date.fromisoformat(params["start_date"])
+        end_date = date.fromisoformat(params["end_date"])
+        company = db.get(Company, job.company_id)
+        company_name = company.name if company else "Company"
+
+        if job.report_type == "payroll":
+            render_params, summary = collect_payroll_report(
+                db, job.company_id, company_name, start_date, end_date
+            )
+        else:
+            render_params, summary = collect_financial_report(
+                db, job.company_id, company_name, start_date, end_date, params.get("variant", "summary")
+            )
+
+        db.expunge(job)
+        return job, render_params, summary
+    finally:
+        db.close()
+
+
+def _upload_report(job: ReportJob, pdf_file: BinaryIO) -> str:
+    """Upload a rendered report and return its storage key."""
+    params = json.loads(job.parameters)
+    prefix = "payroll_report" if job.report_type == "payroll" else "financial_report"
+    # Content-addressed: the same report data always maps to the same object
+    version = job.cache_key[:16] if job.cache_key else datetime.now().strftime('%Y%m%d%H%M%S')
+    filename = f"{prefix}_{params['start_date']}_{params['end_date']}_{version}.pdf"
+    file_key = f"{job.company_id}/reports/{filename}"
+
+    pdf_file.seek(0)
+    get_storage().upload_fileobj(
+        fileobj=pdf_file,
+        file_key=file_key,
+        content_type="application/pdf",
+        metadata={
+            "report_type": params.get("variant", job.report_type),
+            "start_date": params["start_date"],
+            "end_date": params["end_date"],
+            "generated_by": str(job.requested_by),
+            "company_id": str(job.company_id),
+            "report_job_id": job.id
+        },
+        tags=REPORT_CACHE_TAG
+    )
+    return file_key
+
+
+def _finish_job(
+    job_id: str,
+    file_key: Optional[str],
+    summary: Optional[Dict[str, Any]],
+    error: Optional[str]
+) -> ReportJob:
+    """Record the outcome of a job."""
+    db = SessionLocal()
+    try:
+        job = db.get(ReportJob, job_id)
+        job.status = "failed" if error else "completed"
+        job.file_key = file_key
+        job.summary = json.dumps(summary) if summary else None
+        job.error = error
+        job.completed_at = datetime.utcnow()
+        db.commit()
+        db.refresh(job)
+        db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+async def run_report_job(job_id: str, executor=None) -> None:
+    """Generate a report for a queued job and notify the requesting user.
+
+    Args:
+        job_id: ReportJob ID
+        executor: Executor for PDF rendering (defaults to the process pool)
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        job, render_params, summary = await run_in_threadpool(_start_job, job_id)
+        # A named file, as the PDF is written by another process
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+            await loop.run_in_executor(
+                executor or get_report_process_pool(),
+                render_report_file, job.report_type, render_params, pdf_file.name
+            )
+            file_key = await run_in_threadpool(_upload_report, job, pdf_file)
+        await run_in_threadpool(_finish_job, job_id, file_key, summary, None)
+    except Exception as e:
+        logger.error(f"Report job {job_id} failed: {e}")
+        job = await run_in_threadpool(_finish_job, job_id, None, None, str(e))
+        await notify_user_specific(
+            user_id=job.requested_by,
+            company_id=job.company_id,
+            notification_type="report_failed",
+            title="Report failed",
+            message=str(e),
+            data={"job_id": job_id, "report_type": job.report_type}
+        )
+        return
+
+    logger.info(f"Report job {job_id} completed: {file_key}")
+    await notify_user_specific(
+        user_id=job.requested_by,
+        company_id=job.company_id,
+        notification_type="report_ready",
+        title="Report ready",
+        message=f"Your {job.report_type} report for {summary['period']} is ready",
+        data={"job_id": job_id, "report_type": job.report_type, "file_key": file_key}
+    )
@@ -0,0 +1,74 @@
+"""Context of the request being served.
+
+The ids of the current request, company and user live in context variables
+set by the middleware stack (the request id by ``RequestContextMiddleware``,
+company and user by ``TenantContextMiddleware``), so any code running for
+the request can read them without having the ``Request`` at hand. The
+logging ``ContextFilter`` adds them to every record, and the request id is
+forwarded to Celery tasks, WebSocket messages and outbound API calls so one
+request can be followed across processes.
+
+The ``RequestTrace`` of a request aggregates the time spent in its stages
+(SQL, Stripe, S3, SendGrid...), see ``tracing.span``.
+"""
+
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, List, Optional
+import time
+
+# Header carrying the request id, accepted from clients and sent downstream
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+company_id_var: ContextVar[Optional[str]] = ContextVar("company_id", default=None)
+user_id_var: ContextVar[Optional[str]] = ContextVar("user_id", default=None)
+
+
+def log_context() -> Dict[str, Optional[str]]:
+    """Ids of the current request, company and user (None outside of requests)."""
+    return {
+        "request_id": request_id_var.get(),
+        "company_id": company_id_var.get(),
+        "user_id": user_id_var.get(),
+    }
+
+
+def outbound_headers() -> Dict[str, str]:
+    """Headers correlating an outbound call with the current request."""
+    request_id = request_id_var.get()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+class RequestTrace:
+    """Time spent in each stage of one request, aggregated by stage name.
+
+    Stages may be recorded from worker threads (threadpool endpoints, SDK
+    executors), which share the trace through the copied context.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # name -> [count, seconds]
+        self._lock = Lock()
+
+    def add(self, name: str, duration: float) -> None:
+        """Record ``duration`` seconds spent in stage ``name``."""
+        with self._lock:
+            stage = self.stages.setdefault(name, [0, 0.0])
+            stage[0] += 1
+            stage[1] += duration
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value: each stage and the total so far, in ms."""
+        with self._lock:
+            metrics = [
+                f"{name};dur={seconds * 1000:.1f};desc=\"{int(count)}x\""
+                for name, (count, seconds) in self.stages.items()
+            ]
+        metrics.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+# Trace of the request being served (None outside of requests)
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
@@ -1,19 +1,26 @@
 """AWS S3 file storage service."""
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from fastapi import UploadFile
-from typing import Optional, Dict
-import uuid
+from typing import Any, BinaryIO, Iterator, Optional, Dict
+from urllib.parse import urlencode
 import logging
-from pathlib import Path
+import asyncio
+import time
+
+from fastapi.concurrency import run_in_threadpool
 
 from ..config import settings
+from .request_context import outbound_headers
+from .storage import FileTooLargeError, StorageBackend, build_file_key
+from .tracing import record_span
 
 logger = logging.getLogger(__name__)
 
 
-class S3Service:
+class S3Service(StorageBackend):
     """Service for managing file uploads to AWS S3."""
     
     def __init__(self):
@@ -24,46 +31,89 @@ class S3Service:
             aws_secret_access_key=settings.aws_secret_access_key,
             region_name=settings.aws_region
         )
+        self.s3_client.meta.events.register("before-call.s3", self._start_span)
+        self.s3_client.meta.events.register("after-call.s3", self._end_span)
+        self.s3_client.meta.events.register("after-call-error.s3", self._end_span)
+        # After signing, so presigned URLs and signatures are unaffected
+        self.s3_client.meta.events.register("before-send.s3", self._add_request_id)
         self.bucket_name = settings.aws_s3_bucket_name
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.s3_multipart_chunk_size,
+            multipart_chunksize=settings.s3_multipart_chunk_size,
+            max_concurrency=settings.s3_max_concurrency
+        )
+    
+    @staticmethod
+    def _start_span(context, **kwargs) -> None:
+        context["span_start"] = time.perf_counter()
+    
+    @staticmethod
+    def _end_span(context, **kwargs) -> None:
+        # Time each S3 API call as the "s3" span
+        if "span_start" in context:
+            record_span("s3", time.perf_counter() - context["span_start"])
+    
+    @staticmethod
+    def _add_request_id(request, **kwargs) -> None:
+        # Transfers run on boto3's own threads, without the request context
+        request.headers.update(outbound_headers())
     
     async def upload_file(
         self,
         file: UploadFile,
         folder: str = "",
-        filename: Optional[str] = None
-    ) -> Dict[str, str]:
-        """Upload a file to S3.
+        filename: Optional[str] = None,
+        max_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Stream an uploaded file to S3.
+        
+        The file is read from its spool in ``settings.s3_multipart_chunk_size``
+        chunks. A file that fits in one chunk is sent with a single PUT;
+        larger files use a multipart upload whose parts are sent from
+        threadpool threads, up to ``settings.s3_max_concurrency`` at a time,
+        while the next chunk is read. The event loop is never blocked on S3
+        and only the in-flight chunks are held in memory.
         
         Args:
             file: FastAPI UploadFile object
             folder: Folder path within bucket (e.g., "invoices", "employee-docs")
             filename: Custom filename (optional, generates UUID if not provided)
+            max_size: Maximum file size in bytes, enforced while streaming (optional)
             
         Returns:
-            Dictionary with file_key, file_url, and original_filename
+            Dictionary with file_key, file_url, original_filename,
+            content_type and file_size
+            
+        Raises:
+            FileTooLargeError: If the file is larger than max_size
         """
+        # Reject early when the client declared the size
+        if max_size is not None and file.size is not None and file.size > max_size:
+            raise FileTooLargeError(max_size)
+        
         try:
-            # Generate unique filename if not provided
-            if not filename:
-                file_extension = Path(file.filename).suffix
-                filename = f"{uuid.uuid4()}{file_extension}"
-            
             # Construct S3 key (path)
-            file_key = f"{folder}/{filename}" if folder else filename
+            file_key = build_file_key(folder, file.filename, filename)
+            content_type = file.content_type or 'application/octet-stream'
+            metadata = {'original_filename': file.filename}
             
-            # Read file content
-            file_content = await file.read()
+            chunk_size = settings.s3_multipart_chunk_size
+            first_chunk = await file.read(chunk_size)
             
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=file_key,
-                Body=file_content,
-                ContentType=file.content_type or 'application/octet-stream',
-                Metadata={
-                    'original_filename': file.filename
-                }
-            )
+            if len(first_chunk) < chunk_size:
+                if max_size is not None and len(first_chunk) > max_size:
+                    raise FileTooLargeError(max_size)
+                await run_in_threadpool(
+                    self.s3_client.put_object,
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    Body=first_chunk,
+                    ContentType=content_type,
+                    Metadata=metadata
+                )
+                size = len(first_chunk)
+            else:
+                size = await self._upload_multipart(file, file_key, first_chunk, content_type, metadata, max_size)
             
             # Generate public URL
             file_url = f"https://{self.bucket_name}.s3.{settings.aws_region}.amazonaws.com/{file_key}"
@@ -73,13 +123,208 @@ class S3Service:
             return {
                 "file_key": file_key,
                 "file_url": file_url,
-                "original_filename": file.filename
+                "original_filename": file.filename,
+                "content_type": content_type,
+                "file_size": size
             }
+        
+        except ClientError as e:
+            logger.error(f"Failed to upload file to S3: {e}")
+            raise Exception(f"File upload failed: {str(e)}")
+    
+    async def _upload_multipart(
+        self,
+        file: UploadFile,
+        file_key: str,
+        first_chunk: bytes,
+        content_type: str,
+        metadata: Dict[str, str],
+        max_size: Optional[int]
+    ) -> int:
+        """Send an upload as an S3 multipart upload with parallel parts.
+        
+        The multipart upload is aborted if reading, size enforcement or any
+        part fails, so no orphaned parts are left in the bucket.
+        
+        Returns:
+            Size of the uploaded file in bytes
+        """
+        upload = await run_in_threadpool(
+            self.s3_client.create_multipart_upload,
+            Bucket=self.bucket_name,
+            Key=file_key,
+            ContentType=content_type,
+            Metadata=metadata
+        )
+        upload_id = upload['UploadId']
+        
+        # Bounds both parallel requests and the chunks held in memory
+        slots = asyncio.Semaphore(settings.s3_max_concurrency)
+        tasks = []
+        
+        async def send_part(part_number: int, body: bytes) -> Dict[str, object]:
+            try:
+                response = await run_in_threadpool(
+                    self.s3_client.upload_part,
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body
+                )
+                return {'PartNumber': part_number, 'ETag': response['ETag']}
+            finally:
+                slots.release()
+        
+        try:
+            chunk = first_chunk
+            size = 0
+            while chunk:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise FileTooLargeError(max_size)
+                
+                await slots.acquire()
+                tasks.append(asyncio.create_task(send_part(len(tasks) + 1, chunk)))
+                chunk = await file.read(settings.s3_multipart_chunk_size)
+            
+            parts = await asyncio.gather(*tasks)
+            await run_in_threadpool(
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=file_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': list(parts)}
+            )
+            return size
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await run_in_threadpool(
+                self.s3_client.abort_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=file_key,
+                UploadId=upload_id
+            )
+            raise
+    
+    def upload_bytes(
+        self,
+        data: bytes,
+        file_key: str,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[Dict[str, str]] = None,
+        tags: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Upload generated content (e.g. a rendered report) to S3.
+        
+        Args:
+            data: File content
+            file_key: S3 object key
+            content_type: MIME type
+            metadata: Object metadata (optional)
+            tags: Object tags, used by bucket lifecycle rules (optional)
+            
+        Returns:
+            The S3 object key
+        """
+        params = {
+            "Bucket": self.bucket_name,
+            "Key": file_key,
+            "Body": data,
+            "ContentType": content_type,
+            "Metadata": metadata or {}
+        }
+        if tags:
+            params["Tagging"] = urlencode(tags)
+        
+        try:
+            self.s3_client.put_object(**params)
+            logger.info(f"File uploaded successfully: {file_key}")
+            return file_key
+        except ClientError as e:
+            logger.error(f"Failed to upload file to S3: {e}")
+            raise Exception(f"File upload failed: {str(e)}")
+    
+    def upload_fileobj(
+        self,
+        fileobj: BinaryIO,
+        file_key: str,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[Dict[str, str]] = None,
+        tags: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Stream a file-like object to S3.
+        
+        Objects larger than ``settings.s3_multipart_chunk_size`` are sent as
+        a multipart upload, one chunk at a time, so the file is never held
+        in memory as a whole.
+        
+        Args:
+            fileobj: Readable binary file object
+            file_key: S3 object key
+            content_type: MIME type
+            metadata: Object metadata (optional)
+            tags: Object tags, used by bucket lifecycle rules (optional)
             
+        Returns:
+            The S3 object key
+        """
+        extra_args = {
+            "ContentType": content_type,
+            "Metadata": metadata or {}
+        }
+        if tags:
+            extra_args["Tagging"] = urlencode(tags)
+        
+        try:
+            self.s3_client.upload_fileobj(
+                fileobj,
+                self.bucket_name,
+                file_key,
+                ExtraArgs=extra_args,
+                Config=self.transfer_config
+            )
+            logger.info(f"File uploaded successfully: {file_key}")
+            return file_key
         except ClientError as e:
             logger.error(f"Failed to upload file to S3: {e}")
             raise Exception(f"File upload failed: {str(e)}")
     
+    def ensure_expiration_rule(self, rule_id: str, tag: Dict[str, str], days: int) -> None:
+        """Create or update a lifecycle rule expiring objects with a tag.
+        
+        Other lifecycle rules on the bucket are preserved.
+        
+        Args:
+            rule_id: Lifecycle rule ID
+            tag: Single tag (key/value) selecting the objects
+            days: Days after creation before objects are deleted
+        """
+        try:
+            rules = self.s3_client.get_bucket_lifecycle_configuration(
+                Bucket=self.bucket_name
+            ).get("Rules", [])
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchLifecycleConfiguration":
+                raise
+            rules = []
+        
+        (tag_key, tag_value), = tag.items()
+        rules = [rule for rule in rules if rule.get("ID") != rule_id]
+        rules.append({
+            "ID": rule_id,
+            "Filter": {"Tag": {"Key": tag_key, "Value": tag_value}},
+            "Status": "Enabled",
+            "Expiration": {"Days": days}
+        })
+        self.s3_client.put_bucket_lifecycle_configuration(
+            Bucket=self.bucket_name,
+            LifecycleConfiguration={"Rules": rules}
+        )
+        logger.info(f"Lifecycle rule {rule_id} set to expire after {days} days")
+    
     def get_presigned_url(
         self,
         file_key: str,
@@ -108,6 +353,22 @@ class S3Service:
             logger.error(f"Failed to generate presigned URL: {e}")
             raise Exception(f"URL generation failed: {str(e)}")
     
+    def get_download_url(self, file_key: str, expiration: int = 3600) -> str:
+        """Get a presigned download URL (see get_presigned_url)."""
+        return self.get_presigned_url(file_key, expiration=expiration)
+    
+    def read_bytes(self, file_key: str) -> bytes:
+        """Download an object into memory.
+        
+        Args:
+            file_key: S3 object key
+            
+        Returns:
+            Object content
+        """
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_key)
+        return response['Body'].read()
+    
     def delete_file(self, file_key: str) -> bool:
         """Delete a file from S3.
         
@@ -153,6 +414,24 @@ class S3Service:
             logger.error(f"Failed to list files from S3: {e}")
             return []
     
+    def iter_files(self, prefix: str = "") -> Iterator[str]:
+        """Iterate over every key under a prefix.
+        
+        Follows ListObjectsV2 continuation tokens, 1000 keys per request.
+        Meant for background jobs; API listings are served from the
+        document index.
+        
+        Args:
+            prefix: Folder prefix to filter by
+            
+        Yields:
+            File keys
+        """
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key']
+    
     def get_file_metadata(self, file_key: str) -> Optional[Dict]:
         """Get metadata for a file.
         
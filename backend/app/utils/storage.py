@@ -0,0 +1,468 @@
+"""Pluggable file storage.
+
+Uploaded documents and generated reports are stored through a
+``StorageBackend`` selected by ``settings.storage_backend``:
+
+- ``"s3"`` (default): ``S3Service`` in ``app.utils.s3_storage``.
+- ``"local"``: ``LocalStorage``, files under ``settings.upload_dir``.
+  Downloads are served by the API itself from signed, expiring URLs
+  (``GET /api/files/raw/{key}``) with range request support, so
+  single-node and on-prem deployments and hermetic test runs need no
+  object store.
+
+Keys are ``/``-separated paths that start with the company ID, e.g.
+``{company_id}/documents/{uuid}.pdf``.
+"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import logging
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Route serving LocalStorage downloads (see routers/files.py)
+LOCAL_DOWNLOAD_PATH = "/api/files/raw"
+
+# Sidecar metadata lives under this directory of the storage root
+LOCAL_META_DIR = ".meta"
+LOCAL_TEMP_PREFIX = ".upload-"
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the maximum allowed size."""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum size of {max_size // (1024 * 1024)}MB")
+        self.max_size = max_size
+
+
+def build_file_key(folder: str, original_filename: str, filename: Optional[str] = None) -> str:
+    """Build the key for an uploaded file.
+
+    Args:
+        folder: Folder path (e.g. "{company_id}/documents")
+        original_filename: Client-supplied filename (its extension is kept)
+        filename: Custom filename (optional, generates UUID if not provided)
+
+    Returns:
+        Storage key
+    """
+    if not filename:
+        filename = f"{uuid.uuid4()}{Path(original_filename).suffix}"
+    return f"{folder}/{filename}" if folder else filename
+
+
+class SignedUrl(NamedTuple):
+    """A download URL and when it stops working."""
+    url: str
+    expires_at: float  # Unix time
+
+    @property
+    def expires_in(self) -> int:
+        """Seconds until the URL expires."""
+        return max(int(self.expires_at - time.time()), 0)
+
+
+class DownloadUrlCache:
+    """Cache of signed download URLs for one storage backend.
+
+    A URL is reused until it has less than ``refresh_margin`` seconds of
+    validity left, so clients get a working link and repeat requests for
+    the same file get the same URL (which browsers can serve from cache).
+    The cache is bounded and evicts least recently used entries.
+    """
+
+    def __init__(self, storage: "StorageBackend", max_entries: int = 10000, refresh_margin: int = 300):
+        """Initialize the cache.
+
+        Args:
+            storage: Backend that signs the URLs
+            max_entries: Maximum number of cached URLs
+            refresh_margin: Minimum remaining validity of a returned URL
+        """
+        self.storage = storage
+        self.max_entries = max_entries
+        self.refresh_margin = refresh_margin
+        self._entries: "OrderedDict[Tuple[str, int], SignedUrl]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_key: str, expiration: int = 3600) -> SignedUrl:
+        """Get a download URL for a file, signing a new one if needed.
+
+        Args:
+            file_key: Storage key
+            expiration: Validity of newly signed URLs in seconds
+
+        Returns:
+            The URL and its expiry
+        """
+        cache_key = (file_key, expiration)
+        with self._lock:
+            cached = self._entries.get(cache_key)
+            if cached and cached.expires_at - time.time() >= self.refresh_margin:
+                self._entries.move_to_end(cache_key)
+                return cached
+
+        signed = SignedUrl(
+            url=self.storage.get_download_url(file_key, expiration=expiration),
+            expires_at=time.time() + expiration
+        )
+        with self._lock:
+            self._entries[cache_key] = signed
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return signed
+
+    def get_many(self, file_keys: Iterable[str], expiration: int = 3600) -> Dict[str, SignedUrl]:
+        """Get download URLs for several files."""
+        return {file_key: self.get(file_key, expiration) for file_key in file_keys}
+
+    def invalidate(self, file_key: str) -> None:
+        """Forget cached URLs for a file (e.g. after it is deleted)."""
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == file_key]:
+                del self._entries[cache_key]
+
+    def clear(self) -> None:
+        """Forget all cached URLs."""
+        with self._lock:
+            self._entries.clear()
+
+
+class StorageBackend(ABC):
+    """Interface implemented by file storage backends."""
+
+    _download_urls: Optional[DownloadUrlCache] = None
+
+    @property
+    def download_urls(self) -> DownloadUrlCache:
+        """Cached download URLs for this backend."""
+        if self._download_urls is None:
+            self._download_urls = DownloadUrlCache(
+                self,
+                max_entries=settings.download_url_cache_size,
+                refresh_margin=settings.download_url_refresh_margin_seconds
+            )
+        return self._download_urls
+
+    @abstractmethod
+    async def upload_file(
+        self,
+        file: UploadFile,
+        folder: str = "",
+        filename: Optional[str] = None,
+        max_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Stream an uploaded file into storage.
+
+        Returns:
+            Dictionary with file_key, file_url, original_filename,
+            content_type and file_size
+
+        Raises:
+            FileTooLargeError: If the file is larger than max_size
+        """
+
+    @abstractmethod
+    def upload_bytes(
+        self,
+        data: bytes,
+        file_key: str,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[Dict[str, str]] = None,
+        tags: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Store generated content under a key and return the key."""
+
+    @abstractmethod
+    def upload_fileobj(
+        self,
+        fileobj: BinaryIO,
+        file_key: str,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[Dict[str, str]] = None,
+        tags: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Stream a file-like object into storage and return the key."""
+
+    @abstractmethod
+    def get_download_url(self, file_key: str, expiration: int = 3600) -> str:
+        """Get a URL that allows downloading a file for ``expiration`` seconds."""
+
+    @abstractmethod
+    def read_bytes(self, file_key: str) -> bytes:
+        """Read a whole file into memory (for small files only)."""
+
+    @abstractmethod
+    def delete_file(self, file_key: str) -> bool:
+        """Delete a file. Returns True if successful."""
+
+    @abstractmethod
+    def list_files(self, prefix: str = "", max_keys: int = 100) -> list:
+        """List the keys starting with a prefix."""
+
+    @abstractmethod
+    def iter_files(self, prefix: str = "") -> Iterator[str]:
+        """Iterate over every key starting with a prefix, in pages if needed."""
+
+    @abstractmethod
+    def get_file_metadata(self, file_key: str) -> Optional[Dict]:
+        """Get content_type, content_length, last_modified and metadata, or None."""
+
+
+def sign_download(file_key: str, expires: int) -> str:
+    """Sign a local download URL.
+
+    Args:
+        file_key: Storage key
+        expires: Expiry as a Unix timestamp
+
+    Returns:
+        Hex HMAC-SHA256 signature
+    """
+    message = f"{file_key}:{expires}".encode("utf-8")
+    return hmac.new(settings.secret_key.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def verify_download(file_key: str, expires: int, signature: str) -> bool:
+    """Check a local download URL's signature and expiry."""
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_download(file_key, expires), signature)
+
+
+class LocalStorage(StorageBackend):
+    """Store files on the local filesystem.
+
+    Each file is written to a temporary file next to its destination and
+    renamed into place, so readers never see partial files. Content type and
+    metadata are kept in a JSON sidecar under ``.meta/``.
+    """
+
+    def __init__(self, root: str, chunk_size: int = 1024 * 1024):
+        """Initialize local storage.
+
+        Args:
+            root: Storage root directory (created if missing)
+            chunk_size: Read size when streaming uploads
+        """
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+
+    def path(self, file_key: str) -> Path:
+        """Resolve a key to its path under the storage root.
+
+        Raises:
+            ValueError: If the key escapes the root or names internal files
+        """
+        if any(part in ("", ".", "..") for part in file_key.split("/")):
+            raise ValueError(f"Invalid file key: {file_key}")
+        path = (self.root / file_key).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Invalid file key: {file_key}")
+        parts = path.relative_to(self.root).parts
+        if parts[0] == LOCAL_META_DIR or parts[-1].startswith(LOCAL_TEMP_PREFIX):
+            raise ValueError(f"Invalid file key: {file_key}")
+        return path
+
+    def _meta_path(self, file_key: str) -> Path:
+        relative = self.path(file_key).relative_to(self.root)
+        return self.root / LOCAL_META_DIR / f"{relative.as_posix()}.json"
+
+    def _open_temp(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=path.parent, prefix=LOCAL_TEMP_PREFIX, delete=False)
+
+    def _commit(
+        self,
+        temp_name: str,
+        file_key: str,
+        content_type: str,
+        metadata: Optional[Dict[str, str]],
+        tags: Optional[Dict[str, str]]
+    ) -> None:
+        """Move a finished temporary file into place and write its sidecar."""
+        meta_path = self._meta_path(file_key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta_path.write_text(json.dumps({
+            "content_type": content_type,
+            "metadata": metadata or {},
+            "tags": tags or {}
+        }))
+        os.replace(temp_name, self.path(file_key))
+
+    async def upload_file(
+        self,
+        file: UploadFile,
+        folder: str = "",
+        filename: Optional[str] = None,
+        max_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Stream an uploaded file to disk in chunks, enforcing max_size."""
+        if max_size is not None and file.size is not None and file.size > max_size:
+            raise FileTooLargeError(max_size)
+
+        file_key = build_file_key(folder, file.filename, filename)
+        content_type = file.content_type or "application/octet-stream"
+        temp = await run_in_threadpool(self._open_temp, self.path(file_key))
+        try:
+            size = 0
+            while chunk := await file.read(self.chunk_size):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise FileTooLargeError(max_size)
+                await run_in_threadpool(temp.write, chunk)
+            await run_in_threadpool(temp.close)
+
+            await run_in_threadpool(
+                self._commit,
+                temp.name,
+                file_key,
+                content_type,
+                {"original_filename": file.filename},
+                None
+            )
+        except BaseException:
+            temp.close()
+            Path(temp.name).unlink(missing_ok=True)
+            raise
+
+        logger.info(f"File stored locally: {file_key}")
+
+        return {
+            "file_key": file_key,
+            "file_url": self.get_download_url(file_key),
+            "original_filename": file.filename,
+            "content_type": content_type,
+            "file_size": size
+        }
+
+    def upload_bytes(
+        self,
+        data: bytes,
+        file_key: str,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[Dict[str, str]] = None,
+        tags: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Write generated content to disk."""
+        with self._open_temp(self.path(file_key)) as temp:
+            temp.write(data)
+        self._commit(temp.name, file_key, content_type, metadata, tags)
+        return file_key
+
+    def upload_fileobj(
+        self,
+        fileobj: BinaryIO,
+        file_key: str,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[Dict[str, str]] = None,
+        tags: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Copy a file-like object to disk in chunks."""
+        with self._open_temp(self.path(file_key)) as temp:
+            shutil.copyfileobj(fileobj, temp, self.chunk_size)
+        self._commit(temp.name, file_key, content_type, metadata, tags)
+        return file_key
+
+    def get_download_url(self, file_key: str, expiration: int = 3600) -> str:
+        """Build a signed URL for the API's local download route."""
+        expires = int(time.time()) + expiration
+        return (
+            f"{LOCAL_DOWNLOAD_PATH}/{quote(file_key)}"
+            f"?expires={expires}&signature={sign_download(file_key, expires)}"
+        )
+
+    def read_bytes(self, file_key: str) -> bytes:
+        """Read a file from disk."""
+        return self.path(file_key).read_bytes()
+
+    def delete_file(self, file_key: str) -> bool:
+        """Delete a file and its metadata sidecar."""
+        try:
+            self.path(file_key).unlink(missing_ok=True)
+            self._meta_path(file_key).unlink(missing_ok=True)
+            logger.info(f"File deleted successfully: {file_key}")
+            return True
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to delete local file: {e}")
+            return False
+
+    def list_files(self, prefix: str = "", max_keys: int = 100) -> list:
+        """List keys starting with a prefix, in key order."""
+        return list(itertools.islice(self.iter_files(prefix), max_keys))
+
+    def iter_files(self, prefix: str = "") -> Iterator[str]:
+        """Iterate over keys starting with a prefix, in key order."""
+        # Only walk the directory the prefix points into
+        directory = (self.root / prefix.rpartition("/")[0]).resolve()
+        if not (directory == self.root or self.root in directory.parents) or not directory.is_dir():
+            return
+
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = sorted(name for name in dirnames if name != LOCAL_META_DIR)
+            relative_dir = Path(dirpath).relative_to(self.root)
+            for name in sorted(filenames):
+                key = (relative_dir / name).as_posix()
+                if name.startswith(LOCAL_TEMP_PREFIX) or not key.startswith(prefix):
+                    continue
+                yield key
+
+    def get_file_metadata(self, file_key: str) -> Optional[Dict]:
+        """Get a file's size, modification time and stored metadata."""
+        try:
+            stat = self.path(file_key).stat()
+        except (OSError, ValueError):
+            return None
+
+        try:
+            sidecar = json.loads(self._meta_path(file_key).read_text())
+        except (OSError, ValueError):
+            sidecar = {}
+
+        return {
+            "content_type": sidecar.get("content_type", "application/octet-stream"),
+            "content_length": stat.st_size,
+            "last_modified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            "metadata": sidecar.get("metadata", {})
+        }
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Get the configured storage backend.
+
+    Also usable as a FastAPI dependency.
+    """
+    global _storage
+    if _storage is None:
+        if settings.storage_backend == "local":
+            _storage = LocalStorage(settings.upload_dir)
+        else:
+            # Imported here: s3_storage itself builds on this module
+            from .s3_storage import s3_service
+            _storage = s3_service
+    return _storage
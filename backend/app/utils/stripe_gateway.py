@@ -0,0 +1,256 @@
+"""Non-blocking gateway for Stripe SDK calls.
+
+The ``stripe`` SDK is synchronous, so every call is dispatched to a small
+thread pool instead of running on the event loop. Read calls are cached per
+customer and identical in-flight reads are coalesced into one SDK request.
+When Stripe reports a change, ``invalidate_stripe_customer`` drops the
+customer's reads in every API process (see ``app.utils.cache_invalidation``).
+
+Calls run in the caller's context, are timed as the ``stripe`` span and send
+the current request id to Stripe in an ``X-Request-ID`` header.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+from app.config import settings
+from app.utils.cache_invalidation import invalidation_listener, publish_invalidation
+from app.utils.lazy import lazy_import
+from app.utils.request_context import outbound_headers
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def _configure_stripe(module) -> None:
+    module.api_key = settings.stripe_secret_key
+    module.default_http_client = _request_id_http_client(module)
+
+
+def _request_id_http_client(module):
+    """Stripe's default HTTP client, sending the current request id with every call."""
+    class RequestIdHTTPClient(module.RequestsClient):
+        def request(self, method, url, headers, post_data=None, **kwargs):
+            return super().request(method, url, {**headers, **outbound_headers()}, post_data, **kwargs)
+
+    return RequestIdHTTPClient(verify_ssl_certs=module.verify_ssl_certs, proxy=module.proxy)
+
+
+# Imported (and configured) on the first Stripe call
+stripe = lazy_import("stripe", on_load=_configure_stripe)
+
+_MISSING = object()
+
+
+class StripeGateway:
+    """Runs Stripe SDK calls off the event loop with caching and coalescing.
+
+    Args:
+        client: Module or object exposing the Stripe resources used here
+            (``Invoice``, ``Customer``, ``PaymentMethod``...). Defaults to the
+            real ``stripe`` module; tests pass a local fake.
+        cache_ttl_seconds: How long read results are kept per customer
+        max_workers: Size of the thread pool used for SDK calls
+    """
+
+    def __init__(
+        self,
+        client: Any = stripe,
+        cache_ttl_seconds: int = 60,
+        max_workers: int = 8
+    ):
+        self.client = client
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="stripe"
+        )
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._cache: Dict[str, Dict[Hashable, Tuple[float, Any]]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking SDK call in the gateway's thread pool.
+
+        Args:
+            func: SDK callable (e.g. ``stripe.Customer.create``)
+
+        Returns:
+            Whatever the SDK call returns
+        """
+        loop = asyncio.get_running_loop()
+        # Executor threads do not inherit context variables (request id)
+        context = contextvars.copy_context()
+        with span("stripe"):
+            return await loop.run_in_executor(
+                self._executor,
+                functools.partial(context.run, func, *args, **kwargs)
+            )
+
+    async def read(
+        self,
+        customer_id: str,
+        key: Hashable,
+        func: Callable,
+        *args,
+        **kwargs
+    ) -> Any:
+        """Run a cached, coalesced read for a customer.
+
+        Concurrent callers asking for the same ``(customer_id, key)`` share one
+        SDK request. Successful results are cached until the TTL expires or the
+        customer is invalidated; errors are never cached.
+
+        Args:
+            customer_id: Stripe customer the read belongs to
+            key: Hashable identifier of the read (method and parameters)
+            func: SDK callable to run on a cache miss
+
+        Returns:
+            The (possibly cached) SDK result
+        """
+        cache_key = (customer_id, key)
+        cached = self._get_cached(customer_id, cache_key)
+        if cached is not _MISSING:
+            return cached
+
+        inflight = self._inflight.get(cache_key)
+        if inflight is None:
+            generation = self._generations.get(customer_id, 0)
+            inflight = asyncio.ensure_future(
+                self._fetch(customer_id, cache_key, generation, func, args, kwargs)
+            )
+            self._inflight[cache_key] = inflight
+            inflight.add_done_callback(
+                lambda _: self._inflight.pop(cache_key, None)
+            )
+
+        # Shield so one cancelled caller doesn't cancel the shared request
+        return await asyncio.shield(inflight)
+
+    async def _fetch(
+        self,
+        customer_id: str,
+        cache_key: Hashable,
+        generation: int,
+        func: Callable,
+        args: tuple,
+        kwargs: dict
+    ) -> Any:
+        """Execute a read and cache it unless the customer was invalidated meanwhile."""
+        result = await self.call(func, *args, **kwargs)
+        with self._lock:
+            if self._generations.get(customer_id, 0) == generation:
+                self._cache.setdefault(customer_id, {})[cache_key] = (
+                    time.monotonic() + self.cache_ttl_seconds,
+                    result
+                )
+        return result
+
+    def _get_cached(self, customer_id: str, cache_key: Hashable) -> Any:
+        """Return a cached value or the _MISSING sentinel."""
+        with self._lock:
+            entries = self._cache.get(customer_id)
+            if not entries or cache_key not in entries:
+                return _MISSING
+            expires_at, value = entries[cache_key]
+            if time.monotonic() >= expires_at:
+                del entries[cache_key]
+                return _MISSING
+            return value
+
+    def invalidate_customer(self, customer_id: Optional[str]) -> None:
+        """Drop all cached reads for a customer.
+
+        Args:
+            customer_id: Stripe customer ID (ignored if empty)
+        """
+        if not customer_id:
+            return
+        with self._lock:
+            self._cache.pop(customer_id, None)
+            self._generations[customer_id] = self._generations.get(customer_id, 0) + 1
+        logger.debug(f"Invalidated Stripe cache for customer {customer_id}")
+
+    def clear(self) -> None:
+        """Drop every cached read."""
+        with self._lock:
+            self._cache.clear()
+
+    # Read helpers
+
+    async def list_invoices(self, customer_id: str, limit: int = 10) -> list:
+        """List a customer's invoices."""
+        invoices = await self.read(
+            customer_id,
+            ("invoices", limit),
+            self.client.Invoice.list,
+            customer=customer_id,
+            limit=limit
+        )
+        return invoices.data
+
+    async def get_upcoming_invoice(self, customer_id: str) -> Any:
+        """Get a customer's upcoming invoice."""
+        return await self.read(
+            customer_id,
+            ("upcoming_invoice",),
+            self.client.Invoice.upcoming,
+            customer=customer_id
+        )
+
+    async def get_customer(self, customer_id: str) -> Any:
+        """Retrieve a customer."""
+        return await self.read(
+            customer_id,
+            ("customer",),
+            self.client.Customer.retrieve,
+            customer_id
+        )
+
+    async def get_default_payment_method(self, customer_id: str) -> Any:
+        """Retrieve a customer's default payment method (or None)."""
+        return await self.read(
+            customer_id,
+            ("default_payment_method",),
+            self._fetch_default_payment_method,
+            customer_id
+        )
+
+    def _fetch_default_payment_method(self, customer_id: str) -> Any:
+        """Customer and PaymentMethod lookups chained in one worker thread."""
+        customer = self.client.Customer.retrieve(customer_id)
+        payment_method_id = customer.invoice_settings.default_payment_method
+        if not payment_method_id:
+            return None
+        return self.client.PaymentMethod.retrieve(payment_method_id)
+
+
+# Singleton instance
+stripe_gateway = StripeGateway(cache_ttl_seconds=settings.stripe_cache_ttl_seconds)
+
+# Channel carrying the Stripe customers whose cached reads are stale
+CUSTOMER_INVALIDATION_CHANNEL = "stripe:customers:invalidate"
+
+invalidation_listener.register(CUSTOMER_INVALIDATION_CHANNEL, stripe_gateway.invalidate_customer, stripe_gateway.clear)
+
+
+def invalidate_stripe_customer(customer_id: Optional[str]) -> None:
+    """Drop a customer's cached reads in this and every other API process.
+
+    Args:
+        customer_id: Stripe customer ID (ignored if empty)
+    """
+    if not customer_id:
+        return
+    stripe_gateway.invalidate_customer(customer_id)
+    publish_invalidation(CUSTOMER_INVALIDATION_CHANNEL, customer_id)
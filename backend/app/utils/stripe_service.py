@@ -1,19 +1,22 @@
 """Stripe payment service for subscription management."""
 
-import stripe
+from __future__ import annotations
+
 from typing import Optional
 from datetime import datetime
 from fastapi import HTTPException, status
 
 from app.config import settings
 from app.models.subscription import PlanTier
-
-# Initialize Stripe
-stripe.api_key = settings.stripe_secret_key
+from app.utils.stripe_gateway import invalidate_stripe_customer, stripe, stripe_gateway
 
 
 class StripeService:
-    """Service class for Stripe operations."""
+    """Service class for Stripe operations.
+    
+    All SDK calls go through ``stripe_gateway`` so they run off the event loop;
+    read calls are additionally cached per customer.
+    """
     
     # Map plan IDs to Stripe Price IDs
     PRICE_MAP = {
@@ -41,7 +44,8 @@ class StripeService:
             Stripe Customer object
         """
         try:
-            customer = stripe.Customer.create(
+            customer = await stripe_gateway.call(
+                stripe_gateway.client.Customer.create,
                 email=email,
                 name=name,
                 metadata=metadata or {}
@@ -81,7 +85,8 @@ class StripeService:
             )
         
         try:
-            session = stripe.checkout.Session.create(
+            session = await stripe_gateway.call(
+                stripe_gateway.client.checkout.Session.create,
                 customer=customer_id,
                 payment_method_types=["card"],
                 line_items=[{
@@ -117,7 +122,8 @@ class StripeService:
             Stripe billing portal Session object
         """
         try:
-            session = stripe.billing_portal.Session.create(
+            session = await stripe_gateway.call(
+                stripe_gateway.client.billing_portal.Session.create,
                 customer=customer_id,
                 return_url=return_url,
             )
@@ -141,7 +147,10 @@ class StripeService:
             Stripe Subscription object
         """
         try:
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            subscription = await stripe_gateway.call(
+                stripe_gateway.client.Subscription.retrieve,
+                subscription_id
+            )
             return subscription
         except stripe.error.StripeError as e:
             raise HTTPException(
@@ -180,10 +189,12 @@ class StripeService:
             if cancel_at_period_end is not None:
                 params["cancel_at_period_end"] = cancel_at_period_end
             
-            subscription = stripe.Subscription.modify(
+            subscription = await stripe_gateway.call(
+                stripe_gateway.client.Subscription.modify,
                 subscription_id,
                 **params
             )
+            invalidate_stripe_customer(subscription.customer)
             return subscription
         except stripe.error.StripeError as e:
             raise HTTPException(
@@ -207,12 +218,17 @@ class StripeService:
         """
         try:
             if immediately:
-                subscription = stripe.Subscription.cancel(subscription_id)
+                subscription = await stripe_gateway.call(
+                    stripe_gateway.client.Subscription.cancel,
+                    subscription_id
+                )
             else:
-                subscription = stripe.Subscription.modify(
+                subscription = await stripe_gateway.call(
+                    stripe_gateway.client.Subscription.modify,
                     subscription_id,
                     cancel_at_period_end=True
                 )
+            invalidate_stripe_customer(subscription.customer)
             return subscription
         except stripe.error.StripeError as e:
             raise HTTPException(
@@ -235,11 +251,7 @@ class StripeService:
             List of Stripe Invoice objects
         """
         try:
-            invoices = stripe.Invoice.list(
-                customer=customer_id,
-                limit=limit
-            )
-            return invoices.data
+            return await stripe_gateway.list_invoices(customer_id, limit=limit)
         except stripe.error.StripeError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -259,8 +271,7 @@ class StripeService:
             Stripe Invoice object or None
         """
         try:
-            invoice = stripe.Invoice.upcoming(customer=customer_id)
-            return invoice
+            return await stripe_gateway.get_upcoming_invoice(customer_id)
         except stripe.error.InvalidRequestError:
             # No upcoming invoice
             return None
@@ -283,13 +294,7 @@ class StripeService:
             Stripe PaymentMethod object or None
         """
         try:
-            customer = stripe.Customer.retrieve(customer_id)
-            if customer.invoice_settings.default_payment_method:
-                payment_method = stripe.PaymentMethod.retrieve(
-                    customer.invoice_settings.default_payment_method
-                )
-                return payment_method
-            return None
+            return await stripe_gateway.get_default_payment_method(customer_id)
         except stripe.error.StripeError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
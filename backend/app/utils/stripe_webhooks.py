@@ -0,0 +1,294 @@
+"""Durable inbox and ordered processing for Stripe webhook events.
+
+The webhook endpoint only verifies and persists events (see ``record_event``)
+and acknowledges Stripe immediately. Events are then applied by the
+``process_stripe_webhook_events`` Celery task, which drains one customer's
+pending events in Stripe creation order. The Stripe event ID is the inbox
+primary key, so redeliveries are never applied twice. Events left
+unprocessed (the task could not be enqueued or ran out of retries) are
+re-enqueued when Stripe redelivers them and by the periodic
+``drain_stripe_webhook_inbox`` task.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+import json
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.company import Company
+from app.models.subscription import Subscription, SubscriptionStatus, PlanTier
+from app.models.webhook import StripeWebhookEvent
+from app.middleware.subscription import invalidate_entitlements
+from app.utils.stripe_gateway import invalidate_stripe_customer, stripe
+
+logger = logging.getLogger(__name__)
+
+# Inbox key for events that are not tied to a Stripe customer
+NO_CUSTOMER = "_none"
+
+# Inbox statuses of events still to be applied
+UNPROCESSED_STATUSES = ("pending", "processing", "failed")
+
+
+def event_customer_id(event: stripe.Event) -> Optional[str]:
+    """Extract the Stripe customer an event belongs to.
+
+    Args:
+        event: Verified Stripe event
+
+    Returns:
+        Stripe customer ID or None
+    """
+    data_object = event.data.object
+    if data_object.get("object") == "customer":
+        return data_object.get("id")
+    return data_object.get("customer")
+
+
+def record_event(
+    db: Session,
+    event: stripe.Event,
+    payload: bytes
+) -> Tuple[StripeWebhookEvent, bool]:
+    """Persist a verified event in the inbox.
+
+    Args:
+        db: Database session
+        event: Verified Stripe event
+        payload: Raw request body the event was verified from
+
+    Returns:
+        Tuple of (inbox row, created). ``created`` is False for redeliveries.
+    """
+    existing = db.get(StripeWebhookEvent, event.id)
+    if existing:
+        return existing, False
+
+    inbox_event = StripeWebhookEvent(
+        id=event.id,
+        event_type=event.type,
+        stripe_customer_id=event_customer_id(event) or NO_CUSTOMER,
+        payload=payload.decode("utf-8"),
+        status="pending",
+        stripe_created_at=datetime.utcfromtimestamp(event.created)
+    )
+    db.add(inbox_event)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Concurrent redelivery won the insert race
+        db.rollback()
+        return db.get(StripeWebhookEvent, event.id), False
+
+    return inbox_event, True
+
+
+def enqueue_customer_events(customer_id: str) -> None:
+    """Schedule processing of a customer's pending inbox events.
+
+    Args:
+        customer_id: Stripe customer ID (or NO_CUSTOMER)
+    """
+    from app.tasks import process_stripe_webhook_events
+
+    process_stripe_webhook_events.delay(customer_id)
+
+
+def customers_with_unprocessed_events(db: Session) -> List[str]:
+    """List the customers whose inbox still holds unprocessed events.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Stripe customer IDs (or NO_CUSTOMER)
+    """
+    return list(db.execute(
+        select(StripeWebhookEvent.stripe_customer_id)
+        .where(StripeWebhookEvent.status.in_(UNPROCESSED_STATUSES))
+        .distinct()
+    ).scalars())
+
+
+def process_customer_events(db: Session, customer_id: str) -> int:
+    """Apply a customer's unprocessed events in Stripe creation order.
+
+    Processing stops at the first failure so that later events for the same
+    customer are never applied before an earlier one. The failed event keeps
+    its place in the queue and is retried by the caller.
+
+    Callers must ensure only one drain runs per customer at a time (the Celery
+    task holds a Redis lock for this).
+
+    Args:
+        db: Database session
+        customer_id: Stripe customer ID (or NO_CUSTOMER)
+
+    Returns:
+        Number of events applied
+
+    Raises:
+        Exception: Re-raised from the first event that failed to apply
+    """
+    pending = db.execute(
+        select(StripeWebhookEvent)
+        .where(StripeWebhookEvent.stripe_customer_id == customer_id)
+        .where(StripeWebhookEvent.status.in_(UNPROCESSED_STATUSES))
+        .order_by(StripeWebhookEvent.stripe_created_at, StripeWebhookEvent.received_at)
+    ).scalars().all()
+
+    applied = 0
+    for inbox_event in pending:
+        inbox_event.status = "processing"
+        inbox_event.attempts = (inbox_event.attempts or 0) + 1
+        db.commit()
+
+        try:
+            event = stripe.Event.construct_from(json.loads(inbox_event.payload), stripe.api_key)
+            dispatch_event(event, db)
+        except Exception as e:
+            db.rollback()
+            inbox_event.status = "failed"
+            inbox_event.last_error = str(e)
+            db.commit()
+            logger.error(f"Failed to apply Stripe event {inbox_event.id} ({inbox_event.event_type}): {e}")
+            raise
+
+        inbox_event.status = "processed"
+        inbox_event.last_error = None
+        inbox_event.processed_at = datetime.utcnow()
+        db.commit()
+        applied += 1
+
+    return applied
+
+
+def dispatch_event(event: stripe.Event, db: Session) -> None:
+    """Route a Stripe event to its handler.
+
+    Args:
+        event: Stripe event reconstructed from the inbox
+        db: Database session
+    """
+    logger.info(f"Applying Stripe event {event.id}: {event.type}")
+
+    if event.type == "customer.subscription.created":
+        handle_subscription_created(event.data.object, db)
+    elif event.type == "customer.subscription.updated":
+        handle_subscription_updated(event.data.object, db)
+    elif event.type == "customer.subscription.deleted":
+        handle_subscription_deleted(event.data.object, db)
+    elif event.type == "invoice.payment_succeeded":
+        handle_payment_succeeded(event.data.object, db)
+    elif event.type == "invoice.payment_failed":
+        handle_payment_failed(event.data.object, db)
+
+    # Cached Stripe reads for this customer are now stale in every API process
+    invalidate_stripe_customer(event_customer_id(event))
+
+
+def handle_subscription_created(subscription_data: stripe.Subscription, db: Session):
+    """Handle subscription.created webhook."""
+    company_id = subscription_data.metadata.get("company_id")
+    if not company_id:
+        logger.error("No company_id in subscription metadata")
+        return
+
+    # Redelivered or replayed event - subscription already recorded
+    existing = db.execute(
+        select(Subscription)
+        .where(Subscription.stripe_subscription_id == subscription_data.id)
+    ).scalar_one_or_none()
+    if existing:
+        logger.info(f"Subscription {subscription_data.id} already recorded")
+        return
+
+    # Create subscription record
+    subscription = Subscription(
+        company_id=company_id,
+        stripe_subscription_id=subscription_data.id,
+        stripe_customer_id=subscription_data.customer,
+        plan_id=subscription_data.metadata.get("plan_id", PlanTier.FREE.value),
+        status=subscription_data.status,
+        current_period_start=datetime.fromtimestamp(subscription_data.current_period_start),
+        current_period_end=datetime.fromtimestamp(subscription_data.current_period_end),
+        cancel_at_period_end=subscription_data.cancel_at_period_end,
+        trial_start=datetime.fromtimestamp(subscription_data.trial_start) if subscription_data.trial_start else None,
+        trial_end=datetime.fromtimestamp(subscription_data.trial_end) if subscription_data.trial_end else None
+    )
+
+    db.add(subscription)
+
+    # Update company
+    company = db.execute(
+        select(Company).where(Company.id == company_id)
+    ).scalar_one_or_none()
+    if company:
+        company.stripe_subscription_id = subscription_data.id
+
+    db.commit()
+    invalidate_entitlements(company_id)
+    logger.info(f"Created subscription {subscription.id} for company {company_id}")
+
+
+def handle_subscription_updated(sub_data: stripe.Subscription, db: Session):
+    """Handle subscription.updated webhook."""
+    subscription = db.execute(
+        select(Subscription)
+        .where(Subscription.stripe_subscription_id == sub_data.id)
+    ).scalar_one_or_none()
+
+    if not subscription:
+        logger.error(f"Subscription not found: {sub_data.id}")
+        return
+
+    # Update subscription
+    subscription.status = sub_data.status
+    subscription.current_period_start = datetime.fromtimestamp(sub_data.current_period_start)
+    subscription.current_period_end = datetime.fromtimestamp(sub_data.current_period_end)
+    subscription.cancel_at_period_end = sub_data.cancel_at_period_end
+
+    if sub_data.canceled_at:
+        subscription.canceled_at = datetime.fromtimestamp(sub_data.canceled_at)
+
+    db.commit()
+    invalidate_entitlements(subscription.company_id)
+    logger.info(f"Updated subscription {subscription.id}")
+
+
+def handle_subscription_deleted(sub_data: stripe.Subscription, db: Session):
+    """Handle subscription.deleted webhook."""
+    subscription = db.execute(
+        select(Subscription)
+        .where(Subscription.stripe_subscription_id == sub_data.id)
+    ).scalar_one_or_none()
+
+    if not subscription:
+        logger.error(f"Subscription not found: {sub_data.id}")
+        return
+
+    # Update status to canceled
+    subscription.status = SubscriptionStatus.CANCELED.value
+    subscription.canceled_at = datetime.utcnow()
+
+    db.commit()
+    invalidate_entitlements(subscription.company_id)
+    logger.info(f"Canceled subscription {subscription.id}")
+
+
+def handle_payment_succeeded(invoice_data: stripe.Invoice, db: Session):
+    """Handle invoice.payment_succeeded webhook."""
+    logger.info(f"Payment succeeded for invoice {invoice_data.id}")
+    # TODO: Send receipt email
+
+
+def handle_payment_failed(invoice_data: stripe.Invoice, db: Session):
+    """Handle invoice.payment_failed webhook."""
+    logger.error(f"Payment failed for invoice {invoice_data.id}")
+    # TODO: Send payment failed email
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..auth.security import get_current_user
 from ..models.user import User
+from .request_context import request_id_var
 
 
 def get_company_context(current_user: User = Depends(get_current_user)) -> str:
@@ -238,7 +239,8 @@ async def log_cross_company_attempt(
         user_agent=details.get("user_agent"),
         details=details,
         success=False,
-        error_message="Attempted cross-company access"
+        error_message="Attempted cross-company access",
+        request_id=request_id_var.get()
     )
     
     try:
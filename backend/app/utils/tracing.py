@@ -0,0 +1,42 @@
+"""Lightweight span timing of request stages.
+
+``span`` times one stage of the work done for a request, typically an
+outbound call::
+
+    with span("stripe"):
+        customer = stripe.Customer.create(email=email)
+
+Each duration is observed in the ``span_duration_seconds`` histogram (the
+latency of a stage across requests) and added to the ``RequestTrace`` of
+the current request, which ``RequestContextMiddleware`` returns in the
+``Server-Timing`` response header (the breakdown of one request). SQL time
+is added to the trace as ``db`` by the engine hooks.
+
+Span names label a Prometheus series: use a fixed set of stage names, never
+ids.
+"""
+
+from contextlib import contextmanager
+from typing import Iterator
+import time
+
+from .metrics import SPAN_DURATION
+from .request_context import current_trace
+
+
+def record_span(name: str, duration: float) -> None:
+    """Record ``duration`` seconds spent in stage ``name``."""
+    SPAN_DURATION.labels(name).observe(duration)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, duration)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage ``name`` (errors included)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
@@ -0,0 +1,118 @@
+"""Warm up connection pools and lazily loaded SDKs before serving traffic.
+
+Run from the application lifespan, after the databases are connected, so
+the first requests of a new pod do not pay for opening connections or
+importing SDKs. Every step is best effort: a failure is logged and the
+remaining steps still run.
+"""
+
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+import anyio.to_thread
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupReport:
+    """Duration of each warmup step, and the steps that failed."""
+
+    durations: Dict[str, float] = field(default_factory=dict)
+    failures: Dict[str, str] = field(default_factory=dict)
+
+
+async def warm_database() -> int:
+    """Open the connections of the SQLAlchemy pool.
+
+    Connections are checked out concurrently so the pool grows to its
+    size; they stay open once returned. No more connections are opened
+    than the threadpool can check out at once, since every checkout holds
+    a thread until all of them are open.
+
+    Returns:
+        Number of connections opened
+    """
+    if not isinstance(engine.pool, QueuePool):
+        # e.g. SQLite, whose connections belong to the thread that opened them
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return 1
+
+    thread_limit = int(anyio.to_thread.current_default_thread_limiter().total_tokens)
+    connections = max(1, min(engine.pool.size(), thread_limit))
+    # Hold every connection until all are open, so they are distinct
+    all_open = threading.Barrier(connections)
+
+    def checkout() -> None:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            all_open.wait(timeout=10)
+
+    await asyncio.gather(*(run_in_threadpool(checkout) for _ in range(connections)))
+    return connections
+
+
+async def warm_rate_limiter() -> None:
+    """Connect to Redis and load the rate limiting script."""
+    from app.middleware.rate_limit import rate_limiter
+
+    if rate_limiter.store is not None:
+        await rate_limiter.store.warmup()
+
+
+async def warm_sdks() -> List[str]:
+    """Import the SDKs of configured services (they load lazily otherwise).
+
+    Returns:
+        Names of the SDKs imported
+    """
+    loaded = []
+    if settings.stripe_secret_key:
+        from app.utils.stripe_gateway import stripe
+
+        await run_in_threadpool(dir, stripe)
+        loaded.append("stripe")
+    return loaded
+
+
+def warmup_steps() -> List[Tuple[str, Callable[[], Awaitable]]]:
+    """Steps run by ``warmup``, in order."""
+    steps = [("database", warm_database), ("sdks", warm_sdks)]
+    if settings.rate_limit_enabled:
+        steps.append(("rate_limiter", warm_rate_limiter))
+    return steps
+
+
+async def warmup(timeout: float = 10.0) -> WarmupReport:
+    """Run every warmup step.
+
+    Args:
+        timeout: Seconds allowed per step
+
+    Returns:
+        Step durations and failures
+    """
+    report = WarmupReport()
+    for name, step in warmup_steps():
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(step(), timeout)
+        except Exception as e:
+            report.failures[name] = str(e) or type(e).__name__
+            logger.warning(f"Warmup step {name} failed: {report.failures[name]}")
+        report.durations[name] = time.perf_counter() - start
+    logger.info(
+        "Warmup finished: " + ", ".join(f"{name} {duration * 1000:.0f}ms" for name, duration in report.durations.items())
+    )
+    return report
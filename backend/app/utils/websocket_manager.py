@@ -6,9 +6,19 @@ import json
 import logging
 from datetime import datetime
 
+from .request_context import request_id_var
+
 logger = logging.getLogger(__name__)
 
 
+def with_request_id(message: dict) -> dict:
+    """Tag a message with the id of the request that triggered it, if any."""
+    request_id = request_id_var.get()
+    if request_id is None or "request_id" in message:
+        return message
+    return {**message, "request_id": request_id}
+
+
 class ConnectionManager:
     """Manages WebSocket connections for real-time notifications."""
     
@@ -71,7 +81,7 @@ class ConnectionManager:
     async def send_personal_message(self, websocket: WebSocket, message: dict):
         """Send a message to a specific WebSocket connection."""
         try:
-            await websocket.send_json(message)
+            await websocket.send_json(with_request_id(message))
         except Exception as e:
             logger.error(f"Failed to send personal message: {e}")
             self.disconnect(websocket)
@@ -88,6 +98,7 @@ class ConnectionManager:
         
         # Get all connections for this company
         connections = self.active_connections[company_id].copy()
+        message = with_request_id(message)
         
         # Send to all connections (except excluded one)
         disconnected = []
@@ -0,0 +1,6 @@
+"""Load-test and benchmark suite.
+
+Generates large synthetic tenants and drives the API in-process through
+scripted scenarios, reporting p50/p95/p99 latency and throughput and
+comparing them against a stored baseline. See ``python -m benchmarks --help``.
+"""
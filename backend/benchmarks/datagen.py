@@ -0,0 +1,220 @@
+"""Synthetic tenants for benchmarks.
+
+Generates ``companies`` companies, each with one admin and one manager
+user, ``employees`` employees, ``transactions`` transactions, ``shifts``
+shifts per employee and ``payroll_runs`` completed payroll runs (with one
+item per employee), plus one draft run used by the payroll processing
+scenario. Rows are written with bulk ``INSERT ... VALUES`` statements in
+batches, so large tenants can be generated in seconds on SQLite or
+PostgreSQL.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterator, List
+import random
+import uuid
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from app.auth.security import get_password_hash
+from app.database import Base
+from app.models import Employee, PayrollItem, PayrollRun, Shift, Transaction
+from app.models.company import Company
+from app.models.user import User
+
+BENCHMARK_PASSWORD = "Benchmark2026!"
+BATCH_SIZE = 5000
+
+DEPARTMENTS = ["Operations", "Sales", "Engineering", "Finance", "Support", "Logistics"]
+EXPENSE_CATEGORIES = ["Payroll", "Rent", "Utilities", "Supplies", "Marketing", "Travel"]
+INCOME_CATEGORIES = ["Sales", "Services", "Subscriptions"]
+
+
+@dataclass
+class Scale:
+    """Size of the generated data set."""
+
+    companies: int = 3
+    employees: int = 100  # per company
+    transactions: int = 2000  # per company
+    shifts: int = 20  # per employee
+    payroll_runs: int = 6  # completed runs per company
+
+
+@dataclass
+class Tenant:
+    """Generated company and the credentials used by scenarios."""
+
+    company_id: str
+    admin_email: str
+    manager_email: str
+    draft_payroll_run_id: str
+    employee_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Dataset:
+    """Generated tenants and the number of rows inserted per table."""
+
+    scale: Scale
+    tenants: List[Tenant]
+    row_counts: Dict[str, int]
+
+
+def _batches(rows: List[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def generate(engine: Engine, scale: Scale, seed: int = 42) -> Dataset:
+    """Create the schema and insert a synthetic data set.
+
+    Args:
+        engine: Engine of the benchmark database (should be empty)
+        scale: Size of the data set
+        seed: Random seed, so runs are comparable
+
+    Returns:
+        The generated tenants and row counts
+    """
+    rng = random.Random(seed)
+    Base.metadata.create_all(bind=engine)
+    # Hashing is deliberately slow, so every user shares one hash
+    password_hash = get_password_hash(BENCHMARK_PASSWORD)
+    now = datetime.utcnow()
+    today = date.today()
+
+    rows: Dict[type, List[dict]] = {model: [] for model in (
+        Company, User, Employee, Transaction, Shift, PayrollRun, PayrollItem
+    )}
+    tenants = []
+
+    for c in range(scale.companies):
+        company_id = str(uuid.uuid4())
+        domain = f"bench{c}.example.com"
+        rows[Company].append({
+            "id": company_id,
+            "name": f"Benchmark Company {c}",
+            "email": f"billing@{domain}",
+            "status": "active",
+        })
+
+        tenant = Tenant(
+            company_id=company_id,
+            admin_email=f"admin@{domain}",
+            manager_email=f"manager@{domain}",
+            draft_payroll_run_id=str(uuid.uuid4())
+        )
+        for role, email in (("company_admin", tenant.admin_email), ("manager", tenant.manager_email)):
+            rows[User].append({
+                "id": str(uuid.uuid4()),
+                "company_id": company_id,
+                "email": email,
+                "hashed_password": password_hash,
+                "first_name": role.split("_")[-1].title(),
+                "last_name": f"Bench{c}",
+                "role": role,
+                "is_active": True,
+                "twofa_enabled": False,
+            })
+
+        salaries = {}
+        for e in range(scale.employees):
+            employee_id = str(uuid.uuid4())
+            salary = Decimal(rng.randrange(3000, 12000))
+            salaries[employee_id] = salary
+            tenant.employee_ids.append(employee_id)
+            rows[Employee].append({
+                "id": employee_id,
+                "company_id": company_id,
+                "first_name": f"First{e}",
+                "last_name": f"Last{e}",
+                "email": f"employee{e}@{domain}",
+                "position": "Associate",
+                "department": rng.choice(DEPARTMENTS),
+                "hire_date": today - timedelta(days=rng.randrange(30, 3000)),
+                "employment_type": "full_time",
+                "status": "active" if rng.random() < 0.9 else "on_leave",
+                "salary_amount": salary,
+            })
+            for s in range(scale.shifts):
+                shift_date = today - timedelta(days=s)
+                start = datetime.combine(shift_date, datetime.min.time()) + timedelta(hours=rng.choice((6, 8, 14)))
+                rows[Shift].append({
+                    "id": str(uuid.uuid4()),
+                    "company_id": company_id,
+                    "employee_id": employee_id,
+                    "shift_date": shift_date,
+                    "start_time": start,
+                    "end_time": start + timedelta(hours=8),
+                    "status": "completed",
+                })
+
+        for _ in range(scale.transactions):
+            is_income = rng.random() < 0.4
+            rows[Transaction].append({
+                "id": str(uuid.uuid4()),
+                "company_id": company_id,
+                "type": "income" if is_income else "expense",
+                "category": rng.choice(INCOME_CATEGORIES if is_income else EXPENSE_CATEGORIES),
+                "amount": Decimal(rng.randrange(1000, 500000)) / 100,
+                "description": "Benchmark transaction",
+                "transaction_date": today - timedelta(days=rng.randrange(0, 365)),
+            })
+
+        # Completed monthly runs going back from last month, plus a draft
+        period_end = today.replace(day=1) - timedelta(days=1)
+        for _ in range(scale.payroll_runs):
+            period_start = period_end.replace(day=1)
+            run_id = str(uuid.uuid4())
+            total = Decimal(0)
+            for employee_id, salary in salaries.items():
+                tax = (salary * Decimal("0.20")).quantize(Decimal("0.01"))
+                total += salary - tax
+                rows[PayrollItem].append({
+                    "id": str(uuid.uuid4()),
+                    "company_id": company_id,
+                    "payroll_run_id": run_id,
+                    "employee_id": employee_id,
+                    "base_salary": salary,
+                    "tax_amount": tax,
+                    "net_amount": salary - tax,
+                    "payment_status": "paid",
+                    "payment_date": now,
+                })
+            rows[PayrollRun].append({
+                "id": run_id,
+                "company_id": company_id,
+                "period_start": period_start,
+                "period_end": period_end,
+                "status": "completed",
+                "total_amount": total,
+                "processed_at": now,
+            })
+            period_end = period_start - timedelta(days=1)
+
+        rows[PayrollRun].append({
+            "id": tenant.draft_payroll_run_id,
+            "company_id": company_id,
+            "period_start": today.replace(day=1),
+            "period_end": today,
+            "status": "draft",
+            "total_amount": None,
+            "processed_at": None,
+        })
+        tenants.append(tenant)
+
+    # Parents first, so foreign keys are satisfied on PostgreSQL
+    with engine.begin() as conn:
+        for model, model_rows in rows.items():
+            for batch in _batches(model_rows):
+                conn.execute(insert(model.__table__), batch)
+
+    return Dataset(
+        scale=scale,
+        tenants=tenants,
+        row_counts={model.__tablename__: len(model_rows) for model, model_rows in rows.items()}
+    )
@@ -0,0 +1,162 @@
+"""Timing, statistics and baseline comparison for benchmark scenarios."""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import json
+import logging
+import time
+
+from .scenarios import BenchmarkContext, Scenario
+
+logger = logging.getLogger(__name__)
+
+# Statistics compared against the baseline; higher is worse for all of them
+COMPARED_STATS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile of a list of values, interpolating between ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+@dataclass
+class ScenarioResult:
+    """Latencies of the timed iterations of one scenario."""
+
+    name: str
+    latencies: List[float] = field(default_factory=list)  # seconds
+    errors: List[str] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Latency percentiles (ms), throughput and error count."""
+        latencies_ms = [latency * 1000 for latency in self.latencies]
+        return {
+            "iterations": len(self.latencies) + len(self.errors),
+            "errors": len(self.errors),
+            "p50_ms": round(percentile(latencies_ms, 50), 3),
+            "p95_ms": round(percentile(latencies_ms, 95), 3),
+            "p99_ms": round(percentile(latencies_ms, 99), 3),
+            "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 3) if latencies_ms else 0.0,
+            "throughput_rps": round(len(self.latencies) / self.wall_time, 2) if self.wall_time else 0.0,
+        }
+
+
+def _timed(scenario: Scenario, ctx: BenchmarkContext, iteration: int, result: ScenarioResult) -> None:
+    scenario.prepare(ctx, iteration)
+    start = time.perf_counter()
+    try:
+        scenario.run(ctx, iteration)
+    except Exception as e:
+        result.errors.append(str(e))
+        logger.warning(f"{scenario.name} iteration {iteration} failed: {e}")
+        return
+    result.latencies.append(time.perf_counter() - start)
+
+
+def run_scenario(
+    scenario: Scenario,
+    ctx: BenchmarkContext,
+    iterations: int,
+    warmup: int = 5,
+    concurrency: int = 1
+) -> ScenarioResult:
+    """Run a scenario and time its iterations.
+
+    Args:
+        scenario: Scenario to run
+        ctx: Shared benchmark state
+        iterations: Number of timed iterations
+        warmup: Untimed iterations run first (connection pool, caches)
+        concurrency: Threads issuing iterations at once (scenarios that
+            cannot run concurrently always use one)
+
+    Returns:
+        Timings of the scenario
+    """
+    result = ScenarioResult(name=scenario.name)
+    scenario.setup(ctx)
+    try:
+        for iteration in range(warmup):
+            _timed(scenario, ctx, iteration, ScenarioResult(name=scenario.name))
+
+        workers = concurrency if scenario.concurrent else 1
+        start = time.perf_counter()
+        if workers == 1:
+            for iteration in range(iterations):
+                _timed(scenario, ctx, warmup + iteration, result)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda i: _timed(scenario, ctx, warmup + i, result), range(iterations)))
+        result.wall_time = time.perf_counter() - start
+    finally:
+        scenario.teardown(ctx)
+    return result
+
+
+def compare(
+    summaries: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = 0.25,
+    min_delta_ms: float = 1.0
+) -> List[str]:
+    """Find regressions against a baseline.
+
+    A statistic regresses when it is more than ``tolerance`` (relative) and
+    ``min_delta_ms`` (absolute, to ignore noise on very fast scenarios)
+    above the baseline. Scenarios missing from the baseline are skipped.
+
+    Args:
+        summaries: Current summaries by scenario name
+        baseline: Baseline summaries by scenario name
+        tolerance: Allowed relative slowdown (0.25 = 25%)
+        min_delta_ms: Allowed absolute slowdown in milliseconds
+
+    Returns:
+        One message per regression
+    """
+    regressions = []
+    for name, summary in summaries.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if summary["errors"] and not reference.get("errors"):
+            regressions.append(f"{name}: {summary['errors']} failed iterations")
+        for stat in COMPARED_STATS:
+            current, previous = summary[stat], reference.get(stat)
+            if previous is None:
+                continue
+            if current > previous * (1 + tolerance) and current - previous > min_delta_ms:
+                regressions.append(
+                    f"{name}: {stat} {current:.1f}ms vs baseline {previous:.1f}ms "
+                    f"(+{(current / previous - 1) * 100 if previous else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Dict[str, float]]]:
+    """Scenario summaries of a saved report (None if there is none)."""
+    try:
+        with open(path) as f:
+            return json.load(f)["scenarios"]
+    except FileNotFoundError:
+        return None
+
+
+def format_table(summaries: Dict[str, Dict[str, float]]) -> str:
+    """Render summaries as a plain text table."""
+    header = f"{'scenario':<20} {'n':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}"
+    lines = [header, "-" * len(header)]
+    for name, s in summaries.items():
+        lines.append(
+            f"{name:<20} {s['iterations']:>6} {s['errors']:>4} {s['p50_ms']:>9.1f} "
+            f"{s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['throughput_rps']:>8.1f}"
+        )
+    return "\n".join(lines)
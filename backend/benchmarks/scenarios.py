@@ -0,0 +1,228 @@
+"""Benchmark scenarios.
+
+Each scenario drives the API in-process through ``TestClient``, like a
+client would, spreading requests over the generated tenants. ``prepare``
+runs before every iteration outside of the timed section, e.g. to put a
+payroll run back in draft so it can be processed again.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+
+from app.models import PayrollRun
+
+from .datagen import BENCHMARK_PASSWORD, Dataset, Tenant
+
+
+class ScenarioError(Exception):
+    """An iteration got an unexpected response."""
+
+
+@dataclass
+class BenchmarkContext:
+    """State shared by the scenarios of a benchmark run."""
+
+    client: TestClient
+    engine: Engine
+    dataset: Dataset
+    # Access tokens by user email, obtained once before timing
+    tokens: Dict[str, str] = field(default_factory=dict)
+
+    def tenant(self, iteration: int) -> Tenant:
+        """Tenant used by an iteration (round robin)."""
+        return self.dataset.tenants[iteration % len(self.dataset.tenants)]
+
+    def headers(self, email: str) -> Dict[str, str]:
+        """Authorization headers for a generated user."""
+        if email not in self.tokens:
+            self.tokens[email] = login(self.client, email)
+        return {"Authorization": f"Bearer {self.tokens[email]}"}
+
+
+def login(client: TestClient, email: str) -> str:
+    """Log a generated user in and return the access token."""
+    response = client.post("/api/auth/login", json={"email": email, "password": BENCHMARK_PASSWORD})
+    check(response, 200)
+    return response.json()["access_token"]
+
+
+def check(response, expected_status: int) -> None:
+    """Raise ScenarioError unless the response has the expected status."""
+    if response.status_code != expected_status:
+        raise ScenarioError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text[:200]}")
+
+
+class Scenario:
+    """A scripted interaction with the API."""
+
+    name = ""
+    description = ""
+    # Whether iterations may run in parallel threads
+    concurrent = True
+
+    def setup(self, ctx: BenchmarkContext) -> None:
+        """Prepare the scenario once, before warmup."""
+        for tenant in ctx.dataset.tenants:
+            ctx.headers(tenant.admin_email)
+
+    def prepare(self, ctx: BenchmarkContext, iteration: int) -> None:
+        """Prepare one iteration (not timed)."""
+
+    def run(self, ctx: BenchmarkContext, iteration: int) -> None:
+        """Run one iteration (timed)."""
+        raise NotImplementedError
+
+    def teardown(self, ctx: BenchmarkContext) -> None:
+        """Release what setup acquired."""
+
+
+class LoginScenario(Scenario):
+    name = "login"
+    description = "POST /api/auth/login (includes password hashing)"
+
+    def setup(self, ctx):
+        pass
+
+    def run(self, ctx, iteration):
+        login(ctx.client, ctx.tenant(iteration).admin_email)
+
+
+class GetScenario(Scenario):
+    """GET an endpoint as the tenant admin."""
+
+    path = ""
+    params: Dict[str, object] = {}
+
+    def run(self, ctx, iteration):
+        headers = ctx.headers(ctx.tenant(iteration).admin_email)
+        check(ctx.client.get(self.path, params=self.params, headers=headers), 200)
+
+
+class DashboardScenario(GetScenario):
+    name = "dashboard"
+    description = "GET /api/dashboard"
+    path = "/api/dashboard"
+
+
+class DashboardChartsScenario(GetScenario):
+    name = "dashboard_charts"
+    description = "GET /api/dashboard/charts (12 months)"
+    path = "/api/dashboard/charts"
+    params = {"months": 12}
+
+
+class EmployeeListScenario(Scenario):
+    name = "employee_list"
+    description = "GET /api/employees, paging through the company"
+
+    def run(self, ctx, iteration):
+        tenant = ctx.tenant(iteration)
+        pages = max(ctx.dataset.scale.employees // 50, 1)
+        params = {"limit": 50, "skip": (iteration // len(ctx.dataset.tenants)) % pages * 50}
+        check(ctx.client.get("/api/employees", params=params, headers=ctx.headers(tenant.admin_email)), 200)
+
+
+class TransactionListScenario(GetScenario):
+    name = "transaction_list"
+    description = "GET /api/finances/transactions"
+    path = "/api/finances/transactions"
+    params = {"limit": 50}
+
+
+class PayrollProcessingScenario(Scenario):
+    name = "payroll_processing"
+    description = "POST /api/payroll/runs/{id}/process for every active employee"
+    # Processing the same run twice at once is rejected
+    concurrent = False
+
+    def setup(self, ctx):
+        for tenant in ctx.dataset.tenants:
+            ctx.headers(tenant.manager_email)
+
+    def prepare(self, ctx, iteration):
+        with ctx.engine.begin() as conn:
+            conn.execute(
+                update(PayrollRun)
+                .where(PayrollRun.id == ctx.tenant(iteration).draft_payroll_run_id)
+                .values(status="draft")
+            )
+
+    def run(self, ctx, iteration):
+        tenant = ctx.tenant(iteration)
+        response = ctx.client.post(
+            f"/api/payroll/runs/{tenant.draft_payroll_run_id}/process",
+            json={"include_all_employees": True},
+            headers=ctx.headers(tenant.manager_email)
+        )
+        check(response, 200)
+
+
+class EmployeeExportScenario(GetScenario):
+    name = "employee_export"
+    description = "GET /api/employees/export (CSV of the whole company)"
+    path = "/api/employees/export"
+
+
+class WebSocketFanoutScenario(Scenario):
+    """One manager broadcasts; time until every connected client received it."""
+
+    name = "websocket_fanout"
+    description = "WebSocket broadcast to every connection of a company"
+    concurrent = False
+
+    def __init__(self, connections: int = 50):
+        self.connections = connections
+        self._sessions: List = []
+        self._sender = None
+
+    def setup(self, ctx):
+        tenant = ctx.dataset.tenants[0]
+        token = ctx.headers(tenant.manager_email)["Authorization"].split(" ", 1)[1]
+        for _ in range(self.connections):
+            session = ctx.client.websocket_connect(f"/api/notifications/ws?token={token}")
+            session.__enter__()
+            session.receive_json()  # connection established
+            self._sessions.append(session)
+        self._sender = self._sessions[0]
+
+    def run(self, ctx, iteration):
+        self._sender.send_json({"type": "broadcast", "content": f"message {iteration}"})
+        for session in self._sessions[1:]:
+            message = session.receive_json()
+            if message.get("content") != f"message {iteration}":
+                raise ScenarioError(f"Unexpected WebSocket message: {message}")
+
+    def teardown(self, ctx):
+        for session in self._sessions:
+            session.__exit__(None, None, None)
+        self._sessions = []
+
+
+def all_scenarios(websocket_connections: int = 50) -> List[Scenario]:
+    """Every scenario, in the order they are run."""
+    return [
+        LoginScenario(),
+        DashboardScenario(),
+        DashboardChartsScenario(),
+        EmployeeListScenario(),
+        TransactionListScenario(),
+        PayrollProcessingScenario(),
+        EmployeeExportScenario(),
+        WebSocketFanoutScenario(websocket_connections),
+    ]
+
+
+def select_scenarios(names: Optional[List[str]], websocket_connections: int = 50) -> List[Scenario]:
+    """Scenarios by name (all of them when ``names`` is empty)."""
+    scenarios = all_scenarios(websocket_connections)
+    if not names:
+        return scenarios
+    by_name = {scenario.name: scenario for scenario in scenarios}
+    unknown = set(names) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))} (available: {', '.join(by_name)})")
+    return [by_name[name] for name in names]
@@ -0,0 +1,39 @@
+"""Install the S3 lifecycle rule that expires cached report PDFs.
+
+Cached reports are tagged ``report-cache=true`` on upload. The daily
+``evict_stale_reports`` task removes expired and superseded reports; this
+rule is a backstop that deletes anything the task missed.
+
+Examples:
+    python scripts/configure_report_lifecycle.py
+    python scripts/configure_report_lifecycle.py --days 45
+"""
+
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.utils.report_cache import REPORT_CACHE_TAG, REPORT_LIFECYCLE_RULE_ID
+from app.utils.s3_storage import s3_service
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Configure S3 expiry of cached reports")
+    parser.add_argument(
+        "--days",
+        type=int,
+        # One day of slack so the eviction task normally runs first
+        default=settings.report_cache_ttl_days + 1,
+        help="Days after upload before cached reports are deleted"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    s3_service.ensure_expiration_rule(REPORT_LIFECYCLE_RULE_ID, REPORT_CACHE_TAG, args.days)
+    print(f"Cached reports in s3://{s3_service.bucket_name} now expire after {args.days} days")
@@ -0,0 +1,85 @@
+"""Replay Stripe webhook events from the durable inbox.
+
+Examples:
+    # Re-queue every failed event
+    python scripts/replay_stripe_webhooks.py --status failed
+
+    # Re-apply specific events inline (no Celery worker needed)
+    python scripts/replay_stripe_webhooks.py --event-id evt_123 --event-id evt_456 --inline
+
+    # Re-queue everything for one customer received since a date
+    python scripts/replay_stripe_webhooks.py --customer cus_ABC --status processed --since 2026-10-01
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.models.webhook import StripeWebhookEvent
+from app.utils.stripe_webhooks import enqueue_customer_events, process_customer_events
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay Stripe webhook events from the inbox")
+    parser.add_argument("--event-id", action="append", default=[], help="Stripe event ID (repeatable)")
+    parser.add_argument("--customer", help="Only events for this Stripe customer ID")
+    parser.add_argument(
+        "--status",
+        default="failed",
+        choices=["pending", "processing", "failed", "processed", "all"],
+        help="Only events in this status (default: failed)"
+    )
+    parser.add_argument("--since", help="Only events received on/after this date (YYYY-MM-DD)")
+    parser.add_argument("--inline", action="store_true", help="Apply events in this process instead of Celery")
+    parser.add_argument("--dry-run", action="store_true", help="List matching events without replaying")
+    return parser.parse_args()
+
+
+def replay(args) -> None:
+    db = SessionLocal()
+    try:
+        query = db.query(StripeWebhookEvent)
+        if args.event_id:
+            query = query.filter(StripeWebhookEvent.id.in_(args.event_id))
+        if args.customer:
+            query = query.filter(StripeWebhookEvent.stripe_customer_id == args.customer)
+        if args.status != "all" and not args.event_id:
+            query = query.filter(StripeWebhookEvent.status == args.status)
+        if args.since:
+            query = query.filter(StripeWebhookEvent.received_at >= datetime.fromisoformat(args.since))
+
+        events = query.order_by(StripeWebhookEvent.stripe_created_at).all()
+        print(f"--- {len(events)} matching Stripe events ---")
+        for event in events:
+            print(f"  {event.id}  {event.event_type:<40} {event.status:<10} attempts={event.attempts}  customer={event.stripe_customer_id}")
+
+        if args.dry_run or not events:
+            return
+
+        # Reset to pending so the ordered drain picks them up again
+        customers = []
+        for event in events:
+            event.status = "pending"
+            event.last_error = None
+            if event.stripe_customer_id not in customers:
+                customers.append(event.stripe_customer_id)
+        db.commit()
+
+        for customer_id in customers:
+            if args.inline:
+                applied = process_customer_events(db, customer_id)
+                print(f"Applied {applied} events for customer {customer_id}")
+            else:
+                enqueue_customer_events(customer_id)
+                print(f"Queued replay for customer {customer_id}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    replay(parse_args())
@@ -6,13 +6,20 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from typing import Generator
+from unittest.mock import patch
 import os
 
+# Tests share one client address; rate limiting has its own tests
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
 from app.main import app
 from app.database import Base, get_db
 from app.models.user import User
 from app.models.company import Company
 from app.auth.security import get_password_hash
+from app.utils import storage as storage_module
+from app.utils.metrics import instrument_engine
+from app.utils.storage import LocalStorage
 
 # Use in-memory SQLite for testing
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///:memory:"
@@ -42,6 +49,29 @@ def db_session() -> Generator:
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def engine_options() -> dict:
+    """Extra ``create_engine`` arguments of ``instrumented_engine``; override per module."""
+    return {}
+
+
+@pytest.fixture
+def instrumented_engine(tmp_path, engine_options) -> Generator:
+    """File-backed SQLite engine with the metrics and query hooks installed."""
+    instrumented = create_engine(f"sqlite:///{tmp_path}/instrumented.db", **engine_options)
+    instrument_engine(instrumented)
+    yield instrumented
+    instrumented.dispose()
+
+
+@pytest.fixture(scope="function")
+def local_storage(tmp_path) -> Generator:
+    """Store files on local disk in a temporary directory instead of S3."""
+    backend = LocalStorage(str(tmp_path / "storage"))
+    with patch.object(storage_module, "_storage", backend):
+        yield backend
+
+
 @pytest.fixture(scope="function")
 def client(db_session) -> Generator:
     """Create a test client with database override."""
@@ -63,15 +93,10 @@ def client(db_session) -> Generator:
 def test_company(db_session) -> Company:
     """Create a test company."""
     company = Company(
+        id="8f14e45f-ceea-467f-a8f6-0c1e5c2b9d3a",
         name="Test Company",
-        domain="testcompany.com",
-        industry="Technology",
-        size="1-10",
-        address="123 Test St",
-        city="Test City",
-        state="TS",
-        zip_code="12345",
-        country="USA"
+        email="info@testcompany.com",
+        address="123 Test St"
     )
     db_session.add(company)
     db_session.commit()
@@ -83,10 +108,11 @@ def test_company(db_session) -> Company:
 def test_admin_user(db_session, test_company) -> User:
     """Create a test admin user."""
     user = User(
+        id="user-admin",
         email="admin@testcompany.com",
         first_name="Admin",
         last_name="User",
-        role="admin",
+        role="company_admin",
         hashed_password=get_password_hash("TestPassword123!"),
         is_active=True,
         company_id=test_company.id
@@ -101,6 +127,7 @@ def test_admin_user(db_session, test_company) -> User:
 def test_manager_user(db_session, test_company) -> User:
     """Create a test manager user."""
     user = User(
+        id="user-manager",
         email="manager@testcompany.com",
         first_name="Manager",
         last_name="User",
@@ -119,6 +146,7 @@ def test_manager_user(db_session, test_company) -> User:
 def test_employee_user(db_session, test_company) -> User:
     """Create a test employee user."""
     user = User(
+        id="user-employee",
         email="employee@testcompany.com",
         first_name="Employee",
         last_name="User",
@@ -0,0 +1,76 @@
+"""Tests for the benchmark data generator and statistics."""
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.models import Employee, PayrollItem, PayrollRun, Shift, Transaction
+from app.models.user import User
+from benchmarks.datagen import Scale, generate
+from benchmarks.runner import ScenarioResult, compare, percentile
+
+
+class TestDataGenerator:
+    """Test suite for the synthetic tenant generator."""
+
+    def test_generates_requested_scale(self, tmp_path):
+        """Every table gets N companies x M rows, linked to the right tenant."""
+        engine = create_engine(f"sqlite:///{tmp_path}/bench.db")
+        scale = Scale(companies=2, employees=5, transactions=30, shifts=3, payroll_runs=2)
+
+        dataset = generate(engine, scale)
+
+        with engine.connect() as conn:
+            def count(model, *where):
+                return conn.execute(select(func.count()).select_from(model).where(*where)).scalar()
+
+            tenant = dataset.tenants[0]
+            assert count(User) == 4
+            assert count(Employee, Employee.company_id == tenant.company_id) == 5
+            assert count(Transaction, Transaction.company_id == tenant.company_id) == 30
+            assert count(Shift) == 2 * 5 * 3
+            assert count(PayrollRun, PayrollRun.status == "completed") == 2 * 2
+            assert count(PayrollItem) == 2 * 2 * 5
+            assert conn.execute(
+                select(PayrollRun.status).where(PayrollRun.id == tenant.draft_payroll_run_id)
+            ).scalar() == "draft"
+        assert dataset.row_counts["transactions"] == 60
+        engine.dispose()
+
+
+class TestStatistics:
+    """Test suite for percentiles, summaries and baseline comparison."""
+
+    def test_percentile_interpolates(self):
+        """Percentiles interpolate between neighbouring ranks."""
+        values = [float(v) for v in range(1, 101)]
+
+        assert percentile(values, 50) == pytest.approx(50.5)
+        assert percentile(values, 99) == pytest.approx(99.01)
+        assert percentile([], 95) == 0.0
+
+    def test_summary(self):
+        """Summaries report milliseconds, errors and throughput."""
+        result = ScenarioResult(name="dashboard", latencies=[0.010, 0.020, 0.030], errors=["500"], wall_time=0.5)
+
+        summary = result.summary()
+
+        assert summary["iterations"] == 4
+        assert summary["errors"] == 1
+        assert summary["p50_ms"] == pytest.approx(20)
+        assert summary["throughput_rps"] == pytest.approx(6)
+
+    def test_compare_flags_regressions_only(self):
+        """Slowdowns beyond the relative and absolute tolerance are reported."""
+        baseline = {
+            "dashboard": {"errors": 0, "p50_ms": 20.0, "p95_ms": 30.0, "p99_ms": 40.0},
+            "fast": {"errors": 0, "p50_ms": 0.2, "p95_ms": 0.3, "p99_ms": 0.4},
+        }
+        current = {
+            "dashboard": {"errors": 0, "p50_ms": 21.0, "p95_ms": 45.0, "p99_ms": 41.0},
+            "fast": {"errors": 0, "p50_ms": 0.5, "p95_ms": 0.9, "p99_ms": 1.0},
+            "new": {"errors": 0, "p50_ms": 100.0, "p95_ms": 100.0, "p99_ms": 100.0},
+        }
+
+        regressions = compare(current, baseline, tolerance=0.25)
+
+        assert regressions == ["dashboard: p95_ms 45.0ms vs baseline 30.0ms (+50%)"]
@@ -0,0 +1,58 @@
+"""Tests for cross-process cache invalidation."""
+
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from app.utils import cache_invalidation
+from app.utils.cache_invalidation import InvalidationListener, publish_invalidation
+
+
+class TestInvalidationListener:
+    """Test suite for applying published invalidations."""
+
+    def test_messages_reach_their_cache(self):
+        """Each channel invalidates the cache registered for it only."""
+        listener = InvalidationListener()
+        entitlements, customers = MagicMock(), MagicMock()
+        listener.register("entitlements", entitlements.invalidate, entitlements.clear)
+        listener.register("customers", customers.invalidate, customers.clear)
+
+        listener.handle({"type": "subscribe", "channel": b"customers", "data": 2})
+        listener.handle({"type": "message", "channel": b"customers", "data": b"cus_1"})
+        listener.handle({"type": "message", "channel": b"unknown", "data": b"x"})
+
+        customers.invalidate.assert_called_once_with("cus_1")
+        entitlements.invalidate.assert_not_called()
+
+    def test_clear_drops_every_cache(self):
+        """Reconnecting clears every cache, whose invalidations may have been missed."""
+        listener = InvalidationListener()
+        caches = [MagicMock(), MagicMock()]
+        for n, cache in enumerate(caches):
+            listener.register(f"channel-{n}", cache.invalidate, cache.clear)
+
+        listener.clear()
+
+        assert all(cache.clear.call_count == 1 for cache in caches)
+
+
+class TestPublishInvalidation:
+    """Test suite for publishing invalidations."""
+
+    def test_publishes_key_on_channel(self):
+        """The key is published as a string on the cache's channel."""
+        publisher = MagicMock()
+        with patch.object(cache_invalidation, "_get_publisher", return_value=publisher):
+            publish_invalidation("customers", "cus_1")
+
+        publisher.publish.assert_called_once_with("customers", "cus_1")
+
+    def test_redis_errors_are_logged(self, caplog):
+        """An unreachable Redis never fails the caller."""
+        publisher = MagicMock()
+        publisher.publish.side_effect = redis.ConnectionError("down")
+        with patch.object(cache_invalidation, "_get_publisher", return_value=publisher):
+            publish_invalidation("customers", "cus_1")
+
+        assert "Failed to broadcast invalidation of cus_1" in caplog.text
@@ -0,0 +1,447 @@
+"""Tests for the MongoDB document index behind file listings."""
+
+import hashlib
+import io
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.auth import get_current_user
+from app.routers import files as files_router
+from app.utils import derivatives as derivatives_module
+from app.utils import document_index
+from app.utils.storage import LocalStorage, get_storage
+
+
+def _get(document, path):
+    for part in path.split("."):
+        if not isinstance(document, dict) or part not in document:
+            return None
+        document = document[part]
+    return document
+
+
+def _matches(document, filters):
+    for field, condition in filters.items():
+        value = _get(document, field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+        elif "$regex" in condition:
+            if not re.match(condition["$regex"], value):
+                return False
+        elif "$all" in condition:
+            if not set(condition["$all"]) <= set(value):
+                return False
+        elif "$in" in condition:
+            if value not in condition["$in"]:
+                return False
+        elif "$ne" in condition:
+            if value == condition["$ne"]:
+                return False
+        elif "$lte" in condition:
+            if value > condition["$lte"]:
+                return False
+        elif "$exists" in condition:
+            if (value is not None) != condition["$exists"]:
+                return False
+    return True
+
+
+def _apply(document, update):
+    for field, value in update.get("$set", {}).items():
+        document[field] = value
+    for field, value in update.get("$inc", {}).items():
+        document[field] = document.get(field, 0) + value
+
+
+class FakeCollection:
+    """In-memory stand-in for the Motor collection calls used by the index."""
+
+    def __init__(self):
+        self.documents = []
+
+    def matching(self, filters):
+        return [document for document in self.documents if _matches(document, filters)]
+
+    async def find(self, filters, projection=None):
+        for document in self.matching(filters):
+            yield dict(document)
+
+    async def find_one(self, filters):
+        found = self.matching(filters)
+        return dict(found[0]) if found else None
+
+    async def find_one_and_update(self, filters, update, upsert=False, return_document=None):
+        found = self.matching(filters)
+        if found:
+            document = found[0]
+        elif upsert:
+            document = {"_id": len(self.documents) + 1, **filters, **update.get("$setOnInsert", {})}
+            self.documents.append(document)
+        else:
+            return None
+        before = dict(document)
+        _apply(document, update)
+        return dict(document) if return_document else before
+
+    async def update_one(self, filters, update):
+        found = self.matching(filters)
+        if found:
+            _apply(found[0], update)
+        return SimpleNamespace(modified_count=len(found[:1]))
+
+    async def update_many(self, filters, update):
+        for document in self.matching(filters):
+            _apply(document, update)
+
+    async def find_one_and_delete(self, filters):
+        found = self.matching(filters)
+        if found:
+            self.documents.remove(found[0])
+            return found[0]
+        return None
+
+
+class FakeQuery:
+    """Stand-in for a Beanie FindMany query."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def count(self):
+        return len(self.documents)
+
+    def sort(self, field):
+        name = field.lstrip("-")
+        self.documents = sorted(self.documents, key=lambda d: d[name], reverse=field.startswith("-"))
+        return self
+
+    def skip(self, n):
+        self.documents = self.documents[n:]
+        return self
+
+    def limit(self, n):
+        self.documents = self.documents[:n]
+        return self
+
+    async def to_list(self):
+        return [SimpleNamespace(**document) for document in self.documents]
+
+    async def update(self, update):
+        for document in self.documents:
+            _apply(document, update)
+
+
+def _fake_model(defaults):
+    collection = FakeCollection()
+
+    class FakeModel:
+        """In-memory stand-in for a Beanie document model."""
+
+        def __init__(self, **fields):
+            self.fields = {**defaults(), **fields}
+
+        async def insert(self):
+            collection.documents.append(self.fields)
+
+        @classmethod
+        async def insert_many(cls, documents):
+            collection.documents.extend(document.fields for document in documents)
+
+        @classmethod
+        def find(cls, filters):
+            return FakeQuery(collection.matching(filters))
+
+        @classmethod
+        def get_motor_collection(cls):
+            return collection
+
+    return FakeModel, collection
+
+
+@pytest.fixture
+def index():
+    """Document and blob collections backed by in-memory fakes."""
+    documents_model, documents = _fake_model(lambda: {
+        "tags": [], "related_entity_type": None, "related_entity_id": None, "content_hash": None,
+        "blob_path": None, "derivatives": {}, "is_deleted": False, "deleted_at": None, "uploaded_at": datetime.utcnow()
+    })
+    blobs_model, blobs = _fake_model(dict)
+    with patch.object(document_index, "DocumentMetadata", documents_model), \
+            patch.object(derivatives_module, "DocumentMetadata", documents_model), \
+            patch.object(document_index, "DocumentBlob", blobs_model), \
+            patch.object(document_index, "get_mongodb_client", return_value=object()):
+        yield SimpleNamespace(documents=documents.documents, blobs=blobs.documents)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Local storage for uploaded files."""
+    return LocalStorage(str(tmp_path))
+
+
+@pytest.fixture
+def client(storage):
+    """Client for the files router as an admin of company co-1."""
+    app = FastAPI()
+    app.include_router(files_router.router, prefix="/api/files")
+    app.dependency_overrides[get_storage] = lambda: storage
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        id="user-1", company_id="co-1", role="company_admin"
+    )
+    with TestClient(app) as client:
+        yield client
+
+
+def _upload(client, name, content=b"%PDF-1.4 test", content_type="application/pdf", **params):
+    response = client.post(
+        "/api/files/upload",
+        params=params,
+        files={"file": (name, content, content_type)}
+    )
+    assert response.status_code == 200
+    return response.json()["file"]
+
+
+class TestDocumentIndex:
+    """Test suite for index-backed file listings."""
+
+    def test_uploads_are_indexed_and_filterable(self, index, client):
+        """Uploads are recorded with their attributes and listings filter on them."""
+        contract = _upload(client, "contract.pdf", folder="employee-docs", document_type="contract",
+                           related_entity_type="employee", related_entity_id="emp-1", tags=["hr", "2026"])
+        _upload(client, "invoice.pdf", b"%PDF-1.4 invoice", folder="invoices", tags=["2026"])
+
+        assert len(index.documents) == 2
+        assert index.documents[0]["file_size"] == len(b"%PDF-1.4 test")
+        assert index.documents[0]["mime_type"] == "application/pdf"
+        assert index.documents[1]["document_type"] == "invoices"
+
+        by_tags = client.get("/api/files/list", params={"tags": ["hr", "2026"]}).json()
+        by_entity = client.get("/api/files/list", params={"related_entity_id": "emp-1"}).json()
+        by_folder = client.get("/api/files/list", params={"folder": "invoices"}).json()
+
+        assert by_tags["files"] == [contract["file_key"]]
+        assert by_tags["documents"][0]["file_name"] == "contract.pdf"
+        assert by_entity["files"] == [contract["file_key"]]
+        assert by_folder["files"] != [contract["file_key"]] and by_folder["total"] == 1
+
+    def test_listing_is_paginated_newest_first(self, index, client):
+        """Pages come from the index with the total count."""
+        keys = [_upload(client, f"doc{i}.pdf", f"content {i}".encode())["file_key"] for i in range(5)]
+        for offset, document in enumerate(index.documents):
+            document["uploaded_at"] = datetime(2026, 1, 1) + timedelta(minutes=offset)
+
+        page = client.get("/api/files/list", params={"skip": 1, "limit": 2}).json()
+
+        assert page["files"] == [keys[3], keys[2]]
+        assert page["count"] == 2
+        assert page["total"] == 5
+
+    def test_deletes_are_recorded(self, index, client):
+        """Deleted files drop out of listings."""
+        key = _upload(client, "old.pdf")["file_key"]
+
+        assert client.delete(f"/api/files/delete/{key}").status_code == 200
+
+        assert index.documents[0]["is_deleted"]
+        assert client.get("/api/files/list").json()["files"] == []
+
+    def test_listing_without_mongodb(self, storage, client):
+        """Without the index, files are stored under their own key and filters are refused."""
+        with patch.object(document_index, "get_mongodb_client", return_value=None):
+            key = _upload(client, "doc.pdf")["file_key"]
+            plain = client.get("/api/files/list", params={"folder": "documents"})
+            filtered = client.get("/api/files/list", params={"document_type": "contract"})
+
+        assert storage.path(key).read_bytes() == b"%PDF-1.4 test"
+        assert plain.json()["files"] == [key]
+        assert filtered.status_code == 503
+
+
+class TestDeduplication:
+    """Test suite for content-addressed uploads."""
+
+    def test_repeated_content_is_stored_once(self, index, storage, client):
+        """A second upload of the same bytes skips the storage write but gets its own entry."""
+        with patch.object(storage, "upload_file", wraps=storage.upload_file) as upload_file:
+            first = _upload(client, "contract.pdf", related_entity_id="emp-1")
+            second = _upload(client, "contract-copy.pdf", related_entity_id="emp-2")
+
+        digest = hashlib.sha256(b"%PDF-1.4 test").hexdigest()
+        assert upload_file.call_count == 1
+        assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+        assert first["content_hash"] == second["content_hash"] == digest
+        assert first["file_key"] != second["file_key"]
+        assert storage.list_files("co-1/") == [f"co-1/blobs/{digest}"]
+        assert [blob["ref_count"] for blob in index.blobs] == [2]
+        assert [document["file_name"] for document in index.documents] == ["contract.pdf", "contract-copy.pdf"]
+
+        urls = client.post("/api/files/download-urls", json={
+            "file_keys": [first["file_key"], second["file_key"]]
+        }).json()["download_urls"]
+        assert client.get(urls[second["file_key"]]).content == b"%PDF-1.4 test"
+        listed = client.get("/api/files/list", params={"related_entity_id": "emp-2", "include_urls": True}).json()
+        assert listed["download_urls"] == {second["file_key"]: urls[second["file_key"]]}
+
+    async def test_blob_outlives_its_references_for_retention(self, index, storage, client):
+        """Deleting uploads only drops references; the blob goes after the retention period."""
+        first = _upload(client, "a.pdf")["file_key"]
+        second = _upload(client, "b.pdf")["file_key"]
+        blob_path = index.blobs[0]["blob_path"]
+
+        client.delete(f"/api/files/delete/{first}")
+        assert index.blobs[0]["ref_count"] == 1
+        client.delete(f"/api/files/delete/{second}")
+        assert index.blobs[0]["ref_count"] == 0
+        assert storage.get_file_metadata(blob_path) is not None
+
+        now = datetime.utcnow()
+        soon = await document_index.reconcile_documents(storage, "co-1", now=now)
+        later = await document_index.reconcile_documents(
+            storage, "co-1", now=now + document_index.BLOB_RETENTION + timedelta(minutes=1)
+        )
+
+        assert soon["blobs_deleted"] == 0
+        assert later["blobs_deleted"] == 1
+        assert index.blobs == []
+        assert storage.get_file_metadata(blob_path) is None
+
+    def test_blob_folder_is_reserved(self, index, client):
+        """Uploads cannot be placed among the blobs."""
+        response = client.post(
+            "/api/files/upload",
+            params={"folder": "blobs"},
+            files={"file": ("a.pdf", b"x", "application/pdf")}
+        )
+
+        assert response.status_code == 400
+
+
+def _png(width, height):
+    out = io.BytesIO()
+    Image.new("RGBA", (width, height), (255, 0, 0, 128)).save(out, "PNG")
+    return out.getvalue()
+
+
+def _image_size(data):
+    image = Image.open(io.BytesIO(data))
+    assert image.format == "JPEG"
+    return image.size
+
+
+class TestDerivatives:
+    """Test suite for thumbnails and previews."""
+
+    def test_image_derivatives(self):
+        """Images are scaled to each size and flattened to JPEG."""
+        rendered = derivatives_module.render_derivatives(_png(2000, 1000), "image/png")
+
+        assert {name: _image_size(data) for name, data in rendered.items()} == {
+            "thumbnail": (256, 128),
+            "preview": (1024, 512)
+        }
+
+    def test_unsupported_types_have_none(self):
+        """Other content types get no derivatives."""
+        assert derivatives_module.render_derivatives(b"a,b\n", "text/csv") == {}
+
+    def test_pdf_first_page_preview(self):
+        """PDFs are previewed from their first page."""
+        pytest.importorskip("pypdfium2")
+        from reportlab.pdfgen.canvas import Canvas
+
+        out = io.BytesIO()
+        canvas = Canvas(out)
+        canvas.drawString(72, 720, "Page one")
+        canvas.showPage()
+        canvas.save()
+
+        rendered = derivatives_module.render_derivatives(out.getvalue(), "application/pdf")
+
+        assert max(_image_size(rendered["preview"])) == 1024
+        assert max(_image_size(rendered["thumbnail"])) == 256
+
+    def test_pdfs_are_skipped_without_pypdfium2(self):
+        """Without pypdfium2 no derivatives are scheduled for PDFs."""
+        with patch.object(derivatives_module, "pdf_previews_available", return_value=False):
+            assert not derivatives_module.supports_derivatives("application/pdf")
+            assert derivatives_module.supports_derivatives("image/png")
+
+        with patch.object(derivatives_module, "pdf_previews_available", return_value=True):
+            assert derivatives_module.supports_derivatives("application/pdf")
+
+    def test_listing_returns_thumbnail_urls(self, index, storage, client):
+        """Uploads get thumbnails in the background, shared by identical content."""
+        photo = _png(800, 600)
+        with patch.object(derivatives_module, "render_derivatives", wraps=derivatives_module.render_derivatives) as render, \
+                patch.object(derivatives_module, "pdf_previews_available", return_value=True):
+            first = _upload(client, "photo.png", photo, "image/png", folder="images")
+            second = _upload(client, "copy.png", photo, "image/png", folder="images")
+            _upload(client, "notes.pdf", b"not really a pdf")
+
+        listing = client.get("/api/files/list", params={"folder": "images"}).json()
+        thumbnails = {document["file_key"]: document["thumbnail_url"] for document in listing["documents"]}
+
+        # Rendered once for both copies of the photo
+        assert [call.args[1] for call in render.call_args_list] == ["image/png", "application/pdf"]
+        assert thumbnails[first["file_key"]] == thumbnails[second["file_key"]]
+        assert _image_size(client.get(thumbnails[first["file_key"]]).content) == (256, 192)
+        assert storage.list_files(f"co-1/derivatives/{first['content_hash']}/") == [
+            f"co-1/derivatives/{first['content_hash']}/preview.jpg",
+            f"co-1/derivatives/{first['content_hash']}/thumbnail.jpg"
+        ]
+
+
+class TestReconciliation:
+    """Test suite for reconcile_documents."""
+
+    async def test_index_follows_the_bucket(self, index, storage):
+        """Unrecorded files are added, vanished ones removed, recent ones left alone."""
+        now = datetime.utcnow()
+        old = time.time() - 3600
+        for key in ("co-1/documents/kept.pdf", "co-1/invoices/unindexed.pdf", "co-1/reports/r.pdf"):
+            storage.upload_bytes(b"%PDF", key, content_type="application/pdf",
+                                 metadata={"original_filename": "scan.pdf"})
+            os.utime(storage.path(key), (old, old))
+        storage.upload_bytes(b"%PDF", "co-1/documents/in-flight.pdf", content_type="application/pdf")
+
+        def entry(key, uploaded_at):
+            return {"company_id": "co-1", "file_path": key, "blob_path": None, "content_hash": None,
+                    "is_deleted": False, "uploaded_at": uploaded_at}
+
+        index.documents.extend([
+            entry("co-1/documents/kept.pdf", now - timedelta(hours=1)),
+            entry("co-1/documents/gone.pdf", now - timedelta(hours=1)),
+            entry("co-1/documents/just-recorded.pdf", now),
+        ])
+
+        result = await document_index.reconcile_documents(storage, "co-1", now=now)
+
+        assert (result["added"], result["removed"]) == (1, 1)
+        by_key = {document["file_path"]: document for document in index.documents}
+        assert by_key["co-1/documents/gone.pdf"]["is_deleted"]
+        assert not by_key["co-1/documents/just-recorded.pdf"]["is_deleted"]
+        added = by_key["co-1/invoices/unindexed.pdf"]
+        assert (added["document_type"], added["file_name"], added["file_size"]) == ("invoices", "scan.pdf", 4)
+        assert "co-1/documents/in-flight.pdf" not in by_key
+        assert "co-1/reports/r.pdf" not in by_key
+
+    async def test_blob_reference_counts_are_recounted(self, index, storage, client):
+        """Leaked references are corrected from the index entries."""
+        _upload(client, "a.pdf")
+        index.blobs[0].update(ref_count=3, created_at=datetime.utcnow() - timedelta(hours=1))
+
+        result = await document_index.reconcile_documents(storage, "co-1")
+
+        assert result["blobs_recounted"] == 1
+        assert index.blobs[0]["ref_count"] == 1
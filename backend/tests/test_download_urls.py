@@ -0,0 +1,114 @@
+"""Tests for cached and batch-signed download URLs."""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import get_current_user
+from app.routers import files as files_router
+from app.utils.storage import DownloadUrlCache, LocalStorage, get_storage
+
+
+class CountingStorage(LocalStorage):
+    """Local storage that counts how often URLs are signed."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.signed = []
+
+    def get_download_url(self, file_key, expiration=3600):
+        self.signed.append(file_key)
+        return super().get_download_url(file_key, expiration=expiration)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Counting local storage with a few company files."""
+    storage = CountingStorage(str(tmp_path))
+    for key in ("co-1/documents/a.txt", "co-1/documents/b.txt", "co-2/documents/c.txt"):
+        storage.upload_bytes(b"data", key, content_type="text/plain")
+    return storage
+
+
+@pytest.fixture
+def client(storage):
+    """Client for the files router as a user of company co-1."""
+    app = FastAPI()
+    app.include_router(files_router.router, prefix="/api/files")
+    app.dependency_overrides[get_storage] = lambda: storage
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="user-1", company_id="co-1")
+    with TestClient(app) as client:
+        yield client
+
+
+class TestDownloadUrlCache:
+    """Test suite for DownloadUrlCache."""
+
+    def test_reuses_url_until_refresh_margin(self, storage):
+        """The same URL is returned until it gets close to expiring."""
+        cache = DownloadUrlCache(storage, refresh_margin=300)
+
+        with patch("app.utils.storage.time.time", return_value=1000.0):
+            first = cache.get("co-1/documents/a.txt", expiration=3600)
+        with patch("app.utils.storage.time.time", return_value=1000.0 + 3200):
+            second = cache.get("co-1/documents/a.txt", expiration=3600)
+        with patch("app.utils.storage.time.time", return_value=1000.0 + 3400):
+            third = cache.get("co-1/documents/a.txt", expiration=3600)
+
+        assert second == first
+        assert third.url != first.url
+        assert storage.signed == ["co-1/documents/a.txt"] * 2
+
+    def test_bounded_and_invalidated(self, storage):
+        """Least recently used entries are evicted; invalidate forgets a key."""
+        cache = DownloadUrlCache(storage, max_entries=2)
+
+        cache.get("co-1/documents/a.txt")
+        cache.get("co-1/documents/b.txt")
+        cache.get("co-1/documents/a.txt")
+        cache.get("co-2/documents/c.txt")  # evicts b
+        cache.get("co-1/documents/b.txt")
+        cache.invalidate("co-1/documents/a.txt")
+        cache.get("co-1/documents/a.txt")
+
+        assert storage.signed == [
+            "co-1/documents/a.txt", "co-1/documents/b.txt", "co-2/documents/c.txt",
+            "co-1/documents/b.txt", "co-1/documents/a.txt"
+        ]
+
+
+class TestDownloadUrlRoutes:
+    """Test suite for the download URL routes."""
+
+    def test_batch_signing_checks_each_key(self, storage, client):
+        """Own files are signed in one call; other companies' files are reported."""
+        response = client.post("/api/files/download-urls", json={
+            "file_keys": ["co-1/documents/a.txt", "co-1/documents/b.txt", "co-2/documents/c.txt", "co-10/x.txt"]
+        })
+
+        body = response.json()
+        assert response.status_code == 200
+        assert sorted(body["download_urls"]) == ["co-1/documents/a.txt", "co-1/documents/b.txt"]
+        assert sorted(body["errors"]) == ["co-10/x.txt", "co-2/documents/c.txt"]
+        assert 3500 < body["expires_in"] <= 3600
+        assert client.get(body["download_urls"]["co-1/documents/a.txt"]).content == b"data"
+
+    def test_batch_size_is_limited(self, client):
+        """Oversized batches are rejected by validation."""
+        keys = [f"co-1/documents/{i}.txt" for i in range(files_router.MAX_BATCH_URLS + 1)]
+
+        response = client.post("/api/files/download-urls", json={"file_keys": keys})
+
+        assert response.status_code == 422
+
+    def test_listing_and_single_url_share_the_cache(self, storage, client):
+        """URLs inlined in a listing are reused by the single-file endpoint."""
+        listing = client.get("/api/files/list", params={"folder": "documents", "include_urls": True}).json()
+        single = client.get("/api/files/download/co-1/documents/a.txt").json()
+
+        assert listing["files"] == ["co-1/documents/a.txt", "co-1/documents/b.txt"]
+        assert single["download_url"] == listing["download_urls"]["co-1/documents/a.txt"]
+        assert storage.signed.count("co-1/documents/a.txt") == 1
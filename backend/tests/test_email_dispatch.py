@@ -0,0 +1,134 @@
+"""Tests for pooled, batched email delivery."""
+
+import json
+from datetime import date
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.utils.email import EmailService, payroll_notice_substitutions
+from app.utils.email_dispatch import EmailDeliveryError, EmailDispatcher, EmailRecipient
+
+
+class FakeSendGrid:
+    """Local stand-in for the SendGrid mail/send endpoint.
+
+    Records every request body and answers with queued status codes
+    (202 once the queue is empty).
+    """
+
+    def __init__(self, statuses=None):
+        self.statuses = list(statuses or [])
+        self.requests = []
+        self.transport = httpx.MockTransport(self._handle)
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(json.loads(request.content))
+        status_code = self.statuses.pop(0) if self.statuses else 202
+        return httpx.Response(status_code, text="" if status_code == 202 else "error")
+
+
+@pytest.fixture
+def sendgrid():
+    """Fake SendGrid API."""
+    return FakeSendGrid()
+
+
+@pytest.fixture
+def dispatcher(sendgrid):
+    """Dispatcher wired to the fake SendGrid API."""
+    return EmailDispatcher(api_key="SG.test", api_url="http://sendgrid.local", transport=sendgrid.transport)
+
+
+class TestEmailDispatcher:
+    """Test suite for EmailDispatcher."""
+
+    async def test_send_posts_single_personalization(self, dispatcher, sendgrid):
+        """A single send posts one request with plain text before HTML."""
+        assert await dispatcher.send("a@example.com", "Hi", "<p>Hi</p>", "Hi") is True
+
+        body = sendgrid.requests[0]
+        assert body["personalizations"] == [{"to": [{"email": "a@example.com"}]}]
+        assert [c["type"] for c in body["content"]] == ["text/plain", "text/html"]
+
+    async def test_client_is_pooled_across_sends(self, dispatcher):
+        """Sends on the same loop reuse one pooled client."""
+        await dispatcher.send("a@example.com", "Hi", "<p>Hi</p>")
+        client = dispatcher._client
+        await dispatcher.send("b@example.com", "Hi", "<p>Hi</p>")
+
+        assert dispatcher._client is client
+        await dispatcher.aclose()
+        assert dispatcher._client is None
+
+    async def test_bulk_send_batches_personalizations(self, dispatcher, sendgrid):
+        """Bulk sends render once and batch up to 1000 recipients per request."""
+        email = EmailService.render_payroll_processed_notice()
+        recipients = [
+            EmailRecipient(email=f"e{i}@example.com", substitutions={"-first_name-": f"E{i}", "-net_pay-": "1,000.00"})
+            for i in range(2500)
+        ]
+
+        sent = await dispatcher.send_bulk(recipients, email.subject, email.html, email.text)
+
+        assert sent == 2500
+        assert [len(r["personalizations"]) for r in sendgrid.requests] == [1000, 1000, 500]
+        assert all(r["content"][1]["value"] == email.html for r in sendgrid.requests)
+        assert sendgrid.requests[0]["personalizations"][0]["substitutions"]["-first_name-"] == "E0"
+
+    @pytest.mark.parametrize("status_code,retryable", [(429, True), (503, True), (400, False)])
+    async def test_failures_are_classified(self, dispatcher, sendgrid, status_code, retryable):
+        """Throttling and server errors are retryable; bad requests are not."""
+        sendgrid.statuses = [status_code]
+
+        with pytest.raises(EmailDeliveryError) as exc_info:
+            await dispatcher.send("a@example.com", "Hi", "<p>Hi</p>")
+
+        assert exc_info.value.retryable is retryable
+        assert exc_info.value.status_code == status_code
+
+    async def test_disabled_without_api_key(self, sendgrid):
+        """Without an API key nothing is sent."""
+        dispatcher = EmailDispatcher(api_key="", transport=sendgrid.transport)
+
+        assert await dispatcher.send("a@example.com", "Hi", "<p>Hi</p>") is False
+        assert await dispatcher.send_bulk([EmailRecipient(email="a@example.com")], "Hi", "<p>Hi</p>") == 0
+        assert sendgrid.requests == []
+
+
+class TestPayrollNotices:
+    """Test suite for bulk payroll processed notices."""
+
+    def test_plain_text_names_are_not_html_escaped(self):
+        """Names are escaped in the HTML part only."""
+        email = EmailService.render_payroll_processed_notice()
+        substitutions = payroll_notice_substitutions("O'Brien", date(2024, 1, 1), date(2024, 1, 15), 1000)
+
+        assert "-first_name-" in email.html and "-first_name_text-" not in email.html
+        assert "-first_name_text-" in email.text and "-first_name-" not in email.text
+        assert substitutions["-first_name-"] == "O&#39;Brien"
+        assert substitutions["-first_name_text-"] == "O'Brien"
+
+    def test_failed_batch_is_retried_alone(self, dispatcher, sendgrid):
+        """When batch 2 of 3 fails, only batch 2 is posted again."""
+        from app import tasks
+
+        recipients = [EmailRecipient(email=f"e{i}@example.com") for i in range(2500)]
+        with patch.object(tasks, "SessionLocal"), \
+                patch.object(tasks, "build_payroll_notice_recipients", return_value=recipients), \
+                patch.object(tasks.send_payroll_notice_batch_task, "delay") as delay:
+            result = tasks.send_payroll_processed_notices_task("run-1")
+        batches = [call.args[1] for call in delay.call_args_list]
+        assert result["batches"] == len(batches) == 3
+
+        sendgrid.statuses = [202, 503, 202]
+        with patch.object(tasks, "email_dispatcher", dispatcher):
+            tasks.send_payroll_notice_batch_task("run-1", batches[0])
+            with pytest.raises(EmailDeliveryError):
+                tasks.send_payroll_notice_batch_task("run-1", batches[1])
+            tasks.send_payroll_notice_batch_task("run-1", batches[2])
+            tasks.send_payroll_notice_batch_task("run-1", batches[1])
+
+        first_recipients = [r["personalizations"][0]["to"][0]["email"] for r in sendgrid.requests]
+        assert first_recipients == ["e0@example.com", "e1000@example.com", "e2000@example.com", "e1000@example.com"]
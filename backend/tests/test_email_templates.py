@@ -0,0 +1,65 @@
+"""Tests for the precompiled email template registry."""
+
+import pytest
+from jinja2.exceptions import SecurityError, UndefinedError
+
+from app.utils.email_templates import EMAIL_SUBJECTS, EmailTemplateRegistry
+
+
+@pytest.fixture
+def registry():
+    """Registry compiled from the shipped templates."""
+    registry = EmailTemplateRegistry()
+    registry.load()
+    return registry
+
+
+class TestEmailTemplateRegistry:
+    """Test suite for EmailTemplateRegistry."""
+
+    def test_all_templates_compile_with_shared_layout(self, registry):
+        """Every registered email compiles and renders inside the base layout."""
+        assert set(registry._templates) == set(EMAIL_SUBJECTS)
+
+        email = registry.render("password_reset", reset_url="https://app/reset?token=t")
+
+        assert email.subject == "Reset Your Pulse Password"
+        assert 'href="https://app/reset?token=t"' in email.html
+        assert "This is an automated email from Pulse" in email.html
+        assert "This is an automated email from Pulse" in email.text
+
+    def test_html_is_autoescaped_but_text_is_not(self, registry):
+        """User values are escaped in HTML and left as-is in plain text."""
+        email = registry.render("welcome", user_name="<script>x</script> & Co")
+
+        assert "&lt;script&gt;x&lt;/script&gt; &amp; Co" in email.html
+        assert "<script>" not in email.html
+        assert "Hi <script>x</script> & Co," in email.text
+
+    def test_subjects_are_templates(self, registry):
+        """Subjects interpolate context like bodies do."""
+        email = registry.render("invoice", invoice_number="INV-7", amount_due=10, due_date="soon", invoice_pdf_url=None)
+
+        assert email.subject == "Invoice INV-7 from Pulse"
+        assert "Download Invoice PDF" not in email.html
+
+    def test_render_many_reuses_compiled_template(self, registry):
+        """Bulk rendering renders each recipient against one compiled template."""
+        compiled = registry.get("welcome")
+        emails = registry.render_many("welcome", [{"user_name": f"User {i}"} for i in range(100)])
+
+        assert registry.get("welcome") is compiled
+        assert len(emails) == 100
+        assert "Hi User 42," in emails[42].text
+
+    def test_missing_variables_fail_loudly(self, registry):
+        """A missing variable raises instead of sending a blank email."""
+        with pytest.raises(UndefinedError):
+            registry.render("welcome")
+
+    def test_templates_are_sandboxed(self, registry):
+        """Templates cannot reach Python internals."""
+        template = registry.env.from_string("{{ value.__class__.__mro__ }}")
+
+        with pytest.raises(SecurityError):
+            template.render(value="x")
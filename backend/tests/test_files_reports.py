@@ -3,65 +3,52 @@
 import pytest
 import io
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 
 class TestFileUpload:
     """Test suite for file upload endpoints."""
     
-    @patch("app.routers.files.s3_service")
-    def test_upload_file_success(self, mock_s3, client, auth_headers, test_company):
+    def test_upload_file_success(self, client, auth_headers, test_company, local_storage):
         """Test successful file upload."""
-        # Mock S3 upload
-        mock_s3.upload_file.return_value = None
-        mock_s3.get_presigned_url.return_value = "https://test-bucket.s3.amazonaws.com/test-file.pdf"
-        
         # Create test file
         file_content = b"Test PDF content"
         files = {
             "file": ("test-document.pdf", io.BytesIO(file_content), "application/pdf")
         }
-        data = {"folder": "invoices"}
         
         response = client.post(
-            "/api/files/upload",
+            "/api/files/upload?folder=invoices",
             headers=auth_headers,
-            files=files,
-            data=data
+            files=files
         )
         
         assert response.status_code == 200
-        result = response.json()
-        assert "file_key" in result
-        assert "file_url" in result
-        assert test_company.id in result["file_key"]
+        result = response.json()["file"]
+        assert result["file_key"].startswith(f"{test_company.id}/invoices/")
+        assert local_storage.read_bytes(result["file_key"]) == file_content
     
-    @patch("app.routers.files.s3_service")
-    def test_upload_multiple_files_success(self, mock_s3, client, auth_headers):
+    def test_upload_multiple_files_success(self, client, auth_headers, test_company, local_storage):
         """Test successful multiple file upload."""
-        mock_s3.upload_file.return_value = None
-        mock_s3.get_presigned_url.return_value = "https://test-bucket.s3.amazonaws.com/test-file.pdf"
-        
         # Create multiple test files
         files = [
             ("files", ("doc1.pdf", io.BytesIO(b"Content 1"), "application/pdf")),
             ("files", ("doc2.pdf", io.BytesIO(b"Content 2"), "application/pdf")),
         ]
-        data = {"folder": "employee-docs"}
         
         response = client.post(
-            "/api/files/upload/multiple",
+            "/api/files/upload/multiple?folder=employee-docs",
             headers=auth_headers,
-            files=files,
-            data=data
+            files=files
         )
         
         assert response.status_code == 200
         result = response.json()
-        assert len(result["uploaded"]) == 2
-        assert len(result["failed"]) == 0
+        assert len(result["uploaded_files"]) == 2
+        assert len(result["errors"]) == 0
+        assert len(local_storage.list_files(f"{test_company.id}/employee-docs")) == 2
     
-    def test_upload_file_too_large(self, client, auth_headers):
+    def test_upload_file_too_large(self, client, auth_headers, local_storage):
         """Test upload of file exceeding size limit."""
         # Create file larger than 10MB
         large_content = b"x" * (11 * 1024 * 1024)  # 11MB
@@ -75,10 +62,11 @@ class TestFileUpload:
             files=files
         )
         
-        assert response.status_code == 400
+        assert response.status_code == 413
         assert "size" in response.json()["detail"].lower()
+        assert local_storage.list_files() == []
     
-    def test_upload_file_invalid_type(self, client, auth_headers):
+    def test_upload_file_invalid_type(self, client, auth_headers, local_storage):
         """Test upload of file with invalid type."""
         files = {
             "file": ("malicious.exe", io.BytesIO(b"exe content"), "application/x-msdownload")
@@ -93,17 +81,9 @@ class TestFileUpload:
         assert response.status_code == 400
         assert "type" in response.json()["detail"].lower()
     
-    @patch("app.routers.files.s3_service")
-    def test_list_files(self, mock_s3, client, auth_headers, test_company):
+    def test_list_files(self, client, auth_headers, test_company, local_storage):
         """Test listing files."""
-        mock_s3.list_files.return_value = [
-            {
-                "Key": f"{test_company.id}/invoices/invoice1.pdf",
-                "Size": 1024,
-                "LastModified": "2024-01-01T00:00:00",
-                "ContentType": "application/pdf"
-            }
-        ]
+        local_storage.upload_bytes(b"invoice", f"{test_company.id}/invoices/invoice1.pdf", "application/pdf")
         
         response = client.get(
             "/api/files/list?folder=invoices",
@@ -112,14 +92,13 @@ class TestFileUpload:
         
         assert response.status_code == 200
         result = response.json()
-        assert "files" in result
+        assert result["files"] == [f"{test_company.id}/invoices/invoice1.pdf"]
         assert result["count"] == 1
     
-    @patch("app.routers.files.s3_service")
-    def test_download_file(self, mock_s3, client, auth_headers, test_company):
+    def test_download_file(self, client, auth_headers, test_company, local_storage):
         """Test generating download URL."""
         file_key = f"{test_company.id}/invoices/test.pdf"
-        mock_s3.get_presigned_url.return_value = "https://test-bucket.s3.amazonaws.com/presigned-url"
+        local_storage.upload_bytes(b"invoice", file_key, "application/pdf")
         
         response = client.get(
             f"/api/files/download/{file_key}",
@@ -129,8 +108,12 @@ class TestFileUpload:
         assert response.status_code == 200
         result = response.json()
         assert "download_url" in result
+        
+        download = client.get(result["download_url"])
+        assert download.status_code == 200
+        assert download.content == b"invoice"
     
-    def test_download_file_unauthorized_company(self, client, auth_headers):
+    def test_download_file_unauthorized_company(self, client, auth_headers, local_storage):
         """Test download of file from another company fails."""
         file_key = "other-company-id/invoices/test.pdf"
         
@@ -141,11 +124,10 @@ class TestFileUpload:
         
         assert response.status_code == 403
     
-    @patch("app.routers.files.s3_service")
-    def test_delete_file_admin(self, mock_s3, client, auth_headers, test_company):
+    def test_delete_file_admin(self, client, auth_headers, test_company, local_storage):
         """Test file deletion by admin."""
         file_key = f"{test_company.id}/invoices/test.pdf"
-        mock_s3.delete_file.return_value = None
+        local_storage.upload_bytes(b"invoice", file_key, "application/pdf")
         
         response = client.delete(
             f"/api/files/delete/{file_key}",
@@ -153,10 +135,12 @@ class TestFileUpload:
         )
         
         assert response.status_code == 200
+        assert local_storage.get_file_metadata(file_key) is None
     
-    def test_delete_file_non_admin(self, client, employee_headers, test_company):
+    def test_delete_file_non_admin(self, client, employee_headers, test_company, local_storage):
         """Test file deletion by non-admin fails."""
         file_key = f"{test_company.id}/invoices/test.pdf"
+        local_storage.upload_bytes(b"invoice", file_key, "application/pdf")
         
         response = client.delete(
             f"/api/files/delete/{file_key}",
@@ -164,45 +148,50 @@ class TestFileUpload:
         )
         
         assert response.status_code == 403
+        assert local_storage.get_file_metadata(file_key) is not None
 
 
 class TestReports:
     """Test suite for report generation endpoints."""
     
-    @patch("app.routers.reports.pdf_service")
-    @patch("app.routers.reports.s3_service")
-    def test_generate_financial_report(self, mock_s3, mock_pdf, client, auth_headers, db_session):
-        """Test financial report generation."""
-        mock_pdf.generate_financial_report.return_value = b"PDF content"
-        mock_s3.upload_file.return_value = None
-        mock_s3.get_presigned_url.return_value = "https://test-bucket.s3.amazonaws.com/report.pdf"
-        
+    @patch("app.routers.reports.run_report_job")
+    def test_generate_financial_report(self, mock_run_job, client, auth_headers, local_storage):
+        """Test financial report generation is queued as a job."""
         response = client.post(
             "/api/reports/financial?start_date=2024-01-01&end_date=2024-01-31&report_type=summary",
             headers=auth_headers
         )
         
-        assert response.status_code == 200
+        assert response.status_code == 202
         result = response.json()
-        assert "download_url" in result
-        assert "file_key" in result
-        assert "report_data" in result
+        assert result["status"] == "queued"
+        assert result["cached"] is False
+        mock_run_job.assert_called_once_with(result["job_id"])
+        
+        job = client.get(f"/api/reports/jobs/{result['job_id']}", headers=auth_headers)
+        assert job.status_code == 200
+        assert job.json()["status"] == "queued"
     
-    @patch("app.routers.reports.pdf_service")
-    @patch("app.routers.reports.s3_service")
-    def test_generate_payroll_report_admin(self, mock_s3, mock_pdf, client, auth_headers):
-        """Test payroll report generation by admin."""
-        mock_pdf.generate_payroll_report.return_value = b"PDF content"
-        mock_s3.upload_file.return_value = None
-        mock_s3.get_presigned_url.return_value = "https://test-bucket.s3.amazonaws.com/payroll.pdf"
+    @patch("app.routers.reports.run_report_job")
+    def test_identical_report_requests_share_job(self, mock_run_job, client, auth_headers, local_storage):
+        """Test an identical request attaches to the job already in flight."""
+        url = "/api/reports/financial?start_date=2024-01-01&end_date=2024-01-31&report_type=summary"
+        
+        first = client.post(url, headers=auth_headers).json()
+        second = client.post(url, headers=auth_headers).json()
         
+        assert second["job_id"] == first["job_id"]
+        mock_run_job.assert_called_once()
+    
+    def test_generate_payroll_report_admin(self, client, auth_headers, local_storage):
+        """Test payroll report generation by admin without payroll data."""
         response = client.post(
             "/api/reports/payroll?start_date=2024-01-01&end_date=2024-01-31",
             headers=auth_headers
         )
         
-        # Will fail if no payroll data, but should not be a permission error
-        assert response.status_code in [200, 404]
+        # No payroll data, but not a permission error
+        assert response.status_code == 404
     
     def test_generate_payroll_report_employee(self, client, employee_headers):
         """Test payroll report generation by employee fails."""
@@ -213,26 +202,25 @@ class TestReports:
         
         assert response.status_code == 403
     
-    @patch("app.routers.reports.s3_service")
-    def test_list_reports(self, mock_s3, client, auth_headers, test_company):
+    def test_get_report_job_other_company(self, client, auth_headers):
+        """Test jobs of other companies are not found."""
+        response = client.get("/api/reports/jobs/unknown-job", headers=auth_headers)
+        
+        assert response.status_code == 404
+    
+    def test_list_reports(self, client, auth_headers, test_company, local_storage):
         """Test listing generated reports."""
-        mock_s3.list_files.return_value = [
-            {
-                "Key": f"{test_company.id}/reports/report1.pdf",
-                "Size": 2048,
-                "LastModified": "2024-01-01T00:00:00",
-                "ContentType": "application/pdf"
-            }
-        ]
+        local_storage.upload_bytes(b"%PDF", f"{test_company.id}/reports/report1.pdf", "application/pdf")
         
         response = client.get("/api/reports/list", headers=auth_headers)
         
         assert response.status_code == 200
         result = response.json()
-        assert "reports" in result
+        assert result["reports"] == [f"{test_company.id}/reports/report1.pdf"]
         assert result["count"] == 1
     
-    def test_generate_financial_report_invalid_dates(self, client, auth_headers):
+    @patch("app.routers.reports.run_report_job")
+    def test_generate_financial_report_invalid_dates(self, mock_run_job, client, auth_headers, local_storage):
         """Test report generation with invalid date range."""
         response = client.post(
             "/api/reports/financial?start_date=2024-12-31&end_date=2024-01-01&report_type=summary",
@@ -240,4 +228,4 @@ class TestReports:
         )
         
         # Should handle gracefully or return error
-        assert response.status_code in [200, 400]
+        assert response.status_code in [202, 400]
@@ -0,0 +1,162 @@
+"""Tests for the startup schema step and the health endpoints."""
+
+from unittest.mock import AsyncMock, patch
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app.database import MigrationStatus
+from app.main import app
+from app.utils import health as health_module
+from app.utils.health import CheckResult, Readiness, ReadinessProbe
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPrepareDatabase:
+    """Test suite for the startup schema step."""
+
+    @pytest.mark.parametrize("environment,mode", [("production", "check"), ("development", "create_all")])
+    def test_auto_mode(self, environment, mode):
+        """Tables are only created outside production."""
+        with patch.object(database.settings, "database_init_mode", "auto"), \
+                patch.object(database.settings, "environment", environment):
+            assert database.database_init_mode() == mode
+
+    def test_check_mode_issues_no_ddl(self):
+        """In check mode the schema revision is compared, no table is created."""
+        status = MigrationStatus(current={"009"}, heads={"009"})
+        with patch.object(database.settings, "database_init_mode", "check"), \
+                patch.object(database, "init_db") as init_db, \
+                patch.object(database, "migration_status", return_value=status):
+            assert database.prepare_database() == "check"
+
+        init_db.assert_not_called()
+
+    def test_schema_behind_head(self):
+        """A schema behind the migrations is logged, or refused when required."""
+        status = MigrationStatus(current={"008"}, heads={"009"})
+        with patch.object(database, "migration_status", return_value=status):
+            assert database.check_migrations() == status
+            with patch.object(database.settings, "database_require_migrations", True):
+                with pytest.raises(RuntimeError, match="alembic upgrade head"):
+                    database.check_migrations()
+
+    def test_unstamped_database(self, tmp_path):
+        """A database never migrated with Alembic is behind the script head."""
+        (tmp_path / "versions").mkdir()
+        (tmp_path / "versions" / "001_initial.py").write_text("revision = '001'\ndown_revision = None\n")
+
+        with patch.object(database, "ALEMBIC_DIR", tmp_path):
+            status = database.migration_status()
+
+        assert status == MigrationStatus(current=set(), heads={"001"})
+        assert not status.up_to_date
+
+
+class TestReadinessProbe:
+    """Test suite for ReadinessProbe."""
+
+    def _probe(self, clock=None, **checks):
+        probe = ReadinessProbe(checks=list(checks), timeout=0.05, cache_seconds=2, clock=clock or FakeClock())
+        for name, check in checks.items():
+            setattr(probe, f"check_{name}", check)
+        return probe
+
+    async def test_ready_when_all_checks_pass(self):
+        """Every configured dependency is checked and reported."""
+        probe = self._probe(postgres=AsyncMock(), redis=AsyncMock())
+
+        readiness = await probe.check()
+
+        assert readiness.ready
+        assert readiness.to_dict()["status"] == "ready"
+        assert set(readiness.to_dict()["checks"]) == {"postgres", "redis"}
+
+    async def test_failure_and_timeout(self):
+        """A failing or slow dependency makes the pod not ready."""
+        async def hang():
+            await asyncio.sleep(10)
+
+        probe = self._probe(postgres=hang, mongodb=AsyncMock(side_effect=ConnectionError("MongoDB is not connected")))
+
+        checks = (await probe.check()).to_dict()["checks"]
+
+        assert checks["postgres"]["error"] == "timed out after 0.05s"
+        assert checks["mongodb"]["status"] == "failed"
+        assert checks["mongodb"]["error"] == "MongoDB is not connected"
+        for task in probe._running.values():
+            task.cancel()
+
+    async def test_slow_check_is_not_started_twice(self):
+        """Probes wait on a check that outlived its timeout instead of piling up."""
+        started = []
+
+        async def slow():
+            started.append(1)
+            await asyncio.sleep(0.08)
+
+        clock = FakeClock()
+        probe = self._probe(clock=clock, postgres=slow)
+
+        assert not (await probe.check()).ready
+        clock.now += 5
+        assert (await probe.check()).ready
+        assert len(started) == 1
+
+    async def test_results_are_cached(self):
+        """Probes within ``cache_seconds`` reuse the last round."""
+        check = AsyncMock()
+        clock = FakeClock()
+        probe = self._probe(clock=clock, redis=check)
+
+        await probe.check()
+        await probe.check()
+        clock.now += 3
+        await probe.check()
+
+        assert check.await_count == 2
+
+    def test_unknown_check(self):
+        """Misconfigured check names fail at startup."""
+        with pytest.raises(ValueError):
+            ReadinessProbe(checks=["postgres", "elasticsearch"])
+
+
+class TestHealthEndpoints:
+    """Test suite for /health/live and /health/ready."""
+
+    def test_live(self):
+        """Liveness does not depend on the databases."""
+        client = TestClient(app)
+
+        with patch.object(health_module.readiness_probe, "check") as check:
+            assert client.get("/health/live").json()["status"] == "healthy"
+            assert client.get("/health").status_code == 200
+
+        check.assert_not_called()
+
+    def test_ready(self):
+        """Readiness answers 503 while a dependency is down."""
+        client = TestClient(app)
+        readiness = Readiness(
+            checks=[CheckResult("postgres", True, 1.2), CheckResult("redis", False, 2.0, "Connection refused")],
+            checked_at=0
+        )
+
+        with patch.object(health_module.readiness_probe, "check", AsyncMock(return_value=readiness)):
+            response = client.get("/health/ready")
+
+        assert response.status_code == 503
+        assert response.json()["status"] == "not_ready"
+        assert response.json()["checks"]["redis"]["error"] == "Connection refused"
@@ -0,0 +1,134 @@
+"""Tests for the local storage backend and its download route."""
+
+import io
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from app.routers import files as files_router
+from app.utils.storage import FileTooLargeError, LocalStorage, get_storage, sign_download
+
+CONTENT = b"0123456789abcdef"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Local storage with a small chunk size."""
+    return LocalStorage(str(tmp_path), chunk_size=4)
+
+
+@pytest.fixture
+def raw_client(storage):
+    """Client for the files router backed by local storage."""
+    app = FastAPI()
+    app.include_router(files_router.router, prefix="/api/files")
+    app.dependency_overrides[get_storage] = lambda: storage
+    with TestClient(app) as client:
+        yield client
+
+
+def _upload(data, filename="notes.txt"):
+    return UploadFile(file=io.BytesIO(data), filename=filename, headers=Headers({"content-type": "text/plain"}))
+
+
+class TestLocalStorage:
+    """Test suite for LocalStorage."""
+
+    async def test_upload_streams_to_disk_with_metadata(self, storage):
+        """Uploads land under the root with their content type and original name."""
+        result = await storage.upload_file(_upload(CONTENT), folder="co-1/documents")
+
+        key = result["file_key"]
+        assert key.startswith("co-1/documents/") and key.endswith(".txt")
+        assert storage.path(key).read_bytes() == CONTENT
+        metadata = storage.get_file_metadata(key)
+        assert metadata["content_length"] == len(CONTENT)
+        assert metadata["content_type"] == "text/plain"
+        assert metadata["metadata"] == {"original_filename": "notes.txt"}
+
+    async def test_oversized_upload_leaves_nothing_behind(self, storage):
+        """The size limit is enforced while streaming and the partial file removed."""
+        with pytest.raises(FileTooLargeError):
+            await storage.upload_file(_upload(CONTENT), folder="co-1", max_size=10)
+
+        assert storage.list_files("co-1") == []
+        assert not any(path.is_file() for path in (storage.root / "co-1").iterdir())
+
+    def test_keys_cannot_escape_the_root(self, storage):
+        """Traversal and internal paths are rejected."""
+        for key in ("../outside.txt", "co-1/../../outside.txt", ".meta/co-1/a.txt", "co-1//a.txt"):
+            with pytest.raises(ValueError):
+                storage.upload_bytes(b"x", key)
+
+    def test_list_and_delete(self, storage):
+        """Listing matches key prefixes and skips sidecars; delete removes both."""
+        for key in ("co-1/reports/a.pdf", "co-1/reports/b.pdf", "co-1/documents/c.pdf", "co-10/reports/d.pdf"):
+            storage.upload_bytes(b"%PDF", key, content_type="application/pdf")
+
+        assert storage.list_files("co-1/reports/") == ["co-1/reports/a.pdf", "co-1/reports/b.pdf"]
+        assert storage.list_files("co-1/") == ["co-1/documents/c.pdf", "co-1/reports/a.pdf", "co-1/reports/b.pdf"]
+        assert storage.list_files("co-1/", max_keys=1) == ["co-1/documents/c.pdf"]
+
+        assert storage.delete_file("co-1/reports/a.pdf")
+        assert storage.get_file_metadata("co-1/reports/a.pdf") is None
+        assert storage.list_files("co-1/reports/") == ["co-1/reports/b.pdf"]
+
+
+class TestLocalDownloads:
+    """Test suite for serving local files through signed URLs."""
+
+    def _url(self, storage, key="co-1/documents/notes.txt"):
+        storage.upload_bytes(CONTENT, key, content_type="text/plain", metadata={"original_filename": "notes.txt"})
+        return storage.get_download_url(key, expiration=60)
+
+    def test_full_download(self, storage, raw_client):
+        """A signed URL serves the whole file and advertises range support."""
+        response = raw_client.get(self._url(storage))
+
+        assert response.status_code == 200
+        assert response.content == CONTENT
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["content-type"].startswith("text/plain")
+
+    @pytest.mark.parametrize("header, expected, content_range", [
+        ("bytes=2-5", CONTENT[2:6], "bytes 2-5/16"),
+        ("bytes=10-", CONTENT[10:], "bytes 10-15/16"),
+        ("bytes=-3", CONTENT[-3:], "bytes 13-15/16"),
+        ("bytes=4-100", CONTENT[4:], "bytes 4-15/16"),
+    ])
+    def test_range_requests(self, storage, raw_client, header, expected, content_range):
+        """Single byte ranges are answered with 206 and the requested slice."""
+        response = raw_client.get(self._url(storage), headers={"Range": header})
+
+        assert response.status_code == 206
+        assert response.content == expected
+        assert response.headers["content-range"] == content_range
+
+    def test_unsatisfiable_range(self, storage, raw_client):
+        """A range past the end of the file is rejected with 416."""
+        response = raw_client.get(self._url(storage), headers={"Range": "bytes=100-"})
+
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */16"
+
+    def test_signature_and_expiry_are_checked(self, storage, raw_client):
+        """Tampered or expired links are refused."""
+        url = self._url(storage)
+        path = urlsplit(url).path
+        expires = int(parse_qs(urlsplit(url).query)["expires"][0])
+
+        other_key = raw_client.get(url.replace("notes.txt", "other.txt"))
+        past = int(time.time()) - 1
+        expired = raw_client.get(path, params={
+            "expires": past,
+            "signature": sign_download("co-1/documents/notes.txt", past)
+        })
+        bad_signature = raw_client.get(path, params={"expires": expires, "signature": "0" * 64})
+
+        assert other_key.status_code == 403
+        assert expired.status_code == 403
+        assert bad_signature.status_code == 403
@@ -0,0 +1,226 @@
+"""Tests for the logging pipeline: context, JSON output, sampling, queue and shipping."""
+
+from logging.handlers import QueueListener
+from unittest.mock import AsyncMock, MagicMock, patch
+import json
+import logging
+import queue
+import sys
+import threading
+
+import pytest
+
+from app.middleware.logging import (
+    ContextFilter,
+    DrainingQueueListener,
+    JsonFormatter,
+    MongoLogShipper,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+)
+from app.utils.metrics import LOG_RECORDS_DROPPED
+from app.utils.request_context import company_id_var, request_id_var
+
+
+def make_record(name="app.test", level=logging.INFO, msg="hello %s", args=("world",), exc_info=None, **extra):
+    record = logging.LogRecord(name, level, "module.py", 12, msg, args, exc_info, func="handler")
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class CollectingHandler(logging.Handler):
+    """Handler keeping the records it receives."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class BlockingHandler(CollectingHandler):
+    """Handler blocking until ``released`` is set."""
+
+    def __init__(self, released: threading.Event):
+        super().__init__()
+        self.released = released
+
+    def emit(self, record):
+        self.released.wait(timeout=10)
+        super().emit(record)
+
+
+@pytest.fixture
+def request_context():
+    """Log records as if emitted while serving a request of company co-1."""
+    tokens = [request_id_var.set("req-1"), company_id_var.set("co-1")]
+    yield
+    request_id_var.reset(tokens[0])
+    company_id_var.reset(tokens[1])
+
+
+class TestStructuredOutput:
+    """Test suite for ContextFilter and JsonFormatter."""
+
+    def test_request_context_and_extras(self, request_context):
+        """Records carry the ids of the current request and their extra fields."""
+        record = make_record(route="/api/items")
+        ContextFilter().filter(record)
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert entry["message"] == "hello world"
+        assert entry["request_id"] == "req-1"
+        assert entry["company_id"] == "co-1"
+        assert "user_id" not in entry
+        assert entry["route"] == "/api/items"
+        assert entry["level"] == "INFO"
+
+    def test_exception(self):
+        """Tracebacks are included as text."""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = make_record(level=logging.ERROR, exc_info=sys.exc_info())
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert entry["exception"].endswith("ValueError: boom")
+
+
+class TestSamplingFilter:
+    """Test suite for SamplingFilter."""
+
+    def test_samples_hot_loggers_only(self):
+        """DEBUG/INFO records of configured loggers (and children) are sampled."""
+        sampling = SamplingFilter({"app.auth": 0.1}, random_func=lambda: 0.5)
+
+        assert not sampling.filter(make_record(name="app.auth.security"))
+        assert sampling.filter(make_record(name="app.auth.security", level=logging.WARNING))
+        assert sampling.filter(make_record(name="app.routers.employees"))
+
+    def test_same_decision_for_every_handler(self):
+        """A record is kept or dropped once, whichever handler asks."""
+        draws = iter([0.05, 0.5])
+        sampling = SamplingFilter({"app": 0.1}, random_func=lambda: next(draws))
+        record = make_record()
+
+        assert [sampling.filter(record), sampling.filter(record)] == [True, True]
+
+
+class TestQueueHandler:
+    """Test suite for the asynchronous (queue and listener) mode."""
+
+    def test_listener_writes_records_with_caller_context(self, request_context):
+        """Arguments and context are captured by the caller, I/O runs on the listener thread."""
+        log_queue = queue.Queue()
+        handler = NonBlockingQueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+        target = CollectingHandler()
+        listener = QueueListener(log_queue, target)
+        args = ["before"]
+
+        listener.start()
+        handler.handle(make_record(msg="value %s", args=(args,)))
+        args.append("after")
+        listener.stop()
+
+        record = target.records[0]
+        assert record.getMessage() == "value ['before']"
+        assert record.company_id == "co-1"
+
+    def test_full_queue_drops_records(self):
+        """A full queue never blocks the caller."""
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        dropped = LOG_RECORDS_DROPPED.labels("queue_full")
+        before = dropped._value.get()
+
+        handler.handle(make_record())
+        handler.handle(make_record())
+
+        assert handler.queue.qsize() == 1
+        assert dropped._value.get() == before + 1
+
+    def test_stop_with_full_queue_writes_queued_records(self):
+        """Stopping waits for room behind the queued records instead of failing."""
+        log_queue = queue.Queue(maxsize=2)
+        released = threading.Event()
+        target = BlockingHandler(released)
+        listener = DrainingQueueListener(log_queue, target, stop_timeout=5)
+
+        listener.start()
+        for n in range(3):
+            log_queue.put(make_record(msg=f"record {n}"))
+        threading.Timer(0.1, released.set).start()
+        listener.stop()
+
+        assert [record.msg for record in target.records] == ["record 0", "record 1", "record 2"]
+
+    def test_stop_with_stuck_handlers_drops_queued_records(self):
+        """When the queue stays full, queued records are dropped and the thread is joined."""
+        log_queue = queue.Queue(maxsize=2)
+        released = threading.Event()
+        target = BlockingHandler(released)
+        listener = DrainingQueueListener(log_queue, target, stop_timeout=0.05)
+        dropped = LOG_RECORDS_DROPPED.labels("shutdown")
+        before = dropped._value.get()
+
+        listener.start()
+        for n in range(3):
+            log_queue.put(make_record(msg=f"record {n}"))
+        # The handler is released only after the queued records were dropped
+        threading.Timer(0.5, released.set).start()
+        listener.stop()
+
+        assert [record.msg for record in target.records] == ["record 0"]
+        assert dropped._value.get() == before + 2
+        assert log_queue.empty()
+
+
+class TestMongoLogShipper:
+    """Test suite for shipping records to the ApplicationLog collection."""
+
+    def test_document(self, request_context):
+        """Records map to ApplicationLog fields; the driver's own records are skipped."""
+        shipper = MongoLogShipper()
+        record = make_record(level=logging.WARNING, route="/api/items")
+        ContextFilter().filter(record)
+
+        shipper.handle(record)
+        shipper.handle(make_record(name="pymongo.command", level=logging.WARNING))
+
+        assert len(shipper.buffer) == 1
+        document = shipper.buffer[0]
+        assert document["level"] == "warning"
+        assert document["message"] == "hello world"
+        assert document["request_id"] == "req-1"
+        assert document["company_id"] == "co-1"
+        assert document["context"] == {"route": "/api/items"}
+
+    async def test_ships_in_batches(self):
+        """Buffered records are inserted ``batch_size`` at a time."""
+        shipper = MongoLogShipper(batch_size=2)
+        for _ in range(5):
+            shipper.handle(make_record(level=logging.ERROR))
+        application_log = MagicMock()
+        application_log.insert_many = AsyncMock()
+
+        with patch("app.mongo_models.ApplicationLog", application_log), \
+                patch("app.mongodb.get_mongodb_client", return_value=MagicMock()):
+            assert await shipper.ship() == 5
+
+        assert [len(call.args[0]) for call in application_log.insert_many.await_args_list] == [2, 2, 1]
+        assert not shipper.buffer
+
+    async def test_keeps_records_while_mongodb_is_down(self):
+        """Records wait in the bounded buffer until MongoDB is connected."""
+        shipper = MongoLogShipper(buffer_size=3)
+        for index in range(4):
+            shipper.handle(make_record(level=logging.ERROR, msg=f"record {index}", args=()))
+
+        with patch("app.mongodb.get_mongodb_client", return_value=None):
+            assert await shipper.ship() == 0
+
+        assert [document["message"] for document in shipper.buffer] == ["record 1", "record 2", "record 3"]
@@ -0,0 +1,143 @@
+"""Tests for Prometheus request, database and runtime metrics."""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from app.middleware.metrics import MetricsMiddleware
+from app.utils.metrics import UNMATCHED_ROUTE, MongoCommandMetrics, RuntimeCollector
+from app.utils.websocket_manager import manager
+
+
+def sample(name, **labels):
+    """Current value of a sample in the default registry (0 if absent)."""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def engine_options():
+    """A small queue pool, for the pool statistics."""
+    return {"poolclass": QueuePool, "pool_size": 2, "max_overflow": 1}
+
+
+@pytest.fixture
+def client(instrumented_engine):
+    """Client for a small app wrapped in the metrics middleware."""
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/items/{item_id}")
+    def get_item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404, detail="Not found")
+        with instrumented_engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    with TestClient(app) as client:
+        yield client
+
+
+class TestRequestMetrics:
+    """Test suite for MetricsMiddleware."""
+
+    def test_latency_labelled_by_route_template_and_status(self, client):
+        """Requests are grouped by route template, not raw path."""
+        route = "/metrics-test/items/{item_id}"
+        ok_before = sample("http_request_duration_seconds_count", method="GET", route=route, status="200")
+        missing_before = sample("http_request_duration_seconds_count", method="GET", route=route, status="404")
+
+        client.get("/metrics-test/items/1")
+        client.get("/metrics-test/items/2")
+        client.get("/metrics-test/items/0")
+
+        assert sample("http_request_duration_seconds_count", method="GET", route=route, status="200") == ok_before + 2
+        assert sample("http_request_duration_seconds_count", method="GET", route=route, status="404") == missing_before + 1
+        assert sample("http_request_duration_seconds_count", method="GET", route="/metrics-test/items/1", status="200") == 0
+        assert sample("http_requests_in_progress", method="GET") == 0
+
+    def test_unmatched_paths_share_one_label(self, client):
+        """Unknown paths do not create a series per path."""
+        before = sample("http_request_duration_seconds_count", method="GET", route=UNMATCHED_ROUTE, status="404")
+
+        client.get("/metrics-test/nope/1")
+        client.get("/metrics-test/nope/2")
+
+        assert sample("http_request_duration_seconds_count", method="GET", route=UNMATCHED_ROUTE, status="404") == before + 2
+
+    def test_queries_counted_per_request(self, client):
+        """SQL statements run while serving a request are attributed to it."""
+        route = "/metrics-test/items/{item_id}"
+        count_before = sample("db_queries_per_request_count", route=route)
+        sum_before = sample("db_queries_per_request_sum", route=route)
+
+        client.get("/metrics-test/items/1")
+
+        assert sample("db_queries_per_request_count", route=route) == count_before + 1
+        assert sample("db_queries_per_request_sum", route=route) == sum_before + 3
+        assert sample("db_query_time_per_request_seconds_sum", route=route) > 0
+
+
+class TestRuntimeMetrics:
+    """Test suite for scrape-time and listener metrics."""
+
+    def test_pool_stats(self, instrumented_engine):
+        """Pool size, checkouts and overflow are reported."""
+        collector = RuntimeCollector(instrumented_engine, broker_url="")
+        checkouts_before = sample("db_pool_checkouts_total")
+
+        with instrumented_engine.connect(), instrumented_engine.connect(), instrumented_engine.connect():
+            values = {m.name: m.samples[0].value for m in collector.collect()}
+
+        assert values["db_pool_size"] == 2
+        assert values["db_pool_checked_out"] == 3
+        assert values["db_pool_overflow"] == 1
+        assert sample("db_pool_checkouts_total") == checkouts_before + 3
+
+    def test_queue_length_and_websockets(self, instrumented_engine):
+        """Celery queue length is read from Redis; WebSocket counts from the manager."""
+        collector = RuntimeCollector(instrumented_engine, broker_url="redis://localhost:6379/0")
+        redis_client = MagicMock()
+        redis_client.llen.return_value = 7
+        connections = {"co-1": {object(), object()}, "co-2": {object()}}
+
+        with patch("redis.Redis.from_url", return_value=redis_client), \
+                patch.object(manager, "active_connections", connections):
+            metrics = {m.name: m.samples[0] for m in collector.collect()}
+
+        assert metrics["celery_queue_length"].value == 7
+        assert metrics["celery_queue_length"].labels == {"queue": "celery"}
+        assert metrics["websocket_connections"].value == 3
+        assert metrics["websocket_companies"].value == 2
+        redis_client.llen.assert_called_once_with("celery")
+
+    def test_unreachable_broker_is_skipped(self, instrumented_engine):
+        """A broker outage drops the queue gauge instead of failing the scrape."""
+        collector = RuntimeCollector(instrumented_engine, broker_url="redis://localhost:6379/0")
+        redis_client = MagicMock()
+        redis_client.llen.side_effect = ConnectionError("refused")
+
+        with patch("redis.Redis.from_url", return_value=redis_client):
+            names = [m.name for m in collector.collect()]
+
+        assert "celery_queue_length" not in names
+        assert "websocket_connections" in names
+
+    def test_mongo_command_timings(self):
+        """Command durations are recorded by command name and outcome."""
+        listener = MongoCommandMetrics()
+        before = sample("mongodb_command_duration_seconds_count", command="find", status="success")
+        failed_before = sample("mongodb_command_duration_seconds_count", command="insert", status="failure")
+
+        listener.succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+        listener.failed(SimpleNamespace(command_name="insert", duration_micros=2000))
+
+        assert sample("mongodb_command_duration_seconds_count", command="find", status="success") == before + 1
+        assert sample("mongodb_command_duration_seconds_count", command="insert", status="failure") == failed_before + 1
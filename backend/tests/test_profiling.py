@@ -0,0 +1,147 @@
+"""Tests for the sampling profiler, X-Profile requests and profiler endpoints."""
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import get_current_user
+from app.auth.security import create_access_token
+from app.middleware.profiling import ProfilingMiddleware
+from app.routers import monitoring
+from app.utils.profiler import APP_DIR, Profile, StackSampler, profiler_session
+
+
+def busy(seconds):
+    """Burn CPU in a recognizable frame."""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+@pytest.fixture(autouse=True)
+def clean_session():
+    """Fresh profiler state for every test."""
+    profiler_session.stop()
+    profiler_session.last_profile = None
+    profiler_session.request_profiles.clear()
+    yield
+    profiler_session.stop()
+
+
+class TestProfile:
+    """Test suite for StackSampler and profile exports."""
+
+    def test_sampler_records_stacks(self):
+        """Stacks are recorded outermost first."""
+        sampler = StackSampler(interval=0.001).start()
+        busy(0.1)
+        profile = sampler.stop()
+
+        assert profile.samples > 0
+        assert any("busy" in [frame[0] for frame in stack] for stack in profile.stacks)
+        assert profile.duration >= 0.1
+
+    def test_exports(self):
+        """Collapsed and speedscope outputs describe the same samples."""
+        main, handler = ("main", "/srv/main.py", 1), ("handler", f"{APP_DIR}/routers/x.py", 10)
+        query = ("execute", "/lib/sqlalchemy.py", 99)
+        profile = Profile(interval=0.01)
+        profile.stacks[(main, handler, query)] = 3
+        profile.stacks[(main, handler)] = 1
+
+        assert profile.collapsed().splitlines() == [
+            "main (main.py:1);handler (x.py:10);execute (sqlalchemy.py:99) 3",
+            "main (main.py:1);handler (x.py:10) 1",
+        ]
+        speedscope = json.loads(json.dumps(profile.speedscope()))
+        assert [frame["name"] for frame in speedscope["shared"]["frames"]] == ["main", "handler", "execute"]
+        assert speedscope["profiles"][0]["samples"] == [[0, 1, 2], [0, 1]]
+        assert speedscope["profiles"][0]["weights"] == pytest.approx([0.03, 0.01])
+        assert profile.top(1)[0] == {"function": "execute (sqlalchemy.py:99)", "samples": 3, "share": 0.75}
+        assert profile.top(1, app_only=True)[0]["share"] == 1.0
+        assert "handler (x.py:10) 100%" in profile.summary()
+
+
+class TestRequestProfiling:
+    """Test suite for ProfilingMiddleware."""
+
+    def _client(self):
+        app = FastAPI()
+        app.add_middleware(ProfilingMiddleware)
+
+        # Async, like most routes: runs on the loop under the middleware's frames
+        @app.get("/work")
+        async def work():
+            busy(0.05)
+            return {"ok": True}
+
+        return TestClient(app)
+
+    def _headers(self, role):
+        token = create_access_token({"sub": "user-1", "company_id": "co-1", "role": role})
+        return {"Authorization": f"Bearer {token}", "X-Profile": "1"}
+
+    def test_super_admin_gets_summary(self):
+        """The response carries a summary and the id of the stored profile."""
+        response = self._client().get("/work", headers=self._headers("super_admin"))
+
+        assert response.status_code == 200
+        assert "samples" in response.headers["X-Profile-Summary"]
+        assert profiler_session.find(response.headers["X-Profile-Id"]).samples > 0
+
+    def test_other_roles_are_not_profiled(self):
+        """The header is ignored unless the token belongs to a super admin."""
+        client = self._client()
+
+        response = client.get("/work", headers=self._headers("company_admin"))
+        forged = client.get("/work", headers={"Authorization": "Bearer not-a-token", "X-Profile": "1"})
+
+        assert "X-Profile-Id" not in response.headers
+        assert "X-Profile-Id" not in forged.headers
+        assert not profiler_session.request_profiles
+
+
+class TestProfilerEndpoints:
+    """Test suite for the profiler monitoring endpoints."""
+
+    def _client(self, role):
+        app = FastAPI()
+        app.include_router(monitoring.router, prefix="/api/monitoring")
+        app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="user-1", company_id="co-1", role=role)
+        return TestClient(app)
+
+    def test_window_profile(self):
+        """A window can be started, stopped and downloaded."""
+        client = self._client("super_admin")
+
+        assert client.post("/api/monitoring/profiler/start", params={"duration": 60, "interval_ms": 1}).json()["running"]
+        assert client.post("/api/monitoring/profiler/start").status_code == 409
+        busy(0.05)
+        status = client.post("/api/monitoring/profiler/stop").json()
+
+        assert not status["running"]
+        profile_id = status["last_profile"]["id"]
+        speedscope = client.get(f"/api/monitoring/profiler/profiles/{profile_id}").json()
+        assert speedscope["profiles"][0]["type"] == "sampled"
+        collapsed = client.get(f"/api/monitoring/profiler/profiles/{profile_id}", params={"format": "collapsed"})
+        assert collapsed.headers["content-type"].startswith("text/plain")
+        assert client.get("/api/monitoring/profiler/profiles/missing").status_code == 404
+
+    def test_window_stops_by_itself(self):
+        """The window ends after its duration."""
+        profiler_session.start(duration=0.05, interval=0.001)
+        time.sleep(0.3)
+
+        assert not profiler_session.running
+        assert profiler_session.last_profile is not None
+
+    def test_company_admin_is_rejected(self):
+        """Profiles show every tenant's requests, so only super admins get them."""
+        response = self._client("company_admin").post("/api/monitoring/profiler/start")
+
+        assert response.status_code == 403
+        assert not profiler_session.running
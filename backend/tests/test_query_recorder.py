@@ -0,0 +1,131 @@
+"""Tests for per-request SQL recording, N+1 detection and query budgets."""
+
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+import logging
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from app.middleware.metrics import MetricsMiddleware
+from app.models import Transaction
+from app.routers import dashboard
+from app.utils.query_recorder import QueryRecorder, assert_max_queries, check_query_budget, statement_shape
+
+from .conftest import engine as test_engine
+
+
+class TestStatementShape:
+    """Test suite for statement_shape."""
+
+    def test_literals_and_parameter_lists_are_collapsed(self):
+        """Statements differing only in values or IN-list length share a shape."""
+        first = statement_shape("SELECT * FROM employees WHERE id IN (?, ?)  AND status = 'active' LIMIT 10")
+        second = statement_shape("SELECT * FROM employees\n WHERE id IN (?, ?, ?) AND status = 'on_leave' LIMIT 20")
+
+        assert first == second == "SELECT * FROM employees WHERE id IN (?) AND status = ? LIMIT ?"
+
+    def test_postgres_parameters(self):
+        """psycopg2 named parameters are collapsed too."""
+        shape = statement_shape("SELECT 1 FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)")
+
+        assert shape == "SELECT ? FROM t WHERE id IN (?)"
+
+
+class TestQueryBudget:
+    """Test suite for check_query_budget and the metrics middleware."""
+
+    def test_repeated_shapes_are_reported(self, caplog):
+        """A shape repeated past the threshold is flagged as a possible N+1."""
+        recorder = QueryRecorder()
+        recorder.record("SELECT * FROM companies", 0.001)
+        for i in range(12):
+            recorder.record(f"SELECT * FROM employees WHERE id = {i}", 0.001)
+
+        with caplog.at_level(logging.WARNING):
+            exceeded = check_query_budget(recorder, "/api/employees")
+
+        assert exceeded == ["repeated"]
+        assert recorder.repeated(10) == [("SELECT * FROM employees WHERE id = ?", 12)]
+        assert "Possible N+1 in /api/employees" in caplog.text
+
+    def test_statement_count_is_reported(self):
+        """Too many statements are flagged even when they all differ."""
+        recorder = QueryRecorder()
+        for table in ("a", "b", "c"):
+            recorder.record(f"SELECT * FROM {table}", 0.001)
+
+        with patch("app.utils.query_recorder.settings.query_count_warning_threshold", 2):
+            assert check_query_budget(recorder, "/api/things") == ["count"]
+
+    def test_middleware_counts_n_plus_one_requests(self, instrumented_engine):
+        """Requests repeating a statement are counted per route."""
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/budget-test/items")
+        def list_items():
+            with instrumented_engine.connect() as conn:
+                for i in range(12):
+                    conn.execute(text("SELECT :id"), {"id": i})
+            return []
+
+        labels = {"route": "/budget-test/items", "reason": "repeated"}
+        before = REGISTRY.get_sample_value("db_query_budget_exceeded_total", labels) or 0
+
+        with TestClient(app) as client:
+            client.get("/budget-test/items")
+
+        assert REGISTRY.get_sample_value("db_query_budget_exceeded_total", labels) == before + 1
+
+
+class TestAssertMaxQueries:
+    """Test suite for the assert_max_queries test helper."""
+
+    def test_within_budget(self, instrumented_engine):
+        """Blocks within the budget pass and expose the statements."""
+        with assert_max_queries(2, instrumented_engine) as recorder:
+            with instrumented_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+
+        assert recorder.count == 2
+        assert recorder.statements == ["SELECT 1", "SELECT 2"]
+
+    def test_over_budget_lists_statements(self, instrumented_engine):
+        """Exceeding the budget fails with the offending statement shapes."""
+        with pytest.raises(AssertionError, match=r"at most 1 SQL statements, got 3:\n  3x SELECT \?"):
+            with assert_max_queries(1, instrumented_engine):
+                with instrumented_engine.connect() as conn:
+                    for i in range(3):
+                        conn.execute(text(f"SELECT {i}"))
+
+    async def test_dashboard_charts_query_budget(self, db_session):
+        """Monthly chart totals take one query, however many months are shown."""
+        today = date.today()
+        for transaction_type, amount in (("income", "100.00"), ("income", "50.00"), ("expense", "30.00")):
+            db_session.add(Transaction(
+                id=str(uuid.uuid4()),
+                company_id="co-1",
+                type=transaction_type,
+                category="Sales",
+                amount=Decimal(amount),
+                transaction_date=today
+            ))
+        db_session.commit()
+
+        with assert_max_queries(2, test_engine):
+            charts = await dashboard.get_dashboard_charts(
+                months=12, db=db_session, current_user=SimpleNamespace(company_id="co-1")
+            )
+
+        assert len(charts.income_by_month) == 12
+        assert charts.income_by_month[-1].value == Decimal("150")
+        assert charts.expenses_by_month[-1].value == Decimal("30")
+        assert charts.income_by_month[0].value == 0
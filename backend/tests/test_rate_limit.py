@@ -0,0 +1,174 @@
+"""Tests for the token bucket rate limiter and its middleware."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth.security import create_access_token
+from app.middleware.rate_limit import (
+    Bucket,
+    MemoryBucketStore,
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitResult,
+    RedisBucketStore,
+    TOKEN_BUCKET_LUA,
+)
+from app.middleware.subscription import Entitlements, entitlement_cache
+from app.models.subscription import PlanTier
+from app.schemas.subscription import PLAN_CONFIGS
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemoryBucketStore:
+    """Test suite for the in-process token buckets."""
+
+    async def test_burst_then_refill(self):
+        """A bucket allows ``limit`` requests at once, then refills over the period."""
+        clock = FakeClock()
+        store = MemoryBucketStore(clock=clock)
+        bucket = Bucket("user:1", limit=3, period=60)
+
+        results = [await store.consume([bucket]) for _ in range(4)]
+
+        assert [result.allowed for result in results] == [True, True, True, False]
+        assert results[2].remaining == 0
+        assert results[3].retry_after == pytest.approx(20)
+        clock.now += 20
+        assert (await store.consume([bucket])).allowed
+
+    async def test_all_buckets_or_none(self):
+        """A request rejected by the company bucket does not use the user's tokens."""
+        store = MemoryBucketStore(clock=FakeClock())
+        company = Bucket("company:1", limit=2)
+        user_a, user_b = Bucket("user:a", limit=5), Bucket("user:b", limit=5)
+
+        await store.consume([user_a, company])
+        await store.consume([user_b, company])
+        rejected = await store.consume([user_a, company])
+
+        assert not rejected.allowed
+        assert rejected.bucket == company
+        assert (await store.consume([user_a])).remaining == 3
+
+
+class TestRedisBucketStore:
+    """Test suite for the Lua-backed store."""
+
+    async def test_script_arguments_and_result(self):
+        """Keys are prefixed, limits passed in ms and the reply mapped back."""
+        script = AsyncMock(return_value=[0, 2, 0, 1500, 60000])
+        client = MagicMock()
+        client.register_script.return_value = script
+        buckets = [Bucket("user:1", limit=60), Bucket("company:1", limit=300)]
+
+        result = await RedisBucketStore(client).consume(buckets)
+
+        client.register_script.assert_called_once_with(TOKEN_BUCKET_LUA)
+        script.assert_awaited_once_with(
+            keys=["ratelimit:user:1", "ratelimit:company:1"],
+            args=[1, 60, 60000, 300, 60000]
+        )
+        assert not result.allowed
+        assert result.bucket == buckets[1]
+        assert result.retry_after == 1.5
+        assert result.headers()["Retry-After"] == "2"
+
+
+class TestRateLimiter:
+    """Test suite for the local fast path and Redis fallback."""
+
+    async def test_rejections_are_served_locally(self):
+        """Once a bucket is empty, the store is not asked again until it refills."""
+        bucket = Bucket("user:1", limit=1)
+        store = MagicMock()
+        store.consume = AsyncMock(return_value=RateLimitResult(False, bucket, 0, retry_after=30, reset=60))
+        limiter = RateLimiter(store)
+
+        first = await limiter.hit([bucket])
+        second = await limiter.hit([bucket])
+
+        assert not first.allowed and not second.allowed
+        assert store.consume.await_count == 1
+        assert second.headers()["RateLimit-Remaining"] == "0"
+
+    async def test_falls_back_to_local_buckets(self):
+        """Redis errors fall back to local buckets for the retry interval."""
+        store = MagicMock()
+        store.consume = AsyncMock(side_effect=ConnectionError("redis down"))
+        limiter = RateLimiter(store, retry_interval=30)
+        bucket = Bucket("user:1", limit=1)
+
+        results = [await limiter.hit([bucket]) for _ in range(2)]
+
+        assert [result.allowed for result in results] == [True, False]
+        assert store.consume.await_count == 1
+
+
+class TestRateLimitMiddleware:
+    """Test suite for RateLimitMiddleware."""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.add_middleware(RateLimitMiddleware, limiter=RateLimiter())
+
+        @app.get("/api/items")
+        async def items():
+            return []
+
+        @app.get("/health")
+        async def health():
+            return {"status": "healthy"}
+
+        return TestClient(app)
+
+    @pytest.fixture
+    def free_plan(self):
+        """Company co-1 on the free plan, with tiny limits."""
+        entitlement_cache.set(Entitlements(company_id="co-1", plan_id=PlanTier.FREE, status="free"))
+        limits = {"user_per_minute": 2, "company_per_minute": 3}
+        with patch.dict(PLAN_CONFIGS[PlanTier.FREE].rate_limits, limits):
+            yield
+        entitlement_cache.invalidate("co-1")
+
+    def _headers(self, user_id):
+        token = create_access_token({"sub": user_id, "company_id": "co-1", "role": "employee"})
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_user_and_company_limits(self, client, free_plan):
+        """Users share the company's budget on top of their own."""
+        alice, bob = self._headers("alice"), self._headers("bob")
+
+        first = client.get("/api/items", headers=alice)
+        assert first.status_code == 200
+        assert first.headers["RateLimit-Limit"] == "2"
+        assert first.headers["RateLimit-Remaining"] == "1"
+
+        assert client.get("/api/items", headers=alice).status_code == 200
+        assert client.get("/api/items", headers=alice).status_code == 429
+        assert client.get("/api/items", headers=bob).status_code == 200
+
+        rejected = client.get("/api/items", headers=bob)
+        assert rejected.status_code == 429
+        assert rejected.headers["RateLimit-Limit"] == "3"
+        assert int(rejected.headers["Retry-After"]) >= 1
+        assert rejected.json()["detail"] == "Rate limit exceeded. Please try again later."
+
+    def test_anonymous_requests_keyed_on_ip(self, client):
+        """Requests without a valid token share the client IP's bucket."""
+        with patch("app.middleware.rate_limit.settings.rate_limit_anonymous_per_minute", 1):
+            assert client.get("/api/items").status_code == 200
+            assert client.get("/api/items", headers={"Authorization": "Bearer forged"}).status_code == 429
+            assert client.get("/health").status_code == 200
@@ -0,0 +1,171 @@
+"""Tests for the content-addressed report cache."""
+
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.models.company import Company
+from app.models.finance import Transaction
+from app.models.report import ReportJob
+from app.utils.report_cache import (
+    compute_data_version,
+    evict_stale_reports,
+    find_cached_report,
+    find_inflight_report,
+    reap_stale_report_jobs,
+    report_cache_key,
+)
+
+START, END = date(2026, 1, 1), date(2026, 1, 31)
+PARAMS = {"start_date": "2026-01-01", "end_date": "2026-01-31", "variant": "summary"}
+
+
+@pytest.fixture
+def company(db_session):
+    """Company with one January transaction."""
+    db_session.add(Company(id="co-1", name="Acme", email="acme@example.com"))
+    db_session.add(Transaction(
+        id="tx-1", company_id="co-1", type="income", amount=Decimal("100.00"),
+        transaction_date=date(2026, 1, 10), updated_at=datetime(2026, 1, 10)
+    ))
+    db_session.commit()
+
+
+def _version(db_session):
+    return compute_data_version(db_session, "co-1", "financial", START, END)
+
+
+def _completed_job(db_session, job_id, cache_key, file_key, completed_at, parameters=PARAMS):
+    job = ReportJob(
+        id=job_id, company_id="co-1", report_type="financial",
+        parameters=json.dumps(parameters, sort_keys=True), cache_key=cache_key,
+        status="completed", file_key=file_key, completed_at=completed_at
+    )
+    db_session.add(job)
+    db_session.commit()
+    return job
+
+
+class TestReportCache:
+    """Test suite for the report cache."""
+
+    def test_data_version_tracks_inserts_edits_and_deletes(self, db_session, company):
+        """Changing the report's rows changes the version; restoring them restores it."""
+        versions = [_version(db_session)]
+
+        transaction = db_session.get(Transaction, "tx-1")
+        transaction.amount = Decimal("150.00")
+        transaction.updated_at = datetime(2026, 2, 1)
+        db_session.commit()
+        versions.append(_version(db_session))
+
+        db_session.add(Transaction(
+            id="tx-2", company_id="co-1", type="expense", amount=Decimal("5.00"),
+            transaction_date=date(2026, 1, 11), updated_at=datetime(2026, 1, 11)
+        ))
+        db_session.commit()
+        versions.append(_version(db_session))
+
+        db_session.delete(db_session.get(Transaction, "tx-2"))
+        db_session.commit()
+        versions.append(_version(db_session))
+
+        assert len(set(versions[:3])) == 3
+        # Deleting the inserted row restores the previous data and version
+        assert versions[3] == versions[1]
+
+    def test_cache_key_is_deterministic(self):
+        """Equal inputs give equal keys regardless of parameter order."""
+        reordered = dict(reversed(list(PARAMS.items())))
+
+        assert report_cache_key("co-1", "financial", PARAMS, "v1") == report_cache_key("co-1", "financial", reordered, "v1")
+        assert report_cache_key("co-1", "financial", PARAMS, "v1") != report_cache_key("co-1", "financial", PARAMS, "v2")
+        assert report_cache_key("co-1", "financial", PARAMS, "v1") != report_cache_key("co-2", "financial", PARAMS, "v1")
+
+    def test_hit_requires_fresh_job_and_existing_object(self, db_session, company, local_storage):
+        """Only unexpired reports still present in storage are served from cache."""
+        _completed_job(db_session, "job-old", "key-old", "co-1/reports/old.pdf", datetime.utcnow() - timedelta(days=90))
+        _completed_job(db_session, "job-new", "key-new", "co-1/reports/new.pdf", datetime.utcnow())
+        for key in ("co-1/reports/old.pdf", "co-1/reports/new.pdf"):
+            local_storage.upload_bytes(b"%PDF", key)
+
+        assert find_cached_report(db_session, "co-1", "key-old") is None
+        assert find_cached_report(db_session, "co-1", "key-new").id == "job-new"
+        assert find_cached_report(db_session, "co-2", "key-new") is None
+
+        local_storage.delete_file("co-1/reports/new.pdf")
+        assert find_cached_report(db_session, "co-1", "key-new") is None
+
+    def test_eviction_removes_expired_and_superseded_reports(self, db_session, company, local_storage):
+        """Old versions and expired reports are deleted; the latest is kept."""
+        now = datetime.utcnow()
+        _completed_job(db_session, "job-v1", "k1", "co-1/reports/v1.pdf", now - timedelta(days=2))
+        _completed_job(db_session, "job-v2", "k2", "co-1/reports/v2.pdf", now - timedelta(days=1))
+        q2 = dict(PARAMS, start_date="2026-04-01", end_date="2026-04-30")
+        _completed_job(db_session, "job-q2", "k3", "co-1/reports/q2.pdf", now - timedelta(days=60), parameters=q2)
+        for name in ("v1", "v2", "q2"):
+            local_storage.upload_bytes(b"%PDF", f"co-1/reports/{name}.pdf")
+
+        assert evict_stale_reports(db_session, now=now) == 2
+
+        assert local_storage.list_files("co-1/reports/") == ["co-1/reports/v2.pdf"]
+        assert db_session.get(ReportJob, "job-v2").status == "completed"
+        assert db_session.get(ReportJob, "job-v1").status == "expired"
+
+    def test_eviction_keeps_object_shared_with_newer_job(self, db_session, company, local_storage):
+        """A re-render of unchanged data shares the object, which must survive."""
+        now = datetime.utcnow()
+        _completed_job(db_session, "job-a", "k1", "co-1/reports/same.pdf", now - timedelta(days=2))
+        _completed_job(db_session, "job-b", "k1", "co-1/reports/same.pdf", now - timedelta(days=1))
+        local_storage.upload_bytes(b"%PDF", "co-1/reports/same.pdf")
+
+        evict_stale_reports(db_session, now=now)
+
+        assert local_storage.get_file_metadata("co-1/reports/same.pdf") is not None
+        assert db_session.get(ReportJob, "job-a").status == "expired"
+        assert db_session.get(ReportJob, "job-b").file_key == "co-1/reports/same.pdf"
+
+
+def _inflight_job(db_session, job_id, status, created_at, started_at=None):
+    job = ReportJob(
+        id=job_id, company_id="co-1", report_type="financial",
+        parameters=json.dumps(PARAMS, sort_keys=True), cache_key=job_id,
+        status=status, created_at=created_at, started_at=started_at
+    )
+    db_session.add(job)
+    db_session.commit()
+    return job
+
+
+class TestInflightReports:
+    """Test suite for jobs lost with the API process running them."""
+
+    def test_stale_jobs_are_not_joined(self, db_session, company):
+        """Identical requests only attach to jobs that are still progressing."""
+        now = datetime.utcnow()
+        _inflight_job(db_session, "fresh", "queued", now - timedelta(minutes=1))
+        _inflight_job(db_session, "stuck-queued", "queued", now - timedelta(hours=2))
+        _inflight_job(db_session, "long-running", "running", now - timedelta(hours=2), started_at=now - timedelta(minutes=5))
+        _inflight_job(db_session, "stuck-running", "running", now - timedelta(hours=2), started_at=now - timedelta(hours=1))
+
+        assert find_inflight_report(db_session, "co-1", "fresh").id == "fresh"
+        assert find_inflight_report(db_session, "co-1", "long-running").id == "long-running"
+        assert find_inflight_report(db_session, "co-1", "stuck-queued") is None
+        assert find_inflight_report(db_session, "co-1", "stuck-running") is None
+
+    def test_reaper_fails_stale_jobs(self, db_session, company):
+        """Jobs older than the timeout are marked failed; live jobs are left alone."""
+        now = datetime.utcnow()
+        _inflight_job(db_session, "fresh", "queued", now - timedelta(minutes=1))
+        _inflight_job(db_session, "stuck-queued", "queued", now - timedelta(hours=2))
+        _inflight_job(db_session, "stuck-running", "running", now - timedelta(hours=2), started_at=now - timedelta(hours=1))
+
+        assert reap_stale_report_jobs(db_session, now=now) == 2
+
+        assert db_session.get(ReportJob, "fresh").status == "queued"
+        for job_id in ("stuck-queued", "stuck-running"):
+            job = db_session.get(ReportJob, job_id)
+            assert job.status == "failed"
+            assert job.error
@@ -0,0 +1,112 @@
+"""Tests for the SQL report data layer."""
+
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app.models.company import Company
+from app.models.employee import Employee
+from app.models.finance import Transaction
+from app.models.payroll import PayrollItem, PayrollRun
+from app.utils.report_data import get_financial_totals, get_payroll_totals, iter_payroll_lines
+
+START, END = date(2026, 1, 1), date(2026, 1, 31)
+
+
+@contextmanager
+def count_queries(db_session):
+    """Count SQL statements executed inside the block."""
+    statements = []
+    engine = db_session.get_bind()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def company(db_session):
+    """Company with transactions inside and outside January."""
+    company = Company(id="co-1", name="Acme", email="acme@example.com")
+    db_session.add(company)
+    rows = [
+        ("income", "Sales", "1000.00", date(2026, 1, 5)),
+        ("income", "Services", "250.50", date(2026, 1, 20)),
+        ("expense", "Rent", "300.00", date(2026, 1, 1)),
+        ("expense", "Rent", "300.00", date(2026, 1, 31)),
+        ("expense", None, "40.00", date(2026, 1, 15)),
+        ("expense", "", "10.00", date(2026, 1, 15)),
+        ("expense", "Rent", "999.00", date(2026, 2, 1)),
+    ]
+    for i, (kind, category, amount, day) in enumerate(rows):
+        db_session.add(Transaction(
+            id=f"tx-{i}", company_id=company.id, type=kind, category=category,
+            amount=Decimal(amount), transaction_date=day
+        ))
+    db_session.commit()
+    return company
+
+
+@pytest.fixture
+def payroll(db_session, company):
+    """Payroll items for three employees."""
+    run = PayrollRun(id="run-1", company_id=company.id, period_start=START, period_end=END)
+    db_session.add(run)
+    for i, (first, last) in enumerate([("Zed", "Young"), ("Amy", "Adams"), ("Bob", "Brown")]):
+        db_session.add(Employee(
+            id=f"emp-{i}", company_id=company.id, first_name=first, last_name=last,
+            email=f"{first.lower()}@example.com", hire_date=date(2025, 1, 1)
+        ))
+        db_session.add(PayrollItem(
+            id=f"item-{i}", company_id=company.id, payroll_run_id=run.id, employee_id=f"emp-{i}",
+            base_salary=Decimal("1000.00"), deductions=Decimal("100.00"), net_amount=Decimal("720.00"),
+            created_at=datetime(2026, 1, 31, 12)
+        ))
+    db_session.commit()
+
+
+class TestReportData:
+    """Test suite for report aggregation queries."""
+
+    def test_financial_totals_grouped_in_one_query(self, db_session, company):
+        """Totals and the category breakdown come from a single GROUP BY."""
+        with count_queries(db_session) as statements:
+            totals = get_financial_totals(db_session, "co-1", START, END)
+
+        assert len(statements) == 1
+        assert "GROUP BY" in statements[0]
+        assert totals.income == Decimal("1250.50")
+        assert totals.expenses == Decimal("650.00")
+        assert totals.net == Decimal("600.50")
+        assert totals.expense_breakdown == {"Rent": Decimal("600.00"), "Uncategorized": Decimal("50.00")}
+
+    def test_financial_totals_empty_period(self, db_session, company):
+        """A period without transactions yields zero totals."""
+        totals = get_financial_totals(db_session, "co-1", date(2025, 1, 1), date(2025, 1, 31))
+
+        assert (totals.income, totals.expenses, totals.expense_breakdown) == (0, 0, {})
+
+    def test_payroll_lines_use_single_joined_query(self, db_session, payroll):
+        """Employee names are joined in, not lazy-loaded per item."""
+        with count_queries(db_session) as statements:
+            lines = list(iter_payroll_lines(db_session, "co-1", START, END, batch_size=2))
+
+        assert len(statements) == 1
+        assert [line.employee_name for line in lines] == ["Amy Adams", "Bob Brown", "Zed Young"]
+        assert lines[0].net_pay == 720.0
+
+    def test_payroll_totals(self, db_session, payroll):
+        """Payroll totals are aggregated in SQL."""
+        totals = get_payroll_totals(db_session, "co-1", START, END)
+
+        assert totals.employee_count == 3
+        assert totals.total_gross == Decimal("3000.00")
+        assert totals.total_net == Decimal("2160.00")
@@ -0,0 +1,122 @@
+"""Tests for background report generation jobs."""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.models.company import Company
+from app.models.employee import Employee
+from app.models.finance import Transaction
+from app.models.payroll import PayrollItem, PayrollRun
+from app.models.report import ReportJob
+from app.utils import report_jobs
+from app.utils.report_jobs import create_report_job, run_report_job
+
+
+@pytest.fixture
+def company(db_session):
+    """Company with a few transactions in January."""
+    company = Company(id="co-1", name="Acme", email="acme@example.com")
+    db_session.add(company)
+    for i, (kind, category, amount) in enumerate([
+        ("income", "Sales", "1000.00"),
+        ("expense", "Rent", "300.00"),
+        ("expense", None, "50.00"),
+    ]):
+        db_session.add(Transaction(
+            id=f"tx-{i}",
+            company_id=company.id,
+            type=kind,
+            category=category,
+            amount=Decimal(amount),
+            transaction_date=date(2026, 1, 10)
+        ))
+    db_session.commit()
+    return company
+
+
+@pytest.fixture
+def job_env(db_session, local_storage):
+    """Point the job runner at the test database and local storage, and stub out WebSockets."""
+    session_factory = sessionmaker(bind=db_session.get_bind())
+    with patch.object(report_jobs, "SessionLocal", session_factory), \
+            patch.object(report_jobs, "notify_user_specific", new_callable=AsyncMock) as notify:
+        yield local_storage, notify
+
+
+def _job(db_session, report_type="financial", **parameters):
+    parameters.setdefault("start_date", "2026-01-01")
+    parameters.setdefault("end_date", "2026-01-31")
+    return create_report_job(db_session, "co-1", "user-1", report_type, parameters)
+
+
+class TestReportJobs:
+    """Test suite for background report jobs."""
+
+    async def test_financial_report_renders_in_worker_process(self, db_session, company, job_env):
+        """A job renders in the process pool, uploads the PDF and notifies the user."""
+        storage, notify = job_env
+        job = _job(db_session, variant="summary")
+
+        try:
+            await run_report_job(job.id)
+        finally:
+            report_jobs.shutdown_report_process_pool()
+
+        db_session.expire_all()
+        job = db_session.get(ReportJob, job.id)
+        assert job.status == "completed"
+        assert job.file_key.startswith("co-1/reports/financial_report_2026-01-01_2026-01-31_")
+        assert json.loads(job.summary)["net_income"] == 650.0
+
+        assert storage.path(job.file_key).read_bytes().startswith(b"%PDF")
+        assert notify.call_args.kwargs["notification_type"] == "report_ready"
+        assert notify.call_args.kwargs["data"]["job_id"] == job.id
+
+    async def test_payroll_report_streams_lines_from_database(self, db_session, company, job_env):
+        """Payroll lines are read by the renderer, not passed in the job parameters."""
+        storage, notify = job_env
+        db_session.add(PayrollRun(id="run-1", company_id="co-1", period_start=date(2026, 1, 1), period_end=date(2026, 1, 31)))
+        for i in range(60):
+            db_session.add(Employee(
+                id=f"emp-{i}", company_id="co-1", first_name="Employee", last_name=f"{i:03d}",
+                email=f"e{i}@example.com", hire_date=date(2025, 1, 1)
+            ))
+            db_session.add(PayrollItem(
+                id=f"item-{i}", company_id="co-1", payroll_run_id="run-1", employee_id=f"emp-{i}",
+                base_salary=Decimal("1000.00"), deductions=Decimal("100.00"), net_amount=Decimal("900.00"),
+                created_at=datetime(2026, 1, 31, 12)
+            ))
+        db_session.commit()
+        job = _job(db_session, report_type="payroll")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            await run_report_job(job.id, executor=executor)
+
+        db_session.expire_all()
+        job = db_session.get(ReportJob, job.id)
+        assert job.status == "completed"
+        assert json.loads(job.summary)["employee_count"] == 60
+        assert storage.path(job.file_key).read_bytes().startswith(b"%PDF")
+        assert storage.get_file_metadata(job.file_key)["content_type"] == "application/pdf"
+
+    async def test_failed_job_records_error_and_notifies(self, db_session, company, job_env):
+        """A job without data is marked failed and the user is told why."""
+        storage, notify = job_env
+        job = _job(db_session, report_type="payroll")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            await run_report_job(job.id, executor=executor)
+
+        db_session.expire_all()
+        job = db_session.get(ReportJob, job.id)
+        assert job.status == "failed"
+        assert "No payroll data" in job.error
+        assert job.completed_at is not None
+        assert storage.list_files("co-1/") == []
+        assert notify.call_args.kwargs["notification_type"] == "report_failed"
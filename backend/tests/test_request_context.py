@@ -0,0 +1,135 @@
+"""Tests for request ids, their propagation and span timing."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.celery_config import bind_request_id, propagate_request_id, unbind_request_id
+from app.database import engine
+from app.middleware.request_context import RequestContextMiddleware
+from app.utils.email_dispatch import EmailDispatcher
+from app.utils.request_context import RequestTrace, current_trace, request_id_var
+from app.utils.stripe_gateway import StripeGateway
+from app.utils.tracing import span
+from app.utils.websocket_manager import ConnectionManager
+
+
+@pytest.fixture
+def request_id():
+    """Run the test as if serving request req-1."""
+    token = request_id_var.set("req-1")
+    yield "req-1"
+    request_id_var.reset(token)
+
+
+class TestRequestContextMiddleware:
+    """Test suite for RequestContextMiddleware."""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.add_middleware(RequestContextMiddleware, server_timing=True)
+
+        @app.get("/items")
+        def items():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            with span("stripe"):
+                pass
+            logging.getLogger("app.test").info("listing items")
+            return {"request_id": request_id_var.get()}
+
+        return TestClient(app)
+
+    def test_generates_request_id(self, client):
+        """Requests without an id get a new one, echoed in the response."""
+        first, second = client.get("/items"), client.get("/items")
+
+        assert first.headers["X-Request-ID"] == first.json()["request_id"]
+        assert len(first.headers["X-Request-ID"]) == 32
+        assert first.headers["X-Request-ID"] != second.headers["X-Request-ID"]
+        assert request_id_var.get() is None
+
+    def test_accepts_valid_incoming_id(self, client):
+        """Ids from clients or proxies are kept when well-formed."""
+        kept = client.get("/items", headers={"X-Request-ID": "lb-1234.abc"})
+        replaced = client.get("/items", headers={"X-Request-ID": "bad id\twith spaces"})
+
+        assert kept.json()["request_id"] == "lb-1234.abc"
+        assert replaced.json()["request_id"] != "bad id\twith spaces"
+
+    def test_server_timing(self, client):
+        """SQL time and spans of the request are broken down in Server-Timing."""
+        timing = client.get("/items").headers["Server-Timing"]
+
+        stages = {metric.split(";")[0].strip() for metric in timing.split(",")}
+        assert {"db", "stripe", "total"} <= stages
+
+    def test_logs_carry_request_id(self, client, caplog):
+        """Records logged while serving a request carry its id."""
+        from app.middleware.logging import ContextFilter
+
+        caplog.handler.addFilter(ContextFilter())
+        with caplog.at_level(logging.INFO, logger="app.test"):
+            response = client.get("/items")
+
+        record = next(record for record in caplog.records if record.getMessage() == "listing items")
+        assert record.request_id == response.headers["X-Request-ID"]
+
+
+class TestPropagation:
+    """Test suite for forwarding the request id downstream."""
+
+    def test_celery_task_headers(self, request_id):
+        """Enqueued tasks carry the request id and run with it."""
+        headers = {}
+        propagate_request_id(headers=headers)
+        assert headers == {"request_id": "req-1"}
+
+        task = SimpleNamespace(request=SimpleNamespace(request_id="req-2"))
+        bind_request_id(task_id="t-1", task=task)
+        assert request_id_var.get() == "req-2"
+        unbind_request_id(task_id="t-1")
+        assert request_id_var.get() == "req-1"
+
+    async def test_websocket_messages(self, request_id):
+        """Pushed messages are tagged with the request that triggered them."""
+        manager = ConnectionManager()
+        websocket = MagicMock()
+        websocket.send_json = AsyncMock()
+
+        await manager.send_personal_message(websocket, {"type": "notification"})
+
+        websocket.send_json.assert_awaited_once_with({"type": "notification", "request_id": "req-1"})
+
+    async def test_sendgrid_requests(self, request_id):
+        """Email API calls send the request id and are timed."""
+        sent = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            sent.append(request.headers.get("X-Request-ID"))
+            return httpx.Response(202)
+
+        dispatcher = EmailDispatcher(api_key="SG.test", api_url="http://sendgrid.local", transport=httpx.MockTransport(handle))
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        try:
+            await dispatcher.send("a@example.com", "Hi", "<p>Hi</p>")
+        finally:
+            current_trace.reset(token)
+            await dispatcher.aclose()
+
+        assert sent == ["req-1"]
+        assert trace.stages["sendgrid"][0] == 1
+
+    async def test_stripe_calls_run_in_request_context(self, request_id):
+        """SDK calls in the gateway's threads see the request id."""
+        gateway = StripeGateway(client=MagicMock())
+
+        assert await gateway.call(request_id_var.get) == "req-1"
@@ -0,0 +1,140 @@
+"""Tests for streaming S3 uploads."""
+
+import io
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi import BackgroundTasks, UploadFile
+from starlette.datastructures import Headers
+
+from app.config import settings
+from app.routers import files as files_router
+from app.utils.s3_storage import FileTooLargeError, S3Service
+
+CHUNK_SIZE = 1024
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 client calls used by uploads."""
+
+    def __init__(self, part_delay=0.0):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.part_threads = set()
+        self.part_delay = part_delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentType, Metadata):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, ContentType, Metadata):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.part_threads.add(threading.get_ident())
+        time.sleep(self.part_delay)
+        self.uploads[UploadId][PartNumber] = Body
+        with self._lock:
+            self.in_flight -= 1
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == sorted(parts)
+        self.objects[Key] = b"".join(parts[number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(Key)
+
+
+@pytest.fixture
+def fake_s3():
+    """S3 service backed by the in-memory stand-in, with small parts."""
+    service = S3Service()
+    service.s3_client = FakeS3(part_delay=0.02)
+    with patch.object(settings, "s3_multipart_chunk_size", CHUNK_SIZE), \
+            patch.object(settings, "s3_max_concurrency", 4):
+        yield service
+
+
+def _upload(data, filename="report.pdf"):
+    return UploadFile(
+        file=io.BytesIO(data),
+        filename=filename,
+        headers=Headers({"content-type": "application/pdf"})
+    )
+
+
+class TestStreamingUploads:
+    """Test suite for streaming S3 uploads."""
+
+    async def test_small_file_uses_single_put(self, fake_s3):
+        """A file smaller than one part is sent with a single PUT."""
+        result = await fake_s3.upload_file(_upload(b"hello"), folder="co-1/documents")
+
+        assert fake_s3.s3_client.objects[result["file_key"]] == b"hello"
+        assert result["file_key"].startswith("co-1/documents/")
+        assert fake_s3.s3_client.uploads == {}
+
+    async def test_large_file_uploads_parts_in_parallel_off_the_loop(self, fake_s3):
+        """Parts are sent concurrently from worker threads and reassembled in order."""
+        data = bytes(range(256)) * 40  # 10 parts
+
+        result = await fake_s3.upload_file(_upload(data), folder="co-1/documents")
+
+        client = fake_s3.s3_client
+        assert client.objects[result["file_key"]] == data
+        assert 1 < client.max_in_flight <= 4
+        assert threading.get_ident() not in client.part_threads
+
+    async def test_size_limit_enforced_while_streaming(self, fake_s3):
+        """An oversized upload without a declared size is aborted mid-stream."""
+        with pytest.raises(FileTooLargeError):
+            await fake_s3.upload_file(_upload(b"x" * (CHUNK_SIZE * 5)), folder="co-1", max_size=CHUNK_SIZE * 3)
+
+        client = fake_s3.s3_client
+        assert client.objects == {}
+        assert client.uploads == {}
+        assert len(client.aborted) == 1
+
+    async def test_declared_size_rejected_before_reading(self, fake_s3):
+        """A declared size over the limit is rejected without touching S3."""
+        upload = UploadFile(file=io.BytesIO(b"x" * 10), size=10, filename="a.pdf")
+
+        with pytest.raises(FileTooLargeError):
+            await fake_s3.upload_file(upload, max_size=5)
+
+        assert upload.file.tell() == 0
+
+    async def test_multiple_files_upload_concurrently(self, fake_s3):
+        """Files in one request are uploaded at the same time; failures are per file."""
+        fake_s3.s3_client.part_delay = 0.1
+        files = [_upload(b"a" * CHUNK_SIZE * 2, f"doc{i}.pdf") for i in range(3)]
+        files.append(_upload(b"bad", "script.exe"))
+        user = SimpleNamespace(id="user-1", company_id="co-1")
+
+        started = time.monotonic()
+        response = await files_router.upload_multiple_files(
+            background_tasks=BackgroundTasks(), files=files, folder="documents", current_user=user, storage=fake_s3,
+            db=None
+        )
+        elapsed = time.monotonic() - started
+
+        assert len(response["uploaded_files"]) == 3
+        assert [error["filename"] for error in response["errors"]] == ["script.exe"]
+        # Sequential uploads would take at least 3 files x 0.1s
+        assert elapsed < 0.25
+        assert fake_s3.s3_client.max_in_flight > 2
@@ -0,0 +1,150 @@
+"""Tests for the slow query log and its monitoring endpoint."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.auth import get_current_user
+from app.database import SlowQueryLog, describe_parameters, slow_query_log
+from app.middleware.metrics import MetricsMiddleware
+from app.routers import monitoring
+
+
+@pytest.fixture
+def slow_log():
+    """Global slow query log recording every statement."""
+    slow_query_log.clear()
+    with patch.object(slow_query_log, "threshold_ms", 0):
+        yield slow_query_log
+    slow_query_log.clear()
+
+
+class TestSlowQueryLog:
+    """Test suite for SlowQueryLog."""
+
+    def test_offenders_ranked_by_total_time(self):
+        """Statements are aggregated by shape and ranked by total time."""
+        log = SlowQueryLog(threshold_ms=100)
+        conn = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"))
+
+        log.observe(conn, "SELECT a", "SELECT a", {"id": 1}, 0.5, route="/a", company_id="co-1")
+        for _ in range(3):
+            log.observe(conn, "SELECT b", "SELECT b", ("x", 2), 0.2, route="/b", company_id="co-2")
+
+        top = log.top(10)
+        assert [item["statement"] for item in top] == ["SELECT b", "SELECT a"]
+        assert top[0]["count"] == 3
+        assert top[0]["total_ms"] == pytest.approx(600)
+        assert top[0]["routes"] == {"/b": 3}
+        assert top[0]["company_ids"] == {"co-2": 3}
+        assert top[0]["last_parameters"] == ["str", "int"]
+        assert log.recent(1)[0]["statement"] == "SELECT b"
+        assert log.is_slow(0.1) and not log.is_slow(0.05)
+
+    def test_bounded(self):
+        """The ring buffer and the aggregated statements are bounded."""
+        log = SlowQueryLog(threshold_ms=0, max_records=2)
+        conn = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"))
+
+        with patch.object(SlowQueryLog, "MAX_STATEMENTS", 2):
+            log.observe(conn, "SELECT a", "SELECT a", {}, 0.3)
+            log.observe(conn, "SELECT b", "SELECT b", {}, 0.1)
+            log.observe(conn, "SELECT c", "SELECT c", {}, 0.2)
+
+        assert len(log.recent(10)) == 2
+        assert sorted(item["statement"] for item in log.top(10)) == ["SELECT a", "SELECT c"]
+
+    def test_parameter_values_are_not_kept(self):
+        """Only the types of bound parameters are described."""
+        assert describe_parameters({"email": "a@b.c", "id": 3}) == {"email": "str", "id": "int"}
+        assert describe_parameters([("a", 1), ("b", 2)]) == {"rows": 2, "row": ["str", "int"]}
+
+    def test_explain_on_postgres_uses_savepoint(self):
+        """Sampled SELECTs are explained inside a savepoint."""
+        log = SlowQueryLog(threshold_ms=0, explain_sample_rate=1.0)
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [("Seq Scan on employees",), ("  Filter: (company_id = 'x')",)]
+        conn = MagicMock()
+        conn.dialect.name = "postgresql"
+        conn.connection.dbapi_connection.cursor.return_value = cursor
+
+        record = log.observe(conn, "SELECT * FROM employees WHERE company_id = %(c)s", "SELECT * FROM employees WHERE company_id = ?", {"c": "x"}, 0.4)
+        log.observe(conn, "UPDATE employees SET x = 1", "UPDATE employees SET x = ?", {}, 0.4)
+
+        assert record.explain == "Seq Scan on employees\n  Filter: (company_id = 'x')"
+        executed = [call.args[0] for call in cursor.execute.call_args_list]
+        assert executed == [
+            "SAVEPOINT slow_query_explain",
+            "EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM employees WHERE company_id = %(c)s",
+            "RELEASE SAVEPOINT slow_query_explain",
+        ]
+        assert log.top(10)[0]["last_explain"] == record.explain
+
+
+class TestSlowQueryTracking:
+    """Test suite for slow statements recorded by the engine hooks."""
+
+    def test_attributed_to_route_and_company(self, instrumented_engine, slow_log):
+        """Slow statements carry the request route and company and are persisted."""
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def set_company(request: Request, call_next):
+            request.state.company_id = "co-1"
+            return await call_next(request)
+
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/slow-test/{item_id}")
+        def get_item(item_id: int):
+            with instrumented_engine.connect() as conn:
+                conn.execute(text("SELECT :id"), {"id": item_id})
+            return {}
+
+        with patch.object(slow_query_log, "persist", AsyncMock()) as persist, TestClient(app) as client:
+            client.get("/slow-test/1")
+
+        record = slow_log.recent(1)[0]
+        assert record["statement"] == "SELECT ?"
+        assert record["route"] == "/slow-test/{item_id}"
+        assert record["company_id"] == "co-1"
+        assert persist.await_args.args[0][0].statement == "SELECT ?"
+
+    def test_outside_requests(self, instrumented_engine, slow_log):
+        """Statements outside of requests are still recorded."""
+        with instrumented_engine.connect() as conn:
+            conn.execute(text("SELECT 42"))
+
+        assert slow_log.recent(1)[0]["route"] is None
+
+
+class TestSlowQueryEndpoint:
+    """Test suite for the slow query monitoring endpoint."""
+
+    def _client(self, role):
+        app = FastAPI()
+        app.include_router(monitoring.router, prefix="/api/monitoring")
+        app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="user-1", company_id="co-1", role=role)
+        return TestClient(app)
+
+    def test_super_admin_sees_offenders(self, instrumented_engine, slow_log):
+        """Offenders are listed worst first."""
+        with instrumented_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        response = self._client("super_admin").get("/api/monitoring/slow-queries", params={"include_recent": True})
+
+        body = response.json()
+        assert response.status_code == 200
+        assert body["offenders"][0]["statement"] == "SELECT ?"
+        assert body["recent"][0]["statement"] == "SELECT ?"
+
+    def test_company_admin_is_rejected(self):
+        """Offenders span companies, so company admins cannot see them."""
+        response = self._client("company_admin").get("/api/monitoring/slow-queries")
+
+        assert response.status_code == 403
@@ -0,0 +1,183 @@
+"""Tests for application import time, lazy SDK imports and warmup."""
+
+from pathlib import Path
+from typing import Dict, Tuple
+from unittest.mock import AsyncMock, patch
+import asyncio
+import os
+import subprocess
+import sys
+
+import anyio.to_thread
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from app.utils import warmup as warmup_module
+from app.utils.lazy import lazy_import
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# SDKs of optional services, imported on first use only
+LAZY_MODULES = ("stripe", "reportlab", "sentry_sdk", "boto3", "botocore", "qrcode", "sendgrid", "celery")
+
+# Cumulative import time allowed for app.main (seconds)
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", "5"))
+
+
+def parse_importtime(output: str) -> Dict[str, Tuple[int, int]]:
+    """Parse ``python -X importtime`` output.
+
+    Returns:
+        Self and cumulative microseconds by module name
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return modules
+
+
+@pytest.fixture(scope="module")
+def app_import_times():
+    """Import times of a fresh interpreter importing the application."""
+    env = dict(os.environ, DATABASE_URL="sqlite:///:memory:", SECRET_KEY="import-time", SENTRY_DSN="")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return parse_importtime(result.stderr)
+
+
+class TestImportTime:
+    """Test suite for the cost of importing the application."""
+
+    def test_parse_importtime(self):
+        """Nested imports are reported by name with both timings."""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     _json\n"
+            "import time:      1500 |       1620 |   json\n"
+        )
+
+        assert parse_importtime(output) == {"_json": (120, 120), "json": (1500, 1620)}
+
+    def test_optional_sdks_are_not_imported(self, app_import_times):
+        """SDKs of optional services load on first use, not at startup."""
+        imported = sorted(name for name in LAZY_MODULES if name in app_import_times)
+
+        assert imported == []
+
+    def test_within_budget(self, app_import_times):
+        """Importing the application stays within the budget."""
+        seconds = app_import_times["app.main"][1] / 1_000_000
+
+        assert seconds < IMPORT_BUDGET_SECONDS, f"import app.main took {seconds:.2f}s"
+
+
+class TestLazyImport:
+    """Test suite for lazy_import."""
+
+    def test_loads_on_first_attribute(self):
+        """The module is imported (and configured) on first use only."""
+        configured = []
+        module = lazy_import("json", on_load=lambda m: configured.append(m.__name__))
+
+        assert not module.is_loaded
+        assert module.dumps([1]) == "[1]"
+        assert module.is_loaded
+        assert configured == ["json"]
+
+    def test_attribute_assignment_reaches_module(self):
+        """Setting attributes (e.g. ``stripe.api_key``) sets them on the module."""
+        module = lazy_import("tests")
+
+        module.lazy_flag = True
+        try:
+            assert sys.modules["tests"].lazy_flag is True
+        finally:
+            del sys.modules["tests"].lazy_flag
+
+    def test_missing_module(self):
+        """Import errors surface on first use."""
+        module = lazy_import("app.does_not_exist")
+
+        with pytest.raises(ModuleNotFoundError):
+            module.anything
+
+
+class TestWarmup:
+    """Test suite for the startup warmup."""
+
+    async def test_warms_database_pool(self, tmp_path):
+        """The pool is filled to its size with open connections."""
+        engine = create_engine(
+            f"sqlite:///{tmp_path}/warmup.db",
+            poolclass=QueuePool,
+            pool_size=3,
+            connect_args={"check_same_thread": False}
+        )
+
+        with patch.object(warmup_module, "engine", engine), \
+                patch.object(warmup_module.settings, "database_pool_size", 20):
+            assert await warmup_module.warm_database() == 3
+
+        assert engine.pool.checkedin() == 3
+        engine.dispose()
+
+    async def test_warmup_fits_in_the_threadpool(self, tmp_path):
+        """A pool larger than the threadpool is warmed up to the thread limit."""
+        engine = create_engine(
+            f"sqlite:///{tmp_path}/warmup.db",
+            poolclass=QueuePool,
+            pool_size=5,
+            connect_args={"check_same_thread": False}
+        )
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        total_tokens = limiter.total_tokens
+        limiter.total_tokens = 2
+
+        try:
+            with patch.object(warmup_module, "engine", engine):
+                assert await asyncio.wait_for(warmup_module.warm_database(), 5) == 2
+        finally:
+            limiter.total_tokens = total_tokens
+
+        assert engine.pool.checkedin() == 2
+        engine.dispose()
+
+    async def test_warms_single_connection_engines(self):
+        """Engines without a QueuePool (SQLite in memory) get one connection."""
+        engine = create_engine("sqlite:///:memory:")
+
+        with patch.object(warmup_module, "engine", engine):
+            assert await warmup_module.warm_database() == 1
+
+        engine.dispose()
+
+    async def test_failures_do_not_stop_warmup(self):
+        """A failing step is reported and the next steps still run."""
+        failing = AsyncMock(side_effect=ConnectionError("redis down"))
+        succeeding = AsyncMock()
+        steps = [("rate_limiter", failing), ("database", succeeding)]
+
+        with patch.object(warmup_module, "warmup_steps", return_value=steps):
+            report = await warmup_module.warmup()
+
+        assert report.failures == {"rate_limiter": "redis down"}
+        assert set(report.durations) == {"rate_limiter", "database"}
+        succeeding.assert_awaited_once()
+
+    async def test_loads_configured_sdks(self):
+        """Stripe is imported ahead of traffic only when it is configured."""
+        with patch.object(warmup_module.settings, "stripe_secret_key", ""):
+            assert await warmup_module.warm_sdks() == []
+        with patch.object(warmup_module.settings, "stripe_secret_key", "sk_test"):
+            assert await warmup_module.warm_sdks() == ["stripe"]
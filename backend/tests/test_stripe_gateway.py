@@ -0,0 +1,157 @@
+"""Tests for the non-blocking Stripe gateway."""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import stripe_gateway as stripe_gateway_module
+from app.utils.stripe_gateway import CUSTOMER_INVALIDATION_CHANNEL, StripeGateway, invalidate_stripe_customer
+
+
+class FakeStripe:
+    """Local stand-in for the ``stripe`` module.
+
+    Each resource method sleeps briefly (like a network round-trip) and
+    records how often it was called and from which thread.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = []
+        self.threads = set()
+        fake = self
+
+        class Invoice:
+            @staticmethod
+            def list(customer, limit):
+                fake._record("Invoice.list")
+                return SimpleNamespace(data=[SimpleNamespace(id=f"in_{customer}_{i}") for i in range(limit)])
+
+            @staticmethod
+            def upcoming(customer):
+                fake._record("Invoice.upcoming")
+                return SimpleNamespace(id=f"upcoming_{customer}")
+
+        class Customer:
+            @staticmethod
+            def retrieve(customer_id):
+                fake._record("Customer.retrieve")
+                return SimpleNamespace(
+                    id=customer_id,
+                    invoice_settings=SimpleNamespace(default_payment_method="pm_1")
+                )
+
+        class PaymentMethod:
+            @staticmethod
+            def retrieve(payment_method_id):
+                fake._record("PaymentMethod.retrieve")
+                return SimpleNamespace(id=payment_method_id, type="card", card=None)
+
+        self.Invoice = Invoice
+        self.Customer = Customer
+        self.PaymentMethod = PaymentMethod
+
+    def _record(self, name: str):
+        self.calls.append(name)
+        self.threads.add(threading.get_ident())
+        time.sleep(self.latency)
+
+    def count(self, name: str) -> int:
+        return self.calls.count(name)
+
+
+@pytest.fixture
+def fake_stripe():
+    """Fake Stripe client."""
+    return FakeStripe()
+
+
+@pytest.fixture
+def gateway(fake_stripe):
+    """Gateway wired to the fake Stripe client."""
+    return StripeGateway(client=fake_stripe, cache_ttl_seconds=60)
+
+
+class TestStripeGateway:
+    """Test suite for StripeGateway."""
+
+    async def test_calls_run_off_event_loop(self, gateway, fake_stripe):
+        """SDK calls never execute on the event loop thread."""
+        await gateway.get_upcoming_invoice("cus_1")
+
+        assert threading.get_ident() not in fake_stripe.threads
+
+    async def test_independent_reads_run_concurrently(self, gateway, fake_stripe):
+        """Independent reads overlap instead of running back to back."""
+        start = time.perf_counter()
+        await asyncio.gather(
+            gateway.get_upcoming_invoice("cus_1"),
+            gateway.list_invoices("cus_1", limit=3),
+            gateway.get_customer("cus_1"),
+        )
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < fake_stripe.latency * 2.5
+
+    async def test_identical_inflight_reads_are_coalesced(self, gateway, fake_stripe):
+        """Concurrent identical reads share a single SDK request."""
+        results = await asyncio.gather(*[
+            gateway.get_default_payment_method("cus_1") for _ in range(10)
+        ])
+
+        assert all(result is results[0] for result in results)
+        assert fake_stripe.count("Customer.retrieve") == 1
+        assert fake_stripe.count("PaymentMethod.retrieve") == 1
+
+    async def test_reads_are_cached_per_customer(self, gateway, fake_stripe):
+        """Reads are cached per customer and invalidated explicitly."""
+        await gateway.list_invoices("cus_1", limit=2)
+        await gateway.list_invoices("cus_1", limit=2)
+        await gateway.list_invoices("cus_2", limit=2)
+        assert fake_stripe.count("Invoice.list") == 2
+
+        gateway.invalidate_customer("cus_1")
+        await gateway.list_invoices("cus_1", limit=2)
+        assert fake_stripe.count("Invoice.list") == 3
+
+    async def test_customer_invalidation_is_broadcast(self, gateway, fake_stripe):
+        """Invalidating a customer drops it here and publishes it for the other processes."""
+        await gateway.list_invoices("cus_1", limit=2)
+
+        with patch.object(stripe_gateway_module, "stripe_gateway", gateway), \
+                patch.object(stripe_gateway_module, "publish_invalidation") as publish:
+            invalidate_stripe_customer("cus_1")
+
+        publish.assert_called_once_with(CUSTOMER_INVALIDATION_CHANNEL, "cus_1")
+        await gateway.list_invoices("cus_1", limit=2)
+        assert fake_stripe.count("Invoice.list") == 2
+
+    async def test_invalidation_during_fetch_skips_cache(self, gateway, fake_stripe):
+        """A result fetched before a webhook invalidation is not cached."""
+        pending = asyncio.ensure_future(gateway.get_upcoming_invoice("cus_1"))
+        await asyncio.sleep(0)
+        gateway.invalidate_customer("cus_1")
+        await pending
+
+        await gateway.get_upcoming_invoice("cus_1")
+        assert fake_stripe.count("Invoice.upcoming") == 2
+
+    async def test_errors_are_not_cached(self, gateway, fake_stripe):
+        """Failed reads propagate and are retried on the next call."""
+        attempts = []
+
+        def flaky(customer):
+            attempts.append(customer)
+            if len(attempts) == 1:
+                raise RuntimeError("stripe down")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await gateway.read("cus_1", ("flaky",), flaky, "cus_1")
+
+        assert await gateway.read("cus_1", ("flaky",), flaky, "cus_1") == "ok"
+        assert len(attempts) == 2
@@ -0,0 +1,197 @@
+"""Tests for the Stripe webhook inbox."""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+import stripe
+from redis.exceptions import LockNotOwnedError
+
+from app.models.webhook import StripeWebhookEvent
+from app.utils import stripe_webhooks
+from app.utils.stripe_webhooks import customers_with_unprocessed_events, process_customer_events, record_event
+
+
+def _event(event_id: str, created: int, customer: str = "cus_1", event_type: str = "invoice.payment_succeeded"):
+    """Build a verified-looking Stripe event and its raw payload."""
+    body = {
+        "id": event_id,
+        "object": "event",
+        "type": event_type,
+        "created": created,
+        "data": {"object": {"object": "invoice", "id": f"in_{event_id}", "customer": customer}},
+    }
+    payload = json.dumps(body).encode("utf-8")
+    return stripe.Event.construct_from(body, "sk_test"), payload
+
+
+class TestWebhookInbox:
+    """Test suite for webhook persistence and ordered processing."""
+
+    def test_redelivered_event_is_recorded_once(self, db_session):
+        """Stripe retries with the same event ID are deduplicated."""
+        event, payload = _event("evt_1", created=100)
+
+        _, created = record_event(db_session, event, payload)
+        _, created_again = record_event(db_session, event, payload)
+
+        assert created is True
+        assert created_again is False
+        assert db_session.query(StripeWebhookEvent).count() == 1
+
+    def test_events_apply_in_stripe_order(self, db_session):
+        """A customer's events are applied by creation time, not arrival."""
+        for event_id, created in [("evt_late", 300), ("evt_early", 100), ("evt_mid", 200)]:
+            record_event(db_session, *_event(event_id, created))
+
+        applied = []
+        with patch.object(stripe_webhooks, "dispatch_event", side_effect=lambda e, db: applied.append(e.id)):
+            assert process_customer_events(db_session, "cus_1") == 3
+
+        assert applied == ["evt_early", "evt_mid", "evt_late"]
+        statuses = {e.status for e in db_session.query(StripeWebhookEvent).all()}
+        assert statuses == {"processed"}
+
+    def test_processed_events_are_not_reapplied(self, db_session):
+        """Draining twice never re-applies an event."""
+        record_event(db_session, *_event("evt_1", created=100))
+
+        with patch.object(stripe_webhooks, "dispatch_event") as dispatch:
+            process_customer_events(db_session, "cus_1")
+            process_customer_events(db_session, "cus_1")
+
+        assert dispatch.call_count == 1
+
+    def test_failure_blocks_later_events_until_retry(self, db_session):
+        """A failed event stops the drain so later events wait their turn."""
+        record_event(db_session, *_event("evt_1", created=100))
+        record_event(db_session, *_event("evt_2", created=200))
+
+        with patch.object(stripe_webhooks, "dispatch_event", side_effect=RuntimeError("db down")):
+            with pytest.raises(RuntimeError):
+                process_customer_events(db_session, "cus_1")
+
+        first = db_session.get(StripeWebhookEvent, "evt_1")
+        second = db_session.get(StripeWebhookEvent, "evt_2")
+        assert (first.status, first.attempts, first.last_error) == ("failed", 1, "db down")
+        assert second.status == "pending"
+
+        with patch.object(stripe_webhooks, "dispatch_event"):
+            assert process_customer_events(db_session, "cus_1") == 2
+        assert db_session.get(StripeWebhookEvent, "evt_1").attempts == 2
+
+    def test_customers_are_drained_independently(self, db_session):
+        """Draining one customer leaves other customers' events queued."""
+        record_event(db_session, *_event("evt_a", created=100, customer="cus_a"))
+        record_event(db_session, *_event("evt_b", created=100, customer="cus_b"))
+
+        with patch.object(stripe_webhooks, "dispatch_event"):
+            assert process_customer_events(db_session, "cus_a") == 1
+
+        assert db_session.get(StripeWebhookEvent, "evt_b").status == "pending"
+
+    def test_lists_customers_with_unprocessed_events(self, db_session):
+        """Customers with pending or failed events are found for the periodic drain."""
+        record_event(db_session, *_event("evt_a", created=100, customer="cus_a"))
+        record_event(db_session, *_event("evt_b", created=100, customer="cus_b"))
+        record_event(db_session, *_event("evt_c", created=100, customer="cus_c"))
+        db_session.get(StripeWebhookEvent, "evt_b").status = "failed"
+        db_session.get(StripeWebhookEvent, "evt_c").status = "processed"
+        db_session.commit()
+
+        assert sorted(customers_with_unprocessed_events(db_session)) == ["cus_a", "cus_b"]
+
+
+class TestWebhookEndpoint:
+    """Test suite for receiving webhooks."""
+
+    @pytest.fixture
+    def enqueue(self):
+        """Celery configured, with enqueueing patched."""
+        with patch("app.routers.billing.settings.celery_broker_url", "redis://broker"), \
+                patch("app.routers.billing.enqueue_customer_events") as enqueue:
+            yield enqueue
+
+    def _deliver(self, client, event_id: str):
+        event, payload = _event(event_id, created=100)
+        with patch("app.routers.billing.StripeService.construct_webhook_event", return_value=event):
+            return client.post("/api/billing/webhooks", content=payload, headers={"stripe-signature": "t=1"})
+
+    def test_redelivery_reenqueues_unprocessed_event(self, client, db_session, enqueue):
+        """An event whose drain was never enqueued is retried when Stripe redelivers it."""
+        enqueue.side_effect = ConnectionError("broker down")
+        assert self._deliver(client, "evt_1").json() == {"status": "success"}
+
+        enqueue.side_effect = None
+        assert self._deliver(client, "evt_1").json() == {"status": "duplicate"}
+
+        assert enqueue.call_count == 2
+        enqueue.assert_called_with("cus_1")
+
+    def test_redelivery_of_processed_event_is_acknowledged(self, client, db_session, enqueue):
+        """Processed events are acknowledged without scheduling anything."""
+        self._deliver(client, "evt_1")
+        db_session.get(StripeWebhookEvent, "evt_1").status = "processed"
+        db_session.commit()
+
+        assert self._deliver(client, "evt_1").json() == {"status": "duplicate"}
+        assert enqueue.call_count == 1
+
+
+class TestWebhookTask:
+    """Test suite for the per-customer drain task."""
+
+    @pytest.fixture
+    def lock(self):
+        """Redis lock handed out by the task's Redis client."""
+        lock = MagicMock()
+        lock.acquire.return_value = True
+        with patch("app.tasks.get_redis_client") as client, patch("app.tasks.SessionLocal"):
+            client.return_value.lock.return_value = lock
+            yield lock
+
+    def test_busy_lock_requeues_outside_retry_budget(self, lock):
+        """A drain already running makes the task re-enqueue, not retry."""
+        from app.tasks import process_stripe_webhook_events
+
+        lock.acquire.return_value = False
+        with patch.object(process_stripe_webhook_events, "apply_async") as apply_async, \
+                patch.object(process_stripe_webhook_events, "retry") as retry:
+            result = process_stripe_webhook_events("cus_1")
+
+        assert result["status"] == "busy"
+        apply_async.assert_called_once_with(("cus_1",), countdown=2)
+        retry.assert_not_called()
+
+    def test_drains_events_arriving_mid_drain(self, lock):
+        """The lock holder keeps draining until a pass finds nothing new."""
+        from app.tasks import process_stripe_webhook_events
+
+        with patch.object(stripe_webhooks, "process_customer_events", side_effect=[3, 1, 0]) as drain:
+            result = process_stripe_webhook_events("cus_1")
+
+        assert result["applied"] == 4
+        assert drain.call_count == 3
+        lock.release.assert_called_once()
+
+    def test_expired_lock_does_not_hide_result(self, lock):
+        """Releasing a lock that already expired keeps the task's result."""
+        from app.tasks import process_stripe_webhook_events
+
+        lock.release.side_effect = LockNotOwnedError("expired")
+        with patch.object(stripe_webhooks, "process_customer_events", return_value=0):
+            result = process_stripe_webhook_events("cus_1")
+
+        assert result["status"] == "success"
+
+    def test_periodic_drain_enqueues_stuck_customers(self):
+        """The beat task re-enqueues every customer with unprocessed events."""
+        from app.tasks import drain_stripe_webhook_inbox_task, process_stripe_webhook_events
+
+        with patch("app.tasks.SessionLocal"), \
+                patch.object(stripe_webhooks, "customers_with_unprocessed_events", return_value=["cus_a", "cus_b"]), \
+                patch.object(process_stripe_webhook_events, "delay") as delay:
+            result = drain_stripe_webhook_inbox_task()
+
+        assert result["customers"] == 2
+        assert [call.args for call in delay.call_args_list] == [("cus_a",), ("cus_b",)]
@@ -0,0 +1,225 @@
+"""Tests for plan entitlement resolution and caching."""
+
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from app.middleware import subscription as subscription_middleware
+from app.middleware.subscription import (
+    INVALIDATION_CHANNEL,
+    EntitlementCache,
+    Entitlements,
+    check_feature_access,
+    check_usage_limit,
+    entitlement_cache,
+    get_entitlements,
+    invalidate_entitlements,
+    resolve_entitlements,
+)
+from app.models.subscription import PlanTier, Subscription, SubscriptionStatus
+from app.utils.cache_invalidation import invalidation_listener
+
+
+def _subscription(plan_id: str, period_end: datetime = None):
+    """Build a lightweight stand-in for a Subscription row."""
+    return SimpleNamespace(
+        plan_id=plan_id,
+        status="active",
+        current_period_end=period_end or datetime.utcnow() + timedelta(days=30),
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_entitlement_cache():
+    """Start every test with an empty entitlement cache."""
+    entitlement_cache.clear()
+    yield
+    entitlement_cache.clear()
+
+
+@pytest.fixture
+def user():
+    """Minimal authenticated user."""
+    return SimpleNamespace(id="user-1", company_id="company-1")
+
+
+class TestEntitlementCache:
+    """Test suite for the in-process entitlement cache."""
+
+    def test_get_returns_cached_entry(self):
+        """Cached entitlements are returned until invalidated."""
+        cache = EntitlementCache(ttl_seconds=60)
+        entitlements = Entitlements(company_id="c1", plan_id=PlanTier.FREE, status="free")
+        cache.set(entitlements)
+
+        assert cache.get("c1") is entitlements
+        cache.invalidate("c1")
+        assert cache.get("c1") is None
+
+    def test_entry_expires_at_period_end(self):
+        """Entries never outlive the subscription's billing period."""
+        cache = EntitlementCache(ttl_seconds=3600)
+        cache.set(Entitlements(
+            company_id="c1",
+            plan_id=PlanTier.PAYROLL,
+            status="active",
+            current_period_end=datetime.now() - timedelta(seconds=1),
+            has_subscription=True
+        ))
+
+        assert cache.get("c1") is None
+
+
+class TestResolveEntitlements:
+    """Test suite for entitlement resolution."""
+
+    async def test_resolves_once_then_hits_cache(self, user):
+        """Repeated checks only query subscriptions once."""
+        lookup = AsyncMock(return_value=_subscription(PlanTier.PAYROLL.value))
+        with patch.object(subscription_middleware, "get_active_subscription", lookup):
+            assert await check_feature_access(PlanTier.PAYROLL, user, db=None)
+            assert not await check_feature_access(PlanTier.FINANCE, user, db=None)
+            within, _, limit = await check_usage_limit("messages", user, db=None)
+
+        assert lookup.await_count == 1
+        assert within is True
+        assert limit == 500
+
+    async def test_invalidation_forces_refresh(self, user):
+        """Invalidating a company picks up the new plan."""
+        lookup = AsyncMock(return_value=None)
+        with patch.object(subscription_middleware, "get_active_subscription", lookup):
+            first = await resolve_entitlements(user, db=None)
+            lookup.return_value = _subscription(PlanTier.ALL_ACCESS.value)
+            invalidate_entitlements(user.company_id)
+            second = await resolve_entitlements(user, db=None)
+
+        assert first.plan_id == PlanTier.FREE
+        assert second.plan_id == PlanTier.ALL_ACCESS
+        assert second.limit_for("employees") is None
+        assert lookup.await_count == 2
+
+    async def test_dependency_stores_on_request_state(self, user):
+        """The dependency resolves once and reuses request.state."""
+        request = SimpleNamespace(state=SimpleNamespace())
+        lookup = AsyncMock(return_value=None)
+        with patch.object(subscription_middleware, "get_active_subscription", lookup):
+            first = await get_entitlements(request, current_user=user, db=None)
+            entitlement_cache.clear()
+            second = await get_entitlements(request, current_user=user, db=None)
+
+        assert first is second
+        assert lookup.await_count == 1
+
+
+class TestDatabaseEntitlements:
+    """Test suite for resolving entitlements from the database (no lookup patched)."""
+
+    @pytest.fixture
+    def subscriptions(self, db_session, test_company):
+        """An older trialing plan, the current plan and a canceled plan."""
+        now = datetime.utcnow()
+        for n, (plan_id, status, created_at) in enumerate([
+            (PlanTier.FINANCE, SubscriptionStatus.TRIALING, now - timedelta(days=60)),
+            (PlanTier.PAYROLL, SubscriptionStatus.ACTIVE, now - timedelta(days=1)),
+            (PlanTier.ALL_ACCESS, SubscriptionStatus.CANCELED, now),
+        ]):
+            db_session.add(Subscription(
+                company_id=uuid.UUID(test_company.id),
+                stripe_subscription_id=f"sub_{n}",
+                stripe_customer_id="cus_1",
+                plan_id=plan_id,
+                status=status,
+                current_period_start=now - timedelta(days=1),
+                current_period_end=now + timedelta(days=30),
+                created_at=created_at
+            ))
+        db_session.commit()
+
+    async def test_resolves_latest_active_subscription(self, db_session, test_admin_user, subscriptions):
+        """Several active or trialing rows resolve to the most recent one."""
+        entitlements = await resolve_entitlements(test_admin_user, db_session)
+        within, count, limit = await check_usage_limit("employees", test_admin_user, db_session)
+
+        assert entitlements.plan_id == PlanTier.PAYROLL
+        assert entitlements.has_subscription
+        # The payroll plan includes no employees
+        assert (within, count, limit) == (False, 0, 0)
+
+    def test_billing_routes_with_cold_cache(self, client, auth_headers, subscriptions):
+        """Usage and dashboard resolve entitlements when nothing is cached."""
+        usage = client.get("/api/billing/usage", headers=auth_headers)
+        entitlement_cache.clear()
+        dashboard = client.get("/api/billing/dashboard", headers=auth_headers)
+
+        assert usage.status_code == 200
+        assert usage.json()["employees_count"] == 0
+        assert usage.json()["messages_limit"] == 500
+        assert dashboard.status_code == 200
+        assert dashboard.json()["subscription"]["plan_id"] == PlanTier.PAYROLL.value
+
+
+class TestPlanGuards:
+    """Test suite for the require_plan and require_limit dependencies."""
+
+    @pytest.fixture
+    def client(self, user):
+        from fastapi import Depends, FastAPI
+        from fastapi.testclient import TestClient
+        from app.auth.security import get_current_user
+        from app.database import get_db
+        from app.middleware.subscription import require_limit, require_plan
+
+        app = FastAPI()
+        app.dependency_overrides[get_current_user] = lambda: user
+        app.dependency_overrides[get_db] = lambda: None
+
+        @app.get("/payroll", dependencies=[
+            Depends(require_plan(PlanTier.PAYROLL)),
+            Depends(require_limit("messages")),
+        ])
+        async def payroll(entitlements: Entitlements = Depends(get_entitlements)):
+            return {"plan": entitlements.plan_id.value}
+
+        return TestClient(app)
+
+    def test_guards_share_request_entitlements(self, client):
+        """Guards and the route resolve entitlements once per request."""
+        lookup = AsyncMock(return_value=_subscription(PlanTier.PAYROLL.value))
+        with patch.object(subscription_middleware, "get_active_subscription", lookup):
+            response = client.get("/payroll")
+
+        assert response.status_code == 200
+        assert response.json() == {"plan": PlanTier.PAYROLL.value}
+        assert lookup.await_count == 1
+
+    def test_missing_feature_requires_payment(self, client):
+        """Plans without the feature get 402."""
+        lookup = AsyncMock(return_value=_subscription(PlanTier.FINANCE.value))
+        with patch.object(subscription_middleware, "get_active_subscription", lookup):
+            response = client.get("/payroll")
+
+        assert response.status_code == 402
+
+
+class TestSharedInvalidation:
+    """Test suite for broadcasting invalidations to other processes."""
+
+    def test_invalidation_is_published(self):
+        """Invalidating a company publishes it for the other processes."""
+        with patch.object(subscription_middleware, "publish_invalidation") as publish:
+            invalidate_entitlements("company-1")
+
+        publish.assert_called_once_with(INVALIDATION_CHANNEL, "company-1")
+
+    def test_listener_drops_invalidated_company(self):
+        """Invalidations published elsewhere clear the local cache entry."""
+        for company_id in ("c1", "c2"):
+            entitlement_cache.set(Entitlements(company_id=company_id, plan_id=PlanTier.FREE, status="free"))
+
+        invalidation_listener.handle({"type": "message", "channel": INVALIDATION_CHANNEL.encode(), "data": b"c1"})
+
+        assert entitlement_cache.get("c1") is None
+        assert entitlement_cache.get("c2") is not None